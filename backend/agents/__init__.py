@@ -0,0 +1,11 @@
+"""
+AI agents
+Importing agents.langchain_agents loads LangChain, the book vector store and Supabase, so routers
+reach the LangChain manager through get_langchain_agent_manager() on first use instead of at startup
+"""
+
+
+def get_langchain_agent_manager():
+    """Shared LangChain agent manager, importing its module on the first call"""
+    from agents.langchain_agents import langchain_agent_manager
+    return langchain_agent_manager
@@ -6,7 +6,12 @@ from typing import Dict, Any, List, Optional
 from datetime import datetime
 import json
 from services.ai_service import ai_service
-from services.redis_service import redis_service
+from services.interaction_log import interaction_log
+from services.prompt_builder import compact_json
+from services.usage_accounting import usage_scope
+from services.metrics_engine import metrics_engine
+from services.agent_result_cache import agent_result_cache
+from services.agent_fanout import run_agents
 
 class FinancialAgent:
     """Base class for all financial agents"""
@@ -38,13 +43,19 @@ class CashFlowOptimizer(FinancialAgent):
         current_balance = data.get('current_balance', 0)
         monthly_expenses = data.get('monthly_expenses', 0)
         
+        # Runway y nivel de riesgo salen del motor de métricas; el modelo solo los interpreta
+        computed = metrics_engine.evaluate_one({"cash_balance": current_balance, "monthly_burn": monthly_expenses})
+        runway_months = computed["metrics"]["runway_months"]
+        risk_level = computed["risk"]["runway_risk"] or "Bajo"
+        
         # AI-powered analysis
         prompt = f"""
         Como Maya, especialista en optimización de flujo de caja, analiza los siguientes datos:
         
         Balance actual: ${current_balance:,.2f}
         Gastos mensuales: ${monthly_expenses:,.2f}
-        Historial de flujo de caja: {json.dumps(cash_flow_data, indent=2)}
+        Runway calculado: {f"{runway_months} meses" if runway_months is not None else "sin quema de caja"} (riesgo {risk_level})
+        Historial de flujo de caja: {compact_json(cash_flow_data)}
         
         Proporciona:
         1. Análisis de patrones y tendencias
@@ -62,15 +73,11 @@ class CashFlowOptimizer(FinancialAgent):
             "data_context": data
         })
         
-        # Calculate additional metrics
-        runway_months = current_balance / monthly_expenses if monthly_expenses > 0 else float('inf')
-        risk_level = "Alto" if runway_months < 3 else "Medio" if runway_months < 6 else "Bajo"
-        
         return {
             "agent": self.name,
             "analysis": analysis,
             "metrics": {
-                "runway_months": round(runway_months, 1),
+                "runway_months": round(runway_months, 1) if runway_months is not None else float('inf'),
                 "risk_level": risk_level,
                 "liquidity_ratio": round(current_balance / monthly_expenses, 2) if monthly_expenses > 0 else 0
             },
@@ -102,13 +109,14 @@ class UnitEconomicsAnalyst(FinancialAgent):
         churn_rate = data.get('churn_rate', 0)
         avg_revenue_per_user = data.get('arpu', 0)
         customer_count = data.get('customer_count', 0)
+        ltv_cac_ratio = metrics_engine.evaluate_one(data)["metrics"]["ltv_cac_ratio"] or 0
         
         prompt = f"""
         Como Carlos, analista experto en Unit Economics, evalúa estas métricas:
         
         LTV (Customer Lifetime Value): ${ltv:,.2f}
         CAC (Customer Acquisition Cost): ${cac:,.2f}
-        Ratio LTV/CAC: {ltv/cac:.2f} si CAC > 0 else "N/A"
+        Ratio LTV/CAC: {f"{ltv_cac_ratio:.2f}" if cac > 0 else "N/A"}
         Churn Rate: {churn_rate:.2%}
         ARPU (Revenue per User): ${avg_revenue_per_user:,.2f}
         Total Customers: {customer_count:,}
@@ -131,7 +139,6 @@ class UnitEconomicsAnalyst(FinancialAgent):
         })
         
         # Calculate health scores
-        ltv_cac_ratio = ltv / cac if cac > 0 else 0
         payback_months = cac / (avg_revenue_per_user * (1 - churn_rate)) if avg_revenue_per_user > 0 and churn_rate < 1 else 0
         
         health_score = "Excelente" if ltv_cac_ratio > 3 else "Bueno" if ltv_cac_ratio > 2 else "Regular" if ltv_cac_ratio > 1 else "Crítico"
@@ -248,6 +255,12 @@ class RiskAssessmentSpecialist(FinancialAgent):
         burn_rate = data.get('burn_rate', 0)
         revenue_volatility = data.get('revenue_volatility', 0)
         
+        # Niveles de riesgo por reglas (motor de métricas); el LLM aporta la mitigación
+        risk = metrics_engine.evaluate_one(data)["risk"]
+        liquidity_risk = risk["liquidity_risk"] or "Bajo"
+        concentration_risk_level = risk["concentration_risk"] or "Bajo"
+        financial_risk = risk["financial_risk"] or "Bajo"
+        
         prompt = f"""
         Como Alex, especialista en riesgos financieros, evalúa estos indicadores:
         
@@ -255,6 +268,7 @@ class RiskAssessmentSpecialist(FinancialAgent):
         Concentración de clientes: {concentration_risk:.1f}% (top cliente)
         Burn rate mensual: ${burn_rate:,.2f}
         Volatilidad de ingresos: {revenue_volatility:.1f}%
+        Niveles ya calculados: liquidez {liquidity_risk}, concentración {concentration_risk_level}, apalancamiento {financial_risk}
         
         Evalúa riesgos en:
         1. Riesgo de liquidez y solvencia
@@ -277,11 +291,6 @@ class RiskAssessmentSpecialist(FinancialAgent):
             "data_context": data
         })
         
-        # Calculate risk scores
-        liquidity_risk = "Alto" if burn_rate > 0 and (data.get('cash_balance', 0) / burn_rate) < 6 else "Medio" if (data.get('cash_balance', 0) / burn_rate) < 12 else "Bajo"
-        concentration_risk_level = "Alto" if concentration_risk > 25 else "Medio" if concentration_risk > 15 else "Bajo"
-        financial_risk = "Alto" if debt_to_equity > 2 else "Medio" if debt_to_equity > 1 else "Bajo"
-        
         return {
             "agent": self.name,
             "analysis": analysis,
@@ -411,23 +420,23 @@ class AgentManager:
             raise ValueError(f"Agent {agent_id} not found")
         
         agent = self.agents[agent_id]
-        result = await agent.process_request(user_id, data)
-        
-        # Store consultation in Redis for learning system
-        consultation_key = f"agent_consultation:{user_id}:{agent_id}:{datetime.now().isoformat()}"
-        redis_service.redis_client.setex(
-            consultation_key,
-            24 * 60 * 60,  # 24 hours
-            json.dumps({
+        
+        async def analyze() -> Dict[str, Any]:
+            with usage_scope(user=user_id, agent=agent_id):
+                result = await agent.process_request(user_id, data)
+            
+            # Store consultation for learning system
+            await interaction_log.append("classic", user_id, agent_id, {
                 "agent_id": agent_id,
                 "user_id": user_id,
                 "input_data": data,
                 "result": result,
                 "timestamp": datetime.now().isoformat()
             })
-        )
+            return result
         
-        return result
+        # Same data and question as a recent consultation: reuse the analysis
+        return await agent_result_cache.get_or_compute("classic", user_id, agent_id, data, analyze)
     
     async def multi_agent_analysis(self, user_id: str, comprehensive_data: Dict[str, Any]) -> Dict[str, Any]:
         """Get analysis from multiple relevant agents"""
@@ -454,19 +463,19 @@ class AgentManager:
         if not relevant_agents:
             relevant_agents = list(self.agents.keys())
         
-        # Get analysis from each relevant agent
-        results = {}
-        for agent_id in relevant_agents:
-            try:
-                results[agent_id] = await self.consult_agent(agent_id, user_id, comprehensive_data)
-            except Exception as e:
-                results[agent_id] = {
-                    "error": str(e),
-                    "agent": self.agents[agent_id].name
-                }
+        # Get analysis from all relevant agents concurrently (per-agent timeout, partial results kept)
+        outcomes = await run_agents({
+            agent_id: (lambda agent_id=agent_id: self.consult_agent(agent_id, user_id, comprehensive_data))
+            for agent_id in relevant_agents
+        })
+        results = {
+            agent_id: outcome.as_result(self.agents[agent_id].name)
+            for agent_id, outcome in outcomes.items()
+        }
         
         return {
             "multi_agent_analysis": results,
+            "partial_results": not all(outcome.ok for outcome in outcomes.values()),
             "summary": f"Consulta realizada con {len(relevant_agents)} agentes especializados",
             "timestamp": datetime.now().isoformat()
         }
@@ -3,14 +3,17 @@ Agente especializado en análisis y optimización de flujo de caja
 Basado en los Capítulos 3-4 del libro "Finanzas para Emprendedores"
 """
 
-from typing import Dict, List, Optional
+from typing import TYPE_CHECKING, Dict, List, Optional
 from pydantic import BaseModel, Field
 from pydantic_ai import Agent
-import pandas as pd
 from datetime import datetime, timedelta
-import json
+from functools import lru_cache
 import os
 from services.dual_ai_service import dual_ai_service
+from services.prompt_builder import compact_json
+
+if TYPE_CHECKING:
+    import pandas as pd  # Se importa al usarse: pandas es costoso al arrancar
 
 class CashFlowEntry(BaseModel):
     """Entrada individual de flujo de caja"""
@@ -74,10 +77,7 @@ def get_cash_flow_ai_model():
         return 'mock:cash-flow-analyzer'
 
 # Agente especializado en análisis de flujo de caja
-cash_flow_analyzer = Agent(
-    get_cash_flow_ai_model(),
-    result_type=CashFlowAnalysis,
-    system_prompt="""
+CASH_FLOW_ANALYZER_PROMPT = """
     Eres un especialista en gestión de flujo de caja para PyMEs y emprendimientos,
     con expertise en los conceptos de los Capítulos 3-4 de "Finanzas para Emprendedores".
     
@@ -119,14 +119,15 @@ cash_flow_analyzer = Agent(
     - Priorizadas por impacto y urgencia
     - Con tiempos de implementación claros
     - Considerando riesgos y beneficios
-    """,
-)
+    """
+
+@lru_cache(maxsize=None)
+def get_cash_flow_analyzer() -> Agent:
+    """Agente especializado en análisis de flujo de caja (se construye en el primer uso, no al importar)"""
+    return Agent(get_cash_flow_ai_model(), result_type=CashFlowAnalysis, system_prompt=CASH_FLOW_ANALYZER_PROMPT)
 
 # Agente para optimización de cobros
-collections_optimizer = Agent(
-    get_cash_flow_ai_model(),
-    result_type=List[CashFlowRecommendation],
-    system_prompt="""
+COLLECTIONS_OPTIMIZER_PROMPT = """
     Eres un especialista en optimización de cobros y gestión de cuentas por cobrar.
     
     Tu enfoque está en:
@@ -150,15 +151,23 @@ collections_optimizer = Agent(
        - Diversificación de cartera
     
     Proporciona estrategias prácticas para acelerar la conversión de ventas en efectivo.
-    """,
-)
+    """
+
+@lru_cache(maxsize=None)
+def get_collections_optimizer() -> Agent:
+    """Agente para optimización de cobros (se construye en el primer uso, no al importar)"""
+    return Agent(get_cash_flow_ai_model(), result_type=List[CashFlowRecommendation], system_prompt=COLLECTIONS_OPTIMIZER_PROMPT)
 
 class CashFlowAdvisorService:
     """Servicio de asesoría especializada en flujo de caja"""
     
-    def __init__(self):
-        self.cash_flow_analyzer = cash_flow_analyzer
-        self.collections_optimizer = collections_optimizer
+    @property
+    def cash_flow_analyzer(self) -> Agent:
+        return get_cash_flow_analyzer()
+    
+    @property
+    def collections_optimizer(self) -> Agent:
+        return get_collections_optimizer()
     
     async def analyze_cash_flow_health(
         self,
@@ -168,6 +177,7 @@ class CashFlowAdvisorService:
         business_context: Dict
     ) -> CashFlowAnalysis:
         """Análisis integral de salud del flujo de caja"""
+        import pandas as pd
         
         # Preparar datos históricos
         df = pd.DataFrame([entry.dict() for entry in historical_data])
@@ -202,7 +212,7 @@ class CashFlowAdvisorService:
         prompt = f"""
         Analiza la salud del flujo de caja de este negocio basándote en los siguientes datos:
         
-        {json.dumps(analysis_data, indent=2, ensure_ascii=False, default=str)}
+        {compact_json(analysis_data)}
         
         Proporciona un análisis integral que incluya:
         
@@ -253,10 +263,10 @@ class CashFlowAdvisorService:
         Optimiza la estrategia de cobros basándote en:
         
         ANÁLISIS DE COBROS ACTUAL:
-        {json.dumps(collections_analysis, indent=2, ensure_ascii=False)}
+        {compact_json(collections_analysis)}
         
         PORTAFOLIO DE CLIENTES:
-        {json.dumps(customer_portfolio[:10], indent=2, ensure_ascii=False)}  # Primeros 10 para contexto
+        {compact_json(customer_portfolio[:10])}  # Primeros 10 para contexto
         
         Proporciona recomendaciones específicas para:
         
@@ -289,7 +299,7 @@ class CashFlowAdvisorService:
         result = await self.collections_optimizer.run(prompt)
         return result.data
     
-    def _calculate_collections_metrics(self, df: pd.DataFrame) -> Dict:
+    def _calculate_collections_metrics(self, df: "pd.DataFrame") -> Dict:
         """Calcula métricas de cobros"""
         income_df = df[df['type'] == 'income'].copy()
         
@@ -307,7 +317,7 @@ class CashFlowAdvisorService:
             "income_trend": income_df.groupby(income_df['date'].dt.month)['amount'].sum().pct_change().mean()
         }
     
-    def _calculate_payments_metrics(self, df: pd.DataFrame) -> Dict:
+    def _calculate_payments_metrics(self, df: "pd.DataFrame") -> Dict:
         """Calcula métricas de pagos"""
         expense_df = df[df['type'] == 'expense'].copy()
         
@@ -323,6 +333,7 @@ class CashFlowAdvisorService:
     
     def _analyze_customer_concentration(self, customer_portfolio: List[Dict]) -> Dict:
         """Analiza concentración de clientes"""
+        import pandas as pd
         if not customer_portfolio:
             return {}
         
@@ -350,6 +361,7 @@ class CashFlowAdvisorService:
         forecast_months: int = 12
     ) -> List[CashFlowProjection]:
         """Genera proyección de flujo de caja"""
+        import pandas as pd
         
         # Convertir datos históricos a DataFrame
         df = pd.DataFrame([entry.dict() for entry in historical_data])
@@ -401,6 +413,7 @@ class CashFlowAdvisorService:
     
     def calculate_cash_flow_kpis(self, data: List[CashFlowEntry], current_balance: float) -> Dict:
         """Calcula KPIs clave de flujo de caja"""
+        import pandas as pd
         
         df = pd.DataFrame([entry.dict() for entry in data])
         df['date'] = pd.to_datetime(df['date'])
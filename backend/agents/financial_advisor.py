@@ -6,12 +6,12 @@ Basado en los conceptos del libro "Finanzas para Emprendedores"
 from typing import Dict, List, Optional, Union
 from pydantic import BaseModel, Field
 from pydantic_ai import Agent, RunContext
-import pandas as pd
-import numpy as np
 from datetime import datetime, timedelta
-import json
+from functools import lru_cache
 import os
 from services.dual_ai_service import dual_ai_service, TaskComplexity
+from services.prompt_builder import compact_json
+from services.metrics_engine import metrics_engine
 
 # Modelos de datos financieros
 class FinancialMetrics(BaseModel):
@@ -74,10 +74,7 @@ def get_ai_model_config():
         return 'mock:financial-advisor'  # Mock para desarrollo
 
 # Agente especializado en análisis financiero
-financial_advisor_agent = Agent(
-    get_ai_model_config(),
-    result_type=BusinessAnalysis,
-    system_prompt="""
+FINANCIAL_ADVISOR_PROMPT = """
     Eres un consultor financiero experto especializado en PyMEs y emprendimientos, 
     con profundo conocimiento del libro "Finanzas para Emprendedores".
     
@@ -120,14 +117,15 @@ financial_advisor_agent = Agent(
     - Proporciona explicaciones didácticas
     - Incluye pasos específicos de implementación
     - Menciona riesgos y consideraciones importantes
-    """,
-)
+    """
+
+@lru_cache(maxsize=None)
+def get_financial_advisor_agent() -> Agent:
+    """Agente especializado en análisis financiero (se construye en el primer uso, no al importar)"""
+    return Agent(get_ai_model_config(), result_type=BusinessAnalysis, system_prompt=FINANCIAL_ADVISOR_PROMPT)
 
 # Agente especializado en recomendaciones de precios
-pricing_optimizer_agent = Agent(
-    get_ai_model_config(),
-    result_type=List[FinancialRecommendation],
-    system_prompt="""
+PRICING_OPTIMIZER_PROMPT = """
     Eres un especialista en estrategias de precios para PyMEs, basado en los conceptos 
     de los Capítulos 6-9 del libro "Finanzas para Emprendedores".
     
@@ -155,14 +153,15 @@ pricing_optimizer_agent = Agent(
        - Ciclo de vida del producto
     
     Proporciona recomendaciones específicas, prácticas y cuantificadas cuando sea posible.
-    """,
-)
+    """
+
+@lru_cache(maxsize=None)
+def get_pricing_optimizer_agent() -> Agent:
+    """Agente especializado en recomendaciones de precios (se construye en el primer uso, no al importar)"""
+    return Agent(get_ai_model_config(), result_type=List[FinancialRecommendation], system_prompt=PRICING_OPTIMIZER_PROMPT)
 
 # Agente especializado en análisis de crecimiento
-growth_analyzer_agent = Agent(
-    get_ai_model_config(),
-    result_type=List[FinancialRecommendation],
-    system_prompt="""
+GROWTH_ANALYZER_PROMPT = """
     Eres un analista de crecimiento empresarial especializado en PyMEs y startups,
     con expertise en métricas de crecimiento y unit economics.
     
@@ -192,16 +191,27 @@ growth_analyzer_agent = Agent(
        - Métricas para inversores
     
     Identifica las palancas de crecimiento más efectivas y proporciona un roadmap claro.
-    """,
-)
+    """
+
+@lru_cache(maxsize=None)
+def get_growth_analyzer_agent() -> Agent:
+    """Agente especializado en análisis de crecimiento (se construye en el primer uso, no al importar)"""
+    return Agent(get_ai_model_config(), result_type=List[FinancialRecommendation], system_prompt=GROWTH_ANALYZER_PROMPT)
 
 class FinancialAdvisorService:
     """Servicio principal de asesoría financiera inteligente"""
     
-    def __init__(self):
-        self.financial_advisor = financial_advisor_agent
-        self.pricing_optimizer = pricing_optimizer_agent
-        self.growth_analyzer = growth_analyzer_agent
+    @property
+    def financial_advisor(self) -> Agent:
+        return get_financial_advisor_agent()
+    
+    @property
+    def pricing_optimizer(self) -> Agent:
+        return get_pricing_optimizer_agent()
+    
+    @property
+    def growth_analyzer(self) -> Agent:
+        return get_growth_analyzer_agent()
     
     async def analyze_business_health(
         self,
@@ -243,22 +253,22 @@ class FinancialAdvisorService:
             }
         }
         
-        # Calcular métricas adicionales
-        break_even_units = 0
-        if unit_economics.price_per_unit > unit_economics.variable_cost_per_unit:
-            contribution_margin = unit_economics.price_per_unit - unit_economics.variable_cost_per_unit
-            break_even_units = metrics.fixed_costs / contribution_margin if contribution_margin > 0 else 0
-        
+        # Métricas derivadas calculadas por el motor determinista (el modelo solo interpreta)
+        computed = metrics_engine.evaluate_one({**metrics.dict(), **unit_economics.dict()})
         analysis_data["metricas_calculadas"] = {
-            "unidades_punto_equilibrio": break_even_units,
-            "payback_period_meses": (metrics.coca / (unit_economics.price_per_unit - unit_economics.variable_cost_per_unit)) if (unit_economics.price_per_unit - unit_economics.variable_cost_per_unit) > 0 else 0,
-            "runway_meses": (metrics.cash_flow / abs(metrics.expenses)) if metrics.expenses < 0 else float('inf'),
+            "unidades_punto_equilibrio": computed["metrics"]["break_even_units"],
+            "ingresos_punto_equilibrio": computed["metrics"]["break_even_revenue"],
+            "payback_period_meses": computed["metrics"]["payback_months"],
+            "ratio_ltv_coca": computed["metrics"]["ltv_cac_ratio"],
+            "margen_neto_porcentaje": computed["metrics"]["net_margin_pct"],
+            "health_score": computed["health_score"]["total_score"],
+            "nivel_salud": computed["health_score"]["health_level"],
         }
         
         prompt = f"""
         Analiza la salud financiera completa de este negocio basándote en los siguientes datos:
         
-        {json.dumps(analysis_data, indent=2, ensure_ascii=False)}
+        {compact_json(analysis_data)}
         
         Proporciona un análisis integral que incluya:
         1. Evaluación de la salud general del negocio
@@ -285,13 +295,13 @@ class FinancialAdvisorService:
         Analiza y optimiza la estrategia de precios actual basándote en:
         
         ESTRUCTURA ACTUAL DE PRECIOS:
-        {json.dumps(current_pricing, indent=2, ensure_ascii=False)}
+        {compact_json(current_pricing)}
         
         ESTRUCTURA DE COSTOS:
-        {json.dumps(cost_structure, indent=2, ensure_ascii=False)}
+        {compact_json(cost_structure)}
         
         DATOS DE MERCADO:
-        {json.dumps(market_data, indent=2, ensure_ascii=False)}
+        {compact_json(market_data)}
         
         Proporciona recomendaciones específicas para:
         1. Optimización de precios actuales
@@ -333,13 +343,13 @@ class FinancialAdvisorService:
         - Flujo de caja: ${current_metrics.cash_flow:,.2f}
         
         DATOS DE CRECIMIENTO:
-        {json.dumps(growth_data, indent=2, ensure_ascii=False)}
+        {compact_json(growth_data)}
         
         OBJETIVOS:
-        {json.dumps(objectives, indent=2, ensure_ascii=False)}
+        {compact_json(objectives)}
         
         MÉTRICAS CALCULADAS:
-        {json.dumps(growth_metrics, indent=2, ensure_ascii=False)}
+        {compact_json(growth_metrics)}
         
         Identifica y prioriza oportunidades de crecimiento enfocándote en:
         1. Optimización de unit economics
@@ -407,83 +417,8 @@ class FinancialAdvisorService:
         return analysis_results
     
     def calculate_financial_health_score(self, metrics: FinancialMetrics, unit_economics: UnitEconomics) -> Dict:
-        """Calcula un score de salud financiera integral"""
-        
-        scores = {}
-        
-        # 1. Profitability Score (0-25 puntos)
-        net_margin = (metrics.net_profit / metrics.revenue * 100) if metrics.revenue > 0 else 0
-        if net_margin >= 20:
-            scores["profitability"] = 25
-        elif net_margin >= 15:
-            scores["profitability"] = 20
-        elif net_margin >= 10:
-            scores["profitability"] = 15
-        elif net_margin >= 5:
-            scores["profitability"] = 10
-        else:
-            scores["profitability"] = max(0, 5 + net_margin)
-        
-        # 2. Unit Economics Score (0-25 puntos)
-        ltv_coca_ratio = (metrics.ltv / metrics.coca) if metrics.coca > 0 else 0
-        if ltv_coca_ratio >= 5:
-            scores["unit_economics"] = 25
-        elif ltv_coca_ratio >= 3:
-            scores["unit_economics"] = 20
-        elif ltv_coca_ratio >= 2:
-            scores["unit_economics"] = 15
-        elif ltv_coca_ratio >= 1:
-            scores["unit_economics"] = 10
-        else:
-            scores["unit_economics"] = 0
-        
-        # 3. Cash Flow Score (0-25 puntos)
-        cash_flow_margin = (metrics.cash_flow / metrics.revenue * 100) if metrics.revenue > 0 else 0
-        if cash_flow_margin >= 15:
-            scores["cash_flow"] = 25
-        elif cash_flow_margin >= 10:
-            scores["cash_flow"] = 20
-        elif cash_flow_margin >= 5:
-            scores["cash_flow"] = 15
-        elif cash_flow_margin >= 0:
-            scores["cash_flow"] = 10
-        else:
-            scores["cash_flow"] = max(0, 10 + cash_flow_margin * 2)
-        
-        # 4. Growth Efficiency Score (0-25 puntos)
-        contribution_margin = unit_economics.price_per_unit - unit_economics.variable_cost_per_unit
-        contribution_margin_pct = (contribution_margin / unit_economics.price_per_unit * 100) if unit_economics.price_per_unit > 0 else 0
-        
-        if contribution_margin_pct >= 60:
-            scores["growth_efficiency"] = 25
-        elif contribution_margin_pct >= 40:
-            scores["growth_efficiency"] = 20
-        elif contribution_margin_pct >= 30:
-            scores["growth_efficiency"] = 15
-        elif contribution_margin_pct >= 20:
-            scores["growth_efficiency"] = 10
-        else:
-            scores["growth_efficiency"] = max(0, contribution_margin_pct / 4)
-        
-        # Score total
-        total_score = sum(scores.values())
-        
-        # Determinar nivel de salud
-        if total_score >= 80:
-            health_level = "Excelente"
-        elif total_score >= 60:
-            health_level = "Bueno"
-        elif total_score >= 40:
-            health_level = "Regular"
-        else:
-            health_level = "Crítico"
-        
-        return {
-            "total_score": total_score,
-            "health_level": health_level,
-            "component_scores": scores,
-            "recommendations_priority": "Alta" if total_score < 60 else "Media" if total_score < 80 else "Mantenimiento"
-        }
+        """Calcula un score de salud financiera integral (motor de métricas, sin LLM)"""
+        return metrics_engine.health_score({**metrics.dict(), **unit_economics.dict()})
 
 # Instancia global del servicio
 financial_advisor_service = FinancialAdvisorService()
\ No newline at end of file
@@ -2,22 +2,59 @@
 KatalisApp AI Agents - Powered by LangChain + OpenAI + Pydantic
 Sistema de agentes especializados con tecnología de punta
 """
-from typing import Dict, Any, List, Optional, Union
+from typing import AsyncIterator, Awaitable, Callable, Dict, Any, List, Optional, Tuple, Type, Union
+from functools import lru_cache
+from collections.abc import Mapping
+from contextlib import asynccontextmanager
 from datetime import datetime
 import json
 import os
-from pydantic import BaseModel, Field, validator
+import time
+import asyncio
+import threading
+from pydantic import BaseModel, Field, ValidationError, validator
 from langchain_openai import ChatOpenAI
 import openai
 from langchain.schema import HumanMessage, AIMessage, SystemMessage
-from langchain.prompts import ChatPromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate
-from langchain.output_parsers import PydanticOutputParser
-from langchain.chains import LLMChain
-from langchain.memory import ConversationBufferWindowMemory
 from langchain.tools.retriever import create_retriever_tool
-from langchain.agents import AgentType, initialize_agent
-from services.redis_service import redis_service
+from services.dual_ai_service import DEFAULT_DEEPSEEK_BASE_URL, dual_ai_service
+from services.provider_scheduler import Priority, current_priority, priority_scope
 from app.core.vector_store import get_book_retriever, format_citations
+from services.prompt_builder import compact_json, count_tokens, output_budget
+from services.metrics_engine import metrics_engine
+from services.conversation_memory import conversation_memory
+from services.interaction_log import interaction_log
+from services.agent_result_cache import agent_result_cache
+from services.agent_fanout import AgentOutcome, iter_agents
+from services.agent_digest import digest_prompt, extract_digest, fallback_summary, parse_digest, text_digest
+from services.usage_accounting import usage_accounting, usage_from_langchain, extract_usage, UsageRecord
+from services.deadline import (
+    DeadlineExceeded, run_stage, has_time_for, mark_degraded, degraded_stages, remaining_time,
+    MIN_SECONDS_FOR_LLM, MIN_SECONDS_FOR_RETRIEVAL, MIN_SECONDS_FOR_SUMMARY
+)
+
+# Timeouts propios de cada etapa; el deadline de la petición puede acortarlos
+BOOK_QA_TIMEOUT_SECONDS = float(os.getenv("AI_BOOK_QA_TIMEOUT_SECONDS", "10"))
+AGENT_LLM_TIMEOUT_SECONDS = float(os.getenv("AI_AGENT_LLM_TIMEOUT_SECONDS", "120"))
+
+# "structured": JSON validated against the agent's response model; "text": free-form reasoning
+AGENT_OUTPUT_MODE = os.getenv("AI_AGENT_OUTPUT_MODE", "structured").lower()
+# deepseek-reasoner has no JSON mode; structured output uses the chat model
+AGENT_STRUCTURED_MODEL = os.getenv("AI_AGENT_STRUCTURED_MODEL", "deepseek-chat")
+
+@asynccontextmanager
+async def deepseek_slot(stage: str):
+    """
+    DeepSeek bulkhead slot for an agent LLM call (every agent model is served by DeepSeek),
+    queued at the priority of the current block; the wait counts against the request deadline
+    """
+    if not has_time_for(MIN_SECONDS_FOR_LLM):
+        mark_degraded(stage, "deadline")
+        raise DeadlineExceeded(stage)
+    priority = current_priority()
+    scheduler = dual_ai_service.scheduler
+    async with scheduler.slot("deepseek", priority, remaining_time(scheduler.queue_timeouts[priority])):
+        yield
 
 # Pydantic Models for Agent Responses
 class BookCitation(BaseModel):
@@ -93,9 +130,30 @@ class PerformanceOptimization(BaseModel):
     implementation_priority: List[str] = Field(description="Priority order")
     citations: List[BookCitation] = Field(description="Supporting book citations", default=[])
 
+def _strip_titles(schema: Any) -> Any:
+    if isinstance(schema, dict):
+        # Only drop schema annotations ("title": "..."), not properties that happen to be named title
+        return {key: _strip_titles(value) for key, value in schema.items() if not (key == "title" and isinstance(value, str))}
+    if isinstance(schema, list):
+        return [_strip_titles(item) for item in schema]
+    return schema
+
+@lru_cache(maxsize=None)
+def response_schema_prompt(response_model: type) -> str:
+    """Compact JSON Schema of a response model (citations are filled from retrieval, not by the model)"""
+    schema = _strip_titles(response_model.model_json_schema())
+    schema.get("properties", {}).pop("citations", None)
+    return json.dumps(schema, ensure_ascii=False, separators=(",", ":"))
+
 class BaseLangChainAgent:
     """Base class for LangChain-powered financial agents"""
     
+    # Registry id ("maya", "carlos", ...); keys this agent's interaction log
+    agent_id = "agent"
+    # Display name and specialty, readable from the class without building the agent
+    name = "Agent"
+    specialty = ""
+    
     def __init__(self, name: str, specialty: str, system_prompt: str, response_model: BaseModel):
         self.name = name
         self.specialty = specialty
@@ -105,40 +163,32 @@ class BaseLangChainAgent:
         # Initialize DeepSeek LLM (updated API key)
         self.llm = ChatOpenAI(
             openai_api_key=os.getenv("DEEPSEEK_API_KEY"),
-            openai_api_base="https://api.deepseek.com/v1",
+            openai_api_base=os.getenv("DEEPSEEK_BASE_URL", DEFAULT_DEEPSEEK_BASE_URL),
             model_name="deepseek-reasoner",
             temperature=0.1,  # Lower temperature for more consistent responses
-            max_tokens=2000
+            max_tokens=output_budget("agent_consultation")
         )
         
-        # Setup output parser
-        self.output_parser = PydanticOutputParser(pydantic_object=response_model)
-        
-        # Initialize tools
-        self.tools = self._setup_tools()
+        # Structured mode: provider JSON mode validated against the response model
+        self.output_mode = AGENT_OUTPUT_MODE
+        self.structured_model = AGENT_STRUCTURED_MODEL
+        self.structured_llm = ChatOpenAI(
+            openai_api_key=os.getenv("DEEPSEEK_API_KEY"),
+            openai_api_base=os.getenv("DEEPSEEK_BASE_URL", DEFAULT_DEEPSEEK_BASE_URL),
+            model_name=AGENT_STRUCTURED_MODEL,
+            temperature=0.1,
+            max_tokens=output_budget("agent_structured"),
+            model_kwargs={"response_format": {"type": "json_object"}}
+        )
         
-        # Create agent if tools are available
-        if self.tools:
-            self.agent = initialize_agent(
-                tools=self.tools,
-                llm=self.llm,
-                agent=AgentType.STRUCTURED_CHAT_ZERO_SHOT_REACT_DESCRIPTION,
-                verbose=True,
-                handle_parsing_errors=True
-            )
-        else:
-            # Fallback to simple chain if no tools
-            self.prompt_template = ChatPromptTemplate.from_messages([
-                SystemMessagePromptTemplate.from_template(self.system_prompt + "\n\n{format_instructions}"),
-                HumanMessagePromptTemplate.from_template("{input}")
-            ])
-            
-            self.chain = LLMChain(
-                llm=self.llm,
-                prompt=self.prompt_template,
-                output_parser=self.output_parser,
-                verbose=True
-            )
+        # Book QA tool availability (retrieval itself runs in process_request); connects on first access
+        self._tools: Optional[List] = None
+    
+    @property
+    def tools(self) -> List:
+        if self._tools is None:
+            self._tools = self._setup_tools()
+        return self._tools
     
     def _setup_tools(self) -> List:
         """Setup tools for the agent"""
@@ -159,8 +209,19 @@ class BaseLangChainAgent:
         
         return tools
     
-    async def process_request(self, user_id: str, data: Dict[str, Any], use_book_qa: bool = False) -> Dict[str, Any]:
-        """Process request with DeepSeek - Simplified for Pydantic compatibility"""
+    async def process_request(
+        self,
+        user_id: str,
+        data: Dict[str, Any],
+        use_book_qa: bool = False,
+        book_documents: Optional[List] = None
+    ) -> Dict[str, Any]:
+        """
+        Process request with DeepSeek - Simplified for Pydantic compatibility
+        
+        `book_documents` are passages already retrieved for this question (batch QA); when given,
+        the per-request retrieval is skipped.
+        """
         try:
             # Get question from data
             question = data.get('question', '')
@@ -170,13 +231,30 @@ class BaseLangChainAgent:
             # Prepare financial data context  
             input_text = self._prepare_input(data)
             
+            # Deterministic facts (ratios, runway, risk levels, health score) computed before any LLM call
+            facts = metrics_engine.facts(data, financial_data)
+            if data.get('answer_mode') == 'rules':
+                return await self._rules_response(user_id, data, facts)
+            
             # Book QA context (if requested)
             book_context = ""
             citations = []
-            if use_book_qa:
+            retrieval_seconds = 0.0
+            if use_book_qa and book_documents is None and not has_time_for(MIN_SECONDS_FOR_RETRIEVAL):
+                # Etapa opcional: sin tiempo suficiente se responde sin el libro
+                mark_degraded(f"book_qa:{self.name}", "deadline")
+            elif use_book_qa:
+                retrieval_started = time.monotonic()
                 try:
-                    book_retriever = get_book_retriever(k=3)
-                    relevant_docs = book_retriever._get_relevant_documents(question)
+                    if book_documents is not None:
+                        relevant_docs = book_documents
+                    else:
+                        book_retriever = get_book_retriever(k=3)
+                        relevant_docs = await run_stage(
+                            f"book_qa:{self.name}",
+                            asyncio.to_thread(book_retriever._get_relevant_documents, question),
+                            BOOK_QA_TIMEOUT_SECONDS
+                        )
                     
                     for doc in relevant_docs:
                         book_context += f"Capítulo: {doc.metadata.get('chapter', 'Unknown')}\n"
@@ -186,46 +264,37 @@ class BaseLangChainAgent:
                             "excerpt": doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content,
                             "similarity": doc.metadata.get('similarity', 0.0)
                         })
+                except DeadlineExceeded:
+                    pass  # Ya registrada como etapa degradada
                 except Exception as book_error:
                     print(f"Book QA error: {book_error}")
+                retrieval_seconds = time.monotonic() - retrieval_started
             
             # Build book content section  
             book_section = f"\nCONTENIDO RELEVANTE DEL LIBRO:\n{book_context}" if book_context else ""
             
-            # SIMPLIFIED PROMPT - No complex JSON schemas that confuse DeepSeek
-            simplified_prompt = f"""
-            {self.system_prompt}
-            
-            PREGUNTA: {question}
-            CONTEXTO: {context}
-            DATOS FINANCIEROS: {financial_data}
-            {book_section}
-            
-            Proporciona un análisis completo, específico y detallado basado en los datos financieros proporcionados.
-            Incluye cálculos específicos, recomendaciones concretas y próximos pasos.
-            """
-            
-            # Use DeepSeek directly with simplified prompt
-            from langchain.schema import HumanMessage
-            response = await self.llm.ainvoke([HumanMessage(content=simplified_prompt)])
-            
-            # Check if we got a real response
-            if not response.content or len(response.content.strip()) < 50:
-                print(f"⚠️ Short response from DeepSeek: {len(response.content) if response.content else 0} chars")
-                raise Exception("Empty or very short response from AI model")
-            
-            print(f"✅ DeepSeek responded with {len(response.content)} characters")
-            
-            # Parse the natural language response into structured format
-            structured_analysis = self._parse_natural_response(response.content, self.response_model)
+            if self.output_mode == "structured":
+                structured_analysis, usage = await self._structured_analysis(
+                    user_id, question, context, financial_data, facts, book_section, retrieval_seconds
+                )
+                structured_analysis["citations"] = citations
+                response_text = self._render_structured(structured_analysis)
+                ai_model = self.structured_model
+            else:
+                response_text, usage = await self._text_analysis(
+                    user_id, question, context, financial_data, facts, book_section, retrieval_seconds
+                )
+                # Parse the natural language response into structured format
+                structured_analysis = self._parse_natural_response(response_text, self.response_model)
+                ai_model = "deepseek-reasoner"
             
             result = {
-                "response": response.content,
+                "response": response_text,
                 "structured_analysis": structured_analysis,
                 "citations": citations,
                 "confidence": 0.9,
-                "usage": {"total_tokens": len(response.content.split())},
-                "ai_model": "deepseek-reasoner"
+                "usage": {**usage, "total_tokens": usage["prompt_tokens"] + usage["completion_tokens"]},
+                "ai_model": ai_model
             }
             
             await self._store_interaction(user_id, data, result)
@@ -253,6 +322,175 @@ class BaseLangChainAgent:
                 "timestamp": datetime.now().isoformat()
             }
     
+    async def _rules_response(self, user_id: str, data: Dict[str, Any], facts: Dict[str, Any]) -> Dict[str, Any]:
+        """Rule-level answer straight from the metrics engine, without an LLM round trip"""
+        result = {
+            "response": "\n".join(f"{name.replace('_', ' ').capitalize()}: {value}" for name, value in facts.items())
+                        or "No hay datos suficientes para calcular métricas",
+            "structured_analysis": {"computed_metrics": facts},
+            "citations": [],
+            "confidence": 1.0,
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            "ai_model": "metrics_engine"
+        }
+        await self._store_interaction(user_id, data, result)
+        return {
+            "agent": self.name,
+            "specialty": self.specialty,
+            "analysis": result,
+            "timestamp": datetime.now().isoformat(),
+            "user_id": user_id
+        }
+    
+    async def _invoke_llm(
+        self,
+        llm: ChatOpenAI,
+        model_name: str,
+        messages: List,
+        user_id: str,
+        retrieval_seconds: float = 0.0
+    ) -> Tuple[AIMessage, Dict[str, int]]:
+        """Call the LLM in a DeepSeek bulkhead slot within the request deadline and record its token usage"""
+        labels = {"user": user_id, "agent": self.name}
+        async with deepseek_slot(f"llm:{self.name}"):
+            llm_started = time.monotonic()
+            try:
+                response = await run_stage(
+                    f"llm:{self.name}",
+                    llm.ainvoke(messages),
+                    AGENT_LLM_TIMEOUT_SECONDS,
+                    MIN_SECONDS_FOR_LLM
+                )
+            except Exception:
+                usage_accounting.record(UsageRecord(
+                    provider="deepseek",
+                    model=model_name,
+                    latency_seconds=time.monotonic() - llm_started,
+                    retrieval_seconds=retrieval_seconds,
+                    error=True,
+                    labels=labels
+                ))
+                raise
+        usage = usage_from_langchain(response)
+        usage_accounting.record(UsageRecord(
+            provider="deepseek",
+            model=model_name,
+            latency_seconds=time.monotonic() - llm_started,
+            retrieval_seconds=retrieval_seconds,
+            labels=labels,
+            **usage
+        ))
+        return response, usage
+    
+    async def _text_analysis(
+        self,
+        user_id: str,
+        question: str,
+        context: Dict[str, Any],
+        financial_data: Dict[str, Any],
+        facts: Dict[str, Any],
+        book_section: str,
+        retrieval_seconds: float
+    ) -> Tuple[str, Dict[str, int]]:
+        """Free-text analysis with the reasoning model"""
+        # SIMPLIFIED PROMPT - No complex JSON schemas that confuse DeepSeek
+        simplified_prompt = f"""
+            {self.system_prompt}
+            
+            PREGUNTA: {question}
+            CONTEXTO: {compact_json(context)}
+            DATOS FINANCIEROS: {compact_json(financial_data)}
+            MÉTRICAS CALCULADAS (exactas, no recalcular): {compact_json(facts)}
+            {book_section}
+            
+            Proporciona un análisis completo, específico y detallado basado en los datos financieros proporcionados.
+            Incluye cálculos específicos, recomendaciones concretas y próximos pasos.
+            """
+        
+        print(f"📏 Agent {self.name} prompt: {count_tokens(simplified_prompt)} tokens")
+        
+        response, usage = await self._invoke_llm(
+            self.llm, "deepseek-reasoner", [HumanMessage(content=simplified_prompt)], user_id, retrieval_seconds
+        )
+        
+        # Check if we got a real response
+        if not response.content or len(response.content.strip()) < 50:
+            print(f"⚠️ Short response from DeepSeek: {len(response.content) if response.content else 0} chars")
+            raise Exception("Empty or very short response from AI model")
+        
+        print(f"✅ DeepSeek responded with {len(response.content)} characters")
+        return response.content, usage
+    
+    async def _structured_analysis(
+        self,
+        user_id: str,
+        question: str,
+        context: Dict[str, Any],
+        financial_data: Dict[str, Any],
+        facts: Dict[str, Any],
+        book_section: str,
+        retrieval_seconds: float
+    ) -> Tuple[Dict[str, Any], Dict[str, int]]:
+        """JSON output validated against the agent's response model, with one bounded repair retry"""
+        messages = [
+            SystemMessage(content=(
+                f"{self.system_prompt}\n\n"
+                "Responde únicamente con un objeto JSON válido que cumpla este JSON Schema "
+                f"(sin texto adicional ni markdown):\n{response_schema_prompt(self.response_model)}"
+            )),
+            HumanMessage(content=(
+                f"PREGUNTA: {question}\n"
+                f"CONTEXTO: {compact_json(context)}\n"
+                f"DATOS FINANCIEROS: {compact_json(financial_data)}\n"
+                f"MÉTRICAS CALCULADAS (exactas, no recalcular): {compact_json(facts)}"
+                f"{book_section}"
+            ))
+        ]
+        print(f"📏 Agent {self.name} structured prompt: {count_tokens(messages[0].content + messages[1].content)} tokens")
+        
+        response, usage = await self._invoke_llm(
+            self.structured_llm, self.structured_model, messages, user_id, retrieval_seconds
+        )
+        try:
+            return self.response_model.model_validate_json(response.content).model_dump(), usage
+        except ValidationError as error:
+            print(f"⚠️ Agent {self.name} JSON failed validation, requesting one repair: {error.error_count()} errors")
+            repair_messages = messages + [
+                AIMessage(content=response.content),
+                HumanMessage(content=(
+                    "El JSON anterior no cumple el esquema. Errores: "
+                    f"{compact_json(error.errors(include_url=False, include_input=False))}\n"
+                    "Devuelve solo el objeto JSON corregido."
+                ))
+            ]
+            repaired, repair_usage = await self._invoke_llm(
+                self.structured_llm, self.structured_model, repair_messages, user_id
+            )
+            usage = {key: usage[key] + repair_usage[key] for key in usage}
+            # A second validation error propagates as the agent error
+            return self.response_model.model_validate_json(repaired.content).model_dump(), usage
+    
+    @staticmethod
+    def _render_structured(structured: Dict[str, Any]) -> str:
+        """Readable text version of the structured analysis for chat-style clients"""
+        lines = []
+        for field_name, value in structured.items():
+            if field_name == "citations" or value in (None, "", [], {}):
+                continue
+            label = field_name.replace("_", " ").capitalize()
+            if isinstance(value, list):
+                lines.append(f"{label}:")
+                for item in value:
+                    if isinstance(item, dict):
+                        lines.append(f"- {item.get('title', '')}: {item.get('description', '')}".rstrip(": "))
+                    else:
+                        lines.append(f"- {item}")
+            elif isinstance(value, dict):
+                lines.append(f"{label}: " + ", ".join(f"{k}: {v}" for k, v in value.items()))
+            else:
+                lines.append(f"{label}: {value}")
+        return "\n".join(lines)
+    
     def _parse_natural_response(self, response_content: str, response_model: BaseModel) -> Dict[str, Any]:
         """Parse natural language response into structured format - simplified Pydantic integration"""
         
@@ -318,30 +556,23 @@ class BaseLangChainAgent:
     
     def _prepare_input(self, data: Dict[str, Any]) -> str:
         """Prepare input data for the agent"""
-        return json.dumps(data, indent=2)
+        return compact_json(data)
     
     async def _store_interaction(self, user_id: str, input_data: Dict[str, Any], result: Any):
-        """Store interaction for learning system"""
-        interaction_key = f"agent_interaction:{self.name}:{user_id}:{datetime.now().isoformat()}"
-        interaction_data = {
+        """Store interaction for learning system (capped per-user stream for this agent)"""
+        await interaction_log.append("langchain", user_id, self.agent_id, {
             "agent": self.name,
             "user_id": user_id,
             "input_data": input_data,
-            "result": result.dict() if hasattr(result, 'dict') else str(result),
+            "result": result.dict() if hasattr(result, 'dict') else result,
             "timestamp": datetime.now().isoformat()
-        }
-        
-        try:
-            redis_service.redis_client.setex(
-                interaction_key,
-                7 * 24 * 60 * 60,  # 7 days
-                json.dumps(interaction_data)
-            )
-        except Exception as redis_error:
-            print(f"Redis storage error: {redis_error}")
+        })
 
 class MayaCashFlowAgent(BaseLangChainAgent):
     """Maya - Especialista en Optimización de Flujo de Caja"""
+    agent_id = "maya"
+    name = "Maya - Cash Flow Optimizer"
+    specialty = "Optimización de Flujo de Caja"
     
     def __init__(self):
         system_prompt = """
@@ -360,8 +591,8 @@ class MayaCashFlowAgent(BaseLangChainAgent):
         """
         
         super().__init__(
-            name="Maya - Cash Flow Optimizer",
-            specialty="Optimización de Flujo de Caja",
+            name=self.name,
+            specialty=self.specialty,
             system_prompt=system_prompt,
             response_model=CashFlowAnalysis
         )
@@ -383,7 +614,7 @@ class MayaCashFlowAgent(BaseLangChainAgent):
         - Cuentas por pagar: ${payables:,.2f}
         
         HISTORIAL DE FLUJO DE CAJA:
-        {json.dumps(cash_flow_history, indent=2)}
+        {compact_json(cash_flow_history)}
         
         Proporciona un análisis completo incluyendo:
         1. Cálculo preciso de meses de runway
@@ -395,6 +626,9 @@ class MayaCashFlowAgent(BaseLangChainAgent):
 
 class CarlosUnitEconomicsAgent(BaseLangChainAgent):
     """Carlos - Analista de Unit Economics"""
+    agent_id = "carlos"
+    name = "Carlos - Unit Economics Analyst"
+    specialty = "Análisis de Unit Economics"
     
     def __init__(self):
         system_prompt = """
@@ -413,8 +647,8 @@ class CarlosUnitEconomicsAgent(BaseLangChainAgent):
         """
         
         super().__init__(
-            name="Carlos - Unit Economics Analyst",
-            specialty="Análisis de Unit Economics",
+            name=self.name,
+            specialty=self.specialty,
             system_prompt=system_prompt,
             response_model=UnitEconomicsAnalysis
         )
@@ -439,7 +673,7 @@ class CarlosUnitEconomicsAgent(BaseLangChainAgent):
         - Total de clientes: {customer_count:,}
         
         DATOS DE COHORTES:
-        {json.dumps(cohort_data, indent=2)}
+        {compact_json(cohort_data)}
         
         Proporciona análisis completo incluyendo:
         1. Evaluación de la salud de unit economics vs benchmarks
@@ -451,6 +685,9 @@ class CarlosUnitEconomicsAgent(BaseLangChainAgent):
 
 class SofiaGrowthAgent(BaseLangChainAgent):
     """Sofia - Estratega de Crecimiento"""
+    agent_id = "sofia"
+    name = "Sofia - Growth Strategist"
+    specialty = "Estrategia de Crecimiento"
     
     def __init__(self):
         system_prompt = """
@@ -469,8 +706,8 @@ class SofiaGrowthAgent(BaseLangChainAgent):
         """
         
         super().__init__(
-            name="Sofia - Growth Strategist",
-            specialty="Estrategia de Crecimiento",
+            name=self.name,
+            specialty=self.specialty,
             system_prompt=system_prompt,
             response_model=GrowthStrategy
         )
@@ -492,10 +729,10 @@ class SofiaGrowthAgent(BaseLangChainAgent):
         - Penetración de mercado: {(current_revenue/market_size*100 if market_size > 0 else 0):.3f}%
         
         TENDENCIA DE REVENUE:
-        {json.dumps(revenue_trend, indent=2)}
+        {compact_json(revenue_trend)}
         
         CANALES DE ADQUISICIÓN:
-        {json.dumps(channels, indent=2)}
+        {compact_json(channels)}
         
         Diseña estrategia integral incluyendo:
         1. Assessment del potencial de crecimiento
@@ -507,6 +744,9 @@ class SofiaGrowthAgent(BaseLangChainAgent):
 
 class AlexRiskAgent(BaseLangChainAgent):
     """Alex - Especialista en Evaluación de Riesgos"""
+    agent_id = "alex"
+    name = "Alex - Risk Assessment Specialist"
+    specialty = "Evaluación y Gestión de Riesgos"
     
     def __init__(self):
         system_prompt = """
@@ -525,8 +765,8 @@ class AlexRiskAgent(BaseLangChainAgent):
         """
         
         super().__init__(
-            name="Alex - Risk Assessment Specialist",
-            specialty="Evaluación y Gestión de Riesgos",
+            name=self.name,
+            specialty=self.specialty,
             system_prompt=system_prompt,
             response_model=RiskAssessment
         )
@@ -550,7 +790,7 @@ class AlexRiskAgent(BaseLangChainAgent):
         - Runway: {(cash_balance/burn_rate if burn_rate > 0 else 0):.1f} meses
         
         CONTEXTO ADICIONAL:
-        {json.dumps(data.get('risk_context', {}), indent=2)}
+        {compact_json(data.get('risk_context', {}))}
         
         Proporciona evaluación completa incluyendo:
         1. Scoring cuantitativo de riesgo overall (0-100)
@@ -562,6 +802,9 @@ class AlexRiskAgent(BaseLangChainAgent):
 
 class DianaPerformanceAgent(BaseLangChainAgent):
     """Diana - Optimizadora de Rendimiento"""
+    agent_id = "diana"
+    name = "Diana - Performance Optimizer"
+    specialty = "Optimización de Rendimiento Operacional"
     
     def __init__(self):
         system_prompt = """
@@ -580,8 +823,8 @@ class DianaPerformanceAgent(BaseLangChainAgent):
         """
         
         super().__init__(
-            name="Diana - Performance Optimizer",
-            specialty="Optimización de Rendimiento Operacional",
+            name=self.name,
+            specialty=self.specialty,
             system_prompt=system_prompt,
             response_model=PerformanceOptimization
         )
@@ -603,10 +846,10 @@ class DianaPerformanceAgent(BaseLangChainAgent):
         - Score de eficiencia de procesos: {process_efficiency:.0f}/100
         
         MÉTRICAS POR DEPARTAMENTO:
-        {json.dumps(department_metrics, indent=2)}
+        {compact_json(department_metrics)}
         
         ANÁLISIS DE PROCESOS:
-        {json.dumps(data.get('process_analysis', {}), indent=2)}
+        {compact_json(data.get('process_analysis', {}))}
         
         Desarrolla plan de optimización incluyendo:
         1. Score de eficiencia actual vs potencial
@@ -616,59 +859,99 @@ class DianaPerformanceAgent(BaseLangChainAgent):
         5. Estimación de cost savings y ROI
         """
 
+class LazyAgentRegistry(Mapping):
+    """Agents keyed by id, constructed on first use instead of at import time"""
+    
+    def __init__(self, factories: Dict[str, Type[BaseLangChainAgent]]):
+        self._factories = factories
+        self._agents: Dict[str, BaseLangChainAgent] = {}
+        # The warm-up builds agents in a worker thread while requests may build them on the loop
+        self._build_lock = threading.Lock()
+    
+    @staticmethod
+    def _key(agent_id: Any) -> str:
+        return getattr(agent_id, "value", agent_id)
+    
+    def __getitem__(self, agent_id: Any) -> BaseLangChainAgent:
+        key = self._key(agent_id)
+        agent = self._agents.get(key)
+        if agent is None:
+            factory = self._factories[key]
+            with self._build_lock:
+                agent = self._agents.get(key)
+                if agent is None:
+                    started = time.monotonic()
+                    agent = self._agents[key] = factory()
+                    print(f"🧩 Agent {key} built on first use in {time.monotonic() - started:.2f}s")
+        return agent
+    
+    def __contains__(self, agent_id: Any) -> bool:
+        return self._key(agent_id) in self._factories
+    
+    def __iter__(self):
+        return iter(self._factories)
+    
+    def __len__(self) -> int:
+        return len(self._factories)
+    
+    def specs(self) -> Dict[str, Type[BaseLangChainAgent]]:
+        """Agent classes by id, without building them"""
+        return dict(self._factories)
+    
+    def built(self) -> List[str]:
+        return list(self._agents)
+    
+    def warm_up(self, with_tools: bool = False) -> List[str]:
+        """Build every agent ahead of traffic (optionally connecting their book_qa tools too)"""
+        for agent_id in self._factories:
+            agent = self[agent_id]
+            if with_tools:
+                agent.tools
+        return self.built()
+
 class LangChainAgentManager:
     """Manager for LangChain-powered AI agents"""
     
     def __init__(self):
-        self.agents = {
-            "maya": MayaCashFlowAgent(),
-            "carlos": CarlosUnitEconomicsAgent(),
-            "sofia": SofiaGrowthAgent(),
-            "alex": AlexRiskAgent(),
-            "diana": DianaPerformanceAgent()
-        }
-        
-        # Initialize conversation memories for each agent
-        self.memories = {
-            agent_id: ConversationBufferWindowMemory(
-                k=5,  # Keep last 5 interactions
-                return_messages=True
-            ) for agent_id in self.agents.keys()
-        }
+        self.agents = LazyAgentRegistry({
+            "maya": MayaCashFlowAgent,
+            "carlos": CarlosUnitEconomicsAgent,
+            "sofia": SofiaGrowthAgent,
+            "alex": AlexRiskAgent,
+            "diana": DianaPerformanceAgent
+        })
+
     
     def get_available_agents(self) -> List[Dict[str, str]]:
-        """Get list of available agents with their specialties"""
+        """Get list of available agents with their specialties (read from the agent classes, nothing is built)"""
         return [
             {
                 "id": agent_id,
-                "name": agent.name,
-                "specialty": agent.specialty,
-                "description": f"Especialista en {agent.specialty.lower()} usando IA avanzada",
+                "name": agent_class.name,
+                "specialty": agent_class.specialty,
+                "description": f"Especialista en {agent_class.specialty.lower()} usando IA avanzada",
                 "technology": "LangChain + OpenAI GPT-4 + Pydantic"
             }
-            for agent_id, agent in self.agents.items()
+            for agent_id, agent_class in self.agents.specs().items()
         ]
     
-    async def consult_agent(self, agent_id: str, user_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
-        """Consult with a specific LangChain agent"""
+    async def consult_agent(
+        self,
+        agent_id: str,
+        user_id: str,
+        data: Dict[str, Any],
+        refresh: bool = False
+    ) -> Dict[str, Any]:
+        """Consult with a specific LangChain agent (cached per user until their data changes)"""
         if agent_id not in self.agents:
             raise ValueError(f"Agent {agent_id} not found")
         
         agent = self.agents[agent_id]
         
         try:
-            result = await agent.process_request(user_id, data)
-            
-            # Update conversation memory
-            if agent_id in self.memories:
-                self.memories[agent_id].chat_memory.add_user_message(
-                    f"Data: {json.dumps(data, indent=2)}"
-                )
-                self.memories[agent_id].chat_memory.add_ai_message(
-                    f"Analysis: {json.dumps(result, indent=2)}"
-                )
-            
-            return result
+            return await agent_result_cache.get_or_compute(
+                "langchain", user_id, agent_id, data, self._analysis(agent_id, user_id, data), refresh=refresh
+            )
             
         except Exception as e:
             return {
@@ -679,34 +962,127 @@ class LangChainAgentManager:
                 "timestamp": datetime.now().isoformat()
             }
     
-    async def multi_agent_consultation(self, user_id: str, comprehensive_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Get comprehensive analysis from multiple relevant agents"""
+    def _analysis(self, agent_id: str, user_id: str, data: Dict[str, Any]) -> Callable[[], Awaitable[Dict[str, Any]]]:
+        """Uncached agent analysis, as the compute function of the result cache"""
+        agent = self.agents[agent_id]
+        
+        async def analyze() -> Dict[str, Any]:
+            result = await agent.process_request(user_id, data)
+            
+            # Update per-user conversation memory for this agent
+            await conversation_memory.append_turn(
+                user_id,
+                f"Data: {compact_json(data)}",
+                f"Analysis: {compact_json(result)}",
+                scope=f"agent:{agent_id}"
+            )
+            return result
+        
+        return analyze
+    
+    async def prefetch_agent(self, agent_id: str, user_id: str, data: Dict[str, Any]) -> bool:
+        """Speculative analysis into the result cache; its LLM calls queue at batch priority in the DeepSeek bulkhead"""
+        if agent_id not in self.agents:
+            return False
+        with priority_scope(Priority.BATCH):
+            return await agent_result_cache.warm(
+                "langchain", user_id, agent_id, data, self._analysis(agent_id, user_id, data)
+            )
+    
+    async def multi_agent_consultation(
+        self,
+        user_id: str,
+        comprehensive_data: Dict[str, Any],
+        progress: Optional[Callable[[int, str], None]] = None
+    ) -> Dict[str, Any]:
+        """Get comprehensive analysis from multiple relevant agents (progress(percent, message) is optional)"""
+        agents_total = 0
+        completed = 0
+        result: Dict[str, Any] = {}
+        async for event in self.stream_multi_agent_consultation(user_id, comprehensive_data):
+            if event["event"] == "start":
+                agents_total = len(event["agents"])
+                if progress:
+                    progress(0, f"Consultando a {agents_total} agentes en paralelo")
+            elif event["event"] == "agent":
+                completed += 1
+                if progress:
+                    progress(int(80 * completed / agents_total), f"{self.agents[event['agent_id']].name}: {event['status']}")
+            elif event["event"] == "summarizing" and progress:
+                progress(85, "Generando resumen ejecutivo")
+            elif event["event"] == "summary":
+                result = event["result"]
+        return result
+    
+    async def stream_multi_agent_consultation(
+        self,
+        user_id: str,
+        comprehensive_data: Dict[str, Any]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Multi-agent consultation as events: start, one 'agent' event per agent as it finishes, then the summary"""
         
         # Determine relevant agents based on data
         relevant_agents = self._determine_relevant_agents(comprehensive_data)
+        yield {"event": "start", "agents": relevant_agents, "timestamp": datetime.now().isoformat()}
         
-        # Consult each relevant agent
-        agent_results = {}
-        for agent_id in relevant_agents:
-            try:
-                result = await self.consult_agent(agent_id, user_id, comprehensive_data)
-                agent_results[agent_id] = result
-            except Exception as e:
-                agent_results[agent_id] = {
-                    "error": str(e),
-                    "agent": self.agents[agent_id].name
+        # Consult all relevant agents concurrently; each one has its own timeout.
+        # Map step: each result is digested as soon as its agent finishes, overlapping the slower agents
+        outcomes: Dict[str, AgentOutcome] = {}
+        digest_tasks: Dict[str, asyncio.Future] = {}
+        try:
+            async for outcome in iter_agents({
+                agent_id: (lambda agent_id=agent_id: self.consult_agent(agent_id, user_id, comprehensive_data))
+                for agent_id in relevant_agents
+            }):
+                outcomes[outcome.agent_id] = outcome
+                agent_result = outcome.as_result(self.agents[outcome.agent_id].name)
+                digest_tasks[outcome.agent_id] = asyncio.ensure_future(
+                    self._digest_result(outcome.agent_id, agent_result, user_id)
+                )
+                yield {
+                    "event": "agent",
+                    "agent_id": outcome.agent_id,
+                    "status": outcome.status,
+                    "seconds": outcome.seconds,
+                    "result": agent_result
                 }
-        
-        # Generate executive summary
-        executive_summary = await self._generate_executive_summary(agent_results, comprehensive_data)
-        
-        return {
-            "consultation_type": "multi_agent_analysis",
-            "agents_consulted": len(relevant_agents),
-            "agent_results": agent_results,
-            "executive_summary": executive_summary,
-            "timestamp": datetime.now().isoformat(),
-            "user_id": user_id
+            agent_results = {
+                agent_id: outcomes[agent_id].as_result(self.agents[agent_id].name)
+                for agent_id in relevant_agents
+            }
+            
+            # Reduce step: the executive summary only sees the digests and the computed metrics
+            yield {"event": "summarizing", "timestamp": datetime.now().isoformat()}
+            digests = list(await asyncio.gather(*(digest_tasks[agent_id] for agent_id in relevant_agents)))
+        finally:
+            # Client went away mid-stream: stop pending digest calls too
+            for task in digest_tasks.values():
+                if not task.done():
+                    task.cancel()
+        
+        if has_time_for(MIN_SECONDS_FOR_SUMMARY):
+            executive_summary = await self._generate_executive_summary(
+                digests, metrics_engine.facts(comprehensive_data)
+            )
+        else:
+            # Etapa opcional: se omite la llamada y se usa el resumen local
+            mark_degraded("executive_summary", "deadline")
+            executive_summary = self._fallback_summary(digests)
+        
+        yield {
+            "event": "summary",
+            "result": {
+                "consultation_type": "multi_agent_analysis",
+                "agents_consulted": len(relevant_agents),
+                "agent_results": agent_results,
+                "agent_timings": {agent_id: outcomes[agent_id].seconds for agent_id in relevant_agents},
+                "partial_results": not all(outcome.ok for outcome in outcomes.values()),
+                "executive_summary": executive_summary,
+                "agent_digests": digests,
+                "degraded_stages": degraded_stages(),
+                "timestamp": datetime.now().isoformat(),
+                "user_id": user_id
+            }
         }
     
     def _determine_relevant_agents(self, data: Dict[str, Any]) -> List[str]:
@@ -739,18 +1115,41 @@ class LangChainAgentManager:
         
         return relevant
     
-    async def _generate_executive_summary(self, agent_results: Dict[str, Any], data: Dict[str, Any]) -> str:
-        """Generate executive summary from multi-agent analysis"""
+    async def _digest_result(self, agent_id: str, result: Dict[str, Any], user_id: str) -> Dict[str, Any]:
+        """Short digest of one agent's result: read from the structured output, or a small LLM map for free text"""
+        agent = self.agents[agent_id]
+        digest = extract_digest(agent.name, result)
+        if digest is not None:
+            return digest
+        
+        response_text = result["analysis"].get("response", "")
+        if not has_time_for(MIN_SECONDS_FOR_LLM):
+            mark_degraded(f"digest:{agent_id}", "deadline")
+            return text_digest(agent.name, response_text)
+        try:
+            response, _ = await agent._invoke_llm(
+                agent.structured_llm.bind(max_tokens=output_budget("agent_digest")),
+                agent.structured_model,
+                [HumanMessage(content=digest_prompt(agent.name, response_text))],
+                user_id
+            )
+            return parse_digest(agent.name, response.content, response_text)
+        except Exception as e:
+            print(f"⚠️ Digest for {agent.name} failed, using response excerpt: {e}")
+            return text_digest(agent.name, response_text)
+    
+    async def _generate_executive_summary(self, digests: List[Dict[str, Any]], facts: Dict[str, Any]) -> str:
+        """Generate executive summary from the agents' digests (reduce step)"""
         
         summary_prompt = f"""
         Como consultor ejecutivo senior, sintetiza los siguientes análisis de agentes especializados 
         en un resumen ejecutivo conciso para el CEO/Founder:
         
-        DATOS ANALIZADOS:
-        {json.dumps(data, indent=2)}
+        MÉTRICAS CALCULADAS:
+        {compact_json(facts)}
         
-        ANÁLISIS DE AGENTES:
-        {json.dumps(agent_results, indent=2)}
+        DIGEST DE CADA AGENTE:
+        {compact_json(digests)}
         
         Proporciona un resumen ejecutivo que incluya:
         1. Estado general del negocio (2-3 líneas)
@@ -761,14 +1160,36 @@ class LangChainAgentManager:
         
         Mantén el resumen bajo 200 palabras, enfocado en insights accionables.
         """
+        print(f"📏 Executive summary prompt: {count_tokens(summary_prompt)} tokens")
         
         try:
             # Use one of the agents' LLM for summary generation
-            llm = list(self.agents.values())[0].llm
-            response = await llm.agenerate([[HumanMessage(content=summary_prompt)]])
+            llm = self.agents[next(iter(self.agents))].llm
+            async with deepseek_slot("executive_summary"):
+                started = time.monotonic()
+                response = await run_stage(
+                    "executive_summary",
+                    llm.agenerate(
+                        [[HumanMessage(content=summary_prompt)]],
+                        max_tokens=output_budget("executive_summary")
+                    ),
+                    AGENT_LLM_TIMEOUT_SECONDS,
+                    MIN_SECONDS_FOR_LLM
+                )
+            usage_accounting.record(UsageRecord(
+                provider="deepseek",
+                model="deepseek-reasoner",
+                latency_seconds=time.monotonic() - started,
+                labels={"agent": "executive_summary"},
+                **extract_usage((response.llm_output or {}).get("token_usage"))
+            ))
             return response.generations[0][0].text
         except Exception as e:
-            return f"Resumen ejecutivo: Análisis completado por {len(agent_results)} agentes especializados. Revisa los análisis individuales para insights detallados."
+            return self._fallback_summary(digests)
+    
+    def _fallback_summary(self, digests: List[Dict[str, Any]]) -> str:
+        """Resumen sin LLM cuando la síntesis falla o no hay tiempo para ella"""
+        return fallback_summary(digests)
 
 # Global instance
 langchain_agent_manager = LangChainAgentManager()
\ No newline at end of file
@@ -5,6 +5,7 @@ Mock AI Service para testing sin OpenAI API
 from typing import Dict, List
 from datetime import datetime
 import random
+from services.metrics_engine import metrics_engine
 
 class MockFinancialAdvisor:
     """Mock service que simula respuestas de IA para testing"""
@@ -122,83 +123,8 @@ class MockFinancialAdvisor:
         }
     
     def calculate_health_score(self, metrics, unit_economics):
-        """Calcula score de salud financiera"""
-        
-        scores = {}
-        
-        # 1. Profitability Score (0-25 puntos)
-        net_margin = (metrics.net_profit / metrics.revenue * 100) if metrics.revenue > 0 else 0
-        if net_margin >= 20:
-            scores["profitability"] = 25
-        elif net_margin >= 15:
-            scores["profitability"] = 20
-        elif net_margin >= 10:
-            scores["profitability"] = 15
-        elif net_margin >= 5:
-            scores["profitability"] = 10
-        else:
-            scores["profitability"] = max(0, 5 + net_margin)
-        
-        # 2. Unit Economics Score (0-25 puntos)
-        ltv_coca_ratio = (metrics.ltv / metrics.coca) if metrics.coca > 0 else 0
-        if ltv_coca_ratio >= 5:
-            scores["unit_economics"] = 25
-        elif ltv_coca_ratio >= 3:
-            scores["unit_economics"] = 20
-        elif ltv_coca_ratio >= 2:
-            scores["unit_economics"] = 15
-        elif ltv_coca_ratio >= 1:
-            scores["unit_economics"] = 10
-        else:
-            scores["unit_economics"] = 0
-        
-        # 3. Cash Flow Score (0-25 puntos)
-        cash_flow_margin = (metrics.cash_flow / metrics.revenue * 100) if metrics.revenue > 0 else 0
-        if cash_flow_margin >= 15:
-            scores["cash_flow"] = 25
-        elif cash_flow_margin >= 10:
-            scores["cash_flow"] = 20
-        elif cash_flow_margin >= 5:
-            scores["cash_flow"] = 15
-        elif cash_flow_margin >= 0:
-            scores["cash_flow"] = 10
-        else:
-            scores["cash_flow"] = max(0, 10 + cash_flow_margin * 2)
-        
-        # 4. Growth Efficiency Score (0-25 puntos)
-        contribution_margin = unit_economics.price_per_unit - unit_economics.variable_cost_per_unit
-        contribution_margin_pct = (contribution_margin / unit_economics.price_per_unit * 100) if unit_economics.price_per_unit > 0 else 0
-        
-        if contribution_margin_pct >= 60:
-            scores["growth_efficiency"] = 25
-        elif contribution_margin_pct >= 40:
-            scores["growth_efficiency"] = 20
-        elif contribution_margin_pct >= 30:
-            scores["growth_efficiency"] = 15
-        elif contribution_margin_pct >= 20:
-            scores["growth_efficiency"] = 10
-        else:
-            scores["growth_efficiency"] = max(0, contribution_margin_pct / 4)
-        
-        # Score total
-        total_score = sum(scores.values())
-        
-        # Determinar nivel de salud
-        if total_score >= 80:
-            health_level = "Excelente"
-        elif total_score >= 60:
-            health_level = "Bueno"
-        elif total_score >= 40:
-            health_level = "Regular"
-        else:
-            health_level = "Crítico"
-        
-        return {
-            "total_score": total_score,
-            "health_level": health_level,
-            "component_scores": scores,
-            "recommendations_priority": "Alta" if total_score < 60 else "Media" if total_score < 80 else "Mantenimiento"
-        }
+        """Calcula score de salud financiera (mismo motor que el servicio real)"""
+        return metrics_engine.health_score({**metrics.dict(), **unit_economics.dict()})
     
     def get_quick_recommendations(self, metrics, unit_economics, context):
         """Genera recomendaciones rápidas"""
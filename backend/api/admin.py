@@ -1,8 +1,10 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Query, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import List
 from models.auth import AdminLogin, AccessKeyCreate, AccessKey, TokenResponse, UserRole
 from services.auth_service import auth_service
+from services.redis_service import redis_service
+from services.usage_accounting import usage_accounting, DIMENSIONS
 from datetime import datetime
 
 router = APIRouter()
@@ -56,7 +58,7 @@ async def create_access_key(
     admin: dict = Depends(get_admin_user)
 ):
     """Create a new access key"""
-    key, access_key = auth_service.generate_access_key(key_data, admin["sub"])
+    key, access_key = await auth_service.generate_access_key(key_data, admin["sub"])
     
     # Return the access key data with the actual key (only shown once)
     response_data = access_key.dict()
@@ -67,7 +69,7 @@ async def create_access_key(
 @router.get("/admin/access-keys", response_model=List[AccessKey])
 async def list_access_keys(admin: dict = Depends(get_admin_user)):
     """List all access keys for the admin"""
-    return auth_service.get_admin_keys(admin["sub"])
+    return await auth_service.get_admin_keys(admin["sub"])
 
 @router.delete("/admin/access-keys/{key_id}")
 async def revoke_access_key(
@@ -75,7 +77,7 @@ async def revoke_access_key(
     admin: dict = Depends(get_admin_user)
 ):
     """Revoke an access key"""
-    success = auth_service.revoke_access_key(key_id, admin["sub"])
+    success = await auth_service.revoke_access_key(key_id, admin["sub"])
     
     if not success:
         raise HTTPException(
@@ -99,7 +101,7 @@ async def get_totp_setup(admin: dict = Depends(get_admin_user)):
 @router.get("/admin/stats")
 async def get_admin_stats(admin: dict = Depends(get_admin_user)):
     """Get admin dashboard statistics"""
-    keys = auth_service.get_admin_keys(admin["sub"])
+    keys = await auth_service.get_admin_keys(admin["sub"])
     
     active_keys = len([k for k in keys if k.is_active])
     total_uses = sum(k.uses_count for k in keys)
@@ -108,5 +110,28 @@ async def get_admin_stats(admin: dict = Depends(get_admin_user)):
         "total_keys": len(keys),
         "active_keys": active_keys,
         "total_api_calls": total_uses,
-        "keys_created_today": len([k for k in keys if k.created_at.date() == datetime.utcnow().date()])
-    }
\ No newline at end of file
+        "keys_created_today": len([k for k in keys if k.created_at.date() == datetime.utcnow().date()]),
+        "auth_cache": auth_service.cache_stats()
+    }
+
+@router.post("/admin/maintenance/reindex")
+async def reindex_redis(admin: dict = Depends(get_admin_user)):
+    """Index Redis data written before the secondary indexes existed (one-off, uses SCAN)"""
+    indexed = await redis_service.backfill_indexes()
+    indexed["access_keys"] = await auth_service.backfill_key_index()
+    return {"success": True, "indexed": indexed}
+
+@router.get("/admin/ai-usage")
+async def get_ai_usage(
+    dimension: str = Query("provider", description=f"One of: {', '.join(DIMENSIONS)}"),
+    hours: int = Query(24, ge=1, le=24 * 30),
+    limit: int = Query(50, ge=1, le=500),
+    admin: dict = Depends(get_admin_user)
+):
+    """AI tokens, latency and cost rolled up by user, agent, provider, model or endpoint"""
+    if dimension not in DIMENSIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown dimension, expected one of: {', '.join(DIMENSIONS)}"
+        )
+    return await usage_accounting.get_usage(dimension=dimension, hours=hours, limit=limit)
@@ -3,6 +3,7 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
 from typing import Dict, Any, Optional
 from services.ai_service import ai_service
+from services.conversation_memory import conversation_memory
 from services.auth_service import auth_service
 from middleware import ai_rate_limit
 
@@ -43,7 +44,8 @@ async def ai_chat(
         response = await ai_service.chat_with_user(
             user_id=current_user["sub"],
             message=request.message,
-            context=request.context
+            context=request.context,
+            use_memory=True
         )
         
         return {
@@ -121,19 +123,18 @@ async def get_available_topics(current_user: dict = Depends(get_authenticated_us
 @router.get("/ai/conversation-history")
 async def get_conversation_history(current_user: dict = Depends(get_authenticated_user)):
     """Get user's conversation history summary"""
-    memory = ai_service.get_user_memory(current_user["sub"])
+    window = await conversation_memory.get_window(current_user["sub"])
     
     # Get recent messages
     messages = []
-    for message in memory.chat_memory.messages[-10:]:  # Last 10 messages
-        if hasattr(message, 'content'):
-            msg_type = "user" if "HumanMessage" in str(type(message)) else "ai"
-            messages.append({
-                "type": msg_type,
-                "content": message.content[:200] + "..." if len(message.content) > 200 else message.content
-            })
+    for message in window["messages"][-10:]:  # Last 10 messages
+        messages.append({
+            "type": "user" if message["type"] == "human" else "ai",
+            "content": message["content"][:200] + "..." if len(message["content"]) > 200 else message["content"]
+        })
     
     return {
         "recent_messages": messages,
-        "total_messages": len(memory.chat_memory.messages)
+        "total_messages": window["stored_messages"],
+        "summary": window["summary"]
     }
\ No newline at end of file
@@ -10,6 +10,9 @@ from datetime import datetime
 
 import os
 from services.dual_ai_service import dual_ai_service
+from services.job_queue import job_queue
+from services.metrics_engine import metrics_engine, quick_recommendations, METRICS_BATCH_MAX
+from api.jobs import get_authenticated_user, job_accepted_response
 
 # Detectar qué servicios de IA están disponibles
 ai_status = dual_ai_service.get_service_status()
@@ -64,6 +67,10 @@ class ScenarioAnalysisRequest(BaseModel):
     base_metrics: FinancialMetrics
     scenarios: List[Dict]
 
+class MetricsBatchRequest(BaseModel):
+    records: List[Dict] = Field(description="Empresas o periodos; cada registro puede llevar id/company_id/period")
+    include_recommendations: bool = False
+
 class HealthScoreResponse(BaseModel):
     total_score: float
     health_level: str
@@ -312,16 +319,8 @@ async def get_health_score(
             retention_months=retention_months
         )
         
-        if USE_MOCK_AI:
-            health_score = mock_financial_advisor.calculate_health_score(
-                metrics=metrics,
-                unit_economics=unit_economics
-            )
-        else:
-            health_score = financial_advisor_service.calculate_financial_health_score(
-                metrics=metrics,
-                unit_economics=unit_economics
-            )
+        # Fórmulas puras: el motor de métricas responde sin pasar por ningún LLM
+        health_score = metrics_engine.health_score({**metrics.dict(), **unit_economics.dict()})
         
         return health_score
         
@@ -332,97 +331,43 @@ async def get_health_score(
 async def get_quick_recommendations(request: BusinessAnalysisRequest):
     """Recomendaciones rápidas basadas en métricas clave"""
     try:
-        # Calcular ratios clave
         metrics = request.financial_metrics
-        unit_econ = request.unit_economics
+        computed = metrics_engine.evaluate_one({**metrics.dict(), **request.unit_economics.dict()})
+        quick = quick_recommendations(computed, cash_flow=metrics.cash_flow)
         
-        ltv_coca_ratio = metrics.ltv / metrics.coca if metrics.coca > 0 else 0
-        net_margin = (metrics.net_profit / metrics.revenue * 100) if metrics.revenue > 0 else 0
-        contribution_margin = unit_econ.price_per_unit - unit_econ.variable_cost_per_unit
-        contribution_margin_pct = (contribution_margin / unit_econ.price_per_unit * 100) if unit_econ.price_per_unit > 0 else 0
-        
-        quick_recommendations = []
-        
-        # Recomendaciones basadas en ratios
-        if ltv_coca_ratio < 3:
-            quick_recommendations.append({
-                "category": "unit_economics",
-                "priority": "Alta",
-                "title": "Optimizar Ratio LTV/COCA",
-                "description": f"Tu ratio LTV/COCA es {ltv_coca_ratio:.1f}x, por debajo del mínimo recomendado de 3x. Considera reducir costos de adquisición o aumentar el valor del cliente.",
-                "actions": [
-                    "Revisar canales de marketing más eficientes",
-                    "Implementar estrategias de retención",
-                    "Optimizar el precio o reducir costos variables"
-                ]
-            })
-        
-        if net_margin < 10:
-            quick_recommendations.append({
-                "category": "profitability",
-                "priority": "Alta",
-                "title": "Mejorar Margen Neto",
-                "description": f"Tu margen neto de {net_margin:.1f}% está por debajo del 10% recomendado. Es crucial mejorar la rentabilidad.",
-                "actions": [
-                    "Revisar estructura de costos",
-                    "Optimizar precios",
-                    "Eliminar gastos innecesarios"
-                ]
-            })
-        
-        if contribution_margin_pct < 30:
-            quick_recommendations.append({
-                "category": "pricing",
-                "priority": "Media",
-                "title": "Aumentar Margen de Contribución",
-                "description": f"Tu margen de contribución de {contribution_margin_pct:.1f}% podría mejorarse para tener más flexibilidad financiera.",
-                "actions": [
-                    "Analizar posibilidad de aumento de precios",
-                    "Optimizar costos variables",
-                    "Añadir servicios de mayor valor"
-                ]
-            })
-        
-        if metrics.cash_flow < 0:
-            quick_recommendations.append({
-                "category": "cash_flow",
-                "priority": "Crítica",
-                "title": "Resolver Flujo de Caja Negativo",
-                "description": "Tu flujo de caja es negativo, lo que representa un riesgo inmediato para la operación.",
-                "actions": [
-                    "Acelerar cobros a clientes",
-                    "Negociar términos de pago con proveedores",
-                    "Reducir gastos no esenciales",
-                    "Considerar línea de crédito de emergencia"
-                ]
-            })
+        return {
+            **quick,
+            "health_score": computed["health_score"],
+            "generated_at": datetime.now().isoformat()
+        }
         
-        # Si todo está bien
-        if not quick_recommendations and ltv_coca_ratio >= 3 and net_margin >= 15:
-            quick_recommendations.append({
-                "category": "growth",
-                "priority": "Media",
-                "title": "Acelerar Crecimiento",
-                "description": "Tus métricas financieras son saludables. Es momento de considerar estrategias de crecimiento.",
-                "actions": [
-                    "Invertir más en marketing con ROI comprobado",
-                    "Expandir a nuevos mercados o segmentos",
-                    "Desarrollar nuevos productos/servicios",
-                    "Optimizar operaciones para escalar"
-                ]
-            })
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generando recomendaciones: {str(e)}")
+
+@router.post("/metrics/batch")
+async def score_metrics_batch(request: MetricsBatchRequest):
+    """Métricas, riesgos y health score de muchas empresas o periodos en una sola llamada (sin LLM)"""
+    if len(request.records) > METRICS_BATCH_MAX:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Máximo {METRICS_BATCH_MAX} registros por llamada, recibidos {len(request.records)}"
+        )
+    try:
+        results = metrics_engine.evaluate(request.records)
+        if request.include_recommendations:
+            for record, result in zip(request.records, results):
+                result["recommendations"] = quick_recommendations(
+                    result, cash_flow=float(record.get("cash_flow") or 0)
+                )["recommendations"]
         
         return {
-            "recommendations": quick_recommendations,
-            "summary": f"Analizadas {len(quick_recommendations)} áreas prioritarias",
-            "overall_status": "Crítico" if any(r["priority"] == "Crítica" for r in quick_recommendations) else 
-                            "Necesita atención" if any(r["priority"] == "Alta" for r in quick_recommendations) else
-                            "Saludable",
+            "results": results,
+            "portfolio": metrics_engine.summarize(results),
             "generated_at": datetime.now().isoformat()
         }
         
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error generando recomendaciones: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error calculando métricas: {str(e)}")
 
 @router.post("/test-dual-ai")
 async def test_dual_ai(request: Dict):
@@ -462,63 +407,89 @@ async def test_dual_ai(request: Dict):
 async def complex_reasoning_analysis(request: BusinessAnalysisRequest):
     """Análisis complejo usando DeepSeek R1 para razonamiento profundo"""
     try:
-        # Este endpoint está diseñado para usar DeepSeek R1 específicamente
-        analysis_prompt = f"""
-        Realiza un análisis financiero profundo y estrategia de optimización para este negocio:
-        
-        MÉTRICAS FINANCIERAS:
-        - Ingresos: ${request.financial_metrics.revenue:,.2f}
-        - Gastos: ${request.financial_metrics.expenses:,.2f}
-        - Utilidad neta: ${request.financial_metrics.net_profit:,.2f}
-        - Flujo de caja: ${request.financial_metrics.cash_flow:,.2f}
-        - LTV: ${request.financial_metrics.ltv:,.2f}
-        - COCA: ${request.financial_metrics.coca:,.2f}
-        
-        UNIT ECONOMICS:
-        - Precio por unidad: ${request.unit_economics.price_per_unit:,.2f}
-        - Costo variable unitario: ${request.unit_economics.variable_cost_per_unit:,.2f}
-        - Gasto en marketing: ${request.unit_economics.marketing_spend:,.2f}
-        - Nuevos clientes: {request.unit_economics.new_customers}
-        
-        CONTEXTO DEL NEGOCIO:
-        - Industria: {request.business_context.industry}
-        - Etapa: {request.business_context.business_stage}
-        - Empleados: {request.business_context.employee_count}
-        - Meses operando: {request.business_context.months_operating}
-        
-        Proporciona:
-        1. Análisis detallado de la situación actual
-        2. Identificación de problemas críticos y oportunidades
-        3. Estrategia de optimización paso a paso
-        4. Proyecciones financieras realistas
-        5. Plan de acción con prioridades y tiempos
-        """
-        
-        # Forzar uso de DeepSeek para razonamiento complejo
-        ai_response = await dual_ai_service.generate_response(
-            prompt=analysis_prompt,
-            task_type="complex_reasoning_analysis",
-            context={
-                "business_context": request.business_context.dict(),
-                "analysis_type": "comprehensive_business_analysis"
-            },
-            force_provider="deepseek"  # Forzar DeepSeek R1
-        )
-        
-        return {
-            "analysis": ai_response.content,
-            "reasoning_steps": ai_response.reasoning_steps,
-            "model_used": ai_response.model_used,
-            "provider": ai_response.provider,
-            "confidence": ai_response.confidence,
-            "analysis_type": "deep_reasoning",
-            "timestamp": datetime.now().isoformat(),
-            "recommendation": "Este análisis usa DeepSeek R1 para razonamiento profundo y estrategias complejas"
-        }
-        
+        return await _run_reasoning_analysis(request)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error en análisis de razonamiento: {str(e)}")
 
+@router.post("/reasoning-analysis/async", status_code=202)
+async def submit_reasoning_analysis(
+    request: BusinessAnalysisRequest,
+    current_user: dict = Depends(get_authenticated_user)
+):
+    """Encola el análisis de razonamiento; consulta el resultado en /api/jobs/{job_id}"""
+    try:
+        job_id = await job_queue.submit(
+            "reasoning_analysis",
+            current_user.get("user_id", current_user.get("sub")),
+            request.dict()
+        )
+        return job_accepted_response(job_id)
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+async def _reasoning_analysis_job(payload: Dict, progress) -> Dict:
+    progress(10, "Preparando análisis de razonamiento")
+    return await _run_reasoning_analysis(BusinessAnalysisRequest(**payload), priority="background")
+
+async def _run_reasoning_analysis(request: BusinessAnalysisRequest, priority: Optional[str] = None) -> Dict:
+    """Pipeline del análisis de razonamiento, compartido por la versión síncrona y el job"""
+    # Este endpoint está diseñado para usar DeepSeek R1 específicamente
+    analysis_prompt = f"""
+    Realiza un análisis financiero profundo y estrategia de optimización para este negocio:
+    
+    MÉTRICAS FINANCIERAS:
+    - Ingresos: ${request.financial_metrics.revenue:,.2f}
+    - Gastos: ${request.financial_metrics.expenses:,.2f}
+    - Utilidad neta: ${request.financial_metrics.net_profit:,.2f}
+    - Flujo de caja: ${request.financial_metrics.cash_flow:,.2f}
+    - LTV: ${request.financial_metrics.ltv:,.2f}
+    - COCA: ${request.financial_metrics.coca:,.2f}
+    
+    UNIT ECONOMICS:
+    - Precio por unidad: ${request.unit_economics.price_per_unit:,.2f}
+    - Costo variable unitario: ${request.unit_economics.variable_cost_per_unit:,.2f}
+    - Gasto en marketing: ${request.unit_economics.marketing_spend:,.2f}
+    - Nuevos clientes: {request.unit_economics.new_customers}
+    
+    CONTEXTO DEL NEGOCIO:
+    - Industria: {request.business_context.industry}
+    - Etapa: {request.business_context.business_stage}
+    - Empleados: {request.business_context.employee_count}
+    - Meses operando: {request.business_context.months_operating}
+    
+    Proporciona:
+    1. Análisis detallado de la situación actual
+    2. Identificación de problemas críticos y oportunidades
+    3. Estrategia de optimización paso a paso
+    4. Proyecciones financieras realistas
+    5. Plan de acción con prioridades y tiempos
+    """
+    
+    # Forzar uso de DeepSeek para razonamiento complejo
+    ai_response = await dual_ai_service.generate_response(
+        prompt=analysis_prompt,
+        task_type="complex_reasoning_analysis",
+        context={
+            "business_context": request.business_context.dict(),
+            "analysis_type": "comprehensive_business_analysis"
+        },
+        force_provider="deepseek",  # Forzar DeepSeek R1
+        priority=priority
+    )
+    
+    return {
+        "analysis": ai_response.content,
+        "reasoning_steps": ai_response.reasoning_steps,
+        "model_used": ai_response.model_used,
+        "provider": ai_response.provider,
+        "confidence": ai_response.confidence,
+        "analysis_type": "deep_reasoning",
+        "timestamp": datetime.now().isoformat(),
+        "recommendation": "Este análisis usa DeepSeek R1 para razonamiento profundo y estrategias complejas"
+    }
+
+job_queue.register("reasoning_analysis", _reasoning_analysis_job)
+
 # Endpoints de utilidad
 @router.get("/benchmarks/{industry}")
 async def get_industry_benchmarks(industry: str):
@@ -0,0 +1,81 @@
+"""
+KatalisApp Jobs API
+Consulta de estado, progreso y resultado de análisis de IA ejecutados en segundo plano
+"""
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from typing import Any, Dict
+import asyncio
+import json
+
+from services.auth_service import auth_service
+from services.job_queue import job_queue, FINISHED_STATES
+
+security = HTTPBearer()
+
+def get_authenticated_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Verify user has access"""
+    token_data = auth_service.verify_token(credentials.credentials)
+    return token_data
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+# Intervalo de consulta del stream de eventos
+EVENTS_POLL_SECONDS = 1.0
+
+
+def job_accepted_response(job_id: str) -> Dict[str, Any]:
+    """Respuesta estándar de los endpoints que encolan un trabajo"""
+    return {
+        "status": "accepted",
+        "job_id": job_id,
+        "status_url": f"/api/jobs/{job_id}",
+        "events_url": f"/api/jobs/{job_id}/events"
+    }
+
+
+async def _get_user_job(job_id: str, current_user: dict) -> Dict[str, Any]:
+    job = await job_queue.get_job(job_id)
+    user_id = current_user.get("user_id", current_user.get("sub"))
+    if not job or job.get("user_id") != user_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/stats")
+async def get_job_stats(current_user: dict = Depends(get_authenticated_user)):
+    """Estado del pool de workers"""
+    return job_queue.get_stats()
+
+
+@router.get("/{job_id}")
+async def get_job_status(job_id: str, current_user: dict = Depends(get_authenticated_user)):
+    """Estado, progreso y (si terminó) resultado del trabajo"""
+    return await _get_user_job(job_id, current_user)
+
+
+@router.get("/{job_id}/events")
+async def stream_job_events(job_id: str, current_user: dict = Depends(get_authenticated_user)):
+    """Server-Sent Events con cada cambio de progreso hasta que el trabajo termina"""
+    await _get_user_job(job_id, current_user)
+
+    async def event_stream():
+        last_update = None
+        while True:
+            job = await job_queue.get_job(job_id)
+            if job is None:
+                yield f"event: error\ndata: {json.dumps({'detail': 'Job expired'})}\n\n"
+                return
+            if job.get("updated_at") != last_update:
+                last_update = job.get("updated_at")
+                yield f"event: progress\ndata: {json.dumps(job, default=str)}\n\n"
+            if job.get("status") in FINISHED_STATES:
+                return
+            await asyncio.sleep(EVENTS_POLL_SECONDS)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
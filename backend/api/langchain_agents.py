@@ -9,8 +9,16 @@ from datetime import datetime
 import json
 
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from agents.langchain_agents import langchain_agent_manager
+from agents import get_langchain_agent_manager
 from services.auth_service import auth_service
+from services.job_queue import job_queue
+from services.provider_scheduler import Priority, priority_scope
+from services.conversation_memory import conversation_memory
+from services.agent_result_cache import agent_result_cache
+from services.analysis_prefetch import analysis_prefetcher
+from services.interaction_log import interaction_log
+from api.jobs import job_accepted_response
+from api.streaming import event_stream_response
 
 security = HTTPBearer()
 
@@ -26,6 +34,7 @@ class AgentConsultationRequest(BaseModel):
     agent_id: str
     data: Dict[str, Any]
     context: Optional[str] = None
+    refresh: bool = False  # Ignore the cached analysis and recompute
 
 class MultiAgentRequest(BaseModel):
     comprehensive_data: Dict[str, Any]
@@ -73,7 +82,7 @@ class PerformanceData(BaseModel):
 async def get_available_agents(current_user: dict = Depends(get_authenticated_user)):
     """Get list of available LangChain AI agents"""
     try:
-        agents = langchain_agent_manager.get_available_agents()
+        agents = get_langchain_agent_manager().get_available_agents()
         return {
             "status": "success",
             "agents": agents,
@@ -91,10 +100,11 @@ async def consult_agent(
 ):
     """Consult with a specific LangChain AI agent"""
     try:
-        result = await langchain_agent_manager.consult_agent(
+        result = await get_langchain_agent_manager().consult_agent(
             agent_id=request.agent_id,
             user_id=current_user.get("user_id", current_user.get("sub")),
-            data=request.data
+            data=request.data,
+            refresh=request.refresh
         )
         
         return {
@@ -110,6 +120,43 @@ async def consult_agent(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error consulting agent: {str(e)}")
 
+@router.get("/agents/last-analysis/{agent_id}")
+async def get_last_analysis(
+    agent_id: str,
+    current_user: dict = Depends(get_authenticated_user)
+):
+    """Previous analysis of this agent for the user, served from cache while their data is unchanged"""
+    if agent_id not in get_langchain_agent_manager().agents:
+        raise HTTPException(status_code=404, detail=f"Agent {agent_id} not found")
+    user_id = current_user.get("user_id", current_user.get("sub"))
+    analysis = await agent_result_cache.latest("langchain", user_id, agent_id)
+    return {
+        "status": "success" if analysis else "not_found",
+        "agent_id": agent_id,
+        "analysis": analysis,
+        "timestamp": datetime.now().isoformat()
+    }
+
+@router.post("/agents/data-changed")
+async def notify_data_changed(current_user: dict = Depends(get_authenticated_user)):
+    """The user's financial data changed: invalidate their cached agent analyses"""
+    user_id = current_user.get("user_id", current_user.get("sub"))
+    return {
+        "status": "success",
+        "data_version": await agent_result_cache.bump_data_version(user_id),
+        "timestamp": datetime.now().isoformat()
+    }
+
+@router.get("/agents/cache/stats")
+async def get_agent_cache_stats(current_user: dict = Depends(get_authenticated_user)):
+    """Hit/stale/miss counters of the agent result cache and the predictive prefetch"""
+    return {
+        "status": "success",
+        "cache": agent_result_cache.snapshot(),
+        "prefetch": analysis_prefetcher.snapshot(),
+        "timestamp": datetime.now().isoformat()
+    }
+
 @router.post("/agents/multi-agent-analysis")
 async def multi_agent_analysis(
     request: MultiAgentRequest,
@@ -117,7 +164,7 @@ async def multi_agent_analysis(
 ):
     """Get comprehensive analysis from multiple relevant LangChain agents"""
     try:
-        result = await langchain_agent_manager.multi_agent_consultation(
+        result = await get_langchain_agent_manager().multi_agent_consultation(
             user_id=current_user.get("user_id", current_user.get("sub")),
             comprehensive_data=request.comprehensive_data
         )
@@ -132,6 +179,52 @@ async def multi_agent_analysis(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error in multi-agent analysis: {str(e)}")
 
+@router.post("/agents/multi-agent-analysis/stream")
+async def stream_multi_agent_analysis(
+    request: MultiAgentRequest,
+    format: str = "ndjson",
+    current_user: dict = Depends(get_authenticated_user)
+):
+    """Multi-agent analysis streamed as NDJSON or SSE: each agent's result as soon as it finishes, then the summary"""
+    return event_stream_response(
+        get_langchain_agent_manager().stream_multi_agent_consultation(
+            user_id=current_user.get("user_id", current_user.get("sub")),
+            comprehensive_data=request.comprehensive_data
+        ),
+        format
+    )
+
+@router.post("/agents/multi-agent-analysis/async", status_code=202)
+async def submit_multi_agent_analysis(
+    request: MultiAgentRequest,
+    current_user: dict = Depends(get_authenticated_user)
+):
+    """Queue a multi-agent analysis; poll /api/jobs/{job_id} for progress and result"""
+    user_id = current_user.get("user_id", current_user.get("sub"))
+    try:
+        job_id = await job_queue.submit("multi_agent_analysis", user_id, {
+            "user_id": user_id,
+            "comprehensive_data": request.comprehensive_data
+        })
+        return job_accepted_response(job_id)
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+async def _multi_agent_job(payload: Dict[str, Any], progress) -> Dict[str, Any]:
+    # Nobody waits on the response: its LLM calls queue behind interactive traffic
+    with priority_scope(Priority.BACKGROUND):
+        return await get_langchain_agent_manager().multi_agent_consultation(
+            user_id=payload["user_id"],
+            comprehensive_data=payload["comprehensive_data"],
+            progress=progress
+        )
+
+async def _prefetch_agent(agent_id: str, user_id: str, data: Dict[str, Any]) -> bool:
+    return await get_langchain_agent_manager().prefetch_agent(agent_id, user_id, data)
+
+job_queue.register("multi_agent_analysis", _multi_agent_job)
+analysis_prefetcher.register("langchain", _prefetch_agent)
+
 # Specialized agent endpoints with structured data models
 
 @router.post("/agents/maya/cash-flow-analysis")
@@ -141,7 +234,7 @@ async def maya_cash_flow_analysis(
 ):
     """Maya - Cash Flow Optimization Analysis"""
     try:
-        result = await langchain_agent_manager.consult_agent(
+        result = await get_langchain_agent_manager().consult_agent(
             agent_id="maya",
             user_id=current_user.get("user_id", current_user.get("sub")),
             data=data.dict()
@@ -165,7 +258,7 @@ async def carlos_unit_economics_analysis(
 ):
     """Carlos - Unit Economics Analysis"""
     try:
-        result = await langchain_agent_manager.consult_agent(
+        result = await get_langchain_agent_manager().consult_agent(
             agent_id="carlos",
             user_id=current_user.get("user_id", current_user.get("sub")),
             data=data.dict()
@@ -189,7 +282,7 @@ async def sofia_growth_strategy(
 ):
     """Sofia - Growth Strategy Development"""
     try:
-        result = await langchain_agent_manager.consult_agent(
+        result = await get_langchain_agent_manager().consult_agent(
             agent_id="sofia",
             user_id=current_user.get("user_id", current_user.get("sub")),
             data=data.dict()
@@ -213,7 +306,7 @@ async def alex_risk_assessment(
 ):
     """Alex - Risk Assessment and Mitigation"""
     try:
-        result = await langchain_agent_manager.consult_agent(
+        result = await get_langchain_agent_manager().consult_agent(
             agent_id="alex",
             user_id=current_user.get("user_id", current_user.get("sub")),
             data=data.dict()
@@ -237,7 +330,7 @@ async def diana_performance_optimization(
 ):
     """Diana - Performance Optimization"""
     try:
-        result = await langchain_agent_manager.consult_agent(
+        result = await get_langchain_agent_manager().consult_agent(
             agent_id="diana",
             user_id=current_user.get("user_id", current_user.get("sub")),
             data=data.dict()
@@ -265,7 +358,7 @@ async def get_user_agent_preferences(
         from services.redis_service import redis_service
         
         preferences_key = f"user_preferences:{user_id}"
-        preferences = redis_service.redis_client.get(preferences_key)
+        preferences = await redis_service.redis_client.get(preferences_key)
         
         if preferences:
             prefs_data = json.loads(preferences)
@@ -302,11 +395,13 @@ async def update_user_agent_preferences(
         preferences["updated_at"] = datetime.now().isoformat()
         
         # Store preferences in Redis
-        redis_service.redis_client.setex(
+        await redis_service.redis_client.setex(
             preferences_key,
             30 * 24 * 60 * 60,  # 30 days
             json.dumps(preferences)
         )
+        # Preferences shape the analyses, so cached results are no longer valid
+        await agent_result_cache.bump_data_version(user_id)
         
         return {
             "status": "success",
@@ -323,30 +418,31 @@ async def update_user_agent_preferences(
 async def get_agent_conversation_memory(
     agent_id: str,
     user_id: str,
+    limit: int = 10,
+    before: Optional[str] = None,
     current_user: dict = Depends(get_authenticated_user)
 ):
-    """Get conversation history/memory for a specific agent and user"""
+    """
+    Get conversation history/memory for a specific agent and user
+    
+    Interactions are paginated newest first: pass the returned `next_cursor` as `before`
+    to get the previous page.
+    """
     try:
-        from services.redis_service import redis_service
-        
         # Get recent interactions
-        memory_pattern = f"agent_interaction:{agent_id}:{user_id}:*"
-        memory_keys = redis_service.redis_client.keys(memory_pattern)
+        try:
+            page = await interaction_log.recent("langchain", user_id, agent_id, count=limit, before=before)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        interactions = page["interactions"]
         
-        interactions = []
-        for key in sorted(memory_keys)[-10:]:  # Last 10 interactions
-            interaction_data = redis_service.redis_client.get(key)
-            if interaction_data:
-                interactions.append(json.loads(interaction_data))
-        
-        # Get agent memory from LangChain manager
-        agent_memory = None
-        if agent_id in langchain_agent_manager.memories:
-            memory = langchain_agent_manager.memories[agent_id]
-            agent_memory = {
-                "buffer_length": len(memory.chat_memory.messages),
-                "recent_messages": [msg.content for msg in memory.chat_memory.messages[-5:]]
-            }
+        # Get this user's conversation window for the agent
+        window = await conversation_memory.get_window(user_id, scope=f"agent:{agent_id}")
+        agent_memory = {
+            "buffer_length": window["stored_messages"],
+            "recent_messages": [msg["content"] for msg in window["messages"][-5:]],
+            "summary": window["summary"]
+        }
         
         return {
             "status": "success",
@@ -354,9 +450,12 @@ async def get_agent_conversation_memory(
             "user_id": user_id,
             "stored_interactions": len(interactions),
             "recent_interactions": interactions,
+            "next_cursor": page["next_cursor"],
             "langchain_memory": agent_memory,
             "timestamp": datetime.now().isoformat()
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting agent memory: {str(e)}")
\ No newline at end of file
@@ -1,8 +1,10 @@
+import asyncio
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
 from typing import Dict, Any, List, Optional
 from datetime import datetime
 from services.redis_service import redis_service
+from services.analysis_prefetch import analysis_prefetcher
 
 router = APIRouter()
 
@@ -40,23 +42,27 @@ async def update_user_progress(user_id: str, progress: ProgressUpdate):
             "last_activity": datetime.utcnow().isoformat()
         }
         
-        success = redis_service.save_user_progress(user_id, progress.module_id, progress_data)
+        success = await redis_service.save_user_progress(user_id, progress.module_id, progress_data)
         
         if not success:
             raise HTTPException(status_code=500, detail="Failed to save progress")
         
         # Track completion if progress is 100%
         if progress.progress_percentage >= 100:
-            redis_service.track_module_completion(user_id, progress.module_id)
-            redis_service.increment_global_stat("modules_completed")
+            await redis_service.track_module_completion(user_id, progress.module_id)
+            await redis_service.increment_global_stat("modules_completed")
         
         # Update global statistics
-        redis_service.increment_global_stat("learning_sessions")
+        await redis_service.increment_global_stat("learning_sessions")
+        
+        # Warm the analysis the user is likely to request next
+        prefetching = await analysis_prefetcher.on_progress(user_id, progress.module_id, progress.progress_percentage)
         
         return {
             "success": True,
             "message": "Progress updated successfully",
-            "progress": progress_data
+            "progress": progress_data,
+            "prefetching": prefetching
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error updating progress: {str(e)}")
@@ -65,7 +71,7 @@ async def update_user_progress(user_id: str, progress: ProgressUpdate):
 async def get_user_progress(user_id: str, module_id: str):
     """Get user progress for a specific module"""
     try:
-        progress = redis_service.get_user_progress(user_id, module_id)
+        progress = await redis_service.get_user_progress(user_id, module_id)
         
         if progress is None:
             return {
@@ -86,8 +92,11 @@ async def get_user_progress(user_id: str, module_id: str):
 async def get_all_user_progress(user_id: str):
     """Get all progress for a user across all modules"""
     try:
-        progress = redis_service.get_all_user_progress(user_id)
-        completions = redis_service.get_user_completions(user_id, days=30)
+        # Independent reads: overlap their round trips
+        progress, completions = await asyncio.gather(
+            redis_service.get_all_user_progress(user_id),
+            redis_service.get_user_completions(user_id, days=30)
+        )
         
         # Calculate overall statistics
         total_modules = len(progress)
@@ -121,7 +130,7 @@ async def create_bookmark(user_id: str, bookmark: BookmarkCreate):
             "content_type": bookmark.content_type
         }
         
-        success = redis_service.save_bookmark(user_id, bookmark_data)
+        success = await redis_service.save_bookmark(user_id, bookmark_data)
         
         if not success:
             raise HTTPException(status_code=500, detail="Failed to create bookmark")
@@ -138,7 +147,7 @@ async def create_bookmark(user_id: str, bookmark: BookmarkCreate):
 async def get_user_bookmarks(user_id: str):
     """Get all bookmarks for a user"""
     try:
-        bookmarks = redis_service.get_user_bookmarks(user_id)
+        bookmarks = await redis_service.get_user_bookmarks(user_id)
         return {"bookmarks": bookmarks}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting bookmarks: {str(e)}")
@@ -147,7 +156,7 @@ async def get_user_bookmarks(user_id: str):
 async def delete_bookmark(user_id: str, bookmark_id: str):
     """Delete a user bookmark"""
     try:
-        success = redis_service.remove_bookmark(user_id, bookmark_id)
+        success = await redis_service.remove_bookmark(user_id, bookmark_id)
         
         if not success:
             raise HTTPException(status_code=500, detail="Failed to delete bookmark")
@@ -161,15 +170,19 @@ async def delete_bookmark(user_id: str, bookmark_id: str):
 async def start_learning_session(user_id: str, session: LearningSession):
     """Start a new learning session"""
     try:
-        session_id = redis_service.start_learning_session(user_id, session.module_id)
+        session_id = await redis_service.start_learning_session(user_id, session.module_id)
         
         if not session_id:
             raise HTTPException(status_code=500, detail="Failed to start learning session")
         
+        # Warm the module's agent analysis before the user asks for it
+        prefetching = await analysis_prefetcher.on_session_start(user_id, session.module_id)
+        
         return {
             "success": True,
             "session_id": session_id,
-            "message": "Learning session started"
+            "message": "Learning session started",
+            "prefetching": prefetching
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error starting session: {str(e)}")
@@ -178,7 +191,7 @@ async def start_learning_session(user_id: str, session: LearningSession):
 async def end_learning_session(session_id: str, completion_percentage: float = 0.0):
     """End a learning session"""
     try:
-        success = redis_service.end_learning_session(session_id, completion_percentage)
+        success = await redis_service.end_learning_session(session_id, completion_percentage)
         
         if not success:
             raise HTTPException(status_code=500, detail="Failed to end learning session")
@@ -195,11 +208,11 @@ async def end_learning_session(session_id: str, completion_percentage: float = 0
 async def get_global_analytics():
     """Get global learning analytics"""
     try:
-        stats = redis_service.get_global_stats()
+        stats = await redis_service.get_global_stats()
         
         return {
             "global_statistics": stats,
-            "redis_connected": redis_service.is_connected()
+            "redis_connected": redis_service.is_available()
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting analytics: {str(e)}")
@@ -208,10 +221,12 @@ async def get_global_analytics():
 async def health_check():
     """Health check for the progress service"""
     try:
-        redis_connected = redis_service.is_connected()
+        # Breaker state kept current by the background probe: no PING per request
+        redis_connected = redis_service.is_available()
         return {
             "status": "healthy" if redis_connected else "degraded",
             "redis_connected": redis_connected,
+            "redis": redis_service.health_snapshot(),
             "timestamp": datetime.utcnow().isoformat()
         }
     except Exception as e:
@@ -3,19 +3,15 @@ from fastapi.responses import FileResponse
 from typing import Optional, List, Dict, Any
 from datetime import datetime, timedelta
 from pydantic import BaseModel
-import pandas as pd
 import io
 import json
 import os
 import tempfile
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from services.auth_service import auth_service
 from services.ai_service import ai_service
+from services.job_queue import job_queue
+from api.jobs import job_accepted_response
 
 security = HTTPBearer()
 
@@ -40,6 +36,98 @@ class FinancialData(BaseModel):
     units_sold: int
     date: str
 
+def _no_progress(percent: int, message: str):
+    pass
+
+async def _build_report_metrics(request: ReportRequest, user_id: str, progress=_no_progress) -> dict:
+    """Calcula métricas e insights del reporte (compartido por el endpoint síncrono y el job)"""
+    progress(5, "Calculando métricas del periodo")
+    
+    # Simulate real financial data (in real app, get from database)
+    end_date = datetime.now()
+    start_date = end_date - timedelta(days=request.period_days)
+    
+    # Generate sample data for the period
+    financial_data = []
+    base_revenue = 300000
+    base_expenses = 200000
+    
+    for i in range(request.period_days):
+        date = start_date + timedelta(days=i)
+        growth_factor = 1 + (i * 0.002)  # 0.2% daily growth
+        
+        revenue = base_revenue * growth_factor + (i % 7) * 5000  # Weekly cycles
+        expenses = base_expenses * growth_factor + (i % 5) * 3000  # Different expense cycles
+        
+        financial_data.append({
+            "date": date.strftime("%Y-%m-%d"),
+            "revenue": round(revenue, 2),
+            "expenses": round(expenses, 2),
+            "profit": round(revenue - expenses, 2),
+            "cash_flow": round((revenue - expenses) * 0.8, 2),  # 80% of profit as cash flow
+            "customers": 400 + i * 2,  # Growing customer base
+            "units_sold": int(revenue / 150)  # Average unit price 150
+        })
+    
+    # Calculate metrics
+    total_revenue = sum(d["revenue"] for d in financial_data)
+    total_expenses = sum(d["expenses"] for d in financial_data)
+    total_profit = total_revenue - total_expenses
+    avg_cash_flow = sum(d["cash_flow"] for d in financial_data) / len(financial_data)
+    
+    # Unit economics
+    total_customers = financial_data[-1]["customers"]
+    ltv = 3000  # Example LTV
+    coca = 100  # Example COCA
+    roi = (total_profit / total_expenses) * 100
+    
+    metrics = {
+        "period": {
+            "start_date": start_date.strftime("%Y-%m-%d"),
+            "end_date": end_date.strftime("%Y-%m-%d"),
+            "days": request.period_days
+        },
+        "financial_summary": {
+            "total_revenue": round(total_revenue, 2),
+            "total_expenses": round(total_expenses, 2),
+            "net_profit": round(total_profit, 2),
+            "profit_margin": round((total_profit / total_revenue) * 100, 2),
+            "average_daily_revenue": round(total_revenue / request.period_days, 2),
+            "average_cash_flow": round(avg_cash_flow, 2)
+        },
+        "unit_economics": {
+            "ltv": ltv,
+            "coca": coca,
+            "ltv_coca_ratio": round(ltv / coca, 2),
+            "roi": round(roi, 2),
+            "total_customers": total_customers,
+            "revenue_per_customer": round(total_revenue / total_customers, 2)
+        },
+        "growth_metrics": {
+            "revenue_growth": round(((financial_data[-1]["revenue"] / financial_data[0]["revenue"]) - 1) * 100, 2),
+            "customer_growth": round(((total_customers / 400) - 1) * 100, 2),
+            "daily_growth_rate": round(0.2, 2)  # 0.2% from simulation
+        },
+        "detailed_data": financial_data
+    }
+    
+    # Get AI insights
+    progress(30, "Generando insights de IA")
+    ai_insights = await ai_service.analyze_financial_data(
+        user_id,
+        "comprehensive_analysis",
+        {
+            "financial_summary": metrics["financial_summary"],
+            "unit_economics": metrics["unit_economics"],
+            "growth_metrics": metrics["growth_metrics"],
+            "period_days": request.period_days
+        },
+        priority="background"
+    )
+    
+    metrics["ai_insights"] = ai_insights
+    return metrics
+
 @router.post("/generate")
 async def generate_report(
     request: ReportRequest,
@@ -47,87 +135,7 @@ async def generate_report(
 ):
     """Generate comprehensive financial report with real data analysis"""
     try:
-        # Simulate real financial data (in real app, get from database)
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=request.period_days)
-        
-        # Generate sample data for the period
-        financial_data = []
-        base_revenue = 300000
-        base_expenses = 200000
-        
-        for i in range(request.period_days):
-            date = start_date + timedelta(days=i)
-            growth_factor = 1 + (i * 0.002)  # 0.2% daily growth
-            
-            revenue = base_revenue * growth_factor + (i % 7) * 5000  # Weekly cycles
-            expenses = base_expenses * growth_factor + (i % 5) * 3000  # Different expense cycles
-            
-            financial_data.append({
-                "date": date.strftime("%Y-%m-%d"),
-                "revenue": round(revenue, 2),
-                "expenses": round(expenses, 2),
-                "profit": round(revenue - expenses, 2),
-                "cash_flow": round((revenue - expenses) * 0.8, 2),  # 80% of profit as cash flow
-                "customers": 400 + i * 2,  # Growing customer base
-                "units_sold": int(revenue / 150)  # Average unit price 150
-            })
-        
-        # Calculate metrics
-        total_revenue = sum(d["revenue"] for d in financial_data)
-        total_expenses = sum(d["expenses"] for d in financial_data)
-        total_profit = total_revenue - total_expenses
-        avg_cash_flow = sum(d["cash_flow"] for d in financial_data) / len(financial_data)
-        
-        # Unit economics
-        total_customers = financial_data[-1]["customers"]
-        ltv = 3000  # Example LTV
-        coca = 100  # Example COCA
-        roi = (total_profit / total_expenses) * 100
-        
-        metrics = {
-            "period": {
-                "start_date": start_date.strftime("%Y-%m-%d"),
-                "end_date": end_date.strftime("%Y-%m-%d"),
-                "days": request.period_days
-            },
-            "financial_summary": {
-                "total_revenue": round(total_revenue, 2),
-                "total_expenses": round(total_expenses, 2),
-                "net_profit": round(total_profit, 2),
-                "profit_margin": round((total_profit / total_revenue) * 100, 2),
-                "average_daily_revenue": round(total_revenue / request.period_days, 2),
-                "average_cash_flow": round(avg_cash_flow, 2)
-            },
-            "unit_economics": {
-                "ltv": ltv,
-                "coca": coca,
-                "ltv_coca_ratio": round(ltv / coca, 2),
-                "roi": round(roi, 2),
-                "total_customers": total_customers,
-                "revenue_per_customer": round(total_revenue / total_customers, 2)
-            },
-            "growth_metrics": {
-                "revenue_growth": round(((financial_data[-1]["revenue"] / financial_data[0]["revenue"]) - 1) * 100, 2),
-                "customer_growth": round(((total_customers / 400) - 1) * 100, 2),
-                "daily_growth_rate": round(0.2, 2)  # 0.2% from simulation
-            },
-            "detailed_data": financial_data
-        }
-        
-        # Get AI insights
-        ai_insights = await ai_service.analyze_financial_data(
-            current_user["sub"],
-            "comprehensive_analysis",
-            {
-                "financial_summary": metrics["financial_summary"],
-                "unit_economics": metrics["unit_economics"],
-                "growth_metrics": metrics["growth_metrics"],
-                "period_days": request.period_days
-            }
-        )
-        
-        metrics["ai_insights"] = ai_insights
+        metrics = await _build_report_metrics(request, current_user["sub"])
         
         if request.format == "json":
             return metrics
@@ -144,6 +152,28 @@ async def generate_report(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating report: {str(e)}")
 
+@router.post("/generate/async", status_code=202)
+async def submit_report(
+    request: ReportRequest,
+    current_user: dict = Depends(get_authenticated_user)
+):
+    """Encola la generación del reporte (solo formato json); consulta el resultado en /api/jobs/{job_id}"""
+    if request.format != "json":
+        raise HTTPException(status_code=400, detail="Async reports only support json format")
+    try:
+        job_id = await job_queue.submit("report_generate", current_user["sub"], {
+            "request": request.dict(),
+            "user_id": current_user["sub"]
+        })
+        return job_accepted_response(job_id)
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+async def _report_job(payload: dict, progress) -> dict:
+    return await _build_report_metrics(ReportRequest(**payload["request"]), payload["user_id"], progress)
+
+job_queue.register("report_generate", _report_job)
+
 @router.get("/kpis")
 async def get_kpis(
     period_days: int = Query(30, description="Number of days for KPI analysis"),
@@ -258,7 +288,8 @@ async def optimize_expenses(
         ai_analysis = await ai_service.analyze_financial_data(
             current_user["sub"],
             "expense_optimization",
-            expense_data
+            expense_data,
+            priority="background"
         )
         
         # Generate optimization recommendations
@@ -310,102 +341,129 @@ async def optimize_expenses(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error optimizing expenses: {str(e)}")
 
+async def _build_forecast(user_id: str, progress=_no_progress) -> dict:
+    """Proyección del próximo mes con IA (compartida por el endpoint síncrono y el job)"""
+    # Get historical data for forecasting
+    historical_data = [
+        {"month": "2024-01", "revenue": 320000, "expenses": 240000, "customers": 450},
+        {"month": "2024-02", "revenue": 335000, "expenses": 250000, "customers": 480},
+        {"month": "2024-03", "revenue": 365000, "expenses": 260000, "customers": 520},
+        {"month": "2024-04", "revenue": 380000, "expenses": 265000, "customers": 550},
+        {"month": "2024-05", "revenue": 395000, "expenses": 270000, "customers": 580},
+        {"month": "2024-06", "revenue": 380430, "expenses": 275000, "customers": 565}
+    ]
+    
+    # Calculate trends
+    revenue_trend = (historical_data[-1]["revenue"] - historical_data[0]["revenue"]) / len(historical_data)
+    expense_trend = (historical_data[-1]["expenses"] - historical_data[0]["expenses"]) / len(historical_data)
+    customer_trend = (historical_data[-1]["customers"] - historical_data[0]["customers"]) / len(historical_data)
+    
+    # AI-powered forecasting
+    progress(30, "Generando proyección con IA")
+    ai_forecast = await ai_service.analyze_financial_data(
+        user_id,
+        "financial_forecast",
+        {
+            "historical_data": historical_data,
+            "trends": {
+                "revenue_trend": revenue_trend,
+                "expense_trend": expense_trend,
+                "customer_trend": customer_trend
+            }
+        },
+        priority="background"
+    )
+    
+    # Generate projections
+    progress(80, "Calculando escenarios")
+    next_month_base = historical_data[-1]
+    
+    # Conservative, realistic, optimistic scenarios
+    scenarios = {
+        "conservative": {
+            "revenue": round(next_month_base["revenue"] * 1.02, 2),  # 2% growth
+            "expenses": round(next_month_base["expenses"] * 1.03, 2),  # 3% expense increase
+            "customers": round(next_month_base["customers"] * 1.015),  # 1.5% growth
+            "probability": 70
+        },
+        "realistic": {
+            "revenue": round(next_month_base["revenue"] * 1.05, 2),  # 5% growth
+            "expenses": round(next_month_base["expenses"] * 1.02, 2),  # 2% expense increase
+            "customers": round(next_month_base["customers"] * 1.03),  # 3% growth
+            "probability": 60
+        },
+        "optimistic": {
+            "revenue": round(next_month_base["revenue"] * 1.10, 2),  # 10% growth
+            "expenses": round(next_month_base["expenses"] * 1.01, 2),  # 1% expense increase
+            "customers": round(next_month_base["customers"] * 1.05),  # 5% growth
+            "probability": 30
+        }
+    }
+    
+    # Calculate derived metrics for each scenario
+    for scenario_name, scenario in scenarios.items():
+        scenario["profit"] = scenario["revenue"] - scenario["expenses"]
+        scenario["profit_margin"] = round((scenario["profit"] / scenario["revenue"]) * 100, 1)
+        scenario["revenue_per_customer"] = round(scenario["revenue"] / scenario["customers"], 2)
+    
+    return {
+        "forecast_date": datetime.now().isoformat(),
+        "target_month": (datetime.now() + timedelta(days=30)).strftime("%Y-%m"),
+        "historical_trends": {
+            "revenue_monthly_growth": round((revenue_trend / next_month_base["revenue"]) * 100, 2),
+            "expense_monthly_growth": round((expense_trend / next_month_base["expenses"]) * 100, 2),
+            "customer_monthly_growth": round((customer_trend / next_month_base["customers"]) * 100, 2)
+        },
+        "scenarios": scenarios,
+        "recommendations": [
+            "Mantener crecimiento actual del 5% mensual en ingresos",
+            "Controlar crecimiento de gastos por debajo del 2%",
+            "Enfocar en retención de clientes actuales",
+            "Invertir en canales de adquisición más eficientes"
+        ],
+        "key_metrics_to_monitor": [
+            "Conversión de leads a clientes",
+            "Costo de adquisición por canal",
+            "Retención mensual de clientes",
+            "Margen por producto/servicio"
+        ],
+        "ai_insights": ai_forecast,
+        "confidence_level": 75
+    }
+
 @router.post("/project-forecast")
 async def project_next_month(
     current_user: dict = Depends(get_authenticated_user)
 ):
     """Project financial metrics for next month using AI"""
     try:
-        # Get historical data for forecasting
-        historical_data = [
-            {"month": "2024-01", "revenue": 320000, "expenses": 240000, "customers": 450},
-            {"month": "2024-02", "revenue": 335000, "expenses": 250000, "customers": 480},
-            {"month": "2024-03", "revenue": 365000, "expenses": 260000, "customers": 520},
-            {"month": "2024-04", "revenue": 380000, "expenses": 265000, "customers": 550},
-            {"month": "2024-05", "revenue": 395000, "expenses": 270000, "customers": 580},
-            {"month": "2024-06", "revenue": 380430, "expenses": 275000, "customers": 565}
-        ]
-        
-        # Calculate trends
-        revenue_trend = (historical_data[-1]["revenue"] - historical_data[0]["revenue"]) / len(historical_data)
-        expense_trend = (historical_data[-1]["expenses"] - historical_data[0]["expenses"]) / len(historical_data)
-        customer_trend = (historical_data[-1]["customers"] - historical_data[0]["customers"]) / len(historical_data)
-        
-        # AI-powered forecasting
-        ai_forecast = await ai_service.analyze_financial_data(
-            current_user["sub"],
-            "financial_forecast",
-            {
-                "historical_data": historical_data,
-                "trends": {
-                    "revenue_trend": revenue_trend,
-                    "expense_trend": expense_trend,
-                    "customer_trend": customer_trend
-                }
-            }
-        )
-        
-        # Generate projections
-        next_month_base = historical_data[-1]
-        
-        # Conservative, realistic, optimistic scenarios
-        scenarios = {
-            "conservative": {
-                "revenue": round(next_month_base["revenue"] * 1.02, 2),  # 2% growth
-                "expenses": round(next_month_base["expenses"] * 1.03, 2),  # 3% expense increase
-                "customers": round(next_month_base["customers"] * 1.015),  # 1.5% growth
-                "probability": 70
-            },
-            "realistic": {
-                "revenue": round(next_month_base["revenue"] * 1.05, 2),  # 5% growth
-                "expenses": round(next_month_base["expenses"] * 1.02, 2),  # 2% expense increase
-                "customers": round(next_month_base["customers"] * 1.03),  # 3% growth
-                "probability": 60
-            },
-            "optimistic": {
-                "revenue": round(next_month_base["revenue"] * 1.10, 2),  # 10% growth
-                "expenses": round(next_month_base["expenses"] * 1.01, 2),  # 1% expense increase
-                "customers": round(next_month_base["customers"] * 1.05),  # 5% growth
-                "probability": 30
-            }
-        }
-        
-        # Calculate derived metrics for each scenario
-        for scenario_name, scenario in scenarios.items():
-            scenario["profit"] = scenario["revenue"] - scenario["expenses"]
-            scenario["profit_margin"] = round((scenario["profit"] / scenario["revenue"]) * 100, 1)
-            scenario["revenue_per_customer"] = round(scenario["revenue"] / scenario["customers"], 2)
-        
-        return {
-            "forecast_date": datetime.now().isoformat(),
-            "target_month": (datetime.now() + timedelta(days=30)).strftime("%Y-%m"),
-            "historical_trends": {
-                "revenue_monthly_growth": round((revenue_trend / next_month_base["revenue"]) * 100, 2),
-                "expense_monthly_growth": round((expense_trend / next_month_base["expenses"]) * 100, 2),
-                "customer_monthly_growth": round((customer_trend / next_month_base["customers"]) * 100, 2)
-            },
-            "scenarios": scenarios,
-            "recommendations": [
-                "Mantener crecimiento actual del 5% mensual en ingresos",
-                "Controlar crecimiento de gastos por debajo del 2%",
-                "Enfocar en retención de clientes actuales",
-                "Invertir en canales de adquisición más eficientes"
-            ],
-            "key_metrics_to_monitor": [
-                "Conversión de leads a clientes",
-                "Costo de adquisición por canal",
-                "Retención mensual de clientes",
-                "Margen por producto/servicio"
-            ],
-            "ai_insights": ai_forecast,
-            "confidence_level": 75
-        }
+        return await _build_forecast(current_user["sub"])
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating forecast: {str(e)}")
 
+@router.post("/project-forecast/async", status_code=202)
+async def submit_forecast(current_user: dict = Depends(get_authenticated_user)):
+    """Encola la proyección del próximo mes; consulta el resultado en /api/jobs/{job_id}"""
+    try:
+        job_id = await job_queue.submit("project_forecast", current_user["sub"], {"user_id": current_user["sub"]})
+        return job_accepted_response(job_id)
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+async def _forecast_job(payload: dict, progress) -> dict:
+    return await _build_forecast(payload["user_id"], progress)
+
+job_queue.register("project_forecast", _forecast_job)
+
 async def _generate_pdf_report(metrics: dict, report_type: str) -> str:
     """Generate PDF report"""
+    # reportlab is only needed for PDF exports; importing it lazily keeps startup fast
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    
     # Create temporary file
     temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
     
@@ -458,6 +516,8 @@ async def _generate_pdf_report(metrics: dict, report_type: str) -> str:
 
 async def _generate_excel_report(metrics: dict, report_type: str) -> str:
     """Generate Excel report"""
+    import pandas as pd
+    
     temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx')
     
     with pd.ExcelWriter(temp_file.name, engine='openpyxl') as writer:
@@ -490,6 +550,8 @@ async def _generate_excel_report(metrics: dict, report_type: str) -> str:
 
 async def _generate_csv_report(metrics: dict, report_type: str) -> str:
     """Generate CSV report"""
+    import pandas as pd
+    
     temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.csv', mode='w')
     
     # Combine all data
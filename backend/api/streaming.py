@@ -0,0 +1,42 @@
+"""
+Respuestas en streaming para eventos incrementales (NDJSON o Server-Sent Events)
+Cada evento es un dict con la clave "event"; se envía en cuanto el generador lo produce
+"""
+
+import json
+from typing import Any, AsyncIterator, Dict
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+STREAM_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+
+
+def _encode(event: Dict[str, Any], stream_format: str) -> str:
+    payload = json.dumps(event, default=str, ensure_ascii=False)
+    if stream_format == "sse":
+        return f"event: {event.get('event', 'message')}\ndata: {payload}\n\n"
+    return payload + "\n"
+
+
+def event_stream_response(events: AsyncIterator[Dict[str, Any]], stream_format: str = "ndjson") -> StreamingResponse:
+    """StreamingResponse que serializa cada evento; un error a mitad de stream se envía como evento final"""
+    if stream_format not in STREAM_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Formato inválido, usa uno de: {list(STREAM_FORMATS)}")
+
+    async def body():
+        try:
+            async for event in events:
+                yield _encode(event, stream_format)
+        except Exception as e:
+            # Los headers ya se enviaron: el error viaja como último evento
+            yield _encode({"event": "error", "detail": str(e)}, stream_format)
+
+    return StreamingResponse(
+        body(),
+        media_type=STREAM_FORMATS[stream_format],
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
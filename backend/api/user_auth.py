@@ -14,7 +14,7 @@ def get_authenticated_user(credentials: HTTPAuthorizationCredentials = Depends(s
 @router.post("/user/login", response_model=TokenResponse)
 async def user_login(login_data: UserLogin):
     """User login with access code"""
-    user = auth_service.create_user_from_access_code(login_data.access_code)
+    user = await auth_service.create_user_from_access_code(login_data.access_code)
     
     if not user:
         raise HTTPException(
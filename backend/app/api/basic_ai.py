@@ -4,7 +4,7 @@ Basic AI Insights API - Simplified AI responses without LangChain complexity
 from fastapi import APIRouter, HTTPException
 from typing import Dict, Any, List
 from datetime import datetime
-import random
+from services.metrics_engine import metrics_engine
 
 router = APIRouter(prefix="/api/ai", tags=["ai"])
 
@@ -104,74 +104,14 @@ def generate_business_analysis(financial_data: Dict[str, Any]) -> Dict[str, Any]
     }
 
 def generate_health_score(financial_data: Dict[str, Any]) -> Dict[str, Any]:
-    """Generate health score based on financial metrics"""
+    """Generate health score based on financial metrics (shared deterministic metrics engine)"""
     
-    revenue = financial_data.get("revenue", 0)
-    expenses = financial_data.get("expenses", 0) 
-    net_profit = financial_data.get("net_profit", 0)
-    cash_flow = financial_data.get("cash_flow", 0)
-    
-    # Component scores (0-100)
-    scores = {}
-    
-    # Profitability score
-    profit_margin = (net_profit / revenue * 100) if revenue > 0 else 0
-    if profit_margin > 20:
-        scores["profitability"] = 100
-    elif profit_margin > 15:
-        scores["profitability"] = 85
-    elif profit_margin > 10:
-        scores["profitability"] = 70
-    elif profit_margin > 5:
-        scores["profitability"] = 50
-    else:
-        scores["profitability"] = 25
-    
-    # Liquidity score based on cash flow
-    if cash_flow > revenue * 0.1:  # 10% of revenue
-        scores["liquidity"] = 100
-    elif cash_flow > 0:
-        scores["liquidity"] = 75
-    elif cash_flow > -revenue * 0.05:  # Within 5% of revenue
-        scores["liquidity"] = 50
-    else:
-        scores["liquidity"] = 25
-    
-    # Efficiency score based on expense ratio
-    expense_ratio = (expenses / revenue * 100) if revenue > 0 else 100
-    if expense_ratio < 60:
-        scores["efficiency"] = 100
-    elif expense_ratio < 70:
-        scores["efficiency"] = 85
-    elif expense_ratio < 80:
-        scores["efficiency"] = 70
-    elif expense_ratio < 90:
-        scores["efficiency"] = 50
-    else:
-        scores["efficiency"] = 25
-    
-    # Growth score (simplified)
-    scores["growth"] = random.randint(60, 90)  # Would be based on historical data
-    
-    # Calculate total score
-    total_score = sum(scores.values()) / len(scores)
-    
-    # Determine health level
-    if total_score >= 80:
-        health_level = "Excelente"
-    elif total_score >= 65:
-        health_level = "Bueno"
-    elif total_score >= 50:
-        health_level = "Regular"
-    else:
-        health_level = "Crítico"
-    
-    return {
-        "total_score": round(total_score, 1),
-        "health_level": health_level,
-        "component_scores": scores,
-        "recommendations_priority": "Alta" if total_score < 60 else "Media" if total_score < 80 else "Baja"
+    # ltv/coca default to 0 when not provided; missing components are excluded instead of scoring 0
+    record = {
+        key: value for key, value in financial_data.items()
+        if not (key in ("ltv", "coca") and not value)
     }
+    return metrics_engine.health_score(record)
 
 @router.post("/analyze/business-health")
 async def analyze_business_health(financial_metrics: Dict[str, Any]):
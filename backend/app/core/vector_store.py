@@ -8,6 +8,7 @@ import logging
 from typing import Optional, List, Dict, Any
 from functools import lru_cache
 import json
+import asyncio
 import hashlib
 
 from langchain_core.retrievers import BaseRetriever
@@ -44,7 +45,14 @@ class SupabaseBookRetriever:
         try:
             # Generate query embedding
             query_embedding = self.embeddings.embed_query(query)
-            
+        except Exception as e:
+            logger.error(f"Error retrieving documents: {e}")
+            return []
+        return self._search(query, query_embedding)
+    
+    def _search(self, query: str, query_embedding: List[float]) -> List[Document]:
+        """Retrieve relevant documents for an already embedded query"""
+        try:
             # Use the Supabase search_book_embeddings function
             try:
                 result = self.supabase_client.rpc('search_book_embeddings', {
@@ -113,6 +121,28 @@ class SupabaseBookRetriever:
     async def aget_relevant_documents(self, query: str) -> List[Document]:
         """Async version of get_relevant_documents"""
         return self._get_relevant_documents(query)
+    
+    async def aget_relevant_documents_batch(self, queries: List[str]) -> List[List[Document]]:
+        """
+        Retrieve documents for several queries with a single embedding call
+        
+        Duplicate queries are embedded and searched once; the searches run concurrently.
+        Results keep the order of `queries`.
+        """
+        unique_queries = list(dict.fromkeys(queries))
+        try:
+            query_embeddings = await asyncio.to_thread(self.embeddings.embed_documents, unique_queries)
+        except Exception as e:
+            logger.error(f"Error embedding query batch: {e}")
+            return [[] for _ in queries]
+        
+        results = await asyncio.gather(*(
+            asyncio.to_thread(self._search, query, embedding)
+            for query, embedding in zip(unique_queries, query_embeddings)
+        ))
+        logger.info(f"Batch retrieval: {len(queries)} queries, {len(unique_queries)} embedded in one call")
+        by_query = dict(zip(unique_queries, results))
+        return [by_query[query] for query in queries]
 
 class CachedBookRetriever:
     """Wrapper for book retriever with Redis caching"""
@@ -261,6 +291,9 @@ class MockBookRetriever:
     
     async def aget_relevant_documents(self, query: str) -> List[Document]:
         return self._get_relevant_documents(query)
+    
+    async def aget_relevant_documents_batch(self, queries: List[str]) -> List[List[Document]]:
+        return [self._get_relevant_documents(query) for query in queries]
 
 @lru_cache(maxsize=1)
 def get_supabase_client() -> Client:
@@ -273,32 +306,6 @@ def get_supabase_client() -> Client:
     
     return create_client(url, service_key)
 
-def check_tokens(text: str, max_tokens: int = 3000) -> bool:
-    """
-    Check if text exceeds token limit
-    
-    Args:
-        text: Text to check
-        max_tokens: Maximum allowed tokens
-    
-    Returns:
-        bool: True if within limit, False otherwise
-    """
-    try:
-        import tiktoken
-        tokenizer = tiktoken.get_encoding("cl100k_base")
-        token_count = len(tokenizer.encode(text))
-        
-        if token_count > max_tokens:
-            logger.warning(f"Text exceeds {max_tokens} tokens ({token_count})")
-            return False
-        
-        return True
-    
-    except Exception as e:
-        logger.error(f"Error checking tokens: {e}")
-        return True  # Allow by default if check fails
-
 def format_citations(documents: List[Document]) -> List[Dict[str, Any]]:
     """
     Format documents as citations for API responses
@@ -16,21 +16,23 @@ import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 
-from agents.langchain_agents import (
-    MayaCashFlowAgent,
-    CarlosUnitEconomicsAgent, 
-    SofiaGrowthAgent,
-    AlexRiskAgent,
-    DianaPerformanceAgent
-)
+from agents import get_langchain_agent_manager
 from middleware import ai_rate_limit
-from app.core.vector_store import check_tokens
+from services.prompt_builder import check_tokens
+from services.deadline import degraded_stages, run_stage, has_time_for, mark_degraded, MIN_SECONDS_FOR_RETRIEVAL
+from services.agent_fanout import AgentOutcome, run_agents, iter_agents
+from services.provider_scheduler import Priority, priority_scope
+from api.streaming import event_stream_response
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 security = HTTPBearer()
 
+# Batch QA: questions per call and per-question timeout (queue wait in the bulkhead included)
+BATCH_QA_MAX_QUESTIONS = int(os.getenv("AI_BATCH_QA_MAX_QUESTIONS", "20"))
+BATCH_QA_ITEM_TIMEOUT_SECONDS = float(os.getenv("AI_BATCH_QA_ITEM_TIMEOUT_SECONDS", "90"))
+
 # Agent enumeration
 class AgentEnum(str, Enum):
     maya = "maya"
@@ -44,21 +46,28 @@ class QAInput(BaseModel):
     question: str = Field(..., description="Question for the agent")
     context: Optional[Dict[str, Any]] = Field(default=None, description="Additional context")
     financial_data: Optional[Dict[str, Any]] = Field(default=None, description="Financial data for analysis")
+    answer_mode: str = Field(default="llm", description="'rules' answers from the metrics engine without calling the LLM")
 
 class QAMultiInput(BaseModel):
     question: str = Field(..., description="Question for all agents")
     agents: List[AgentEnum] = Field(..., description="List of agents to consult")
     context: Optional[Dict[str, Any]] = Field(default=None, description="Additional context")
     financial_data: Optional[Dict[str, Any]] = Field(default=None, description="Financial data for analysis")
+    answer_mode: str = Field(default="llm", description="'rules' answers from the metrics engine without calling the LLM")
+
+class QABatchItem(BaseModel):
+    agent: AgentEnum = Field(..., description="Agent that answers this question")
+    question: str = Field(..., description="Question for the agent")
+
+class QABatchInput(BaseModel):
+    items: List[QABatchItem] = Field(..., description="Questions to answer, in order")
+    context: Optional[Dict[str, Any]] = Field(default=None, description="Additional context shared by all questions")
+    financial_data: Optional[Dict[str, Any]] = Field(default=None, description="Financial data shared by all questions")
+    answer_mode: str = Field(default="llm", description="'rules' answers from the metrics engine without calling the LLM")
 
-# Initialize agents
-AGENTS = {
-    AgentEnum.maya: MayaCashFlowAgent(),
-    AgentEnum.carlos: CarlosUnitEconomicsAgent(),
-    AgentEnum.sofia: SofiaGrowthAgent(),
-    AgentEnum.alex: AlexRiskAgent(),
-    AgentEnum.diana: DianaPerformanceAgent()
-}
+def _agents():
+    """Agents shared with the LangChain manager; the module loads and each agent is built on first use"""
+    return get_langchain_agent_manager().agents
 
 def get_authenticated_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Verify user has AI access"""
@@ -75,17 +84,20 @@ def get_authenticated_user(credentials: HTTPAuthorizationCredentials = Depends(s
 @router.get("/agents/available")
 async def list_available_agents():
     """List all available agents"""
+    agents = _agents()
+    built = set(agents.built())
     agents_info = {}
-    for agent_name, agent in AGENTS.items():
+    for agent_name, agent_class in agents.specs().items():
         agents_info[agent_name] = {
-            "name": agent.name,
-            "specialty": agent.specialty,
-            "has_book_qa": hasattr(agent, 'tools') and len(agent.tools) > 0
+            "name": agent_class.name,
+            "specialty": agent_class.specialty,
+            # Known once the agent is built: its book_qa tool connects to the vector store
+            "has_book_qa": len(agents[agent_name].tools) > 0 if agent_name in built else None
         }
     
     return {
         "agents": agents_info,
-        "total_agents": len(AGENTS)
+        "total_agents": len(agents)
     }
 
 # Public endpoint for demo/testing (sin autenticación)
@@ -109,19 +121,20 @@ async def agent_chat_demo(
         logger.info(f"Demo agent consultation - Agent: {agent.value}, Question: {qa_input.question[:100]}...")
         
         # Get agent instance
-        if agent not in AGENTS:
+        if agent not in _agents():
             raise HTTPException(
                 status_code=404,
                 detail=f"Agent {agent.value} not found"
             )
         
-        agent_instance = AGENTS[agent]
+        agent_instance = _agents()[agent]
         
         # Prepare data for agent processing (sin user_id para demo)
         agent_data = {
             "question": qa_input.question,
             "context": qa_input.context or {},
             "financial_data": qa_input.financial_data or {},
+            "answer_mode": qa_input.answer_mode,
             "user_id": "demo_user"
         }
         
@@ -210,19 +223,20 @@ async def agent_book_qa(
             )
         
         # Get the specified agent
-        if agent not in AGENTS:
+        if agent not in _agents():
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Agent '{agent}' not found"
             )
         
-        selected_agent = AGENTS[agent]
+        selected_agent = _agents()[agent]
         
         # Prepare data for agent processing
         agent_data = {
             "question": qa_input.question,
             "context": qa_input.context or {},
             "financial_data": qa_input.financial_data or {},
+            "answer_mode": qa_input.answer_mode,
             "user_id": current_user["sub"]
         }
         
@@ -249,6 +263,86 @@ async def agent_book_qa(
             detail="Internal server error processing agent request"
         )
 
+def _prepare_multi_book_qa(qa_input: QAMultiInput, current_user: dict) -> Dict[str, Any]:
+    """Validate a multi-agent request and build the shared agent payload"""
+    # Check token limits
+    full_text = f"{qa_input.question} {qa_input.context or ''} {qa_input.financial_data or ''}"
+    if not check_tokens(full_text):
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Request exceeds token limit (3000 tokens max)"
+        )
+    
+    # Validate agents
+    if not qa_input.agents:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="At least one agent must be specified"
+        )
+    
+    for agent in qa_input.agents:
+        if agent not in _agents():
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Agent '{agent}' not found"
+            )
+    
+    # Prepare data for agent processing
+    return {
+        "question": qa_input.question,
+        "context": qa_input.context or {},
+        "financial_data": qa_input.financial_data or {},
+        "answer_mode": qa_input.answer_mode,
+        "user_id": current_user["sub"]
+    }
+
+def _book_qa_calls(agents: List[AgentEnum], agent_data: Dict[str, Any], user_id: str) -> Dict[AgentEnum, Any]:
+    return {
+        agent_name: (lambda agent_name=agent_name: _agents()[agent_name].process_request(
+            user_id=user_id,
+            data=agent_data,
+            use_book_qa=True
+        ))
+        for agent_name in agents
+    }
+
+def _book_qa_answer(outcome: AgentOutcome) -> Dict[str, Any]:
+    if outcome.ok:
+        return {
+            "success": True,
+            "response": outcome.result,
+            "seconds": outcome.seconds
+        }
+    logger.error(f"Error processing agent {outcome.agent_id}: {outcome.status} {outcome.error}")
+    return {
+        "success": False,
+        "status": outcome.status,
+        "error": outcome.error,
+        "seconds": outcome.seconds
+    }
+
+def _book_qa_summary(qa_input: QAMultiInput, results: Dict[AgentEnum, Dict[str, Any]]) -> Dict[str, Any]:
+    # Compile summary (answers keep the requested agent order)
+    answers = {agent_name: results[agent_name] for agent_name in qa_input.agents if agent_name in results}
+    successful_agents = [name for name, result in answers.items() if result["success"]]
+    failed_agents = [name for name, result in answers.items() if not result["success"]]
+    
+    return {
+        "success": True,
+        "question": qa_input.question,
+        "agents_consulted": qa_input.agents,
+        "successful_agents": successful_agents,
+        "failed_agents": failed_agents,
+        "answers": answers,
+        "book_qa_enabled": True,
+        "degraded_stages": degraded_stages(),
+        "summary": {
+            "total_agents": len(qa_input.agents),
+            "successful": len(successful_agents),
+            "failed": len(failed_agents)
+        }
+    }
+
 @router.post("/multi/book-qa", dependencies=[Depends(ai_rate_limit)])
 async def multi_agent_book_qa(
     qa_input: QAMultiInput,
@@ -263,89 +357,160 @@ async def multi_agent_book_qa(
     - **financial_data**: Optional financial data for analysis
     """
     try:
-        # Check token limits
-        full_text = f"{qa_input.question} {qa_input.context or ''} {qa_input.financial_data or ''}"
-        if not check_tokens(full_text):
-            raise HTTPException(
-                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                detail="Request exceeds token limit (3000 tokens max)"
-            )
+        agent_data = _prepare_multi_book_qa(qa_input, current_user)
         
-        # Validate agents
-        if not qa_input.agents:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="At least one agent must be specified"
-            )
+        # Process all agents concurrently; a slow agent times out without blocking the others
+        outcomes = await run_agents(_book_qa_calls(qa_input.agents, agent_data, current_user["sub"]))
+        results = {agent_name: _book_qa_answer(outcome) for agent_name, outcome in outcomes.items()}
         
-        for agent in qa_input.agents:
-            if agent not in AGENTS:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail=f"Agent '{agent}' not found"
-                )
+        return _book_qa_summary(qa_input, results)
         
-        # Prepare data for agent processing
-        agent_data = {
-            "question": qa_input.question,
-            "context": qa_input.context or {},
-            "financial_data": qa_input.financial_data or {},
-            "user_id": current_user["sub"]
-        }
-        
-        # Process all agents in parallel
-        tasks = []
-        for agent_name in qa_input.agents:
-            agent = AGENTS[agent_name]
-            task = agent.process_request(
-                user_id=current_user["sub"],
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in multi-agent book QA: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error processing multi-agent request"
+        )
+
+@router.post("/multi/book-qa/stream", dependencies=[Depends(ai_rate_limit)])
+async def multi_agent_book_qa_stream(
+    qa_input: QAMultiInput,
+    format: str = "ndjson",
+    current_user: dict = Depends(get_authenticated_user)
+):
+    """
+    Streaming variant of /multi/book-qa (NDJSON or SSE via ?format=sse)
+    
+    Emits a `start` event, one `agent` event per agent in completion order, and a final `summary`
+    event with the same body as the non-streaming endpoint.
+    """
+    agent_data = _prepare_multi_book_qa(qa_input, current_user)
+    
+    async def events():
+        yield {"event": "start", "agents": qa_input.agents}
+        results = {}
+        async for outcome in iter_agents(_book_qa_calls(qa_input.agents, agent_data, current_user["sub"])):
+            results[outcome.agent_id] = _book_qa_answer(outcome)
+            yield {"event": "agent", "agent_id": outcome.agent_id, **results[outcome.agent_id]}
+        yield {"event": "summary", "result": _book_qa_summary(qa_input, results)}
+    
+    return event_stream_response(events(), format)
+
+async def _batch_book_documents(questions: List[str]) -> List[Optional[List]]:
+    """Book passages for every question from one batched embedding call ([] = answer without the book)"""
+    if not has_time_for(MIN_SECONDS_FOR_RETRIEVAL):
+        mark_degraded("book_qa:batch", "deadline")
+        return [[] for _ in questions]
+    from agents.langchain_agents import BOOK_QA_TIMEOUT_SECONDS
+    from app.core.vector_store import get_book_retriever
+    try:
+        return await run_stage(
+            "book_qa:batch",
+            get_book_retriever(k=3).aget_relevant_documents_batch(questions),
+            BOOK_QA_TIMEOUT_SECONDS
+        )
+    except Exception as e:
+        # Without shared passages the answers go without the book instead of retrying per question
+        logger.warning(f"Batch book retrieval failed: {e}")
+        return [[] for _ in questions]
+
+def _batch_qa_call(item: QABatchItem, agent_data: Dict[str, Any], user_id: str, book_documents: Optional[List]):
+    async def call():
+        if agent_data["answer_mode"] == "rules":
+            return await _agents()[item.agent].process_request(user_id=user_id, data=agent_data)
+        # Each LLM call waits for a batch slot in the DeepSeek bulkhead: interactive traffic keeps its reserve
+        with priority_scope(Priority.BATCH):
+            return await _agents()[item.agent].process_request(
+                user_id=user_id,
                 data=agent_data,
-                use_book_qa=True
+                use_book_qa=True,
+                book_documents=book_documents
             )
-            tasks.append((agent_name, task))
-        
-        # Wait for all agents to complete
-        results = {}
-        for agent_name, task in tasks:
-            try:
-                result = await task
-                results[agent_name] = {
-                    "success": True,
-                    "response": result
-                }
-            except Exception as e:
-                logger.error(f"Error processing agent {agent_name}: {e}")
-                results[agent_name] = {
-                    "success": False,
-                    "error": str(e)
-                }
-        
-        # Compile summary
-        successful_agents = [name for name, result in results.items() if result["success"]]
-        failed_agents = [name for name, result in results.items() if not result["success"]]
-        
+    return call
+
+@router.post("/multi/book-qa/batch", dependencies=[Depends(ai_rate_limit)])
+async def batch_agent_book_qa(
+    batch_input: QABatchInput,
+    current_user: dict = Depends(get_authenticated_user)
+):
+    """
+    Several questions for one or more agents in a single call
+
+    - **items**: List of {agent, question}; answers come back in the same order
+    - **context**: Optional context shared by all questions
+    - **financial_data**: Optional financial data shared by all questions
+
+    All questions are embedded in one batched call and their retrievals run together;
+    answers are generated concurrently under the provider bulkhead.
+    """
+    if not batch_input.items:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="At least one question must be specified"
+        )
+    if len(batch_input.items) > BATCH_QA_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batch exceeds {BATCH_QA_MAX_QUESTIONS} questions"
+        )
+
+    # Check token limits once for the shared payload and every question
+    full_text = " ".join(item.question for item in batch_input.items)
+    full_text += f" {batch_input.context or ''} {batch_input.financial_data or ''}"
+    if not check_tokens(full_text):
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Request exceeds token limit (3000 tokens max)"
+        )
+
+    try:
+        user_id = current_user["sub"]
+        questions = [item.question for item in batch_input.items]
+        if batch_input.answer_mode == "rules":
+            book_documents = [None] * len(questions)
+        else:
+            book_documents = await _batch_book_documents(questions)
+
+        calls = {}
+        for index, item in enumerate(batch_input.items):
+            agent_data = {
+                "question": item.question,
+                "context": batch_input.context or {},
+                "financial_data": batch_input.financial_data or {},
+                "answer_mode": batch_input.answer_mode,
+                "user_id": user_id
+            }
+            calls[f"{index}:{item.agent.value}"] = _batch_qa_call(item, agent_data, user_id, book_documents[index])
+
+        # The bulkhead caps concurrency; the fan-out only adds per-question timeouts
+        outcomes = await run_agents(calls, timeout=BATCH_QA_ITEM_TIMEOUT_SECONDS, max_concurrency=len(calls))
+        answers = [
+            {"index": index, "agent": item.agent, "question": item.question, **_book_qa_answer(outcome)}
+            for index, (item, outcome) in enumerate(zip(batch_input.items, outcomes.values()))
+        ]
+        successful = sum(1 for answer in answers if answer["success"])
+
         return {
             "success": True,
-            "question": qa_input.question,
-            "agents_consulted": qa_input.agents,
-            "successful_agents": successful_agents,
-            "failed_agents": failed_agents,
-            "answers": results,
-            "book_qa_enabled": True,
+            "answers": answers,
+            "book_qa_enabled": batch_input.answer_mode != "rules",
+            "degraded_stages": degraded_stages(),
             "summary": {
-                "total_agents": len(qa_input.agents),
-                "successful": len(successful_agents),
-                "failed": len(failed_agents)
+                "total_questions": len(answers),
+                "successful": successful,
+                "failed": len(answers) - successful
             }
         }
-        
+
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error in multi-agent book QA: {e}")
+        logger.error(f"Error in batch book QA: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Internal server error processing multi-agent request"
+            detail="Internal server error processing batch request"
         )
 
 @router.post("/{agent}/consult")
@@ -372,19 +537,20 @@ async def single_agent_consult(
             )
         
         # Get the specified agent
-        if agent not in AGENTS:
+        if agent not in _agents():
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Agent '{agent}' not found"
             )
         
-        selected_agent = AGENTS[agent]
+        selected_agent = _agents()[agent]
         
         # Prepare data for agent processing
         agent_data = {
             "question": qa_input.question,
             "context": qa_input.context or {},
             "financial_data": qa_input.financial_data or {},
+            "answer_mode": qa_input.answer_mode,
             "user_id": current_user["sub"]
         }
         
@@ -409,4 +575,4 @@ async def single_agent_consult(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error processing agent request"
-        )
\ No newline at end of file
+        )
@@ -1,18 +1,26 @@
+from services.startup import startup_profile
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 import uvicorn
 from dotenv import load_dotenv
+import asyncio
 import os
 from middleware import rate_limit_middleware, default_limiter, CSRFProtection
 
 # Load environment variables
 load_dotenv()
 
+with startup_profile.measure("core services"):
+    from services.job_queue import job_queue
+    from services.usage_accounting import usage_scope
+    from services.deadline import deadline_scope, deadline_for_request, DEADLINE_HEADER, DEGRADED_HEADER
+    from services.redis_service import RedisUnavailableError
+
 # Initialize CSRF protection
 csrf_protection = CSRFProtection(
     secret_key=os.getenv("SECRET_KEY", "your-secret-key-change-in-production"),
-    exclude_paths={"/docs", "/redoc", "/openapi.json", "/health", "/"}
+    exclude_paths={"/docs", "/redoc", "/openapi.json", "/health", "/ready", "/"}
 )
 
 # Create FastAPI instance
@@ -46,16 +54,56 @@ app.add_middleware(
 async def add_csrf_protection(request: Request, call_next):
     return await csrf_protection(request, call_next)
 
+# Attribute AI usage (tokens, latency, cost) to the endpoint that triggered it
+@app.middleware("http")
+async def add_usage_scope(request: Request, call_next):
+    with usage_scope(endpoint=f"{request.method} {request.url.path}"):
+        return await call_next(request)
+
+# Request deadline shared by every AI stage (client header or per-route default)
+@app.middleware("http")
+async def add_request_deadline(request: Request, call_next):
+    seconds = deadline_for_request(request.url.path, request.headers.get(DEADLINE_HEADER))
+    with deadline_scope(seconds) as deadline:
+        response = await call_next(request)
+        if deadline.degraded:
+            response.headers[DEGRADED_HEADER] = ",".join(deadline.degraded_stages())
+        return response
+
 # Add rate limiting middleware
 @app.middleware("http")
 async def add_rate_limiting(request: Request, call_next):
     return await rate_limit_middleware(request, call_next, default_limiter)
 
+# Redis outage on a path with no local fallback (auth store, admin keys): 503 instead of a 500
+@app.exception_handler(RedisUnavailableError)
+async def redis_unavailable_handler(request: Request, exc: RedisUnavailableError):
+    return JSONResponse(status_code=503, content={"detail": "Service temporarily unavailable, please retry"})
+
 # Startup event to initialize cleanup tasks
 @app.on_event("startup")
 async def startup_event():
     # Start cleanup task for rate limiter
     await default_limiter.start_cleanup()
+    # Start background job workers for long-running AI analyses
+    await job_queue.start()
+    # Probe Redis in the background so requests never wait on a PING
+    from services.redis_service import redis_service
+    await redis_service.start()
+    # Listen for access key revocations published by other workers
+    from services.auth_service import auth_service
+    await auth_service.start()
+    # Warm up clients and agents in the background; /ready reports when it finishes
+    # (the reference keeps the task from being garbage-collected before it completes)
+    app.state.warmup_task = asyncio.create_task(startup_profile.warm_up(warmup_steps()))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await job_queue.stop()
+    from services.auth_service import auth_service
+    await auth_service.stop()
+    from services.redis_service import redis_service
+    await redis_service.close()
 
 # Root endpoint
 @app.get("/")
@@ -66,7 +114,7 @@ async def root():
         "status": "healthy"
     }
 
-# Health check endpoint
+# Health check endpoint (liveness: the process is up)
 @app.get("/health")
 async def health_check():
     return {
@@ -75,14 +123,43 @@ async def health_check():
         "version": "1.0.0"
     }
 
+# Readiness endpoint: warm-up finished and the instance can take traffic
+@app.get("/ready")
+async def readiness_check():
+    profile = startup_profile.snapshot()
+    return JSONResponse(status_code=200 if profile["ready"] else 503, content=profile)
+
 # API endpoints will be added here
-from api import (
-    auth, dashboard, cash_flow, unit_economics, costs_pricing, 
-    profitability, planning, configuration, help, support, progress,
-    admin, user_auth, ai, reports, langchain_agents, notifications, search
-)
-from api import ai_insights
-from app.api import live_metrics
+with startup_profile.measure("api routers"):
+    from api import (
+        auth, dashboard, cash_flow, unit_economics, costs_pricing, 
+        profitability, planning, configuration, help, support, progress,
+        admin, user_auth, ai, reports, langchain_agents, notifications, search, jobs
+    )
+with startup_profile.measure("ai insights router"):
+    from api import ai_insights
+with startup_profile.measure("live metrics router"):
+    from app.api import live_metrics
+
+def warmup_steps():
+    """Clients and agents built ahead of traffic instead of at import time (heavy imports run in the steps)"""
+    from services.redis_service import redis_service
+    from agents import get_langchain_agent_manager
+    
+    def build_book_retriever():
+        from app.core.vector_store import get_book_retriever
+        get_book_retriever(k=3)
+    
+    async def ping_redis():
+        # is_connected() reports an outage as False; raising records the step as an error in /ready
+        if not await redis_service.is_connected():
+            raise ConnectionError("Redis is not configured or did not answer PING")
+    
+    return [
+        ("redis", ping_redis),
+        ("book_retriever", build_book_retriever),
+        ("langchain_agents", lambda: get_langchain_agent_manager().agents.warm_up()),
+    ]
 
 # Security middleware
 @app.middleware("http")
@@ -118,10 +195,12 @@ app.include_router(help.router, prefix="/api", tags=["Help & Documentation"])
 app.include_router(support.router, prefix="/api", tags=["Support"])
 app.include_router(progress.router, prefix="/api/progress", tags=["Learning Progress"])
 app.include_router(reports.router, prefix="/api", tags=["Reports"])
+app.include_router(jobs.router, prefix="/api", tags=["Jobs"])
 app.include_router(langchain_agents.router, prefix="/api", tags=["LangChain AI Agents"])
 
 # Agent endpoints
-from app.routers import agents
+with startup_profile.measure("agents router"):
+    from app.routers import agents
 app.include_router(agents.router, prefix="/api", tags=["Agents"])
 
 # New API integrations
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+LLM Stand-in Server for load and performance testing
+OpenAI-compatible /v1/chat/completions endpoint (streaming included) that replays recorded
+responses from cassettes keyed by prompt hash, records them from a real upstream, or
+synthesises responses with configurable latency distribution, token rate and error rates.
+
+Point the backend at it with:
+    DEEPSEEK_BASE_URL=http://localhost:8090/v1 OPENAI_BASE_URL=http://localhost:8090/v1
+
+Usage:
+    python scripts/llm_standin.py --mode synth --ttft-median 0.8 --ttft-p99 4 --tokens-per-second 40
+    python scripts/llm_standin.py --mode replay --cassettes tests/cassettes --latency-scale 1.0
+    python scripts/llm_standin.py --mode record --cassettes tests/cassettes --upstream-url https://api.deepseek.com/v1
+"""
+
+import os
+import json
+import math
+import time
+import uuid
+import random
+import asyncio
+import hashlib
+import argparse
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# z de la normal estándar para el percentil 99
+Z_P99 = 2.326
+
+FILLER_WORDS = (
+    "El flujo de caja operativo muestra una tendencia estable y conviene revisar el margen "
+    "de contribución por producto antes de ajustar precios o aumentar el gasto en adquisición "
+    "de clientes manteniendo la relación LTV CAC por encima de tres"
+).split()
+
+
+@dataclass
+class StandInConfig:
+    """Comportamiento del servidor stand-in"""
+    mode: str = "synth"                     # synth | replay | record
+    cassette_dir: Optional[str] = None
+    strict_replay: bool = False             # replay: 404 si no hay cassette (si no, sintetiza)
+    latency_scale: float = 1.0              # replay: multiplica la latencia grabada (0 = sin espera)
+    ttft_median: float = 0.8                # synth: mediana del tiempo al primer token (s)
+    ttft_p99: float = 4.0                   # synth: p99 del tiempo al primer token (s)
+    tokens_per_second: float = 40.0         # synth: velocidad de generación
+    output_tokens: int = 300                # synth: tokens de salida típicos (limitados por max_tokens)
+    error_rate: float = 0.0                 # probabilidad de responder 500
+    rate_limit_rate: float = 0.0            # probabilidad de responder 429
+    upstream_url: Optional[str] = None      # record: API real a la que se reenvía
+    upstream_key: Optional[str] = None
+    seed: Optional[int] = None
+    stats: Dict[str, int] = field(default_factory=lambda: {
+        "requests": 0, "streamed": 0, "cassette_hits": 0, "cassette_misses": 0,
+        "recorded": 0, "errors_injected": 0, "rate_limits_injected": 0
+    })
+
+
+def prompt_hash(model: str, messages: List[Dict[str, Any]]) -> str:
+    """Clave de cassette: hash estable del modelo y los mensajes"""
+    canonical = json.dumps({"model": model, "messages": messages}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class CassetteStore:
+    """Respuestas grabadas, un archivo JSON por hash de prompt"""
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        if not path.exists():
+            return None
+        return json.loads(path.read_text(encoding="utf-8"))
+
+    def save(self, key: str, request_body: Dict[str, Any], response: Dict[str, Any], latency: float):
+        self._path(key).write_text(json.dumps({
+            "request": {"model": request_body.get("model"), "messages": request_body.get("messages")},
+            "response": response,
+            "latency_seconds": round(latency, 3)
+        }, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+class LatencyModel:
+    """Tiempo al primer token log-normal (definido por mediana y p99) + velocidad constante de tokens"""
+
+    def __init__(self, median: float, p99: float, tokens_per_second: float, rng: random.Random):
+        self.mu = math.log(max(median, 1e-6))
+        self.sigma = max(0.0, (math.log(max(p99, median, 1e-6)) - self.mu) / Z_P99)
+        self.tokens_per_second = max(tokens_per_second, 1e-6)
+        self.rng = rng
+
+    def time_to_first_token(self) -> float:
+        return self.rng.lognormvariate(self.mu, self.sigma)
+
+    def token_interval(self) -> float:
+        return 1.0 / self.tokens_per_second
+
+
+def count_tokens(text: str) -> int:
+    """Aproximación de tokens por palabras (suficiente para simular el uso)"""
+    return max(1, len(text.split()))
+
+
+def synthesize_content(n_tokens: int, rng: random.Random) -> str:
+    start = rng.randrange(len(FILLER_WORDS))
+    return " ".join(FILLER_WORDS[(start + i) % len(FILLER_WORDS)] for i in range(n_tokens))
+
+
+def completion_payload(model: str, content: str, prompt_tokens: int, reasoning: Optional[str] = None) -> Dict[str, Any]:
+    """Respuesta con el formato de chat.completion de OpenAI"""
+    message: Dict[str, Any] = {"role": "assistant", "content": content}
+    if reasoning is not None:
+        message["reasoning_content"] = reasoning
+    completion_tokens = count_tokens(content)
+    return {
+        "id": f"chatcmpl-standin-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+    }
+
+
+def stream_chunks(completion: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Divide una respuesta completa en chunks chat.completion.chunk (rol, un token por chunk, fin)"""
+    base = {"id": completion["id"], "object": "chat.completion.chunk",
+            "created": completion["created"], "model": completion["model"]}
+    content = completion["choices"][0]["message"]["content"]
+    words = content.split(" ")
+
+    chunks = [dict(base, choices=[{"index": 0, "delta": {"role": "assistant"}, "finish_reason": None}])]
+    for index, word in enumerate(words):
+        piece = word if index == 0 else f" {word}"
+        chunks.append(dict(base, choices=[{"index": 0, "delta": {"content": piece}, "finish_reason": None}]))
+    chunks.append(dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}], usage=completion["usage"]))
+    return chunks
+
+
+def create_app(config: StandInConfig) -> FastAPI:
+    """Aplicación FastAPI del stand-in"""
+    rng = random.Random(config.seed)
+    latency = LatencyModel(config.ttft_median, config.ttft_p99, config.tokens_per_second, rng)
+    cassettes = CassetteStore(config.cassette_dir) if config.cassette_dir else None
+    app = FastAPI(title="KatalisApp LLM Stand-in")
+
+    async def record_upstream(body: Dict[str, Any]) -> Dict[str, Any]:
+        upstream_body = dict(body, stream=False)
+        started = time.monotonic()
+        async with httpx.AsyncClient() as client:
+            response = await client.post(
+                f"{config.upstream_url.rstrip('/')}/chat/completions",
+                headers={"Authorization": f"Bearer {config.upstream_key}", "Content-Type": "application/json"},
+                json=upstream_body,
+                timeout=120.0
+            )
+        response.raise_for_status()
+        data = response.json()
+        cassettes.save(prompt_hash(body.get("model", ""), body.get("messages", [])), body, data, time.monotonic() - started)
+        config.stats["recorded"] += 1
+        return data
+
+    def build_response(body: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], float, float]:
+        """Retorna (respuesta, tiempo al primer token, intervalo entre tokens)"""
+        model = body.get("model", "standin")
+        messages = body.get("messages", [])
+
+        if cassettes and config.mode == "replay":
+            cassette = cassettes.load(prompt_hash(model, messages))
+            if cassette:
+                config.stats["cassette_hits"] += 1
+                recorded = cassette["response"]
+                total = cassette.get("latency_seconds", 0.0) * config.latency_scale
+                tokens = recorded.get("usage", {}).get("completion_tokens") or 1
+                # Reparte la latencia grabada: 20% hasta el primer token, el resto generando
+                return recorded, total * 0.2, (total * 0.8) / tokens
+            config.stats["cassette_misses"] += 1
+            if config.strict_replay:
+                return None, 0.0, 0.0
+
+        prompt_tokens = count_tokens(" ".join(str(m.get("content", "")) for m in messages))
+        n_tokens = min(int(body.get("max_tokens") or config.output_tokens), config.output_tokens)
+        reasoning = "Paso 1: revisar métricas\nPaso 2: comparar con benchmarks" if "reasoner" in model else None
+        completion = completion_payload(model, synthesize_content(max(1, n_tokens), rng), prompt_tokens, reasoning)
+        return completion, latency.time_to_first_token(), latency.token_interval()
+
+    def injected_error() -> Optional[JSONResponse]:
+        roll = rng.random()
+        if roll < config.rate_limit_rate:
+            config.stats["rate_limits_injected"] += 1
+            return JSONResponse(status_code=429, content={"error": {"message": "Rate limit (stand-in)", "type": "rate_limit_error"}})
+        if roll < config.rate_limit_rate + config.error_rate:
+            config.stats["errors_injected"] += 1
+            return JSONResponse(status_code=500, content={"error": {"message": "Internal error (stand-in)", "type": "server_error"}})
+        return None
+
+    @app.post("/v1/chat/completions")
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        config.stats["requests"] += 1
+
+        error = injected_error()
+        if error is not None:
+            return error
+
+        if config.mode == "record":
+            completion = await record_upstream(body)
+            ttft, interval = 0.0, 0.0
+        else:
+            completion, ttft, interval = build_response(body)
+            if completion is None:
+                return JSONResponse(status_code=404, content={"error": {"message": "No cassette for prompt", "type": "cassette_miss"}})
+
+        if not body.get("stream"):
+            tokens = completion.get("usage", {}).get("completion_tokens") or 1
+            await asyncio.sleep(ttft + interval * tokens)
+            return completion
+
+        config.stats["streamed"] += 1
+
+        async def event_stream() -> AsyncIterator[str]:
+            chunks = stream_chunks(completion)
+            await asyncio.sleep(ttft)
+            for index, chunk in enumerate(chunks):
+                if index > 1:
+                    await asyncio.sleep(interval)
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [
+            {"id": "deepseek-reasoner", "object": "model"},
+            {"id": "gpt-4o-mini", "object": "model"}
+        ]}
+
+    @app.get("/stats")
+    async def stats():
+        return {"mode": config.mode, **config.stats}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible LLM stand-in server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--mode", choices=["synth", "replay", "record"], default="synth")
+    parser.add_argument("--cassettes", help="Cassette directory (replay/record)")
+    parser.add_argument("--strict", action="store_true", help="Replay: 404 on cassette miss instead of synthesising")
+    parser.add_argument("--latency-scale", type=float, default=1.0)
+    parser.add_argument("--ttft-median", type=float, default=0.8)
+    parser.add_argument("--ttft-p99", type=float, default=4.0)
+    parser.add_argument("--tokens-per-second", type=float, default=40.0)
+    parser.add_argument("--output-tokens", type=int, default=300)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--upstream-url", default=os.getenv("STANDIN_UPSTREAM_URL"))
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    if args.mode != "synth" and not args.cassettes:
+        parser.error("--cassettes is required for replay and record modes")
+    if args.mode == "record" and not args.upstream_url:
+        parser.error("--upstream-url is required for record mode")
+
+    config = StandInConfig(
+        mode=args.mode,
+        cassette_dir=args.cassettes,
+        strict_replay=args.strict,
+        latency_scale=args.latency_scale,
+        ttft_median=args.ttft_median,
+        ttft_p99=args.ttft_p99,
+        tokens_per_second=args.tokens_per_second,
+        output_tokens=args.output_tokens,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        upstream_url=args.upstream_url,
+        upstream_key=os.getenv("STANDIN_UPSTREAM_KEY"),
+        seed=args.seed
+    )
+    print(f"🎭 LLM stand-in ({config.mode}) en http://{args.host}:{args.port}/v1")
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Startup import profiler
+Runs `python -X importtime -c "import main"` in a fresh interpreter and reports the modules
+with the highest cumulative import cost, grouped by top-level package.
+
+Usage:
+    python scripts/profile_startup.py --top 25
+    python scripts/profile_startup.py --module main --by-package
+"""
+
+import os
+import re
+import sys
+import argparse
+import subprocess
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# import time: self [us] | cumulative | imported package
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def run_importtime(module: str) -> Tuple[List[Tuple[str, int, int, int]], float]:
+    """(módulo, self_us, cumulative_us, profundidad) de cada import y el tiempo total en segundos"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        print(result.stderr[-2000:], file=sys.stderr)
+        raise SystemExit(f"Importing {module} failed")
+
+    entries = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    total = max((cumulative for name, _, cumulative, depth in entries if depth == 0 and name == module), default=0)
+    return entries, total / 1_000_000
+
+
+def by_package(entries: List[Tuple[str, int, int, int]]) -> Dict[str, int]:
+    """Tiempo propio sumado por paquete de primer nivel"""
+    totals: Dict[str, int] = defaultdict(int)
+    for name, self_us, _, _ in entries:
+        totals[name.split(".")[0]] += self_us
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile backend import/startup cost")
+    parser.add_argument("--module", default="main", help="Module to import (default: main)")
+    parser.add_argument("--top", type=int, default=20, help="Number of rows to show")
+    parser.add_argument("--by-package", action="store_true", help="Aggregate self time by top-level package")
+    args = parser.parse_args()
+
+    entries, total_seconds = run_importtime(args.module)
+    print(f"⏱️ import {args.module}: {total_seconds:.2f}s ({len(entries)} modules)\n")
+
+    if args.by_package:
+        rows = sorted(by_package(entries).items(), key=lambda item: item[1], reverse=True)[:args.top]
+        for package, self_us in rows:
+            print(f"{self_us / 1000:10.1f} ms  {package}")
+        return
+
+    rows = sorted(entries, key=lambda entry: entry[2], reverse=True)[:args.top]
+    for name, self_us, cumulative_us, depth in rows:
+        print(f"{cumulative_us / 1000:10.1f} ms cumulative  {self_us / 1000:8.1f} ms self  {'  ' * min(depth, 6)}{name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Digests de resultados de agentes para el resumen ejecutivo map-reduce
+Map: cada resultado se condensa en un digest corto en cuanto el agente termina (sin LLM si la salida es
+estructurada). Reduce: el resumen ejecutivo trabaja solo sobre los digests, no sobre el JSON completo.
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+DIGEST_MAX_ITEMS = 3
+DIGEST_MAX_TEXT_CHARS = 160
+DIGEST_MAX_METRICS = 8
+
+PRIORITY_ORDER = {"critical": 0, "crítica": 0, "high": 1, "alta": 1, "medium": 2, "media": 2, "low": 3, "baja": 3}
+
+# Campos de la salida en texto libre (sin estructura aprovechable para un digest)
+TEXT_MODE_FIELDS = ("analysis_summary", "raw_analysis")
+
+
+def _short(text: Any, limit: int = DIGEST_MAX_TEXT_CHARS) -> str:
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def _is_scalar(value: Any) -> bool:
+    return isinstance(value, (int, float)) or (isinstance(value, str) and 0 < len(value) <= 60)
+
+
+def _recommendation_line(item: Dict[str, Any]) -> str:
+    priority = item.get("priority")
+    title = _short(item.get("title") or item.get("description", ""), 100)
+    return f"{title} ({priority})" if priority else title
+
+
+def unavailable_digest(agent_name: str, result: Dict[str, Any]) -> Dict[str, Any]:
+    return {"agent": agent_name, "status": "unavailable", "reason": _short(result.get("error", "sin resultado"))}
+
+
+def extract_digest(agent_name: str, result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Digest directo de la salida estructurada; None si la salida es texto libre y hace falta un LLM"""
+    if not isinstance(result, dict) or "error" in result or result.get("status") in ("timeout", "skipped", "error"):
+        return unavailable_digest(agent_name, result if isinstance(result, dict) else {})
+
+    structured = (result.get("analysis") or {}).get("structured_analysis") or {}
+    if not structured or any(field in structured for field in TEXT_MODE_FIELDS):
+        return None
+
+    metrics: Dict[str, Any] = {}
+    recommendations: List[Dict[str, Any]] = []
+    highlights: List[str] = []
+    for field_name, value in structured.items():
+        if field_name == "citations":
+            continue
+        if _is_scalar(value):
+            metrics[field_name] = round(value, 2) if isinstance(value, float) else value
+        elif isinstance(value, dict) and value and all(_is_scalar(v) for v in value.values()):
+            metrics.update({f"{field_name}.{k}": v for k, v in list(value.items())[:DIGEST_MAX_ITEMS]})
+        elif isinstance(value, list) and value and isinstance(value[0], dict):
+            recommendations.extend(item for item in value if isinstance(item, dict))
+        elif isinstance(value, list):
+            highlights.extend(_short(item, 100) for item in value[:DIGEST_MAX_ITEMS] if item)
+
+    recommendations.sort(key=lambda item: PRIORITY_ORDER.get(str(item.get("priority", "")).lower(), 4))
+    response_lines = [line for line in str(result["analysis"].get("response", "")).splitlines() if line.strip()]
+    return {
+        "agent": agent_name,
+        "status": "ok",
+        "headline": _short(response_lines[0]) if response_lines else "",
+        "metrics": dict(list(metrics.items())[:DIGEST_MAX_METRICS]),
+        "top_recommendations": [_recommendation_line(item) for item in recommendations[:DIGEST_MAX_ITEMS]],
+        "highlights": highlights[:DIGEST_MAX_ITEMS]
+    }
+
+
+def digest_prompt(agent_name: str, response_text: str) -> str:
+    """Prompt del paso map cuando la salida del agente es texto libre"""
+    return (
+        f"Condensa el siguiente análisis de {agent_name} en un objeto JSON con las claves "
+        '"headline" (una frase), "metrics" (objeto con hasta 5 cifras clave), '
+        '"top_recommendations" (máximo 3 frases cortas) y "highlights" (máximo 3 riesgos u oportunidades). '
+        "Responde solo con el JSON.\n\n"
+        f"ANÁLISIS:\n{response_text}"
+    )
+
+
+def parse_digest(agent_name: str, text: str, response_text: str = "") -> Dict[str, Any]:
+    """Digest devuelto por el LLM; si no es JSON válido se recorta el texto original"""
+    match = re.search(r"\{.*\}", text or "", re.DOTALL)
+    try:
+        parsed = json.loads(match.group(0)) if match else None
+    except json.JSONDecodeError:
+        parsed = None
+    if not isinstance(parsed, dict):
+        return text_digest(agent_name, response_text or text)
+    return {
+        "agent": agent_name,
+        "status": "ok",
+        "headline": _short(parsed.get("headline", "")),
+        "metrics": dict(list((parsed.get("metrics") or {}).items())[:DIGEST_MAX_METRICS]),
+        "top_recommendations": [_short(item, 100) for item in (parsed.get("top_recommendations") or [])[:DIGEST_MAX_ITEMS]],
+        "highlights": [_short(item, 100) for item in (parsed.get("highlights") or [])[:DIGEST_MAX_ITEMS]]
+    }
+
+
+def text_digest(agent_name: str, response_text: str) -> Dict[str, Any]:
+    """Digest sin LLM de una respuesta en texto: primer tramo del análisis"""
+    return {"agent": agent_name, "status": "ok", "headline": _short(response_text, 300)}
+
+
+def fallback_summary(digests: List[Dict[str, Any]]) -> str:
+    """Resumen ejecutivo determinista a partir de los digests (sin LLM)"""
+    available = [digest for digest in digests if digest.get("status") == "ok"]
+    lines = [f"Resumen ejecutivo: análisis completado por {len(available)} de {len(digests)} agentes especializados."]
+    for digest in available:
+        parts = []
+        if digest.get("headline"):
+            parts.append(digest["headline"])
+        if digest.get("top_recommendations"):
+            parts.append("Prioridad: " + digest["top_recommendations"][0])
+        if digest.get("highlights"):
+            parts.append("Atención: " + digest["highlights"][0])
+        if parts:
+            lines.append(f"- {digest['agent']}: " + " | ".join(parts))
+    missing = [digest["agent"] for digest in digests if digest.get("status") != "ok"]
+    if missing:
+        lines.append("Sin resultado: " + ", ".join(missing))
+    return "\n".join(lines)
@@ -0,0 +1,118 @@
+"""
+Ejecución concurrente de varios agentes
+Cada agente corre en su propia tarea con un timeout propio (acotado por el deadline de la petición)
+y un semáforo limita cuántos llaman al modelo a la vez; un agente lento o fallido no bloquea a los
+demás y su resultado parcial queda marcado. La consulta tarda lo que el agente más lento, no la suma,
+y con iter_agents cada resultado se puede entregar en cuanto está listo.
+"""
+
+import os
+import time
+import asyncio
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from services.deadline import DeadlineExceeded, run_stage, has_time_for, mark_degraded, MIN_SECONDS_FOR_LLM
+
+AGENT_TIMEOUT_SECONDS = float(os.getenv("AI_AGENT_TIMEOUT_SECONDS", "45"))
+AGENT_MAX_CONCURRENCY = int(os.getenv("AI_AGENT_MAX_CONCURRENCY", "5"))
+
+# Estados de un agente dentro de una consulta múltiple
+AGENT_OK = "ok"
+AGENT_TIMEOUT = "timeout"
+AGENT_ERROR = "error"
+AGENT_SKIPPED = "skipped"
+
+AgentCall = Callable[[], Awaitable[Any]]
+
+
+def _reported_error(result: Any) -> Optional[str]:
+    """Causa del fallo si el agente capturó su excepción y la devolvió como resultado"""
+    if isinstance(result, dict) and (result.get("error") or result.get("status") == AGENT_ERROR):
+        return str(result.get("error") or result.get("message") or "Error en el agente")
+    return None
+
+
+@dataclass
+class AgentOutcome:
+    """Resultado de un agente en una ejecución concurrente"""
+    agent_id: str
+    status: str
+    result: Any = None
+    error: Optional[str] = None
+    seconds: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.status == AGENT_OK
+
+    def as_result(self, agent_name: str) -> Dict[str, Any]:
+        """Resultado del agente o un marcador con la causa si no terminó"""
+        if self.ok:
+            return self.result
+        if isinstance(self.result, dict):
+            # El agente respondió con su propio error: se conserva su respuesta y se marca el estado
+            return {**self.result, "status": self.status, "error": self.error}
+        return {"agent": agent_name, "status": self.status, "error": self.error}
+
+
+def _agent_runner(
+    timeout: float,
+    max_concurrency: int,
+    on_complete: Optional[Callable[[AgentOutcome], None]] = None
+) -> Callable[[str, AgentCall], Awaitable[AgentOutcome]]:
+    """Ejecutor de un agente con semáforo compartido, timeout propio y captura de errores"""
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def run_one(agent_id: str, call: AgentCall) -> AgentOutcome:
+        async with semaphore:
+            started = time.monotonic()
+            if not has_time_for(MIN_SECONDS_FOR_LLM):
+                # Mientras esperaba turno se agotó el presupuesto de la petición
+                mark_degraded(f"agent:{agent_id}", "deadline")
+                outcome = AgentOutcome(agent_id, AGENT_SKIPPED, error="Sin tiempo restante para este agente")
+            else:
+                try:
+                    result = await run_stage(f"agent:{agent_id}", call(), timeout, MIN_SECONDS_FOR_LLM)
+                    error = _reported_error(result)
+                    outcome = AgentOutcome(agent_id, AGENT_ERROR if error else AGENT_OK, result=result, error=error)
+                except DeadlineExceeded:
+                    outcome = AgentOutcome(agent_id, AGENT_TIMEOUT, error="El agente no respondió a tiempo")
+                except Exception as e:
+                    outcome = AgentOutcome(agent_id, AGENT_ERROR, error=str(e))
+            outcome.seconds = round(time.monotonic() - started, 3)
+        if on_complete:
+            on_complete(outcome)
+        return outcome
+
+    return run_one
+
+
+async def run_agents(
+    calls: Dict[str, AgentCall],
+    timeout: float = AGENT_TIMEOUT_SECONDS,
+    max_concurrency: int = AGENT_MAX_CONCURRENCY,
+    on_complete: Optional[Callable[[AgentOutcome], None]] = None
+) -> Dict[str, AgentOutcome]:
+    """Ejecuta todos los agentes a la vez (máximo `max_concurrency` simultáneos); conserva el orden de entrada"""
+    run_one = _agent_runner(timeout, max_concurrency, on_complete)
+    outcomes = await asyncio.gather(*(run_one(agent_id, call) for agent_id, call in calls.items()))
+    return {outcome.agent_id: outcome for outcome in outcomes}
+
+
+async def iter_agents(
+    calls: Dict[str, AgentCall],
+    timeout: float = AGENT_TIMEOUT_SECONDS,
+    max_concurrency: int = AGENT_MAX_CONCURRENCY
+) -> AsyncIterator[AgentOutcome]:
+    """Igual que run_agents pero entrega cada agente en cuanto termina (orden de finalización)"""
+    run_one = _agent_runner(timeout, max_concurrency)
+    tasks = [asyncio.ensure_future(run_one(agent_id, call)) for agent_id, call in calls.items()]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # El consumidor se fue (p. ej. el cliente cerró el stream): no seguir gastando tokens
+        for task in tasks:
+            if not task.done():
+                task.cancel()
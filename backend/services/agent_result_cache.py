@@ -0,0 +1,255 @@
+"""
+Caché de resultados de agentes por usuario
+La clave combina agente, pregunta y huella de los datos financieros enviados, más un contador de
+versión de datos por usuario: al cambiar sus datos se incrementa la versión y las entradas anteriores
+dejan de encontrarse. Soporta stale-while-revalidate: pasada la ventana fresca se devuelve el resultado
+anterior al instante y se recalcula en segundo plano. La última entrada de cada agente guarda también
+los datos con que se calculó, para que el prefetch pueda repetir ese análisis antes de que se pida.
+"""
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from services.redis_service import redis_service
+from services.usage_accounting import usage_accounting
+from services.deadline import deadline_scope, JOB_DEADLINE_SECONDS
+
+# Campos del payload que no cambian el análisis (identidad, modo de transporte)
+VOLATILE_FIELDS = ("user_id", "request_id", "timestamp")
+
+AgentCompute = Callable[[], Awaitable[Dict[str, Any]]]
+
+
+class AgentResultCache:
+    """Resultados de agentes en Redis (o memoria) con invalidación por versión de datos del usuario"""
+
+    def __init__(self):
+        self.enabled = os.getenv("AI_AGENT_CACHE_ENABLED", "true").lower() == "true"
+        # Edad hasta la que el resultado se sirve sin recalcular
+        self.fresh_seconds = int(os.getenv("AI_AGENT_CACHE_FRESH_SECONDS", str(15 * 60)))
+        # Vida total de la entrada; entre fresh y stale se sirve y se revalida en segundo plano
+        self.stale_seconds = int(os.getenv("AI_AGENT_CACHE_STALE_SECONDS", str(24 * 60 * 60)))
+        self.version_ttl = int(os.getenv("AI_AGENT_CACHE_VERSION_TTL_SECONDS", str(90 * 24 * 60 * 60)))
+
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "refresh_errors": 0, "prefetches": 0}
+        self._refreshing: Set[str] = set()
+        # Referencias a las revalidaciones en curso: el event loop solo guarda referencias débiles
+        self._refresh_tasks: Set[asyncio.Task] = set()
+
+        # Respaldo en memoria si Redis no está disponible (solo válido con un worker)
+        self._local: Dict[str, Tuple[float, str]] = {}
+        self._local_versions: Dict[str, int] = {}
+
+    # Versión de datos por usuario
+    def _version_key(self, user_id: str) -> str:
+        return f"agent_cache:version:{user_id}"
+
+    async def data_version(self, user_id: str) -> int:
+        try:
+            if redis_service.redis_client:
+                return int(await redis_service.redis_client.get(self._version_key(user_id)) or 0)
+        except Exception as e:
+            print(f"Error reading data version: {e}")
+        return self._local_versions.get(user_id, 0)
+
+    async def bump_data_version(self, user_id: str) -> int:
+        """Los datos del usuario cambiaron: todas sus entradas anteriores quedan invalidadas"""
+        key = self._version_key(user_id)
+        try:
+            if redis_service.redis_client:
+                pipe = redis_service.redis_client.pipeline(transaction=False)
+                pipe.incr(key)
+                pipe.expire(key, self.version_ttl)
+                return int((await pipe.execute())[0])
+        except Exception as e:
+            print(f"Error bumping data version: {e}")
+        self._local_versions[user_id] = self._local_versions.get(user_id, 0) + 1
+        return self._local_versions[user_id]
+
+    # Claves
+    @staticmethod
+    def fingerprint(data: Dict[str, Any]) -> str:
+        """Huella estable de los datos enviados (orden de claves irrelevante)"""
+        relevant = {key: value for key, value in data.items() if key not in VOLATILE_FIELDS}
+        canonical = json.dumps(relevant, sort_keys=True, default=str, ensure_ascii=False)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:32]
+
+    def _entry_key(self, namespace: str, user_id: str, agent_id: str, data: Dict[str, Any], version: int) -> str:
+        question = str(data.get("question", "")).strip().lower()
+        question_hash = hashlib.sha256(question.encode("utf-8")).hexdigest()[:16]
+        return f"agent_cache:{namespace}:{user_id}:{agent_id}:v{version}:{question_hash}:{self.fingerprint(data)}"
+
+    def _latest_key(self, namespace: str, user_id: str, agent_id: str) -> str:
+        return f"agent_cache:{namespace}:latest:{user_id}:{agent_id}"
+
+    # Almacenamiento
+    async def _read(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            if redis_service.redis_client:
+                raw = await redis_service.redis_client.get(key)
+                return json.loads(raw) if raw else None
+        except Exception as e:
+            print(f"Error reading agent cache: {e}")
+        local = self._local.get(key)
+        if not local or local[0] < time.monotonic():
+            self._local.pop(key, None)
+            return None
+        return json.loads(local[1])
+
+    async def _write(self, entry_key: str, latest_key: str, entry: Dict[str, Any]):
+        raw = json.dumps(entry, default=str, ensure_ascii=False)
+        try:
+            if redis_service.redis_client:
+                pipe = redis_service.redis_client.pipeline(transaction=False)
+                pipe.setex(entry_key, self.stale_seconds, raw)
+                pipe.setex(latest_key, self.stale_seconds, raw)
+                await pipe.execute()
+                return
+        except Exception as e:
+            print(f"Error writing agent cache: {e}")
+        expires_at = time.monotonic() + self.stale_seconds
+        self._prune_local()
+        self._local[entry_key] = (expires_at, raw)
+        self._local[latest_key] = (expires_at, raw)
+
+    def _prune_local(self):
+        now = time.monotonic()
+        for key in [key for key, (expires_at, _) in self._local.items() if expires_at < now]:
+            del self._local[key]
+
+    # API principal
+    async def get_or_compute(
+        self,
+        namespace: str,
+        user_id: str,
+        agent_id: str,
+        data: Dict[str, Any],
+        compute: AgentCompute,
+        refresh: bool = False
+    ) -> Dict[str, Any]:
+        """Resultado en caché (fresco o stale con revalidación) o recién calculado"""
+        if not self.enabled:
+            return await compute()
+
+        version = await self.data_version(user_id)
+        entry_key = self._entry_key(namespace, user_id, agent_id, data, version)
+        latest_key = self._latest_key(namespace, user_id, agent_id)
+
+        entry = None if refresh else await self._read(entry_key)
+        if entry:
+            age = time.time() - entry["cached_at"]
+            usage_accounting.record_cache_hit(f"agent:{agent_id}")
+            if age < self.fresh_seconds:
+                self.stats["hits"] += 1
+                return self._annotate(entry, "hit", age)
+            self.stats["stale_hits"] += 1
+            self._schedule_refresh(entry_key, latest_key, version, data, compute)
+            return self._annotate(entry, "stale", age)
+
+        self.stats["misses"] += 1
+        result = await compute()
+        if self._cacheable(result):
+            await self._write(entry_key, latest_key, self._entry(result, version, data))
+        return self._annotate({"result": result, "version": version}, "miss", 0.0)
+
+    async def needs_warming(self, namespace: str, user_id: str, agent_id: str, data: Dict[str, Any]) -> bool:
+        """True si no hay entrada o le queda menos de la mitad de su ventana fresca"""
+        if not self.enabled:
+            return False
+        version = await self.data_version(user_id)
+        entry = await self._read(self._entry_key(namespace, user_id, agent_id, data, version))
+        return not entry or time.time() - entry["cached_at"] > self.fresh_seconds / 2
+
+    async def warm(self, namespace: str, user_id: str, agent_id: str, data: Dict[str, Any], compute: AgentCompute) -> bool:
+        """Calcula y guarda el análisis por adelantado (prefetch); no cuenta como consulta"""
+        version = await self.data_version(user_id)
+        result = await compute()
+        self.stats["prefetches"] += 1
+        if not self._cacheable(result):
+            return False
+        await self._write(
+            self._entry_key(namespace, user_id, agent_id, data, version),
+            self._latest_key(namespace, user_id, agent_id),
+            self._entry(result, version, data)
+        )
+        return True
+
+    async def latest(self, namespace: str, user_id: str, agent_id: str) -> Optional[Dict[str, Any]]:
+        """Último análisis del usuario con este agente, si sus datos no cambiaron desde entonces"""
+        entry = await self._read(self._latest_key(namespace, user_id, agent_id))
+        if not entry or entry["version"] != await self.data_version(user_id):
+            return None
+        return self._annotate(entry, "hit", time.time() - entry["cached_at"])
+
+    async def last_input(self, namespace: str, user_id: str, agent_id: str) -> Optional[Dict[str, Any]]:
+        """Datos del último análisis del usuario con este agente (aunque su versión ya no sea la actual)"""
+        entry = await self._read(self._latest_key(namespace, user_id, agent_id))
+        return entry.get("data") if entry else None
+
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["stale_hits"] + self.stats["misses"]
+        return {
+            "enabled": self.enabled,
+            "fresh_seconds": self.fresh_seconds,
+            "stale_seconds": self.stale_seconds,
+            **self.stats,
+            "hit_rate": round((self.stats["hits"] + self.stats["stale_hits"]) / lookups, 3) if lookups else 0.0
+        }
+
+    # Internos
+    @staticmethod
+    def _cacheable(result: Dict[str, Any]) -> bool:
+        return isinstance(result, dict) and "error" not in result and result.get("status") != "error"
+
+    @staticmethod
+    def _entry(result: Dict[str, Any], version: int, data: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "result": result,
+            "version": version,
+            "cached_at": time.time(),
+            "data": {key: value for key, value in data.items() if key not in VOLATILE_FIELDS}
+        }
+
+    @staticmethod
+    def _annotate(entry: Dict[str, Any], status: str, age: float) -> Dict[str, Any]:
+        return {
+            **entry["result"],
+            "cache": {"status": status, "age_seconds": round(age, 1), "data_version": entry["version"]}
+        }
+
+    def _schedule_refresh(
+        self, entry_key: str, latest_key: str, version: int, data: Dict[str, Any], compute: AgentCompute
+    ):
+        if entry_key in self._refreshing:
+            return
+        try:
+            task = asyncio.get_running_loop().create_task(self._refresh(entry_key, latest_key, version, data, compute))
+            self._refresh_tasks.add(task)
+            task.add_done_callback(self._refresh_tasks.discard)
+            self._refreshing.add(entry_key)
+        except RuntimeError:
+            pass  # Sin event loop: se recalculará en la siguiente consulta
+
+    async def _refresh(
+        self, entry_key: str, latest_key: str, version: int, data: Dict[str, Any], compute: AgentCompute
+    ):
+        """Revalidación en segundo plano: no hereda el deadline de la petición que la disparó"""
+        try:
+            with deadline_scope(JOB_DEADLINE_SECONDS, detached=True):
+                result = await compute()
+            self.stats["refreshes"] += 1
+            if self._cacheable(result):
+                await self._write(entry_key, latest_key, self._entry(result, version, data))
+        except Exception as e:
+            self.stats["refresh_errors"] += 1
+            print(f"⚠️ Revalidación de caché de agente falló: {e}")
+        finally:
+            self._refreshing.discard(entry_key)
+
+
+# Instancia global
+agent_result_cache = AgentResultCache()
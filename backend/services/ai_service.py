@@ -1,13 +1,14 @@
 import openai
 import os
-from typing import List, Dict, Any, Optional
-from langchain_openai import ChatOpenAI
-from langchain.schema import HumanMessage, AIMessage, SystemMessage
-from langchain.memory import ConversationBufferWindowMemory
-from langchain.chains import ConversationChain
+from typing import TYPE_CHECKING, List, Dict, Any, Optional
 from services.redis_service import redis_service
 from services.dual_ai_service import dual_ai_service, TaskComplexity
-import json
+from services.prompt_builder import compact_json, output_budget
+from services.conversation_memory import conversation_memory
+from services.usage_accounting import usage_scope
+
+if TYPE_CHECKING:
+    from langchain.memory import ConversationBufferWindowMemory
 
 class AIService:
     def __init__(self):
@@ -17,16 +18,10 @@ class AIService:
         # Obtener estado de servicios de IA
         self.ai_status = dual_ai_service.get_service_status()
         
-        # Configurar cliente OpenAI si está disponible
-        self.llm = None
+        # Configurar cliente OpenAI si está disponible (el cliente LangChain se crea en su primer uso)
+        self._llm = None
         if self.ai_status['openai_available']:
             openai.api_key = self.openai_api_key
-            self.llm = ChatOpenAI(
-                openai_api_key=self.openai_api_key,
-                model_name="gpt-4o-mini",  # Actualizado a gpt-4o-mini
-                temperature=0.7,
-                max_tokens=1000
-            )
             print("✅ OpenAI GPT-4o-mini configurado para tareas simples")
         
         if self.ai_status['deepseek_available']:
@@ -48,57 +43,48 @@ class AIService:
         Siempre proporciona respuestas prácticas, claras y con ejemplos concretos.
         Si el usuario pregunta sobre algo fuera del ámbito financiero, redirige la conversación hacia temas financieros empresariales."""
     
-    def get_user_memory(self, user_id: str) -> ConversationBufferWindowMemory:
-        """Get or create conversation memory for user"""
-        memory_key = f"ai:memory:{user_id}"
-        
-        # Try to load existing memory
-        memory_data = redis_service.redis_client.get(memory_key)
-        
-        if memory_data:
-            # Restore memory from Redis
-            messages = json.loads(memory_data)
-            memory = ConversationBufferWindowMemory(
-                k=10,  # Keep last 10 exchanges
-                return_messages=True
-            )
-            
-            # Restore messages
-            for msg in messages:
-                if msg["type"] == "human":
-                    memory.chat_memory.add_user_message(msg["content"])
-                elif msg["type"] == "ai":
-                    memory.chat_memory.add_ai_message(msg["content"])
-        else:
-            # Create new memory
-            memory = ConversationBufferWindowMemory(
-                k=10,
-                return_messages=True
+    @property
+    def llm(self):
+        """Cliente LangChain de GPT-4o-mini; LangChain se importa aquí y no al arrancar la aplicación"""
+        if self._llm is None and self.ai_status['openai_available']:
+            from langchain_openai import ChatOpenAI
+            self._llm = ChatOpenAI(
+                openai_api_key=self.openai_api_key,
+                openai_api_base=dual_ai_service.openai_base_url,
+                model_name="gpt-4o-mini",  # Actualizado a gpt-4o-mini
+                temperature=0.7,
+                max_tokens=output_budget("financial_chat")
             )
-        
-        return memory
+        return self._llm
     
-    def save_user_memory(self, user_id: str, memory: ConversationBufferWindowMemory):
-        """Save conversation memory to Redis"""
-        memory_key = f"ai:memory:{user_id}"
-        
-        # Convert messages to serializable format
-        messages = []
-        for message in memory.chat_memory.messages:
-            if isinstance(message, HumanMessage):
-                messages.append({"type": "human", "content": message.content})
-            elif isinstance(message, AIMessage):
-                messages.append({"type": "ai", "content": message.content})
+    async def get_user_memory(self, user_id: str) -> "ConversationBufferWindowMemory":
+        """Build a LangChain memory from the user's bounded conversation window"""
+        from langchain.memory import ConversationBufferWindowMemory
+        from langchain.schema import SystemMessage
         
-        # Save to Redis with 7 days expiration
-        redis_service.redis_client.setex(
-            memory_key,
-            7 * 24 * 60 * 60,  # 7 days
-            json.dumps(messages)
+        window = await conversation_memory.get_window(user_id)
+        memory = ConversationBufferWindowMemory(
+            k=conversation_memory.window_turns,
+            return_messages=True
         )
+        if window["summary"]:
+            memory.chat_memory.add_message(SystemMessage(content=f"Resumen previo: {window['summary']}"))
+        for msg in window["messages"]:
+            if msg["type"] == "human":
+                memory.chat_memory.add_user_message(msg["content"])
+            elif msg["type"] == "ai":
+                memory.chat_memory.add_ai_message(msg["content"])
+        return memory
     
-    async def chat_with_user(self, user_id: str, message: str, context: Optional[Dict[str, Any]] = None) -> str:
-        """Chat with user using dual AI strategy"""
+    async def chat_with_user(
+        self,
+        user_id: str,
+        message: str,
+        context: Optional[Dict[str, Any]] = None,
+        priority: str = "interactive",
+        use_memory: bool = False
+    ) -> str:
+        """Chat with user using dual AI strategy (use_memory: include and extend the user's conversation window)"""
         try:
             # Determinar si es una pregunta simple o compleja
             task_type = "financial_chat"
@@ -110,18 +96,27 @@ class AIService:
                 # Preparar prompt con contexto
                 context_info = ""
                 if context:
-                    context_info = f"\nContexto: {json.dumps(context, indent=2, ensure_ascii=False)}\n"
+                    context_info = f"\nContexto: {compact_json(context)}\n"
+                
+                # Historial reciente acotado (lectura de tamaño constante)
+                history_info = ""
+                if use_memory:
+                    history = conversation_memory.format_for_prompt(await conversation_memory.get_window(user_id))
+                    history_info = f"\nConversación previa:\n{history}\n" if history else ""
                 
-                full_prompt = f"{self.system_prompt}\n{context_info}\nUsuario: {message}"
+                full_prompt = f"{self.system_prompt}\n{context_info}{history_info}\nUsuario: {message}"
                 
-                # Usar servicio dual de IA
-                ai_response = await dual_ai_service.generate_response(
-                    prompt=full_prompt,
-                    task_type=task_type,
-                    context=context
-                )
+                # Usar servicio dual de IA (el contexto ya va en el prompt, no se envía dos veces)
+                with usage_scope(user=user_id):
+                    ai_response = await dual_ai_service.generate_response(
+                        prompt=full_prompt,
+                        task_type=task_type,
+                        priority=priority
+                    )
                 
                 response = ai_response.content
+                if use_memory and ai_response.provider != "mock":
+                    await conversation_memory.append_turn(user_id, message, response)
                 
                 # Añadir info del modelo usado para transparencia
                 if ai_response.provider != "mock":
@@ -130,23 +125,27 @@ class AIService:
             else:
                 # Fallback a LangChain si solo tenemos OpenAI
                 if self.llm:
-                    memory = self.get_user_memory(user_id)
+                    from langchain.chains import ConversationChain
+                    from langchain.memory import ConversationBufferWindowMemory
+                    
+                    memory = await self.get_user_memory(user_id) if use_memory else ConversationBufferWindowMemory(k=1)
                     conversation = ConversationChain(llm=self.llm, memory=memory, verbose=False)
                     
                     context_info = ""
                     if context:
-                        context_info = f"\nContexto adicional: {json.dumps(context, indent=2)}\n"
+                        context_info = f"\nContexto adicional: {compact_json(context)}\n"
                     
                     full_prompt = f"{self.system_prompt}\n{context_info}\nUsuario: {message}"
                     response = conversation.predict(input=full_prompt)
                     
-                    self.save_user_memory(user_id, memory)
+                    if use_memory:
+                        await conversation_memory.append_turn(user_id, message, response)
                 else:
                     response = "No hay servicios de IA configurados. Configura OPENAI_API_KEY o DEEPSEEK_API_KEY."
             
             # Track usage
             from services.redis_service import redis_service
-            redis_service.increment_global_stat("ai_conversations")
+            await redis_service.increment_global_stat("ai_conversations")
             
             return response
             
@@ -154,8 +153,14 @@ class AIService:
             print(f"Error in AI chat: {e}")
             return "Lo siento, hubo un error procesando tu consulta. Por favor intenta de nuevo."
     
-    async def analyze_financial_data(self, user_id: str, data_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
-        """Analyze financial data using appropriate AI model"""
+    async def analyze_financial_data(
+        self,
+        user_id: str,
+        data_type: str,
+        data: Dict[str, Any],
+        priority: str = "interactive"
+    ) -> Dict[str, Any]:
+        """Analyze financial data using appropriate AI model (priority: interactive, background, batch)"""
         try:
             # Determinar complejidad del análisis
             complex_analysis_types = ["unit_economics", "cash_flow", "business_health", "growth_strategy"]
@@ -165,7 +170,7 @@ class AIService:
             if data_type == "cash_flow":
                 prompt = f"""ANALIZA PROFUNDAMENTE este flujo de caja empresarial:
                 
-                DATOS: {json.dumps(data, indent=2, ensure_ascii=False)}
+                DATOS: {compact_json(data)}
                 
                 REQUERIMIENTOS:
                 1. Análisis de tendencias y patrones estacionales
@@ -180,7 +185,7 @@ class AIService:
             elif data_type == "unit_economics":
                 prompt = f"""OPTIMIZA las unit economics de este negocio:
                 
-                DATOS: {json.dumps(data, indent=2, ensure_ascii=False)}
+                DATOS: {compact_json(data)}
                 
                 ANALIZA:
                 1. Rentabilidad por unidad y margen de contribución
@@ -195,7 +200,7 @@ class AIService:
             elif data_type == "pricing":
                 prompt = f"""DESARROLLA estrategia de pricing óptima:
                 
-                DATOS: {json.dumps(data, indent=2, ensure_ascii=False)}
+                DATOS: {compact_json(data)}
                 
                 ESTRATEGIA:
                 1. Evaluación integral de estructura actual
@@ -211,20 +216,29 @@ class AIService:
                 prompt = f"""Analiza estos datos financieros:
                 
                 Tipo: {data_type}
-                Datos: {json.dumps(data, indent=2, ensure_ascii=False)}
+                Datos: {compact_json(data)}
                 
                 Proporciona insights y recomendaciones relevantes.
                 """
                 task_type = "general_financial_analysis"
             
+            # Los análisis complejos van directo a DeepSeek salvo que su tipo esté en cascada
+            force_deepseek = (
+                is_complex
+                and self.ai_status['deepseek_available']
+                and not dual_ai_service.cascade.applies(task_type)
+            )
+            
             # Usar servicio dual de IA
             if self.ai_status['openai_available'] or self.ai_status['deepseek_available']:
-                ai_response = await dual_ai_service.generate_response(
-                    prompt=prompt,
-                    task_type=task_type,
-                    context={"user_id": user_id, "analysis_type": data_type},
-                    force_provider="deepseek" if is_complex and self.ai_status['deepseek_available'] else None
-                )
+                with usage_scope(user=user_id):
+                    ai_response = await dual_ai_service.generate_response(
+                        prompt=prompt,
+                        task_type=task_type,
+                        context={"user_id": user_id, "analysis_type": data_type},
+                        force_provider="deepseek" if force_deepseek else None,
+                        priority=priority
+                    )
                 
                 analysis_result = ai_response.content
                 model_info = {
@@ -235,12 +249,12 @@ class AIService:
                 }
             else:
                 # Fallback
-                analysis_result = await self.chat_with_user(user_id, prompt)
+                analysis_result = await self.chat_with_user(user_id, prompt, priority=priority)
                 model_info = {"model_used": "fallback", "provider": "langchain"}
             
             # Track usage
             from services.redis_service import redis_service
-            redis_service.increment_global_stat("ai_analysis")
+            await redis_service.increment_global_stat("ai_analysis")
             
             return {
                 "analysis": analysis_result,
@@ -0,0 +1,177 @@
+"""
+Prefetch predictivo de análisis de agentes
+Al abrir un módulo (inicio de sesión de aprendizaje) o avanzar en él se predice qué análisis pedirá
+el usuario y se calcula en segundo plano, con la prioridad más baja, dentro de la caché de resultados.
+Se repite el último análisis del usuario con ese agente (mismos datos y pregunta), así que al pulsar
+"analizar" con los datos sin cambios la respuesta ya está fresca. Cada usuario tiene un tope por hora.
+"""
+
+import os
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from services.redis_service import redis_service
+from services.agent_result_cache import agent_result_cache
+from services.deadline import deadline_scope, JOB_DEADLINE_SECONDS
+
+# (agent_id, user_id, data) -> True si se calculó y guardó el análisis
+PrefetchRunner = Callable[[str, str, Dict[str, Any]], Awaitable[bool]]
+
+# Módulo de la app -> agente cuyo análisis se pide desde él
+MODULE_AGENTS: Dict[str, str] = {
+    "cash-flow": "maya",
+    "unit-economics": "carlos",
+    "costs-pricing": "carlos",
+    "profitability": "diana",
+    "performance": "diana",
+    "planning": "sofia",
+    "growth": "sofia",
+    "risk": "alex",
+}
+
+# Orden del recorrido de módulos: al completar uno, el siguiente análisis probable es el del próximo
+MODULE_SEQUENCE: List[str] = ["cash-flow", "unit-economics", "costs-pricing", "profitability", "planning"]
+
+
+def normalize_module(module_id: str) -> Optional[str]:
+    """Módulo conocido al que pertenece un id ('cash_flow', 'cash-flow-basics' -> 'cash-flow')"""
+    module = str(module_id).strip().lower().replace("_", "-").replace(" ", "-")
+    for known in sorted(MODULE_AGENTS, key=len, reverse=True):
+        if module == known or module.startswith(f"{known}-"):
+            return known
+    return None
+
+
+class AnalysisPrefetcher:
+    """Predicción del siguiente análisis y ejecución en segundo plano con topes por usuario"""
+
+    def __init__(self):
+        self.enabled = os.getenv("AI_PREFETCH_ENABLED", "true").lower() == "true"
+        self.max_per_user_per_hour = int(os.getenv("AI_PREFETCH_MAX_PER_USER_PER_HOUR", "6"))
+        self.max_in_flight = int(os.getenv("AI_PREFETCH_MAX_IN_FLIGHT", "3"))
+        # Avance (%) del módulo a partir del cual un evento de progreso dispara su análisis
+        self.progress_threshold = float(os.getenv("AI_PREFETCH_PROGRESS_THRESHOLD", "50"))
+
+        self._runners: Dict[str, PrefetchRunner] = {}
+        self._in_flight: Set[str] = set()
+        # Referencias a los análisis en curso: el event loop solo guarda referencias débiles
+        self._tasks: Set[asyncio.Task] = set()
+        self.stats = {
+            "scheduled": 0, "completed": 0, "errors": 0, "already_fresh": 0,
+            "no_previous_input": 0, "rate_limited": 0, "dropped": 0
+        }
+
+        # Respaldo en memoria de los contadores por usuario si Redis no está disponible
+        self._local_quota: Dict[str, Tuple[int, int]] = {}
+
+    def register(self, namespace: str, runner: PrefetchRunner):
+        """Registra quién ejecuta los análisis de un namespace de la caché (p. ej. 'langchain')"""
+        self._runners[namespace] = runner
+
+    # Predicción
+    def predict(self, module_id: str, progress_percentage: Optional[float] = None) -> List[str]:
+        """Agentes cuyo análisis es probable tras este evento (None = inicio de sesión)"""
+        module = normalize_module(module_id)
+        if module is None:
+            return []
+        if progress_percentage is not None and progress_percentage >= 100:
+            if module not in MODULE_SEQUENCE:
+                return []
+            position = MODULE_SEQUENCE.index(module)
+            if position + 1 >= len(MODULE_SEQUENCE):
+                return []
+            return [MODULE_AGENTS[MODULE_SEQUENCE[position + 1]]]
+        if progress_percentage is not None and progress_percentage < self.progress_threshold:
+            return []
+        return [MODULE_AGENTS[module]]
+
+    # Eventos
+    async def on_session_start(self, user_id: str, module_id: str) -> List[str]:
+        return await self._schedule(user_id, self.predict(module_id))
+
+    async def on_progress(self, user_id: str, module_id: str, progress_percentage: float) -> List[str]:
+        return await self._schedule(user_id, self.predict(module_id, progress_percentage))
+
+    # Ejecución
+    async def _schedule(self, user_id: str, agent_ids: List[str]) -> List[str]:
+        """Lanza en segundo plano los análisis que no estén ya frescos; devuelve los programados"""
+        if not self.enabled or not agent_ids:
+            return []
+        scheduled = []
+        for namespace, runner in self._runners.items():
+            for agent_id in agent_ids:
+                key = f"{namespace}:{user_id}:{agent_id}"
+                data = await agent_result_cache.last_input(namespace, user_id, agent_id)
+                if data is None:
+                    # Sin un análisis previo no sabemos qué datos ni pregunta usará
+                    self.stats["no_previous_input"] += 1
+                    continue
+                if key in self._in_flight:
+                    continue
+                if not await agent_result_cache.needs_warming(namespace, user_id, agent_id, data):
+                    self.stats["already_fresh"] += 1
+                    continue
+                if len(self._in_flight) >= self.max_in_flight:
+                    self.stats["dropped"] += 1
+                    continue
+                if not await self._take_quota(user_id):
+                    self.stats["rate_limited"] += 1
+                    return scheduled
+                try:
+                    task = asyncio.get_running_loop().create_task(self._run(key, runner, agent_id, user_id, data))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+                except RuntimeError:
+                    continue  # Sin event loop no hay segundo plano
+                self._in_flight.add(key)
+                self.stats["scheduled"] += 1
+                scheduled.append(agent_id)
+        return scheduled
+
+    async def _run(self, key: str, runner: PrefetchRunner, agent_id: str, user_id: str, data: Dict[str, Any]):
+        """Análisis especulativo: no hereda el deadline de la petición que lo disparó"""
+        try:
+            with deadline_scope(JOB_DEADLINE_SECONDS, detached=True):
+                stored = await runner(agent_id, user_id, data)
+            self.stats["completed" if stored else "errors"] += 1
+            print(f"🔮 Prefetch {key}: {'listo' if stored else 'sin resultado cacheable'}")
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"⚠️ Prefetch {key} falló: {e}")
+        finally:
+            self._in_flight.discard(key)
+
+    # Tope por usuario (ventana de una hora)
+    async def _take_quota(self, user_id: str) -> bool:
+        if self.max_per_user_per_hour <= 0:
+            return False
+        window = int(time.time() // 3600)
+        key = f"prefetch:quota:{user_id}:{window}"
+        try:
+            if redis_service.redis_client:
+                pipe = redis_service.redis_client.pipeline(transaction=False)
+                pipe.incr(key)
+                pipe.expire(key, 3600)
+                return int((await pipe.execute())[0]) <= self.max_per_user_per_hour
+        except Exception as e:
+            print(f"Error reading prefetch quota: {e}")
+        if len(self._local_quota) > 10000:
+            self._local_quota = {user: quota for user, quota in self._local_quota.items() if quota[0] == window}
+        current_window, used = self._local_quota.get(user_id, (window, 0))
+        if current_window != window:
+            used = 0
+        self._local_quota[user_id] = (window, used + 1)
+        return used + 1 <= self.max_per_user_per_hour
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "max_per_user_per_hour": self.max_per_user_per_hour,
+            "in_flight": len(self._in_flight),
+            **self.stats
+        }
+
+
+# Instancia global
+analysis_prefetcher = AnalysisPrefetcher()
@@ -0,0 +1,62 @@
+"""
+Caché local (en proceso) con TTL para la ruta caliente de autenticación
+Guarda tokens ya verificados y access keys ya validadas: una petición autenticada se resuelve con una
+búsqueda en un diccionario, sin Redis ni verificación criptográfica. Acotada en entradas (LRU)
+y en tiempo; las revocaciones llegan a todos los procesos por pub/sub de Redis (ver AuthService)
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Generic, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+
+class LocalTTLCache(Generic[V]):
+    """Diccionario LRU con vencimiento por entrada"""
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, V]]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def get(self, key: str) -> Optional[V]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return entry[1]
+
+    def set(self, key: str, value: V, ttl_seconds: Optional[float] = None):
+        """Guarda el valor; `ttl_seconds` solo puede acortar el TTL por defecto (p. ej. expiración del JWT)"""
+        ttl = self.ttl_seconds if ttl_seconds is None else min(ttl_seconds, self.ttl_seconds)
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def invalidate(self, key: str) -> bool:
+        removed = self._entries.pop(key, None) is not None
+        if removed:
+            self.stats["invalidations"] += 1
+        return removed
+
+    def clear(self):
+        self._entries.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            "entries": len(self._entries),
+            "ttl_seconds": self.ttl_seconds,
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0
+        }
@@ -1,3 +1,5 @@
+import time
+import asyncio
 import secrets
 import hashlib
 import pyotp
@@ -9,8 +11,15 @@ from jose import JWTError, jwt
 from fastapi import HTTPException, status
 from models.auth import AccessKey, AccessKeyCreate, User, UserRole, AccessKeyScope
 from services.redis_service import redis_service
+from services.auth_cache import LocalTTLCache
 import os
 
+# Hash access key id -> sha256 of the key, so a key is found by id without scanning access_key:*
+ACCESS_KEY_INDEX = "access_key_index"
+
+# Pub/sub channel where revocations are announced so every process drops its cached copy
+AUTH_INVALIDATION_CHANNEL = "auth:invalidate"
+
 def serialize_datetime_dict(data: Dict[str, Any]) -> Dict[str, Any]:
     """Convert datetime objects to ISO format strings in a dictionary"""
     serialized = {}
@@ -32,8 +41,134 @@ class AuthService:
         self.admin_username = os.getenv("ADMIN_USERNAME", "admin")
         self.admin_password_hash = self.pwd_context.hash(os.getenv("ADMIN_PASSWORD", "admin123"))
         self.admin_totp_secret = os.getenv("ADMIN_TOTP_SECRET", pyotp.random_base32())
+        
+        # In-process caches for the authenticated hot path
+        cache_ttl = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+        cache_max_entries = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+        self._token_cache: LocalTTLCache[Dict[str, Any]] = LocalTTLCache(cache_ttl, cache_max_entries)
+        # Cached key plus the uses its stored JSON records (usage counted before the uses_count field existed)
+        self._key_cache: LocalTTLCache[Tuple[AccessKey, int]] = LocalTTLCache(cache_ttl, cache_max_entries)
+        
+        # Usage of keys without max_uses is counted locally and flushed to Redis in batches;
+        # keys with max_uses are counted in Redis on every use so the limit holds across workers
+        self.usage_flush_seconds = float(os.getenv("AUTH_USAGE_FLUSH_SECONDS", "5"))
+        self._pending_uses: Dict[str, int] = {}
+        self._pending_last_used: Dict[str, str] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._listener_task: Optional[asyncio.Task] = None
+    
+    # Background tasks
+    async def start(self):
+        """Subscribe to revocations from other processes (application startup)"""
+        if self._listener_task is None and redis_service.redis_client:
+            self._listener_task = asyncio.create_task(self._listen_invalidations())
+    
+    async def stop(self):
+        """Stop background tasks and write pending usage (application shutdown)"""
+        for task in (self._listener_task, self._flush_task):
+            if task:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._listener_task = self._flush_task = None
+        await self.flush_usage()
+    
+    async def _listen_invalidations(self):
+        while True:
+            pubsub = None
+            try:
+                pubsub = redis_service.require_client().pubsub()
+                await pubsub.subscribe(AUTH_INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self._key_cache.invalidate(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Auth invalidation listener disconnected: {e}")
+                # Revocations may have been missed while disconnected
+                self._key_cache.clear()
+                await asyncio.sleep(5)
+            finally:
+                if pubsub is not None:
+                    await asyncio.gather(pubsub.reset(), return_exceptions=True)
+    
+    async def _flush_periodically(self):
+        try:
+            while self._pending_uses:
+                await asyncio.sleep(self.usage_flush_seconds)
+                await self.flush_usage()
+        finally:
+            self._flush_task = None
+    
+    async def flush_usage(self) -> int:
+        """Write the locally counted access key uses in one round trip; returns the keys written"""
+        if not self._pending_uses or not redis_service.redis_client:
+            return 0
+        pending, self._pending_uses = self._pending_uses, {}
+        last_used, self._pending_last_used = self._pending_last_used, {}
+        try:
+            pipe = redis_service.batch(transaction=True)
+            for key_hash, uses in pending.items():
+                # EXISTS runs in the same MULTI block: tells whether the increment recreated an expired key
+                pipe.exists(f"access_key:{key_hash}")
+                pipe.hincrby(f"access_key:{key_hash}", "uses_count", uses)
+                pipe.hset(f"access_key:{key_hash}", "last_used", last_used[key_hash])
+            results = await pipe.execute()
+            orphans = [f"access_key:{key_hash}" for key_hash, exists in zip(pending, results[::3]) if not exists]
+            if orphans:
+                await redis_service.require_client().delete(*orphans)
+            return len(pending) - len(orphans)
+        except Exception as e:
+            print(f"Error flushing access key usage: {e}")
+            # Keep the counts for the next flush
+            for key_hash, uses in pending.items():
+                self._pending_uses[key_hash] = self._pending_uses.get(key_hash, 0) + uses
+                self._pending_last_used.setdefault(key_hash, last_used[key_hash])
+            return 0
+    
+    def _record_use(self, key_hash: str, used_at: datetime):
+        self._pending_uses[key_hash] = self._pending_uses.get(key_hash, 0) + 1
+        self._pending_last_used[key_hash] = used_at.isoformat()
+        if self._flush_task is None:
+            try:
+                self._flush_task = asyncio.get_running_loop().create_task(self._flush_periodically())
+            except RuntimeError:
+                pass  # No event loop: flushed on shutdown
     
-    def generate_access_key(self, key_data: AccessKeyCreate, admin_id: str) -> Tuple[str, AccessKey]:
+    def _load_access_key(self, key_hash: str, key_data: str, uses: Optional[str], last_used: Optional[str]) -> AccessKey:
+        """Key as stored plus the usage counted outside its JSON (uses_count/last_used fields and uses not yet flushed)"""
+        access_key = AccessKey(**json.loads(key_data))
+        access_key.uses_count += int(uses or 0) + self._pending_uses.get(key_hash, 0)
+        if last_used:
+            access_key.last_used = datetime.fromisoformat(last_used)
+        pending_last_used = self._pending_last_used.get(key_hash)
+        if pending_last_used:
+            access_key.last_used = datetime.fromisoformat(pending_last_used)
+        return access_key
+    
+    async def _claim_limited_use(self, key_hash: str, stored_uses: int, max_uses: int) -> Optional[int]:
+        """
+        Count one use of a key with max_uses directly in Redis: HINCRBY is atomic, so across every
+        worker only the uses that stay within the limit are accepted. Returns the total uses, or None if rejected
+        """
+        redis_key = f"access_key:{key_hash}"
+        pipe = redis_service.batch(transaction=True)
+        pipe.exists(redis_key)
+        pipe.hincrby(redis_key, "uses_count", 1)
+        exists, counted = await pipe.execute()
+        if not exists:
+            # Expired since it was cached: drop the hash the increment just recreated
+            await redis_service.require_client().delete(redis_key)
+            self._key_cache.invalidate(key_hash)
+            return None
+        if stored_uses + counted > max_uses:
+            # Over the limit: undo the increment so uses_count keeps counting accepted uses only
+            await redis_service.require_client().hincrby(redis_key, "uses_count", -1)
+            return None
+        await redis_service.require_client().hset(redis_key, "last_used", datetime.utcnow().isoformat())
+        return stored_uses + counted
+    
+    async def generate_access_key(self, key_data: AccessKeyCreate, admin_id: str) -> Tuple[str, AccessKey]:
         """Generate a new access key"""
         # Generate secure random key
         key = f"kat_{secrets.token_urlsafe(32)}"
@@ -56,7 +191,8 @@ class AuthService:
         access_key_data = serialize_datetime_dict(access_key.dict())
         
         key_redis_key = f"access_key:{key_hash}"
-        redis_service.redis_client.hset(key_redis_key, mapping={
+        pipe = redis_service.batch(transaction=True)
+        pipe.hset(key_redis_key, mapping={
             "data": json.dumps(access_key_data),
             "admin_id": admin_id
         })
@@ -64,24 +200,30 @@ class AuthService:
         # Set expiration if specified
         if key_data.expires_at:
             ttl = int((key_data.expires_at - datetime.utcnow()).total_seconds())
-            redis_service.redis_client.expire(key_redis_key, ttl)
+            pipe.expire(key_redis_key, ttl)
         
-        # Store in admin's key list
-        admin_keys_key = f"admin:{admin_id}:keys"
-        redis_service.redis_client.sadd(admin_keys_key, access_key.id)
+        # Index by id and store in admin's key list, atomically with the key itself
+        pipe.hset(ACCESS_KEY_INDEX, access_key.id, key_hash)
+        pipe.sadd(f"admin:{admin_id}:keys", access_key.id)
+        await pipe.execute()
         
         return key, access_key
     
-    def validate_access_key(self, key: str) -> Optional[AccessKey]:
+    async def validate_access_key(self, key: str) -> Optional[AccessKey]:
         """Validate and return access key data"""
         key_hash = hashlib.sha256(key.encode()).hexdigest()
-        key_redis_key = f"access_key:{key_hash}"
         
-        key_data = redis_service.redis_client.hget(key_redis_key, "data")
-        if not key_data:
-            return None
-            
-        access_key = AccessKey(**json.loads(key_data))
+        cached = self._key_cache.get(key_hash)
+        if cached is None:
+            key_data, uses, last_used = await redis_service.require_client().hmget(
+                f"access_key:{key_hash}", ["data", "uses_count", "last_used"]
+            )
+            if not key_data:
+                return None
+            access_key = self._load_access_key(key_hash, key_data, uses, last_used)
+            cached = (access_key, json.loads(key_data).get("uses_count", 0))
+            self._key_cache.set(key_hash, cached)
+        access_key, stored_uses = cached
         
         # Check if key is active
         if not access_key.is_active:
@@ -91,19 +233,25 @@ class AuthService:
         if access_key.expires_at and access_key.expires_at < datetime.utcnow():
             return None
             
-        # Check max uses
+        # Check max uses (the cached count only grows, so it can reject without a round trip)
         if access_key.max_uses and access_key.uses_count >= access_key.max_uses:
             return None
+        
+        if access_key.max_uses:
+            # Limited key: the use is claimed in Redis, shared by every worker
+            uses = await self._claim_limited_use(key_hash, stored_uses, access_key.max_uses)
+            if uses is None:
+                return None
+            access_key.uses_count = uses
+            access_key.last_used = datetime.utcnow()
+            return access_key.copy()
             
-        # Update usage
+        # Update usage: the cached copy right away, Redis in the next batched flush
         access_key.uses_count += 1
         access_key.last_used = datetime.utcnow()
+        self._record_use(key_hash, access_key.last_used)
         
-        # Serialize datetime objects
-        access_key_data = serialize_datetime_dict(access_key.dict())
-        redis_service.redis_client.hset(key_redis_key, "data", json.dumps(access_key_data))
-        
-        return access_key
+        return access_key.copy()
     
     def authenticate_admin(self, username: str, password: str, totp_code: Optional[str] = None) -> bool:
         """Authenticate admin user"""
@@ -121,7 +269,7 @@ class AuthService:
                 
         return True
     
-    def create_user_from_access_code(self, access_code: str) -> Optional[User]:
+    async def create_user_from_access_code(self, access_code: str) -> Optional[User]:
         """Create/get user from access code"""
         # Simple access code validation (can be enhanced)
         if len(access_code) < 6:
@@ -131,7 +279,7 @@ class AuthService:
         user_key = f"user:{user_id}"
         
         # Check if user exists
-        user_data = redis_service.redis_client.hget(user_key, "data")
+        user_data = await redis_service.require_client().hget(user_key, "data")
         if user_data:
             user = User(**json.loads(user_data))
             user.last_login = datetime.utcnow()
@@ -148,8 +296,8 @@ class AuthService:
         
         # Update user data - serialize datetime objects
         user_data = serialize_datetime_dict(user.dict())
-        redis_service.redis_client.hset(user_key, "data", json.dumps(user_data))
-        redis_service.redis_client.expire(user_key, 30 * 24 * 60 * 60)  # 30 days
+        await redis_service.require_client().hset(user_key, "data", json.dumps(user_data))
+        await redis_service.require_client().expire(user_key, 30 * 24 * 60 * 60)  # 30 days
         
         return user
     
@@ -167,51 +315,93 @@ class AuthService:
         return jwt.encode(to_encode, self.secret_key, algorithm=self.algorithm)
     
     def verify_token(self, token: str) -> Dict[str, Any]:
-        """Verify and decode JWT token"""
+        """Verify and decode JWT token (cached until it expires or the cache TTL elapses)"""
+        cached = self._token_cache.get(token)
+        if cached is not None:
+            return dict(cached)
         try:
             payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
-            return payload
+            expires_at = payload.get("exp")
+            self._token_cache.set(token, payload, expires_at - time.time() if expires_at else None)
+            return dict(payload)
         except JWTError:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Could not validate credentials"
             )
     
-    def get_admin_keys(self, admin_id: str) -> List[AccessKey]:
+    async def get_admin_keys(self, admin_id: str) -> List[AccessKey]:
         """Get all access keys for an admin"""
         admin_keys_key = f"admin:{admin_id}:keys"
-        key_ids = redis_service.redis_client.smembers(admin_keys_key)
-        
-        keys = []
-        for key_id in key_ids:
-            # Find key by searching (could be optimized with separate index)
-            pattern = "access_key:*"
-            for key_hash_key in redis_service.redis_client.keys(pattern):
-                key_data = redis_service.redis_client.hget(key_hash_key, "data")
-                if key_data:
-                    access_key = AccessKey(**json.loads(key_data))
-                    if access_key.id == key_id:
-                        keys.append(access_key)
-                        break
+        key_ids = sorted(await redis_service.require_client().smembers(admin_keys_key))
+        if not key_ids:
+            return []
+        
+        key_hashes = await redis_service.require_client().hmget(ACCESS_KEY_INDEX, key_ids)
+        indexed = [(key_id, key_hash) for key_id, key_hash in zip(key_ids, key_hashes) if key_hash]
+        pipe = redis_service.batch()
+        for _, key_hash in indexed:
+            pipe.hmget(f"access_key:{key_hash}", ["data", "uses_count", "last_used"])
+        values = await pipe.execute()
+        
+        keys = [
+            self._load_access_key(key_hash, *fields)
+            for (_, key_hash), fields in zip(indexed, values) if fields[0]
+        ]
+        
+        # Keys that expired (TTL) are dropped from the indexes
+        expired = [key_id for (key_id, _), fields in zip(indexed, values) if not fields[0]]
+        if expired:
+            pipe = redis_service.batch()
+            pipe.hdel(ACCESS_KEY_INDEX, *expired)
+            pipe.srem(admin_keys_key, *expired)
+            await pipe.execute()
         
         return sorted(keys, key=lambda x: x.created_at, reverse=True)
     
-    def revoke_access_key(self, key_id: str, admin_id: str) -> bool:
+    async def revoke_access_key(self, key_id: str, admin_id: str) -> bool:
         """Revoke an access key"""
-        # Find and deactivate the key
-        pattern = "access_key:*"
-        for key_hash_key in redis_service.redis_client.keys(pattern):
-            key_data = redis_service.redis_client.hget(key_hash_key, "data")
+        key_hash = await redis_service.require_client().hget(ACCESS_KEY_INDEX, key_id)
+        if not key_hash:
+            return False
+        
+        key_hash_key = f"access_key:{key_hash}"
+        key_data = await redis_service.require_client().hget(key_hash_key, "data")
+        if not key_data:
+            return False
+        
+        access_key = AccessKey(**json.loads(key_data))
+        access_key.is_active = False
+        # Serialize datetime objects
+        access_key_data = serialize_datetime_dict(access_key.dict())
+        pipe = redis_service.batch()
+        pipe.hset(key_hash_key, "data", json.dumps(access_key_data))
+        # Every process (this one included) drops its cached copy of the key
+        pipe.publish(AUTH_INVALIDATION_CHANNEL, key_hash)
+        await pipe.execute()
+        self._key_cache.invalidate(key_hash)
+        return True
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        return {
+            "tokens": self._token_cache.snapshot(),
+            "access_keys": self._key_cache.snapshot(),
+            "pending_key_uses": sum(self._pending_uses.values())
+        }
+    
+    async def backfill_key_index(self) -> int:
+        """
+        Index access keys created before the id index existed (maintenance, never on the request path)
+        Uses SCAN, so Redis keeps serving other clients while it runs; safe to re-run
+        """
+        indexed = 0
+        async for key_hash_key in redis_service.require_client().scan_iter(match="access_key:*", count=500):
+            key_data = await redis_service.require_client().hget(key_hash_key, "data")
             if key_data:
-                access_key = AccessKey(**json.loads(key_data))
-                if access_key.id == key_id:
-                    access_key.is_active = False
-                    # Serialize datetime objects
-                    access_key_data = serialize_datetime_dict(access_key.dict())
-                    redis_service.redis_client.hset(key_hash_key, "data", json.dumps(access_key_data))
-                    return True
-        
-        return False
+                key_id = json.loads(key_data)["id"]
+                await redis_service.require_client().hset(ACCESS_KEY_INDEX, key_id, key_hash_key.split(":", 1)[1])
+                indexed += 1
+        return indexed
     
     def get_totp_qr_url(self) -> str:
         """Get TOTP QR code URL for admin setup"""
@@ -0,0 +1,228 @@
+"""
+Memoria de conversación por usuario y por agente sobre listas de Redis
+RPUSH + LTRIM: cada turno agrega mensajes en O(1) y las lecturas solo traen la ventana reciente;
+opcionalmente los mensajes que salen de la ventana se condensan en un resumen acumulado
+"""
+
+import os
+import json
+import asyncio
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from services.redis_service import redis_service
+from services.deadline import deadline_scope, JOB_DEADLINE_SECONDS
+
+# Guarda el resumen y quita de la cabeza de la lista solo los mensajes resumidos que siguen ahí.
+# Mientras se resumía, append_turn pudo recortar la cabeza (LTRIM al tope): lo que queda del lote
+# resumido es un sufijo de él al inicio de la lista, y los mensajes posteriores no se tocan.
+# KEYS: lista, resumen; ARGV: resumen, ttl, mensajes resumidos en orden. Retorna cuántos quitó.
+_STORE_SUMMARY_SCRIPT = """
+local count = #ARGV - 2
+local head = redis.call('LRANGE', KEYS[1], 0, count - 1)
+local removed = 0
+for start = 1, count do
+    local matches = true
+    for i = start, count do
+        if head[i - start + 1] ~= ARGV[i + 2] then
+            matches = false
+            break
+        end
+    end
+    if matches then
+        removed = count - start + 1
+        redis.call('LTRIM', KEYS[1], removed, -1)
+        break
+    end
+end
+redis.call('SET', KEYS[2], ARGV[1], 'EX', ARGV[2])
+return removed
+"""
+
+
+class ConversationMemoryStore:
+    """Ventana acotada de mensajes por (scope, usuario) con resumen acumulado opcional"""
+
+    def __init__(self):
+        self.window_turns = int(os.getenv("AI_MEMORY_WINDOW_TURNS", "10"))
+        self.ttl_seconds = int(os.getenv("AI_MEMORY_TTL_SECONDS", str(7 * 24 * 60 * 60)))
+        self.summarize = os.getenv("AI_MEMORY_SUMMARIZE", "false").lower() == "true"
+        # Turnos que se acumulan fuera de la ventana antes de resumirlos en una sola llamada
+        self.summary_batch_turns = int(os.getenv("AI_MEMORY_SUMMARY_BATCH_TURNS", "5"))
+        self.max_message_chars = int(os.getenv("AI_MEMORY_MAX_MESSAGE_CHARS", "2000"))
+
+        # Respaldo en memoria si Redis no está disponible (solo válido con un worker)
+        self._local: Dict[str, deque] = {}
+        self._local_summaries: Dict[str, str] = {}
+        # Referencias a los resúmenes en curso: el event loop solo guarda referencias débiles
+        self._summary_tasks: Set[asyncio.Task] = set()
+
+    @property
+    def window_messages(self) -> int:
+        return 2 * self.window_turns
+
+    @property
+    def summary_trigger_messages(self) -> int:
+        """Con resumen activo se deja crecer un lote extra antes de resumirlo en una sola llamada"""
+        return self.window_messages + 2 * self.summary_batch_turns
+
+    @property
+    def max_stored_messages(self) -> int:
+        """Tope duro de la lista, aunque el resumen falle o se retrase"""
+        if self.summarize:
+            return self.window_messages + 4 * self.summary_batch_turns
+        return self.window_messages
+
+    def _key(self, user_id: str, scope: str) -> str:
+        return f"memory:{scope}:{user_id}"
+
+    def _message(self, message_type: str, content: str) -> str:
+        if len(content) > self.max_message_chars:
+            content = content[:self.max_message_chars] + "…"
+        return json.dumps({
+            "type": message_type,
+            "content": content,
+            "ts": datetime.utcnow().isoformat()
+        }, ensure_ascii=False)
+
+    # Escritura
+    async def append_turn(self, user_id: str, human: str, ai: str, scope: str = "chat") -> int:
+        """Agrega un turno (usuario + IA) y recorta la lista; retorna la longitud almacenada"""
+        key = self._key(user_id, scope)
+        messages = [self._message("human", human), self._message("ai", ai)]
+
+        try:
+            if redis_service.redis_client:
+                pipe = redis_service.redis_client.pipeline(transaction=False)
+                pipe.rpush(key, *messages)
+                pipe.ltrim(key, -self.max_stored_messages, -1)
+                pipe.expire(key, self.ttl_seconds)
+                length = (await pipe.execute())[0]
+                self._maybe_schedule_summary(user_id, scope, length)
+                return min(length, self.max_stored_messages)
+        except Exception as e:
+            print(f"Error saving conversation memory: {e}")
+
+        local = self._local.setdefault(key, deque(maxlen=self.max_stored_messages))
+        local.extend(messages)
+        self._maybe_schedule_summary(user_id, scope, len(local))
+        return len(local)
+
+    # Lectura
+    async def get_window(self, user_id: str, scope: str = "chat") -> Dict[str, Any]:
+        """Ventana reciente de mensajes y resumen acumulado (una sola ida y vuelta a Redis)"""
+        key = self._key(user_id, scope)
+        try:
+            if redis_service.redis_client:
+                pipe = redis_service.redis_client.pipeline(transaction=False)
+                pipe.lrange(key, -self.window_messages, -1)
+                pipe.get(f"{key}:summary")
+                pipe.llen(key)
+                raw_messages, summary, length = await pipe.execute()
+                return {
+                    "summary": summary,
+                    "messages": [json.loads(m) for m in raw_messages],
+                    "stored_messages": length
+                }
+        except Exception as e:
+            print(f"Error loading conversation memory: {e}")
+
+        local = list(self._local.get(key, []))
+        return {
+            "summary": self._local_summaries.get(key),
+            "messages": [json.loads(m) for m in local[-self.window_messages:]],
+            "stored_messages": len(local)
+        }
+
+    async def clear(self, user_id: str, scope: str = "chat"):
+        key = self._key(user_id, scope)
+        try:
+            if redis_service.redis_client:
+                await redis_service.redis_client.delete(key, f"{key}:summary")
+                return
+        except Exception as e:
+            print(f"Error clearing conversation memory: {e}")
+        self._local.pop(key, None)
+        self._local_summaries.pop(key, None)
+
+    @staticmethod
+    def format_for_prompt(window: Dict[str, Any]) -> str:
+        """Historial compacto para anteponer al prompt"""
+        lines = []
+        if window.get("summary"):
+            lines.append(f"Resumen de la conversación previa: {window['summary']}")
+        for message in window.get("messages", []):
+            speaker = "Usuario" if message["type"] == "human" else "Asistente"
+            lines.append(f"{speaker}: {message['content']}")
+        return "\n".join(lines)
+
+    # Resumen acumulado
+    def _maybe_schedule_summary(self, user_id: str, scope: str, length: int):
+        if not self.summarize or length <= self.summary_trigger_messages:
+            return
+        try:
+            task = asyncio.get_running_loop().create_task(self._summarize_overflow(user_id, scope))
+            self._summary_tasks.add(task)
+            task.add_done_callback(self._summary_tasks.discard)
+        except RuntimeError:
+            pass  # Sin event loop: se resumirá en el siguiente turno
+
+    async def _summarize_overflow(self, user_id: str, scope: str):
+        """Condensa en el resumen los mensajes que salen de la ventana y los elimina de la lista"""
+        key = self._key(user_id, scope)
+        client = redis_service.redis_client
+        try:
+            if client:
+                # Un solo resumen a la vez por conversación entre todos los workers
+                if not await client.set(f"{key}:summary_lock", "1", nx=True, ex=120):
+                    return
+                try:
+                    pipe = client.pipeline(transaction=False)
+                    pipe.lrange(key, 0, -self.window_messages - 1)
+                    pipe.get(f"{key}:summary")
+                    overflow, summary = await pipe.execute()
+                    if not overflow:
+                        return
+                    new_summary = await self._build_summary(summary, [json.loads(m) for m in overflow])
+                    # Atómico: otros workers siguen agregando (y recortando) la lista durante el resumen
+                    await client.eval(
+                        _STORE_SUMMARY_SCRIPT, 2, key, f"{key}:summary",
+                        new_summary, self.ttl_seconds, *overflow
+                    )
+                finally:
+                    await client.delete(f"{key}:summary_lock")
+                return
+        except Exception as e:
+            print(f"Error summarizing conversation memory: {e}")
+            return
+
+        local = self._local.get(key)
+        if not local or len(local) <= self.window_messages:
+            return
+        overflow = [json.loads(local.popleft()) for _ in range(len(local) - self.window_messages)]
+        self._local_summaries[key] = await self._build_summary(self._local_summaries.get(key), overflow)
+
+    async def _build_summary(self, previous: Optional[str], messages: List[Dict[str, Any]]) -> str:
+        from services.dual_ai_service import dual_ai_service
+
+        transcript = self.format_for_prompt({"summary": previous, "messages": messages})
+        prompt = (
+            "Actualiza el resumen de esta conversación entre un emprendedor y su asesor financiero. "
+            "Conserva cifras, decisiones y preguntas abiertas; máximo 120 palabras.\n\n"
+            f"{transcript}"
+        )
+        # Tarea en segundo plano: no hereda el deadline de la petición que la disparó
+        with deadline_scope(JOB_DEADLINE_SECONDS, detached=True):
+            response = await dual_ai_service.generate_response(
+                prompt=prompt,
+                task_type="conversation_summary",
+                priority="batch"
+            )
+        if response.provider == "mock":
+            return previous or ""
+        return response.content.strip()
+
+
+# Instancia global
+conversation_memory = ConversationMemoryStore()
@@ -0,0 +1,149 @@
+"""
+Presupuesto de tiempo de extremo a extremo por petición
+El deadline se fija una vez (header o default por ruta) y cada etapa — recuperación del libro,
+llamadas LLM, hedges, resumen — ajusta su timeout a lo que queda; las etapas opcionales
+se omiten si no alcanza el tiempo y quedan registradas como degradadas
+"""
+
+import os
+import time
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Dict, Iterator, List, Optional
+
+# Header con el presupuesto que el cliente está dispuesto a esperar (milisegundos)
+DEADLINE_HEADER = "X-Request-Timeout-Ms"
+DEGRADED_HEADER = "X-Degraded-Stages"
+
+DEFAULT_DEADLINE_SECONDS = float(os.getenv("AI_DEADLINE_DEFAULT_SECONDS", "55"))
+MAX_DEADLINE_SECONDS = float(os.getenv("AI_DEADLINE_MAX_SECONDS", "120"))
+JOB_DEADLINE_SECONDS = float(os.getenv("AI_JOB_DEADLINE_SECONDS", "600"))
+
+# Tiempo mínimo restante para intentar cada etapa opcional
+MIN_SECONDS_FOR_RETRIEVAL = float(os.getenv("AI_DEADLINE_MIN_RETRIEVAL_SECONDS", "8"))
+MIN_SECONDS_FOR_SUMMARY = float(os.getenv("AI_DEADLINE_MIN_SUMMARY_SECONDS", "8"))
+MIN_SECONDS_FOR_LLM = float(os.getenv("AI_DEADLINE_MIN_LLM_SECONDS", "2"))
+
+# Presupuesto por defecto de rutas concretas (prefijo de path -> segundos; gana el primero que coincide)
+ROUTE_DEADLINES: Dict[str, float] = {
+    "/api/ai/chat": 30,
+    "/api/agents/multi-agent-analysis": 55,
+    "/api/multi/book-qa/batch": 120,
+    "/api/multi/book-qa": 55,
+    "/api/reports": 55,
+}
+
+
+class DeadlineExceeded(Exception):
+    """No queda presupuesto para completar la etapa"""
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        super().__init__(f"Deadline agotado en la etapa: {stage}")
+
+
+class Deadline:
+    """Instante límite de la petición y las etapas que se degradaron por falta de tiempo"""
+
+    def __init__(self, seconds: float):
+        self.budget_seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+        self.degraded: List[Dict[str, str]] = []
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def has_time_for(self, seconds: float) -> bool:
+        return self.remaining() >= seconds
+
+    def timeout(self, default: float) -> float:
+        """El menor entre el timeout propio de la etapa y el presupuesto restante"""
+        return min(default, self.remaining())
+
+    def mark_degraded(self, stage: str, reason: str):
+        print(f"⏱️ Etapa degradada: {stage} ({reason}, quedan {self.remaining():.1f}s)")
+        self.degraded.append({"stage": stage, "reason": reason})
+
+    def degraded_stages(self) -> List[str]:
+        return [entry["stage"] for entry in self.degraded]
+
+
+_deadline: ContextVar[Optional[Deadline]] = ContextVar("request_deadline", default=None)
+
+
+@contextmanager
+def deadline_scope(seconds: float, detached: bool = False) -> Iterator[Deadline]:
+    """
+    Fija el deadline de la petición; un deadline exterior más corto se respeta,
+    salvo en trabajo desacoplado de la petición (jobs, resúmenes en segundo plano)
+    """
+    outer = _deadline.get()
+    if not detached and outer is not None and outer.remaining() <= seconds:
+        yield outer
+        return
+    deadline = Deadline(seconds)
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _deadline.get()
+
+
+def remaining_time(default: float) -> float:
+    """Timeout para una etapa: su default acotado por el deadline actual (si existe)"""
+    deadline = _deadline.get()
+    return deadline.timeout(default) if deadline else default
+
+
+def has_time_for(seconds: float) -> bool:
+    deadline = _deadline.get()
+    return deadline is None or deadline.has_time_for(seconds)
+
+
+def mark_degraded(stage: str, reason: str):
+    deadline = _deadline.get()
+    if deadline is not None:
+        deadline.mark_degraded(stage, reason)
+
+
+def degraded_stages() -> List[Dict[str, str]]:
+    deadline = _deadline.get()
+    return list(deadline.degraded) if deadline else []
+
+
+async def run_stage(stage: str, awaitable: Awaitable[Any], default_timeout: float, min_seconds: float = 0.0) -> Any:
+    """
+    Ejecuta una etapa con timeout = min(default, restante); si no alcanza el tiempo
+    la marca como degradada y lanza DeadlineExceeded
+    """
+    if not has_time_for(max(min_seconds, 0.001)):
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        mark_degraded(stage, "deadline")
+        raise DeadlineExceeded(stage)
+    try:
+        return await asyncio.wait_for(awaitable, timeout=remaining_time(default_timeout))
+    except asyncio.TimeoutError:
+        mark_degraded(stage, "timeout")
+        raise DeadlineExceeded(stage) from None
+
+
+def deadline_for_request(path: str, header_value: Optional[str]) -> float:
+    """Presupuesto de una petición HTTP: header del cliente, default de la ruta o default global"""
+    if header_value:
+        try:
+            return min(max(float(header_value) / 1000, 0.1), MAX_DEADLINE_SECONDS)
+        except ValueError:
+            pass
+    for prefix, seconds in ROUTE_DEADLINES.items():
+        if path.startswith(prefix):
+            return seconds
+    return DEFAULT_DEADLINE_SECONDS
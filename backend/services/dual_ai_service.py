@@ -7,12 +7,33 @@ OpenAI GPT-4o-mini: Tareas simples, respuestas rápidas
 import os
 import openai
 import httpx
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from enum import Enum
 from dataclasses import dataclass
-import json
 import asyncio
+import time
 from datetime import datetime
+from services.provider_health import ProviderHealthRegistry
+from services.request_hedging import HedgePolicy, hedged_call
+from services.model_cascade import CascadePolicy
+from services.provider_scheduler import ProviderScheduler, Priority, parse_priority
+from services.prompt_builder import compact_json, count_tokens, output_budget
+from services.usage_accounting import usage_accounting, UsageRecord, extract_usage
+from services.deadline import (
+    DeadlineExceeded, remaining_time, has_time_for, mark_degraded, MIN_SECONDS_FOR_LLM
+)
+
+DEFAULT_DEEPSEEK_BASE_URL = "https://api.deepseek.com/v1"
+DEFAULT_OPENAI_BASE_URL = "https://api.openai.com/v1"
+
+# Timeout propio de cada llamada; el deadline de la petición puede acortarlo
+PROVIDER_TIMEOUT_SECONDS = float(os.getenv("AI_PROVIDER_TIMEOUT_SECONDS", "30"))
+
+# Modelo usado por cada proveedor
+PROVIDER_MODELS = {
+    "deepseek": "deepseek-reasoner",
+    "openai": "gpt-4o-mini"
+}
 
 class TaskComplexity(Enum):
     """Clasificación de complejidad de tareas para seleccionar el modelo apropiado"""
@@ -29,6 +50,11 @@ class AIResponse:
     reasoning_steps: Optional[List[str]] = None
     confidence: Optional[float] = None
     usage_tokens: Optional[int] = None
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    reasoning_tokens: Optional[int] = None
+    cached_prompt_tokens: Optional[int] = None
+    latency_seconds: Optional[float] = None
 
 class DualAIService:
     """Servicio que maneja ambos proveedores de IA según la complejidad de la tarea"""
@@ -38,9 +64,10 @@ class DualAIService:
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
         self.deepseek_api_key = os.getenv("DEEPSEEK_API_KEY")
         
-        # Configuración de APIs
+        # Configuración de APIs (las URLs base permiten apuntar a un stand-in local para pruebas de carga)
         self.openai_client = None
-        self.deepseek_base_url = "https://api.deepseek.com/v1"
+        self.deepseek_base_url = os.getenv("DEEPSEEK_BASE_URL", DEFAULT_DEEPSEEK_BASE_URL).rstrip("/")
+        self.openai_base_url = os.getenv("OPENAI_BASE_URL", DEFAULT_OPENAI_BASE_URL).rstrip("/")
         
         # Inicializar clientes
         self._initialize_clients()
@@ -48,7 +75,19 @@ class DualAIService:
         # Detectar qué servicios están disponibles
         self.openai_available = bool(self.openai_api_key and not self.openai_api_key.startswith("your_"))
         self.deepseek_available = bool(self.deepseek_api_key and not self.deepseek_api_key.startswith("your_"))
-        
+
+        # Salud en vivo por proveedor (latencia EWMA, errores, circuit breaker)
+        self.health = ProviderHealthRegistry()
+
+        # Hedging de peticiones interactivas contra el proveedor secundario
+        self.hedging = HedgePolicy()
+
+        # Bulkheads por proveedor con colas por prioridad
+        self.scheduler = ProviderScheduler()
+
+        # Cascada: modelo rápido primero, razonamiento solo si la respuesta no pasa las verificaciones
+        self.cascade = CascadePolicy()
+
         print(f"🤖 AI Service Status:")
         print(f"   OpenAI GPT-4o-mini: {'✅ Available' if self.openai_available else '❌ Not configured'}")
         print(f"   DeepSeek R1: {'✅ Available' if self.deepseek_available else '❌ Not configured'}")
@@ -59,8 +98,10 @@ class DualAIService:
     def _initialize_clients(self):
         """Inicializa los clientes de IA"""
         if self.openai_api_key:
-            openai.api_key = self.openai_api_key
-            self.openai_client = openai
+            self.openai_client = openai.AsyncOpenAI(
+                api_key=self.openai_api_key,
+                base_url=self.openai_base_url
+            )
     
     def _classify_task_complexity(self, task_type: str, prompt: str) -> TaskComplexity:
         """Clasifica la complejidad de una tarea para seleccionar el modelo apropiado"""
@@ -98,46 +139,220 @@ class DualAIService:
         prompt: str, 
         task_type: str = "general",
         context: Optional[Dict] = None,
-        force_provider: Optional[str] = None
+        force_provider: Optional[str] = None,
+        max_tokens: Optional[int] = None,
+        priority: Optional[str] = None
     ) -> AIResponse:
-        """Genera respuesta usando el proveedor apropiado según la complejidad"""
+        """
+        Genera respuesta usando el proveedor apropiado según la complejidad.
+        `priority` ('interactive', 'background', 'batch') decide la cola del bulkhead;
+        si no se indica se deriva del tipo de tarea.
+        """
         
         # Clasificar complejidad de la tarea
         complexity = self._classify_task_complexity(task_type, prompt)
-        
-        # Determinar proveedor a usar
+        request_priority = parse_priority(priority, task_type)
+
+        # Presupuesto de salida por tipo de tarea
+        if max_tokens is None:
+            max_tokens = output_budget(task_type)
+
+        # Determinar proveedor preferido por complejidad
         if force_provider:
-            provider = force_provider
+            preferred = force_provider
         elif complexity == TaskComplexity.SIMPLE and self.openai_available:
-            provider = "openai"
+            preferred = "openai"
         elif complexity in [TaskComplexity.COMPLEX, TaskComplexity.REASONING] and self.deepseek_available:
-            provider = "deepseek"
+            preferred = "deepseek"
         elif self.openai_available:
-            provider = "openai"  # Fallback
+            preferred = "openai"  # Fallback
         elif self.deepseek_available:
-            provider = "deepseek"  # Fallback
+            preferred = "deepseek"  # Fallback
         else:
             # Mock response
             return self._generate_mock_response(prompt, task_type)
-        
-        print(f"🧠 Task: {task_type} | Complexity: {complexity.value} | Using: {provider}")
-        
+
+        # Cascada: intentar primero con el modelo rápido si el tipo de tarea lo permite
+        draft = None
+        if preferred == "deepseek" and not force_provider and self._cascade_applies(task_type):
+            draft, accepted = await self._cascade_draft(prompt, task_type, context, max_tokens, request_priority)
+            if accepted:
+                return draft
+
+        # Ajustar según la salud en vivo de los proveedores
+        alternative = self._alternative_provider(preferred)
+        provider = self.health.choose(preferred, alternative)
+        if provider is None:
+            print("🔌 Todos los proveedores con circuito abierto - usando respuesta mock")
+            return self._generate_mock_response(prompt, task_type)
+        if draft is not None and provider == draft.provider:
+            # Escalar al mismo modelo rápido solo repetiría la llamada: se usa el borrador
+            print(f"🪜 Cascade: {provider} es el único proveedor disponible, se usa el borrador")
+            return draft
+
+        rerouted = f" (rerouted from {preferred})" if provider != preferred else ""
+        print(f"🧠 Task: {task_type} | Complexity: {complexity.value} | Priority: {request_priority.name.lower()} | Using: {provider}{rerouted}")
+
         try:
-            if provider == "deepseek":
-                return await self._generate_deepseek_response(prompt, context)
-            else:
-                return await self._generate_openai_response(prompt, context)
+            # Tras escalar no tiene sentido repetir la petición al modelo rápido como hedge
+            hedge_provider = None if draft else self._hedge_provider(provider, task_type)
+            if hedge_provider:
+                delay = self.hedging.hedge_delay(self.health.get(provider))
+                # Un hedge que se dispararía sin tiempo para responder solo duplica tráfico
+                if delay is not None and has_time_for(delay + MIN_SECONDS_FOR_LLM):
+                    response, hedge_won = await hedged_call(
+                        self.hedging,
+                        lambda: self._call_provider(provider, prompt, context, max_tokens, request_priority),
+                        lambda: self._call_provider(hedge_provider, prompt, context, max_tokens, request_priority),
+                        delay
+                    )
+                    if hedge_won:
+                        print(f"⚡ Hedge: {hedge_provider} respondió antes que {provider} (espera {delay:.1f}s)")
+                    return response
+            return await self._call_provider(provider, prompt, context, max_tokens, request_priority)
         except Exception as e:
             print(f"❌ Error with {provider}: {e}")
-            # Fallback al otro proveedor
-            if provider == "deepseek" and self.openai_available:
-                return await self._generate_openai_response(prompt, context)
-            elif provider == "openai" and self.deepseek_available:
-                return await self._generate_deepseek_response(prompt, context)
-            else:
-                return self._generate_mock_response(prompt, task_type)
+            if draft is not None:
+                # Escalamiento fallido: la respuesta rápida ya está disponible
+                return draft
+            # Fallback al otro proveedor si admite tráfico y queda presupuesto
+            fallback = self._alternative_provider(provider)
+            if fallback and not has_time_for(MIN_SECONDS_FOR_LLM):
+                mark_degraded(f"llm_fallback:{fallback}", "deadline")
+            elif fallback and self.health.get(fallback).allow_request():
+                try:
+                    return await self._call_provider(fallback, prompt, context, max_tokens, request_priority)
+                except Exception as fallback_error:
+                    print(f"❌ Error with {fallback}: {fallback_error}")
+            return self._generate_mock_response(prompt, task_type)
+
+    def _cascade_applies(self, task_type: str) -> bool:
+        return (
+            self.cascade.applies(task_type)
+            and self.openai_available
+            and not self.health.get("openai").is_degraded()
+        )
+
+    async def _cascade_draft(
+        self,
+        prompt: str,
+        task_type: str,
+        context: Optional[Dict],
+        max_tokens: int,
+        priority: Priority
+    ) -> Tuple[Optional[AIResponse], bool]:
+        """Respuesta de GPT-4o-mini y si se acepta (pasa las verificaciones baratas) o hay que escalar"""
+        try:
+            draft = await self._call_provider("openai", prompt, context, max_tokens, priority)
+        except Exception as e:
+            print(f"❌ Cascade draft error: {e}")
+            self.cascade.record_draft_error(task_type)
+            return None, False
+
+        failures = self.cascade.evaluate(task_type, draft.content, prompt, context)
+        self.cascade.record(task_type, failures)
+        if not failures:
+            print(f"🪜 Cascade: {task_type} resuelto con gpt-4o-mini")
+            return draft, True
+        if not has_time_for(MIN_SECONDS_FOR_LLM):
+            # Sin tiempo para escalar: mejor la respuesta rápida que ninguna
+            mark_degraded("cascade_escalation", "deadline")
+            return draft, True
+        print(f"🪜 Cascade: escalando {task_type} a deepseek ({', '.join(failures)})")
+        return draft, False
+
+    def _alternative_provider(self, provider: str) -> Optional[str]:
+        """Retorna el otro proveedor si está configurado"""
+        if provider == "deepseek" and self.openai_available:
+            return "openai"
+        if provider == "openai" and self.deepseek_available:
+            return "deepseek"
+        return None
+
+    def _hedge_provider(self, provider: str, task_type: str) -> Optional[str]:
+        """Proveedor secundario para hedging si el tipo de tarea lo tiene habilitado"""
+        if not self.hedging.applies(task_type):
+            return None
+        secondary = self._alternative_provider(provider)
+        if secondary is None or self.health.get(secondary).is_degraded():
+            return None
+        return secondary
+
+    async def _call_provider(
+        self,
+        provider: str,
+        prompt: str,
+        context: Optional[Dict] = None,
+        max_tokens: int = 1000,
+        priority: Priority = Priority.INTERACTIVE
+    ) -> AIResponse:
+        """
+        Llama a un proveedor dentro de su bulkhead, registrando latencia y resultado
+        en su estado de salud (el tiempo en cola no cuenta como latencia del proveedor).
+        La espera en cola y la llamada se acotan al deadline de la petición.
+        """
+        health = self.health.get(provider)
+        if not has_time_for(MIN_SECONDS_FOR_LLM):
+            # health.choose() pudo reservar la prueba half-open para esta petición
+            health.release_probe()
+            mark_degraded(f"llm:{provider}", "deadline")
+            raise DeadlineExceeded(f"llm:{provider}")
+
+        queue_timeout = remaining_time(self.scheduler.queue_timeouts[priority])
+        started = None
+        try:
+            async with self.scheduler.slot(provider, priority, queue_timeout):
+                started = time.monotonic()
+                try:
+                    timeout = remaining_time(PROVIDER_TIMEOUT_SECONDS)
+                    if provider == "deepseek":
+                        response = await self._generate_deepseek_response(prompt, context, max_tokens, timeout)
+                    else:
+                        response = await self._generate_openai_response(prompt, context, max_tokens, timeout)
+                except asyncio.CancelledError:
+                    # Perdedor de un hedge: su latencia es al menos el tiempo transcurrido
+                    health.record_cancelled(time.monotonic() - started)
+                    raise
+                except Exception:
+                    latency = time.monotonic() - started
+                    if timeout < PROVIDER_TIMEOUT_SECONDS and not has_time_for(0.001):
+                        # Cortado por el deadline de la petición, no por el proveedor
+                        health.record_cancelled(latency)
+                        mark_degraded(f"llm:{provider}", "deadline")
+                    else:
+                        health.record_failure(latency)
+                    usage_accounting.record(UsageRecord(
+                        provider=provider,
+                        model=PROVIDER_MODELS[provider],
+                        latency_seconds=latency,
+                        error=True
+                    ))
+                    raise
+                latency = time.monotonic() - started
+                health.record_success(latency)
+                response.latency_seconds = latency
+                usage_accounting.record(UsageRecord(
+                    provider=provider,
+                    model=response.model_used,
+                    prompt_tokens=response.prompt_tokens or 0,
+                    completion_tokens=response.completion_tokens or 0,
+                    reasoning_tokens=response.reasoning_tokens or 0,
+                    cached_prompt_tokens=response.cached_prompt_tokens or 0,
+                    latency_seconds=latency
+                ))
+                return response
+        finally:
+            if started is None:
+                # Cola agotada o cancelada antes de llamar: la prueba half-open queda libre
+                health.release_probe()
     
-    async def _generate_deepseek_response(self, prompt: str, context: Optional[Dict] = None) -> AIResponse:
+    async def _generate_deepseek_response(
+        self,
+        prompt: str,
+        context: Optional[Dict] = None,
+        max_tokens: int = 2000,
+        timeout: float = PROVIDER_TIMEOUT_SECONDS
+    ) -> AIResponse:
         """Genera respuesta usando DeepSeek R1 para razonamiento complejo"""
         
         # Preparar mensajes para DeepSeek
@@ -167,10 +382,11 @@ class DualAIService:
         if context:
             messages.append({
                 "role": "system", 
-                "content": f"Contexto adicional: {json.dumps(context, ensure_ascii=False)}"
+                "content": f"Contexto adicional: {compact_json(context)}"
             })
         
         messages.append({"role": "user", "content": prompt})
+        prompt_tokens = count_tokens("\n".join(message["content"] for message in messages))
         
         async with httpx.AsyncClient() as client:
             response = await client.post(
@@ -182,11 +398,11 @@ class DualAIService:
                 json={
                     "model": "deepseek-reasoner",  # DeepSeek R1
                     "messages": messages,
-                    "max_tokens": 2000,
+                    "max_tokens": max_tokens,
                     "temperature": 0.7,
                     "stream": False
                 },
-                timeout=30.0
+                timeout=timeout
             )
             
             if response.status_code == 200:
@@ -200,18 +416,29 @@ class DualAIService:
                     # Parsear pasos de razonamiento
                     reasoning_steps = reasoning_content.split("\n") if reasoning_content else []
                 
+                usage = extract_usage(data.get("usage"))
                 return AIResponse(
                     content=content,
                     model_used="deepseek-reasoner",
                     provider="deepseek",
                     reasoning_steps=reasoning_steps,
                     confidence=0.9,
-                    usage_tokens=data.get("usage", {}).get("total_tokens")
+                    usage_tokens=data.get("usage", {}).get("total_tokens"),
+                    prompt_tokens=usage["prompt_tokens"] or prompt_tokens,
+                    completion_tokens=usage["completion_tokens"],
+                    reasoning_tokens=usage["reasoning_tokens"],
+                    cached_prompt_tokens=usage["cached_prompt_tokens"]
                 )
             else:
                 raise Exception(f"DeepSeek API error: {response.status_code} - {response.text}")
     
-    async def _generate_openai_response(self, prompt: str, context: Optional[Dict] = None) -> AIResponse:
+    async def _generate_openai_response(
+        self,
+        prompt: str,
+        context: Optional[Dict] = None,
+        max_tokens: int = 1000,
+        timeout: float = PROVIDER_TIMEOUT_SECONDS
+    ) -> AIResponse:
         """Genera respuesta usando OpenAI GPT-4o-mini para tareas simples"""
         
         messages = [
@@ -232,28 +459,34 @@ class DualAIService:
         if context:
             messages.append({
                 "role": "system",
-                "content": f"Contexto: {json.dumps(context, ensure_ascii=False)}"
+                "content": f"Contexto: {compact_json(context)}"
             })
         
         messages.append({"role": "user", "content": prompt})
+        prompt_tokens = count_tokens("\n".join(message["content"] for message in messages))
         
         try:
-            response = await asyncio.to_thread(
-                self.openai_client.ChatCompletion.create,
+            response = await self.openai_client.chat.completions.create(
                 model="gpt-4o-mini",
                 messages=messages,
-                max_tokens=1000,
-                temperature=0.7
+                max_tokens=max_tokens,
+                temperature=0.7,
+                timeout=timeout
             )
             
             content = response.choices[0].message.content
+            usage = extract_usage(response.usage.model_dump() if response.usage else None)
             
             return AIResponse(
                 content=content,
                 model_used="gpt-4o-mini", 
                 provider="openai",
                 confidence=0.85,
-                usage_tokens=response.usage.total_tokens
+                usage_tokens=response.usage.total_tokens if response.usage else None,
+                prompt_tokens=usage["prompt_tokens"] or prompt_tokens,
+                completion_tokens=usage["completion_tokens"],
+                reasoning_tokens=usage["reasoning_tokens"],
+                cached_prompt_tokens=usage["cached_prompt_tokens"]
             )
             
         except Exception as e:
@@ -288,7 +521,11 @@ class DualAIService:
             "models": {
                 "simple_tasks": "gpt-4o-mini" if self.openai_available else "mock",
                 "complex_reasoning": "deepseek-reasoner" if self.deepseek_available else "mock"
-            }
+            },
+            "provider_health": self.health.snapshot(),
+            "hedging": self.hedging.snapshot(),
+            "scheduler": self.scheduler.snapshot(),
+            "cascade": self.cascade.snapshot()
         }
 
 # Instancia global del servicio dual
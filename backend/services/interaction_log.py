@@ -0,0 +1,112 @@
+"""
+Registro de interacciones con agentes sobre Redis Streams
+Un stream por (namespace, agente, usuario): XADD con MAXLEN acotado agrega en O(1) y recorta lo
+antiguo; las lecturas paginan hacia atrás con XREVRANGE, así que cuestan O(tamaño de página)
+sin importar cuántos usuarios o interacciones existan (nada de KEYS sobre todo el keyspace)
+"""
+
+import os
+import re
+import json
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.redis_service import redis_service
+
+STREAM_ID_PATTERN = re.compile(r"^\d+-\d+$")
+
+
+class InteractionLog:
+    """Streams acotados de interacciones por agente y usuario, con lectura paginada"""
+
+    def __init__(self):
+        self.max_len = int(os.getenv("AI_INTERACTION_LOG_MAXLEN", "200"))
+        self.ttl_seconds = int(os.getenv("AI_INTERACTION_LOG_TTL_SECONDS", str(7 * 24 * 60 * 60)))
+        self.max_page_size = int(os.getenv("AI_INTERACTION_LOG_MAX_PAGE", "50"))
+
+        # Respaldo en memoria si Redis no está disponible (solo válido con un worker)
+        self._local: Dict[str, deque] = {}
+        self._last_local_id: Tuple[int, int] = (0, 0)
+
+    def _key(self, namespace: str, user_id: str, agent_id: str) -> str:
+        return f"interactions:{namespace}:{agent_id}:{user_id}"
+
+    # Escritura
+    async def append(self, namespace: str, user_id: str, agent_id: str, interaction: Dict[str, Any]) -> Optional[str]:
+        """Agrega una interacción y recorta el stream a max_len; retorna su id"""
+        key = self._key(namespace, user_id, agent_id)
+        payload = json.dumps(interaction, default=str, ensure_ascii=False)
+
+        try:
+            if redis_service.redis_client:
+                pipe = redis_service.redis_client.pipeline(transaction=False)
+                # MAXLEN ~: recorte aproximado, sin coste extra en cada XADD
+                pipe.xadd(key, {"data": payload}, maxlen=self.max_len, approximate=True)
+                pipe.expire(key, self.ttl_seconds)
+                return (await pipe.execute())[0]
+        except Exception as e:
+            print(f"Error appending interaction log: {e}")
+
+        entry_id = self._next_local_id()
+        self._local.setdefault(key, deque(maxlen=self.max_len)).append((entry_id, payload))
+        return entry_id
+
+    # Lectura
+    async def recent(
+        self,
+        namespace: str,
+        user_id: str,
+        agent_id: str,
+        count: int = 10,
+        before: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Página de interacciones de la más reciente a la más antigua
+        `before` es el `next_cursor` de la página anterior (id exclusivo); None empieza por la última
+        """
+        if before is not None and not STREAM_ID_PATTERN.match(before):
+            raise ValueError(f"Cursor inválido: {before}")
+        count = max(1, min(count, self.max_page_size))
+        key = self._key(namespace, user_id, agent_id)
+
+        entries: Optional[List[Tuple[str, str]]] = None
+        try:
+            if redis_service.redis_client:
+                # Uno de más para saber si hay otra página sin una segunda ida y vuelta
+                raw = await redis_service.redis_client.xrevrange(
+                    key, max=f"({before}" if before else "+", min="-", count=count + 1
+                )
+                entries = [(entry_id, fields["data"]) for entry_id, fields in raw]
+        except Exception as e:
+            print(f"Error reading interaction log: {e}")
+
+        if entries is None:
+            local = reversed(self._local.get(key, ()))
+            if before:
+                limit = self._parse_id(before)
+                local = (entry for entry in local if self._parse_id(entry[0]) < limit)
+            entries = [entry for _, entry in zip(range(count + 1), local)]
+
+        page = entries[:count]
+        return {
+            "interactions": [{"id": entry_id, **json.loads(payload)} for entry_id, payload in page],
+            "next_cursor": page[-1][0] if len(entries) > count else None
+        }
+
+    # Internos
+    @staticmethod
+    def _parse_id(entry_id: str) -> Tuple[int, int]:
+        milliseconds, sequence = entry_id.split("-")
+        return int(milliseconds), int(sequence)
+
+    def _next_local_id(self) -> str:
+        """Ids con el mismo formato y orden que los de Redis Streams"""
+        milliseconds = int(time.time() * 1000)
+        last_ms, last_seq = self._last_local_id
+        self._last_local_id = (last_ms, last_seq + 1) if milliseconds <= last_ms else (milliseconds, 0)
+        return f"{self._last_local_id[0]}-{self._last_local_id[1]}"
+
+
+# Instancia global
+interaction_log = InteractionLog()
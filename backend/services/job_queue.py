@@ -0,0 +1,209 @@
+"""
+Cola de trabajos en segundo plano para análisis de IA de larga duración
+El endpoint de envío retorna un job_id; un pool de workers ejecuta el trabajo
+y guarda estado, progreso y resultado en Redis (con TTL) para consultarlo después
+"""
+
+import os
+import json
+import uuid
+import time
+import asyncio
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from services.redis_service import redis_service
+from services.usage_accounting import usage_scope
+from services.deadline import deadline_scope, JOB_DEADLINE_SECONDS
+
+# Estados de un trabajo
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+FINISHED_STATES = (JOB_COMPLETED, JOB_FAILED)
+
+ProgressCallback = Callable[[int, str], None]
+JobHandler = Callable[[Dict[str, Any], ProgressCallback], Awaitable[Any]]
+
+
+class JobQueue:
+    """Pool de workers asyncio con el estado de cada trabajo almacenado en Redis"""
+
+    def __init__(self):
+        self.worker_count = int(os.getenv("AI_JOB_WORKERS", "2"))
+        self.result_ttl = int(os.getenv("AI_JOB_RESULT_TTL_SECONDS", str(24 * 60 * 60)))
+        self.max_pending = int(os.getenv("AI_JOB_MAX_PENDING", "100"))
+
+        self.handlers: Dict[str, JobHandler] = {}
+        self.queue: Optional[asyncio.Queue] = None
+        self.workers = []
+
+        # Respaldo en memoria si Redis no está disponible
+        self._local_jobs: Dict[str, Dict[str, Any]] = {}
+
+    def register(self, job_type: str, handler: JobHandler):
+        """Registra la función que ejecuta un tipo de trabajo"""
+        self.handlers[job_type] = handler
+
+    # Ciclo de vida
+    async def start(self):
+        """Arranca los workers (llamado en el evento startup de la app)"""
+        if self.workers:
+            return
+        self.queue = asyncio.Queue(maxsize=self.max_pending)
+        self.workers = [
+            asyncio.create_task(self._worker(index))
+            for index in range(self.worker_count)
+        ]
+        print(f"🧵 Job queue: {self.worker_count} workers iniciados")
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    # Envío y consulta
+    async def submit(self, job_type: str, user_id: str, payload: Dict[str, Any]) -> str:
+        """Encola un trabajo y retorna su id"""
+        if job_type not in self.handlers:
+            raise ValueError(f"Tipo de trabajo desconocido: {job_type}")
+        if not self.workers:
+            await self.start()
+        if self.queue.full():
+            raise RuntimeError("La cola de trabajos está llena, intenta más tarde")
+
+        self._prune_local_jobs()
+        job_id = uuid.uuid4().hex
+        now = datetime.utcnow().isoformat()
+        await self._save(job_id, {
+            "job_id": job_id,
+            "job_type": job_type,
+            "user_id": user_id,
+            "status": JOB_QUEUED,
+            "progress": 0,
+            "message": "En cola",
+            "created_at": now,
+            "updated_at": now
+        })
+        self.queue.put_nowait((job_id, job_type, user_id, payload))
+        return job_id
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Estado actual del trabajo (con el resultado si ya terminó)"""
+        try:
+            if redis_service.redis_client:
+                data = await redis_service.redis_client.hgetall(f"job:{job_id}")
+                if not data:
+                    return None
+                job = dict(data)
+                job["progress"] = int(job.get("progress", 0))
+                for field in ("result", "error"):
+                    if field in job:
+                        job[field] = json.loads(job[field])
+                return job
+        except Exception as e:
+            print(f"Error getting job {job_id}: {e}")
+        job = self._local_jobs.get(job_id)
+        if not job:
+            return None
+        return {k: v for k, v in job.items() if not k.startswith("_")}
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "workers": len(self.workers),
+            "pending": self.queue.qsize() if self.queue else 0,
+            "max_pending": self.max_pending,
+            "registered_job_types": sorted(self.handlers)
+        }
+
+    # Ejecución
+    async def _worker(self, index: int):
+        while True:
+            job_id, job_type, user_id, payload = await self.queue.get()
+            try:
+                with usage_scope(user=user_id, endpoint=f"job:{job_type}"), \
+                        deadline_scope(JOB_DEADLINE_SECONDS, detached=True):
+                    await self._run(job_id, job_type, payload)
+            finally:
+                self.queue.task_done()
+
+    async def _run(self, job_id: str, job_type: str, payload: Dict[str, Any]):
+        progress_writes: List[asyncio.Task] = []
+
+        def progress(percent: int, message: str):
+            # El handler informa de forma síncrona; la escritura en Redis va en segundo plano
+            progress_writes.append(asyncio.get_running_loop().create_task(self._save(job_id, {
+                "progress": max(0, min(100, int(percent))),
+                "message": message,
+                "updated_at": datetime.utcnow().isoformat()
+            })))
+
+        await self._save(job_id, {
+            "status": JOB_RUNNING,
+            "message": "En ejecución",
+            "started_at": datetime.utcnow().isoformat(),
+            "updated_at": datetime.utcnow().isoformat()
+        })
+
+        try:
+            result = await self.handlers[job_type](payload, progress)
+        except asyncio.CancelledError:
+            await self._finish(job_id, JOB_FAILED, progress_writes, error="Trabajo cancelado al detener el servidor")
+            raise
+        except Exception as e:
+            print(f"❌ Job {job_type}/{job_id} falló: {e}")
+            await self._finish(job_id, JOB_FAILED, progress_writes, error=str(e))
+            return
+
+        await self._finish(job_id, JOB_COMPLETED, progress_writes, result=result)
+
+    async def _finish(
+        self, job_id: str, status: str, progress_writes: List[asyncio.Task],
+        result: Any = None, error: Optional[str] = None
+    ):
+        # El estado final no debe quedar pisado por un progreso que se escriba después
+        await asyncio.gather(*progress_writes, return_exceptions=True)
+        fields = {
+            "status": status,
+            "progress": 100 if status == JOB_COMPLETED else None,
+            "message": "Completado" if status == JOB_COMPLETED else "Error",
+            "finished_at": datetime.utcnow().isoformat(),
+            "updated_at": datetime.utcnow().isoformat()
+        }
+        if status == JOB_COMPLETED:
+            fields["result"] = result
+        else:
+            fields["error"] = error
+        await self._save(job_id, {k: v for k, v in fields.items() if v is not None})
+
+    async def _save(self, job_id: str, fields: Dict[str, Any]):
+        """Actualiza campos del trabajo en Redis (hash con TTL) o en memoria"""
+        try:
+            if redis_service.redis_client:
+                key = f"job:{job_id}"
+                mapping = {
+                    k: json.dumps(v, default=str) if k in ("result", "error") else v
+                    for k, v in fields.items()
+                }
+                pipe = redis_service.redis_client.pipeline(transaction=False)
+                pipe.hset(key, mapping=mapping)
+                pipe.expire(key, self.result_ttl)
+                await pipe.execute()
+                return
+        except Exception as e:
+            print(f"Error saving job {job_id}: {e}")
+        job = self._local_jobs.setdefault(job_id, {})
+        job.update(fields)
+        job["_expires_at"] = time.monotonic() + self.result_ttl
+
+    def _prune_local_jobs(self):
+        now = time.monotonic()
+        expired = [job_id for job_id, job in self._local_jobs.items() if job["_expires_at"] < now]
+        for job_id in expired:
+            del self._local_jobs[job_id]
+
+
+# Instancia global
+job_queue = JobQueue()
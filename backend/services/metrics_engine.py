@@ -0,0 +1,358 @@
+"""
+Motor determinista de métricas financieras
+Runway, LTV/CAC, payback, punto de equilibrio, márgenes, niveles de riesgo y health score calculados
+con numpy sobre columnas completas: una empresa, los periodos de una empresa o cientos de clientes
+de un contador cuestan lo mismo en código. Las preguntas que se responden con fórmulas no pasan por el LLM
+y los agentes reciben estos hechos ya calculados en su prompt.
+"""
+
+import os
+import math
+from typing import Any, Dict, List, Mapping, Sequence
+
+import numpy as np
+
+# Máximo de registros por llamada batch
+METRICS_BATCH_MAX = int(os.getenv("AI_METRICS_BATCH_MAX", "1000"))
+
+# Nombre canónico -> alias aceptados en los payloads existentes (agentes, endpoints, formularios)
+FIELD_ALIASES: Dict[str, Sequence[str]] = {
+    "revenue": ("revenue", "monthly_revenue", "ingresos"),
+    "expenses": ("expenses", "gastos"),
+    "net_profit": ("net_profit", "utilidad_neta"),
+    "cash_flow": ("cash_flow", "flujo_caja"),
+    "ltv": ("ltv",),
+    "coca": ("coca", "cac"),
+    "fixed_costs": ("fixed_costs", "costos_fijos"),
+    "price_per_unit": ("price_per_unit", "precio_por_unidad"),
+    "variable_cost_per_unit": ("variable_cost_per_unit", "costo_variable_unitario"),
+    "marketing_spend": ("marketing_spend",),
+    "new_customers": ("new_customers",),
+    "cash_balance": ("cash_balance", "current_balance"),
+    "monthly_burn": ("monthly_burn", "burn_rate", "monthly_expenses"),
+    "customer_concentration": ("customer_concentration",),
+    "debt_to_equity": ("debt_to_equity",),
+}
+
+# Umbrales (medio, alto) de cada nivel de riesgo; "lower" = valores bajos son los riesgosos
+RISK_THRESHOLDS = {
+    "runway_risk": ("runway_months", 6, 3, "lower"),
+    "liquidity_risk": ("runway_months", 12, 6, "lower"),
+    "concentration_risk": ("customer_concentration", 15, 25, "higher"),
+    "financial_risk": ("debt_to_equity", 1, 2, "higher"),
+}
+
+# (umbral mínimo, puntos) de mayor a menor; por debajo del último se aplica la fórmula de cola
+HEALTH_BANDS = {
+    "profitability": ((20, 25), (15, 20), (10, 15), (5, 10)),
+    "unit_economics": ((5, 25), (3, 20), (2, 15), (1, 10)),
+    "cash_flow": ((15, 25), (10, 20), (5, 15), (0, 10)),
+    "growth_efficiency": ((60, 25), (40, 20), (30, 15), (20, 10)),
+}
+HEALTH_INPUTS = {
+    "profitability": "net_margin_pct",
+    "unit_economics": "ltv_cac_ratio",
+    "cash_flow": "cash_flow_margin_pct",
+    "growth_efficiency": "contribution_margin_pct",
+}
+
+
+def _divide(numerator: np.ndarray, denominator: np.ndarray, fill: float = 0.0) -> np.ndarray:
+    """División elemento a elemento; denominador <= 0 devuelve `fill` (NaN se propaga)"""
+    valid = denominator > 0
+    result = np.full(np.broadcast(numerator, denominator).shape, fill, dtype=float)
+    np.divide(numerator, denominator, out=result, where=valid)
+    missing = np.isnan(numerator) | np.isnan(denominator)
+    result[missing] = np.nan
+    return result
+
+
+def _band_score(values: np.ndarray, bands, tail) -> np.ndarray:
+    conditions = [values >= threshold for threshold, _ in bands]
+    choices = [np.full(values.shape, float(points)) for _, points in bands]
+    scores = np.select(conditions, choices, default=tail)
+    scores[np.isnan(values)] = np.nan
+    return scores
+
+
+def _risk_level(values: np.ndarray, medium: float, high: float, direction: str) -> np.ndarray:
+    if direction == "lower":
+        conditions = [values < high, values < medium]
+    else:
+        conditions = [values > high, values > medium]
+    levels = np.select(conditions, ["Alto", "Medio"], default="Bajo").astype(object)
+    levels[np.isnan(values)] = None
+    return levels
+
+
+def _clean(value: Any) -> Any:
+    """numpy -> tipos JSON; NaN/inf pasan a None"""
+    if isinstance(value, (np.floating, float)):
+        value = float(value)
+        return round(value, 2) if math.isfinite(value) else None
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
+
+
+def _first_present(record: Mapping[str, Any], aliases: Sequence[str]) -> float:
+    """Primer alias con valor numérico; NaN si el campo no viene"""
+    for alias in aliases:
+        value = record.get(alias)
+        if value is not None and value != "":
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                return np.nan
+    return np.nan
+
+
+class MetricsEngine:
+    """Métricas financieras vectorizadas sobre columnas (una fila = empresa o periodo)"""
+
+    def columns_from_records(self, records: Sequence[Mapping[str, Any]]) -> Dict[str, np.ndarray]:
+        """Registros -> columnas float; campos ausentes quedan como NaN"""
+        return {
+            field: np.array([_first_present(record, aliases) for record in records], dtype=float)
+            for field, aliases in FIELD_ALIASES.items()
+        }
+
+    def compute(self, columns: Mapping[str, Sequence[float]]) -> Dict[str, np.ndarray]:
+        """Métricas derivadas, niveles de riesgo y health score para todas las filas a la vez"""
+        size = max((len(values) for values in columns.values()), default=0)
+        col = {
+            field: np.asarray(columns[field], dtype=float) if field in columns else np.full(size, np.nan)
+            for field in FIELD_ALIASES
+        }
+        out: Dict[str, np.ndarray] = {}
+
+        out["net_margin_pct"] = _divide(col["net_profit"], col["revenue"]) * 100
+        out["cash_flow_margin_pct"] = _divide(col["cash_flow"], col["revenue"]) * 100
+        out["expense_ratio_pct"] = _divide(col["expenses"], col["revenue"], fill=1.0) * 100
+
+        contribution = col["price_per_unit"] - col["variable_cost_per_unit"]
+        out["contribution_margin"] = contribution
+        out["contribution_margin_pct"] = _divide(contribution, col["price_per_unit"]) * 100
+
+        # CAC declarado o, si falta, gasto de marketing / clientes nuevos
+        coca = np.where(
+            np.isnan(col["coca"]),
+            _divide(col["marketing_spend"], col["new_customers"], fill=np.nan),
+            col["coca"]
+        )
+        out["coca"] = coca
+        out["ltv_cac_ratio"] = _divide(col["ltv"], coca)
+        out["payback_months"] = _divide(coca, contribution, fill=np.nan)
+
+        out["break_even_units"] = _divide(col["fixed_costs"], contribution, fill=np.nan)
+        out["break_even_revenue"] = _divide(col["fixed_costs"], out["contribution_margin_pct"] / 100, fill=np.nan)
+
+        # Sin quema de caja el runway es infinito (riesgo bajo)
+        out["runway_months"] = _divide(col["cash_balance"], col["monthly_burn"], fill=np.inf)
+        out["customer_concentration"] = col["customer_concentration"]
+        out["debt_to_equity"] = col["debt_to_equity"]
+
+        for risk, (source, medium, high, direction) in RISK_THRESHOLDS.items():
+            out[risk] = _risk_level(out[source], medium, high, direction)
+
+        out.update(self._health_score(out))
+        return out
+
+    def _health_score(self, metrics: Mapping[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Cuatro componentes de 0-25; sin datos para un componente el total se reescala a 100"""
+        profitability = metrics[HEALTH_INPUTS["profitability"]]
+        ratio = metrics[HEALTH_INPUTS["unit_economics"]]
+        cash_flow = metrics[HEALTH_INPUTS["cash_flow"]]
+        contribution = metrics[HEALTH_INPUTS["growth_efficiency"]]
+
+        components = {
+            "profitability": _band_score(profitability, HEALTH_BANDS["profitability"], np.maximum(0, 5 + profitability)),
+            "unit_economics": _band_score(ratio, HEALTH_BANDS["unit_economics"], 0.0),
+            "cash_flow": _band_score(cash_flow, HEALTH_BANDS["cash_flow"], np.maximum(0, 10 + cash_flow * 2)),
+            "growth_efficiency": _band_score(contribution, HEALTH_BANDS["growth_efficiency"], np.maximum(0, contribution / 4)),
+        }
+        stacked = np.vstack(list(components.values()))
+        available = (~np.isnan(stacked)).sum(axis=0)
+        total = np.where(
+            available > 0,
+            np.nansum(stacked, axis=0) * len(components) / np.maximum(available, 1),
+            np.nan
+        )
+
+        level = np.select(
+            [total >= 80, total >= 60, total >= 40, ~np.isnan(total)],
+            ["Excelente", "Bueno", "Regular", "Crítico"],
+            default="Sin datos"
+        ).astype(object)
+        priority = np.select(
+            [total < 60, total < 80, ~np.isnan(total)],
+            ["Alta", "Media", "Mantenimiento"],
+            default="Alta"
+        ).astype(object)
+
+        result = {f"score_{name}": values for name, values in components.items()}
+        result.update(health_score=total, health_level=level, recommendations_priority=priority)
+        return result
+
+    def evaluate(self, records: Sequence[Mapping[str, Any]]) -> List[Dict[str, Any]]:
+        """API batch: lista de empresas/periodos -> lista de resultados en el mismo orden"""
+        if not records:
+            return []
+        metrics = self.compute(self.columns_from_records(records))
+        results = []
+        for index, record in enumerate(records):
+            row = {name: _clean(values[index]) for name, values in metrics.items()}
+            results.append({
+                "id": record.get("id") or record.get("company_id") or record.get("period"),
+                "metrics": {
+                    name: row[name] for name in (
+                        "net_margin_pct", "cash_flow_margin_pct", "expense_ratio_pct",
+                        "contribution_margin", "contribution_margin_pct", "coca", "ltv_cac_ratio",
+                        "payback_months", "break_even_units", "break_even_revenue", "runway_months"
+                    )
+                },
+                "risk": {risk: row[risk] for risk in RISK_THRESHOLDS},
+                "health_score": self._health_payload(row)
+            })
+        return results
+
+    def evaluate_one(self, record: Mapping[str, Any]) -> Dict[str, Any]:
+        return self.evaluate([record])[0]
+
+    @staticmethod
+    def _health_payload(row: Mapping[str, Any]) -> Dict[str, Any]:
+        """Mismo formato que devolvían los cálculos escalares de health score"""
+        return {
+            "total_score": row["health_score"] if row["health_score"] is not None else 0,
+            "health_level": row["health_level"],
+            "component_scores": {
+                name: row[f"score_{name}"] for name in HEALTH_BANDS if row[f"score_{name}"] is not None
+            },
+            "recommendations_priority": row["recommendations_priority"]
+        }
+
+    def health_score(self, record: Mapping[str, Any]) -> Dict[str, Any]:
+        return self.evaluate_one(record)["health_score"]
+
+    def summarize(self, results: Sequence[Mapping[str, Any]]) -> Dict[str, Any]:
+        """Resumen de cartera para el contador: promedio, distribución por nivel y alertas"""
+        scores = np.array([result["health_score"]["total_score"] for result in results], dtype=float)
+        levels: Dict[str, int] = {}
+        for result in results:
+            level = result["health_score"]["health_level"]
+            levels[level] = levels.get(level, 0) + 1
+        high_risk = [
+            result["id"] for result in results
+            if "Alto" in result["risk"].values()
+        ]
+        return {
+            "count": len(results),
+            "avg_health_score": _clean(scores.mean()) if len(scores) else None,
+            "by_health_level": levels,
+            "high_risk_ids": high_risk
+        }
+
+    def facts(self, *sources: Mapping[str, Any]) -> Dict[str, Any]:
+        """Hechos ya calculados para el prompt de un agente (solo los que tienen datos)"""
+        record: Dict[str, Any] = {}
+        for source in sources:
+            if isinstance(source, Mapping):
+                record.update({key: value for key, value in source.items() if isinstance(value, (int, float))})
+        result = self.evaluate_one(record)
+        facts = {name: value for name, value in result["metrics"].items() if value is not None}
+        facts.update({risk: level for risk, level in result["risk"].items() if level is not None})
+        if result["health_score"]["component_scores"]:
+            facts["health_score"] = result["health_score"]["total_score"]
+            facts["health_level"] = result["health_score"]["health_level"]
+        return facts
+
+
+def quick_recommendations(result: Mapping[str, Any], cash_flow: float = 0) -> Dict[str, Any]:
+    """Recomendaciones basadas solo en reglas sobre las métricas calculadas (sin LLM)"""
+    metrics = result["metrics"]
+    ltv_coca_ratio = metrics["ltv_cac_ratio"] or 0
+    net_margin = metrics["net_margin_pct"] or 0
+    contribution_margin_pct = metrics["contribution_margin_pct"] or 0
+    recommendations = []
+
+    if ltv_coca_ratio < 3:
+        recommendations.append({
+            "category": "unit_economics",
+            "priority": "Alta",
+            "title": "Optimizar Ratio LTV/COCA",
+            "description": f"Tu ratio LTV/COCA es {ltv_coca_ratio:.1f}x, por debajo del mínimo recomendado de 3x. Considera reducir costos de adquisición o aumentar el valor del cliente.",
+            "actions": [
+                "Revisar canales de marketing más eficientes",
+                "Implementar estrategias de retención",
+                "Optimizar el precio o reducir costos variables"
+            ]
+        })
+
+    if net_margin < 10:
+        recommendations.append({
+            "category": "profitability",
+            "priority": "Alta",
+            "title": "Mejorar Margen Neto",
+            "description": f"Tu margen neto de {net_margin:.1f}% está por debajo del 10% recomendado. Es crucial mejorar la rentabilidad.",
+            "actions": [
+                "Revisar estructura de costos",
+                "Optimizar precios",
+                "Eliminar gastos innecesarios"
+            ]
+        })
+
+    if contribution_margin_pct < 30:
+        recommendations.append({
+            "category": "pricing",
+            "priority": "Media",
+            "title": "Aumentar Margen de Contribución",
+            "description": f"Tu margen de contribución de {contribution_margin_pct:.1f}% podría mejorarse para tener más flexibilidad financiera.",
+            "actions": [
+                "Analizar posibilidad de aumento de precios",
+                "Optimizar costos variables",
+                "Añadir servicios de mayor valor"
+            ]
+        })
+
+    if cash_flow < 0:
+        recommendations.append({
+            "category": "cash_flow",
+            "priority": "Crítica",
+            "title": "Resolver Flujo de Caja Negativo",
+            "description": "Tu flujo de caja es negativo, lo que representa un riesgo inmediato para la operación.",
+            "actions": [
+                "Acelerar cobros a clientes",
+                "Negociar términos de pago con proveedores",
+                "Reducir gastos no esenciales",
+                "Considerar línea de crédito de emergencia"
+            ]
+        })
+
+    if not recommendations and ltv_coca_ratio >= 3 and net_margin >= 15:
+        recommendations.append({
+            "category": "growth",
+            "priority": "Media",
+            "title": "Acelerar Crecimiento",
+            "description": "Tus métricas financieras son saludables. Es momento de considerar estrategias de crecimiento.",
+            "actions": [
+                "Invertir más en marketing con ROI comprobado",
+                "Expandir a nuevos mercados o segmentos",
+                "Desarrollar nuevos productos/servicios",
+                "Optimizar operaciones para escalar"
+            ]
+        })
+
+    overall_status = (
+        "Crítico" if any(r["priority"] == "Crítica" for r in recommendations) else
+        "Necesita atención" if any(r["priority"] == "Alta" for r in recommendations) else
+        "Saludable"
+    )
+    return {
+        "recommendations": recommendations,
+        "summary": f"Analizadas {len(recommendations)} áreas prioritarias",
+        "overall_status": overall_status
+    }
+
+
+# Instancia global
+metrics_engine = MetricsEngine()
@@ -0,0 +1,181 @@
+"""
+Cascada de modelos: primero el modelo rápido, escalar al de razonamiento solo si hace falta
+La respuesta de GPT-4o-mini pasa por verificaciones baratas (longitud, secciones requeridas,
+coherencia con las cifras de entrada); si alguna falla se repite la petición con DeepSeek R1
+"""
+
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+
+@dataclass
+class CascadeRule:
+    """Criterios de aceptación de la respuesta rápida para un tipo de tarea"""
+    min_chars: int = 200
+    # Cada sección es una expresión regular; basta con que aparezca una de sus alternativas
+    required_sections: List[str] = field(default_factory=list)
+
+
+DEFAULT_CASCADE_RULES: Dict[str, CascadeRule] = {
+    "financial_chat": CascadeRule(min_chars=80),
+    "complex_financial_analysis": CascadeRule(
+        min_chars=400,
+        required_sections=[r"recomend|sugier|acci[oó]n"]
+    ),
+    "general_financial_analysis": CascadeRule(
+        min_chars=300,
+        required_sections=[r"recomend|sugier|acci[oó]n"]
+    ),
+    "complex_cash_flow_analysis": CascadeRule(
+        min_chars=600,
+        required_sections=[r"riesgo", r"proyecci|escenario", r"kpi|indicador|m[eé]trica", r"plan|acci[oó]n|paso"]
+    ),
+    "complex_unit_economics_analysis": CascadeRule(
+        min_chars=600,
+        required_sections=[r"ltv|cac", r"equilibrio|break.?even", r"recomend|mejora|optimiz"]
+    ),
+    "complex_pricing_strategy": CascadeRule(
+        min_chars=600,
+        required_sections=[r"precio|pricing", r"margen", r"implementa|plan|fase"]
+    ),
+}
+
+DEFAULT_CASCADE_TASK_TYPES = ",".join(DEFAULT_CASCADE_RULES)
+
+# Tolerancia relativa al comparar una cifra citada con la de entrada
+NUMERIC_TOLERANCE = 0.02
+
+_INPUT_METRIC = re.compile(r'"?([A-Za-z_][A-Za-z0-9_]{2,})"?\s*[:=]\s*(-?\d+(?:\.\d+)?)')
+_NUMBER = r"(-?\d[\d.,]*)"
+
+
+def _load_rules() -> Dict[str, CascadeRule]:
+    """Reglas por defecto; AI_CASCADE_MIN_CHARS=tarea=caracteres,... ajusta la longitud mínima"""
+    rules = {task: CascadeRule(rule.min_chars, list(rule.required_sections)) for task, rule in DEFAULT_CASCADE_RULES.items()}
+    for entry in os.getenv("AI_CASCADE_MIN_CHARS", "").split(","):
+        if "=" not in entry:
+            continue
+        task_type, chars = entry.split("=", 1)
+        try:
+            rules.setdefault(task_type.strip(), CascadeRule()).min_chars = int(chars)
+        except ValueError:
+            print(f"⚠️ Longitud mínima de cascada inválida ignorada: {entry}")
+    return rules
+
+
+def _parse_number(raw: str) -> Optional[float]:
+    """Número citado en texto: admite separadores de miles con coma o punto"""
+    raw = raw.rstrip(".,")
+    if re.fullmatch(r"-?\d{1,3}(?:[.,]\d{3})+", raw):
+        raw = re.sub(r"[.,]", "", raw)
+    else:
+        raw = raw.replace(",", ".")
+    try:
+        return float(raw)
+    except ValueError:
+        return None
+
+
+def _flatten_numbers(value: Any, prefix: str = "") -> Iterator[Tuple[str, float]]:
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from _flatten_numbers(item, str(key))
+    elif isinstance(value, (int, float)) and not isinstance(value, bool) and prefix:
+        yield prefix, float(value)
+
+
+def input_metrics(prompt: str, context: Optional[Dict[str, Any]] = None) -> Dict[str, float]:
+    """Métricas nombradas de la entrada (JSON compacto del prompt y contexto)"""
+    metrics = {key: float(value) for key, value in _INPUT_METRIC.findall(prompt)}
+    metrics.update(_flatten_numbers(context or {}))
+    return {key: value for key, value in metrics.items() if value != 0 and len(key) >= 3}
+
+
+def _consistent(quoted: float, expected: float) -> bool:
+    """La cifra citada coincide con la de entrada (directa, o como porcentaje de un ratio)"""
+    for candidate in (expected, expected * 100, expected / 100):
+        if abs(quoted - candidate) <= NUMERIC_TOLERANCE * abs(candidate):
+            return True
+    return False
+
+
+def numeric_mismatches(answer: str, metrics: Dict[str, float]) -> List[str]:
+    """Métricas que la respuesta cita con un valor distinto al de la entrada"""
+    text = answer.lower()
+    mismatches = []
+    for key, expected in metrics.items():
+        label = re.escape(key.lower().replace("_", " "))
+        pattern = label + r"\s*(?:actual\s*)?(?:de|es|era|:|=)?\s*(?:\$|us\$)?\s*" + _NUMBER
+        for match in re.finditer(pattern, text):
+            quoted = _parse_number(match.group(1))
+            if quoted is not None and not _consistent(quoted, expected):
+                mismatches.append(key)
+                break
+    return mismatches
+
+
+class CascadePolicy:
+    """Tipos de tarea en cascada, verificaciones de la respuesta rápida y métricas de escalamiento"""
+
+    def __init__(self):
+        self.enabled = os.getenv("AI_CASCADE_ENABLED", "true").lower() == "true"
+        task_types = os.getenv("AI_CASCADE_TASK_TYPES", DEFAULT_CASCADE_TASK_TYPES)
+        self.task_types: Set[str] = {t.strip() for t in task_types.split(",") if t.strip()}
+        self.rules = _load_rules()
+
+        self.drafts: Counter = Counter()
+        self.escalations: Counter = Counter()
+        self.draft_errors: Counter = Counter()
+        self.failed_checks: Counter = Counter()
+
+    def applies(self, task_type: str) -> bool:
+        return self.enabled and ("*" in self.task_types or task_type in self.task_types)
+
+    def evaluate(self, task_type: str, answer: str, prompt: str, context: Optional[Dict[str, Any]] = None) -> List[str]:
+        """Verificaciones que no pasa la respuesta rápida (vacío = aceptada)"""
+        rule = self.rules.get(task_type, CascadeRule())
+        failures = []
+        text = (answer or "").strip()
+        if len(text) < rule.min_chars:
+            failures.append("length")
+        lowered = text.lower()
+        for section in rule.required_sections:
+            if not re.search(section, lowered):
+                failures.append(f"section:{section.split('|')[0]}")
+        failures.extend(f"numeric:{key}" for key in numeric_mismatches(text, input_metrics(prompt, context)))
+        return failures
+
+    def record(self, task_type: str, failures: List[str]):
+        self.drafts[task_type] += 1
+        if failures:
+            self.escalations[task_type] += 1
+            self.failed_checks.update(failure.split(":")[0] for failure in failures)
+
+    def record_draft_error(self, task_type: str):
+        self.drafts[task_type] += 1
+        self.escalations[task_type] += 1
+        self.draft_errors[task_type] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        drafts = sum(self.drafts.values())
+        escalations = sum(self.escalations.values())
+        return {
+            "enabled": self.enabled,
+            "task_types": sorted(self.task_types),
+            "drafts": drafts,
+            "escalations": escalations,
+            "escalation_rate": round(escalations / drafts, 3) if drafts else 0.0,
+            "failed_checks": dict(self.failed_checks),
+            "by_task_type": {
+                task_type: {
+                    "drafts": count,
+                    "escalations": self.escalations[task_type],
+                    "draft_errors": self.draft_errors[task_type],
+                    "escalation_rate": round(self.escalations[task_type] / count, 3)
+                }
+                for task_type, count in self.drafts.items()
+            }
+        }
@@ -0,0 +1,164 @@
+"""
+Construcción compacta de prompts y presupuestos de salida por tipo de tarea
+Menos tokens de entrada y salida = menor latencia y costo en cada llamada
+"""
+
+import os
+import json
+from typing import Any, Dict, Optional
+
+# Límites por defecto de la serialización compacta
+DEFAULT_FLOAT_DIGITS = 2
+# Por debajo de 1 se conservan cifras significativas y no decimales (un churn de 0.004 no es 0)
+SMALL_FLOAT_SIGNIFICANT_DIGITS = 3
+DEFAULT_MAX_LIST_ITEMS = 12
+DEFAULT_MAX_STRING_CHARS = 1500
+
+# Presupuesto de tokens de salida por tipo de tarea
+DEFAULT_OUTPUT_BUDGETS: Dict[str, int] = {
+    "financial_chat": 700,
+    "complex_financial_analysis": 1500,
+    "complex_cash_flow_analysis": 1500,
+    "complex_unit_economics_analysis": 1500,
+    "complex_pricing_strategy": 1500,
+    "general_financial_analysis": 1000,
+    "complex_reasoning_analysis": 1800,
+    "kpi_definitions": 400,
+    "simple_query": 500,
+    "agent_consultation": 1200,
+    "agent_structured": 700,
+    "agent_digest": 250,
+    "executive_summary": 450,
+    "conversation_summary": 250,
+    "general": 1000,
+}
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+
+def _round_float(value: float, digits: int = DEFAULT_FLOAT_DIGITS) -> float:
+    """Decimales fijos para magnitudes >= 1 y cifras significativas para ratios pequeños"""
+    if value == 0 or abs(value) >= 1:
+        return round(value, digits)
+    return float(f"{value:.{SMALL_FLOAT_SIGNIFICANT_DIGITS}g}")
+
+
+def _summarize_dropped(items: list) -> Dict[str, Any]:
+    """Resumen de los elementos omitidos de una lista larga"""
+    summary: Dict[str, Any] = {"omitted_items": len(items)}
+    numbers = [x for x in items if isinstance(x, (int, float)) and not isinstance(x, bool)]
+    if numbers and len(numbers) == len(items):
+        summary.update({
+            "min": _round_float(min(numbers)),
+            "max": _round_float(max(numbers)),
+            "avg": _round_float(sum(numbers) / len(numbers)),
+        })
+    return summary
+
+
+def compact_value(
+    value: Any,
+    float_digits: int = DEFAULT_FLOAT_DIGITS,
+    max_list_items: int = DEFAULT_MAX_LIST_ITEMS,
+    max_string_chars: int = DEFAULT_MAX_STRING_CHARS
+) -> Any:
+    """
+    Normaliza un valor para el prompt: elimina campos nulos/vacíos, redondea flotantes,
+    trunca listas largas (conservando inicio y final con un resumen) y cadenas largas
+    """
+    options = dict(float_digits=float_digits, max_list_items=max_list_items, max_string_chars=max_string_chars)
+
+    if isinstance(value, dict):
+        compacted = {}
+        for key, item in value.items():
+            item = compact_value(item, **options)
+            if not _is_empty(item):
+                compacted[key] = item
+        return compacted
+
+    if isinstance(value, (list, tuple)):
+        items = [compact_value(item, **options) for item in value]
+        items = [item for item in items if not _is_empty(item)]
+        if len(items) > max_list_items:
+            head = max_list_items // 2
+            tail = max_list_items - head
+            omitted = items[head:len(items) - tail]
+            return items[:head] + [_summarize_dropped(omitted)] + items[-tail:]
+        return items
+
+    if isinstance(value, float):
+        if value != value or value in (float("inf"), float("-inf")):
+            return str(value)
+        rounded = _round_float(value, float_digits)
+        return int(rounded) if rounded.is_integer() else rounded
+
+    if isinstance(value, str) and len(value) > max_string_chars:
+        return value[:max_string_chars] + "…"
+
+    if hasattr(value, "model_dump"):
+        return compact_value(value.model_dump(), **options)
+    if hasattr(value, "dict") and callable(value.dict):
+        return compact_value(value.dict(), **options)
+
+    return value
+
+
+def compact_json(value: Any, **options) -> str:
+    """Serialización compacta para prompts: sin indentación ni espacios sobrantes"""
+    return json.dumps(
+        compact_value(value, **options),
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=str
+    )
+
+
+_encoder = None
+
+
+def count_tokens(text: str) -> int:
+    """Cuenta tokens del prompt con tiktoken; estimación de ~4 caracteres por token si no está disponible"""
+    global _encoder
+    try:
+        if _encoder is None:
+            import tiktoken
+            _encoder = tiktoken.get_encoding("cl100k_base")
+        return len(_encoder.encode(text))
+    except Exception:
+        return max(1, len(text) // 4)
+
+
+def check_tokens(text: str, max_tokens: int = 3000) -> bool:
+    """Indica si el texto cabe en el límite de tokens de entrada"""
+    token_count = count_tokens(text)
+    if token_count > max_tokens:
+        print(f"⚠️ Texto excede {max_tokens} tokens ({token_count})")
+        return False
+    return True
+
+
+def _load_output_budgets() -> Dict[str, int]:
+    """Presupuestos por defecto sobrescribibles con AI_OUTPUT_BUDGETS=tarea=tokens,..."""
+    budgets = dict(DEFAULT_OUTPUT_BUDGETS)
+    overrides = os.getenv("AI_OUTPUT_BUDGETS", "")
+    for entry in overrides.split(","):
+        if "=" not in entry:
+            continue
+        task_type, tokens = entry.split("=", 1)
+        try:
+            budgets[task_type.strip()] = int(tokens)
+        except ValueError:
+            print(f"⚠️ Presupuesto de salida inválido ignorado: {entry}")
+    return budgets
+
+
+OUTPUT_BUDGETS = _load_output_budgets()
+
+
+def output_budget(task_type: Optional[str]) -> int:
+    """Máximo de tokens de salida para un tipo de tarea"""
+    if task_type and task_type in OUTPUT_BUDGETS:
+        return OUTPUT_BUDGETS[task_type]
+    return OUTPUT_BUDGETS.get("general", 1000)
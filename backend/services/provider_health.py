@@ -0,0 +1,230 @@
+"""
+Salud en vivo de los proveedores de IA
+Latencia EWMA, tasa de error y circuit breaker por proveedor para el enrutamiento adaptativo
+"""
+
+import os
+import time
+from collections import deque
+from enum import Enum
+from typing import Dict, Any, Optional
+
+
+class CircuitState(Enum):
+    """Estados del circuit breaker de un proveedor"""
+    CLOSED = "closed"          # Tráfico normal
+    OPEN = "open"              # Proveedor descartado hasta que expire el enfriamiento
+    HALF_OPEN = "half_open"    # Se permite una petición de prueba para recuperarlo
+
+
+class ProviderHealth:
+    """Estadísticas en vivo de un proveedor: latencia EWMA, errores recientes y circuit breaker"""
+
+    def __init__(
+        self,
+        name: str,
+        slow_latency_seconds: float,
+        ewma_alpha: float = 0.3,
+        window_size: int = 50,
+        failure_threshold: int = 3,
+        error_rate_threshold: float = 0.5,
+        open_seconds: float = 30.0,
+        min_samples: int = 5
+    ):
+        self.name = name
+        self.slow_latency_seconds = slow_latency_seconds
+        self.ewma_alpha = ewma_alpha
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate_threshold
+        self.open_seconds = open_seconds
+        self.min_samples = min_samples
+
+        self.ewma_latency: Optional[float] = None
+        self.outcomes: deque = deque(maxlen=window_size)    # True = éxito
+        self.latencies: deque = deque(maxlen=window_size)   # Latencias de respuestas exitosas
+        self.consecutive_failures = 0
+        self.total_requests = 0
+        self.total_failures = 0
+
+        self.state = CircuitState.CLOSED
+        self.opened_at: Optional[float] = None
+        self.probe_in_flight = False
+
+    # Registro de resultados
+    def record_success(self, latency: float):
+        """Registra una respuesta exitosa y su latencia"""
+        self.total_requests += 1
+        self.outcomes.append(True)
+        self.latencies.append(latency)
+        self._update_ewma(latency)
+        self.consecutive_failures = 0
+
+        if self.state != CircuitState.CLOSED:
+            print(f"✅ Circuit breaker {self.name}: recuperado tras prueba exitosa")
+        self.state = CircuitState.CLOSED
+        self.opened_at = None
+        self.probe_in_flight = False
+
+    def record_failure(self, latency: Optional[float] = None):
+        """Registra un fallo; abre el circuito si se superan los umbrales"""
+        self.total_requests += 1
+        self.total_failures += 1
+        self.outcomes.append(False)
+        self.consecutive_failures += 1
+
+        # Un fallo lento también cuenta para la latencia percibida
+        if latency is not None:
+            self._update_ewma(latency)
+
+        if self.state == CircuitState.HALF_OPEN:
+            self._open()
+        elif self.consecutive_failures >= self.failure_threshold:
+            self._open()
+        elif len(self.outcomes) >= self.min_samples and self.error_rate >= self.error_rate_threshold:
+            self._open()
+
+    def record_cancelled(self, latency: float):
+        """Petición cancelada (p. ej. perdedora de un hedge): solo aporta una cota de latencia"""
+        self._update_ewma(latency)
+        self.probe_in_flight = False
+
+    def release_probe(self):
+        """Libera la prueba half-open reservada por una petición que nunca llegó al proveedor"""
+        self.probe_in_flight = False
+
+    def _update_ewma(self, latency: float):
+        if self.ewma_latency is None:
+            self.ewma_latency = latency
+        else:
+            self.ewma_latency = self.ewma_alpha * latency + (1 - self.ewma_alpha) * self.ewma_latency
+
+    def _open(self):
+        if self.state != CircuitState.OPEN:
+            print(f"🔌 Circuit breaker {self.name}: abierto ({self.consecutive_failures} fallos consecutivos)")
+        self.state = CircuitState.OPEN
+        self.opened_at = time.monotonic()
+        self.probe_in_flight = False
+
+    # Consultas de estado
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def is_degraded(self) -> bool:
+        """Lento o con demasiados errores, aunque el circuito siga cerrado"""
+        if self.state != CircuitState.CLOSED:
+            return True
+        if self.ewma_latency is not None and self.ewma_latency > self.slow_latency_seconds:
+            return True
+        if len(self.outcomes) >= self.min_samples and self.error_rate >= self.error_rate_threshold:
+            return True
+        return False
+
+    def allow_request(self) -> bool:
+        """Indica si se puede enviar tráfico; en half-open solo deja pasar una prueba"""
+        if self.state == CircuitState.CLOSED:
+            return True
+
+        if self.state == CircuitState.OPEN:
+            if self.opened_at is not None and time.monotonic() - self.opened_at >= self.open_seconds:
+                self.state = CircuitState.HALF_OPEN
+                self.probe_in_flight = False
+            else:
+                return False
+
+        # HALF_OPEN: una sola petición de prueba a la vez
+        if self.probe_in_flight:
+            return False
+        self.probe_in_flight = True
+        return True
+
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        """Percentil (0-100) de las latencias recientes exitosas"""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, max(0, int(round(percentile / 100 * (len(ordered) - 1)))))
+        return ordered[index]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Estadísticas en vivo para get_service_status"""
+        return {
+            "state": self.state.value,
+            "degraded": self.is_degraded(),
+            "ewma_latency_seconds": round(self.ewma_latency, 3) if self.ewma_latency is not None else None,
+            "p95_latency_seconds": self.latency_percentile(95),
+            "error_rate": round(self.error_rate, 3),
+            "consecutive_failures": self.consecutive_failures,
+            "window_samples": len(self.outcomes),
+            "total_requests": self.total_requests,
+            "total_failures": self.total_failures
+        }
+
+
+class ProviderHealthRegistry:
+    """Registro de salud de todos los proveedores con la política de enrutamiento"""
+
+    def __init__(self):
+        self.probe_every = int(os.getenv("AI_HEALTH_PROBE_EVERY", "20"))
+        self._requests_since_probe: Dict[str, int] = {}
+        self.providers: Dict[str, ProviderHealth] = {
+            "deepseek": self._build("deepseek", default_slow_latency="25"),
+            "openai": self._build("openai", default_slow_latency="10"),
+        }
+
+    def _build(self, name: str, default_slow_latency: str) -> ProviderHealth:
+        return ProviderHealth(
+            name=name,
+            slow_latency_seconds=float(os.getenv(f"AI_{name.upper()}_SLOW_LATENCY_SECONDS", default_slow_latency)),
+            ewma_alpha=float(os.getenv("AI_HEALTH_EWMA_ALPHA", "0.3")),
+            window_size=int(os.getenv("AI_HEALTH_WINDOW_SIZE", "50")),
+            failure_threshold=int(os.getenv("AI_BREAKER_FAILURE_THRESHOLD", "3")),
+            error_rate_threshold=float(os.getenv("AI_BREAKER_ERROR_RATE", "0.5")),
+            open_seconds=float(os.getenv("AI_BREAKER_OPEN_SECONDS", "30"))
+        )
+
+    def get(self, name: str) -> ProviderHealth:
+        return self.providers[name]
+
+    def _should_probe(self, name: str) -> bool:
+        """Envía una fracción del tráfico a un proveedor degradado para refrescar sus estadísticas"""
+        count = self._requests_since_probe.get(name, 0) + 1
+        if count >= self.probe_every:
+            self._requests_since_probe[name] = 0
+            return True
+        self._requests_since_probe[name] = count
+        return False
+
+    def choose(self, preferred: str, alternative: Optional[str]) -> Optional[str]:
+        """
+        Elige proveedor: el preferido salvo que esté degradado o con el circuito abierto
+        y el alternativo esté sano. Retorna None si ninguno admite tráfico.
+        """
+        preferred_health = self.providers[preferred]
+        alternative_health = self.providers[alternative] if alternative else None
+
+        if not preferred_health.is_degraded():
+            return preferred
+
+        alternative_healthy = alternative_health is not None and not alternative_health.is_degraded()
+
+        if alternative_healthy:
+            # Tráfico de prueba hacia el preferido para detectar su recuperación
+            if preferred_health.state == CircuitState.CLOSED:
+                if self._should_probe(preferred):
+                    return preferred
+            elif preferred_health.allow_request():
+                return preferred
+            return alternative
+
+        # Ambos degradados: el preferido si admite tráfico, si no el alternativo
+        if preferred_health.allow_request():
+            return preferred
+        if alternative_health is not None and alternative_health.allow_request():
+            return alternative
+        return None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {name: health.snapshot() for name, health in self.providers.items()}
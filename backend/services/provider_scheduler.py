@@ -0,0 +1,209 @@
+"""
+Planificador de llamadas LLM con bulkheads por proveedor
+Límite de concurrencia por proveedor y colas separadas por prioridad
+(interactiva, background, batch) con tiempo máximo de espera en cola
+"""
+
+import os
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Any, Deque, Dict, Iterator, Optional
+
+
+class Priority(IntEnum):
+    """Clases de prioridad; menor valor = se atiende primero"""
+    INTERACTIVE = 0    # Chat y consultas del usuario en vivo
+    BACKGROUND = 1     # Reportes y análisis que el usuario espera sin bloquear la UI
+    BATCH = 2          # Trabajos masivos sin usuario esperando
+
+
+# Tipos de tarea que por defecto no son interactivos
+BACKGROUND_TASK_PREFIXES = ("complex_", "general_financial_analysis", "executive_summary")
+
+
+class QueueTimeoutError(Exception):
+    """La petición superó su tiempo máximo de espera en cola"""
+
+    def __init__(self, provider: str, priority: Priority, waited: float):
+        self.provider = provider
+        self.priority = priority
+        self.waited = waited
+        super().__init__(
+            f"Timeout en cola de {provider} ({priority.name.lower()}) tras {waited:.1f}s"
+        )
+
+
+# Prioridad de las llamadas LLM hechas dentro de un bloque (prefetch, lotes, jobs en segundo plano)
+_scoped_priority: ContextVar[Optional[Priority]] = ContextVar("llm_priority", default=None)
+
+
+@contextmanager
+def priority_scope(priority: Priority) -> Iterator[None]:
+    """Las llamadas LLM dentro del bloque esperan en la cola de esta prioridad salvo que indiquen otra"""
+    token = _scoped_priority.set(priority)
+    try:
+        yield
+    finally:
+        _scoped_priority.reset(token)
+
+
+def current_priority(default: Priority = Priority.INTERACTIVE) -> Priority:
+    scoped = _scoped_priority.get()
+    return default if scoped is None else scoped
+
+
+def parse_priority(value: Any, task_type: str = "general") -> Priority:
+    """Normaliza una prioridad ('interactive', Priority, None) o la toma del bloque actual o del tipo de tarea"""
+    if isinstance(value, Priority):
+        return value
+    if isinstance(value, str) and value.upper() in Priority.__members__:
+        return Priority[value.upper()]
+    if _scoped_priority.get() is not None:
+        return _scoped_priority.get()
+    if task_type.startswith(BACKGROUND_TASK_PREFIXES):
+        return Priority.BACKGROUND
+    return Priority.INTERACTIVE
+
+
+class _PriorityStats:
+    """Métricas de espera de una cola de prioridad"""
+
+    def __init__(self, window_size: int = 200):
+        self.wait_times: Deque[float] = deque(maxlen=window_size)
+        self.admitted = 0
+        self.timeouts = 0
+
+    def record_wait(self, waited: float):
+        self.admitted += 1
+        self.wait_times.append(waited)
+
+    def snapshot(self, depth: int) -> Dict[str, Any]:
+        ordered = sorted(self.wait_times)
+        return {
+            "queue_depth": depth,
+            "admitted": self.admitted,
+            "timeouts": self.timeouts,
+            "avg_wait_seconds": round(sum(ordered) / len(ordered), 3) if ordered else 0.0,
+            "p95_wait_seconds": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 3) if ordered else 0.0,
+            "max_wait_seconds": round(ordered[-1], 3) if ordered else 0.0
+        }
+
+
+class ProviderBulkhead:
+    """
+    Límite de concurrencia de un proveedor con colas por prioridad.
+    Los slots libres se entregan siempre a la cola de mayor prioridad; `reserved_interactive`
+    slots quedan reservados para tráfico interactivo y nunca los ocupa background/batch.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, reserved_interactive: int = 1):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.reserved_interactive = min(max(0, reserved_interactive), self.max_concurrency - 1)
+        self.in_flight = 0
+        self.queues: Dict[Priority, Deque[asyncio.Future]] = {p: deque() for p in Priority}
+        self.stats: Dict[Priority, _PriorityStats] = {p: _PriorityStats() for p in Priority}
+
+    def _capacity_for(self, priority: Priority) -> int:
+        if priority == Priority.INTERACTIVE:
+            return self.max_concurrency
+        return self.max_concurrency - self.reserved_interactive
+
+    def _has_waiters_ahead(self, priority: Priority) -> bool:
+        return any(self.queues[p] for p in Priority if p <= priority)
+
+    async def acquire(self, priority: Priority, queue_timeout: Optional[float]):
+        """Espera un slot; lanza QueueTimeoutError si se agota el tiempo en cola"""
+        started = time.monotonic()
+
+        if self.in_flight < self._capacity_for(priority) and not self._has_waiters_ahead(priority):
+            self.in_flight += 1
+            self.stats[priority].record_wait(0.0)
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.queues[priority].append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as error:
+            if waiter.done() and not waiter.cancelled():
+                # El slot llegó justo al expirar: devolverlo a la siguiente petición
+                self.release()
+            else:
+                waiter.cancel()
+                self._discard(priority, waiter)
+            if isinstance(error, asyncio.TimeoutError):
+                waited = time.monotonic() - started
+                self.stats[priority].timeouts += 1
+                print(f"⏳ Cola {self.name}/{priority.name.lower()}: timeout tras {waited:.1f}s")
+                raise QueueTimeoutError(self.name, priority, waited) from None
+            raise
+
+        self.stats[priority].record_wait(time.monotonic() - started)
+
+    def _discard(self, priority: Priority, waiter: asyncio.Future):
+        try:
+            self.queues[priority].remove(waiter)
+        except ValueError:
+            pass
+
+    def release(self):
+        """Libera un slot y lo entrega al primer waiter de la cola más prioritaria que quepa"""
+        self.in_flight -= 1
+        for priority in Priority:
+            queue = self.queues[priority]
+            while queue and queue[0].done():
+                queue.popleft()
+            if queue and self.in_flight < self._capacity_for(priority):
+                waiter = queue.popleft()
+                self.in_flight += 1
+                waiter.set_result(None)
+                return
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority, queue_timeout: Optional[float]):
+        await self.acquire(priority, queue_timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "reserved_interactive": self.reserved_interactive,
+            "in_flight": self.in_flight,
+            "queues": {
+                p.name.lower(): self.stats[p].snapshot(sum(1 for w in self.queues[p] if not w.done()))
+                for p in Priority
+            }
+        }
+
+
+class ProviderScheduler:
+    """Bulkheads de todos los proveedores y tiempos máximos de espera por prioridad"""
+
+    def __init__(self):
+        reserved = int(os.getenv("AI_RESERVED_INTERACTIVE_SLOTS", "1"))
+        self.bulkheads: Dict[str, ProviderBulkhead] = {
+            "deepseek": ProviderBulkhead("deepseek", int(os.getenv("AI_DEEPSEEK_MAX_CONCURRENCY", "4")), reserved),
+            "openai": ProviderBulkhead("openai", int(os.getenv("AI_OPENAI_MAX_CONCURRENCY", "8")), reserved),
+        }
+        self.queue_timeouts: Dict[Priority, float] = {
+            Priority.INTERACTIVE: float(os.getenv("AI_QUEUE_TIMEOUT_INTERACTIVE_SECONDS", "10")),
+            Priority.BACKGROUND: float(os.getenv("AI_QUEUE_TIMEOUT_BACKGROUND_SECONDS", "60")),
+            Priority.BATCH: float(os.getenv("AI_QUEUE_TIMEOUT_BATCH_SECONDS", "300")),
+        }
+
+    def slot(self, provider: str, priority: Priority, queue_timeout: Optional[float] = None):
+        """Context manager asíncrono que reserva un slot del proveedor"""
+        if queue_timeout is None:
+            queue_timeout = self.queue_timeouts[priority]
+        return self.bulkheads[provider].slot(priority, queue_timeout)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {name: bulkhead.snapshot() for name, bulkhead in self.bulkheads.items()}
@@ -0,0 +1,72 @@
+"""
+Circuit breaker para Redis
+Cada comando (o pipeline) pasa por un proxy que mide su latencia y registra errores de conexión,
+timeouts y respuestas lentas en un ProviderHealth, el mismo breaker que usan los proveedores de IA. Con el circuito
+abierto RedisService deja de exponer el cliente y cada servicio cae al instante en su respaldo local
+en vez de esperar el timeout del socket; lo cierra la sonda en segundo plano, no el tráfico.
+"""
+
+import time
+import inspect
+import asyncio
+from typing import Any
+
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+
+from services.provider_health import ProviderHealth
+
+# Errores que indican un Redis caído o lento (no errores de uso como WRONGTYPE)
+UNAVAILABLE_ERRORS = (RedisConnectionError, RedisTimeoutError, asyncio.TimeoutError, OSError)
+
+
+async def track(health: ProviderHealth, awaitable: Any) -> Any:
+    """Espera el comando y registra su resultado en el breaker"""
+    started = time.monotonic()
+    try:
+        result = await awaitable
+    except UNAVAILABLE_ERRORS:
+        health.record_failure(time.monotonic() - started)
+        raise
+    latency = time.monotonic() - started
+    if latency > health.slow_latency_seconds:
+        # Una respuesta lenta cuenta como fallo: varias seguidas abren el circuito
+        health.record_failure(latency)
+    else:
+        health.record_success(latency)
+    return result
+
+
+class GuardedPipeline:
+    """Pipeline cuyo execute() cuenta como una llamada para el breaker"""
+
+    def __init__(self, pipeline: Any, health: ProviderHealth):
+        self._pipeline = pipeline
+        self._health = health
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._pipeline, name)
+
+    async def execute(self, *args, **kwargs) -> Any:
+        return await track(self._health, self._pipeline.execute(*args, **kwargs))
+
+
+class GuardedRedis:
+    """Cliente Redis que registra latencia y fallos de cada comando en el breaker"""
+
+    def __init__(self, client: Any, health: ProviderHealth):
+        self.client = client
+        self._health = health
+
+    def pipeline(self, *args, **kwargs) -> GuardedPipeline:
+        return GuardedPipeline(self.client.pipeline(*args, **kwargs), self._health)
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self.client, name)
+        if not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            result = attribute(*args, **kwargs)
+            # Solo los comandos que esperan a Redis; pubsub(), scan_iter() y similares pasan tal cual
+            return track(self._health, result) if inspect.isawaitable(result) else result
+        return call
@@ -1,8 +1,21 @@
-import redis
+import redis.asyncio as redis
 import json
 import os
-from typing import Optional, Dict, Any, List
+import asyncio
+from collections import deque
+from typing import Optional, Dict, Any, List, Tuple
 from datetime import datetime, timedelta
+from services.provider_health import ProviderHealth, CircuitState
+from services.redis_guard import GuardedRedis, UNAVAILABLE_ERRORS
+
+# Hash with one field per global learning statistic
+GLOBAL_STATS_KEY = "global:stats"
+
+# A buffered write: the commands of one operation, as (command, args, kwargs)
+BufferedWrite = List[Tuple[str, tuple, dict]]
+
+class RedisUnavailableError(Exception):
+    """Redis is not configured or its circuit breaker is open (the API answers 503)"""
 
 class RedisService:
     def __init__(self):
@@ -10,28 +23,208 @@ class RedisService:
         self.redis_rest_url = os.getenv("REDIS_REST_URL") 
         self.redis_rest_token = os.getenv("REDIS_REST_TOKEN")
         
+        # Circuit breaker: connection errors, timeouts and slow replies open it, the background probe closes it
+        self.health = ProviderHealth(
+            name="redis",
+            slow_latency_seconds=float(os.getenv("REDIS_SLOW_LATENCY_SECONDS", "0.5")),
+            failure_threshold=int(os.getenv("REDIS_BREAKER_FAILURE_THRESHOLD", "3"))
+        )
+        self.probe_seconds = float(os.getenv("REDIS_HEALTH_PROBE_SECONDS", "5"))
+        self._probe_task: Optional[asyncio.Task] = None
+        
+        # Non-critical writes (stats, learning sessions) kept while Redis is unavailable, replayed on recovery
+        max_buffered_writes = int(os.getenv("REDIS_FALLBACK_MAX_WRITES", "1000"))
+        self.fallback_enabled = max_buffered_writes > 0
+        self._fallback_writes: deque = deque(maxlen=max(1, max_buffered_writes))
+        self.fallback_stats = {"buffered": 0, "replayed": 0, "dropped": 0}
+        
         if self.redis_url:
             # Convert redis:// to rediss:// for SSL connection to Upstash
             ssl_url = self.redis_url.replace('redis://', 'rediss://')
-            self.redis_client = redis.from_url(
+            socket_timeout = float(os.getenv("REDIS_SOCKET_TIMEOUT_SECONDS", "2"))
+            # Async client over one shared pool: a Redis round trip no longer blocks the event loop
+            self.pool = redis.ConnectionPool.from_url(
                 ssl_url,
-                decode_responses=True
+                decode_responses=True,
+                max_connections=int(os.getenv("REDIS_MAX_CONNECTIONS", "50")),
+                # A slow Redis fails within the timeout instead of holding the request
+                socket_timeout=socket_timeout,
+                socket_connect_timeout=socket_timeout
             )
+            self.redis_client = redis.Redis(connection_pool=self.pool)
         else:
+            self.pool = None
             self.redis_client = None
     
-    def is_connected(self) -> bool:
-        """Check if Redis connection is available"""
+    @property
+    def redis_client(self):
+        """Client for callers; None while Redis is not configured or its circuit breaker is open"""
+        if self._client is None or self.health.state != CircuitState.CLOSED:
+            return None
+        return self._client
+    
+    @redis_client.setter
+    def redis_client(self, client):
+        if isinstance(client, GuardedRedis):
+            client = client.client
+        self._client = GuardedRedis(client, self.health) if client is not None else None
+    
+    def is_available(self) -> bool:
+        """Configured and not tripped, as of the last command or probe (no round trip)"""
+        return self.redis_client is not None
+    
+    def require_client(self):
+        """Client for paths with no local fallback; raises RedisUnavailableError instead of returning None"""
+        client = self.redis_client
+        if client is None:
+            raise RedisUnavailableError("Redis is unavailable")
+        return client
+    
+    async def start(self):
+        """Start the background health probe (application startup)"""
+        if self._client is not None and self._probe_task is None:
+            self._probe_task = asyncio.create_task(self._probe_periodically())
+    
+    async def close(self):
+        """Stop the probe and release the pool's connections (application shutdown)"""
+        if self._probe_task:
+            self._probe_task.cancel()
+            await asyncio.gather(self._probe_task, return_exceptions=True)
+            self._probe_task = None
+        if self.pool:
+            await self.pool.disconnect()
+    
+    async def is_connected(self) -> bool:
+        """Ping Redis now; request paths use is_available() instead"""
+        return self._client is not None and await self.probe()
+    
+    # Health probe
+    async def _probe_periodically(self):
+        while True:
+            await asyncio.sleep(self.probe_seconds)
+            await self.probe()
+    
+    async def probe(self) -> bool:
+        """One PING through the breaker (a fast reply closes it); replays buffered writes once Redis is back"""
         try:
-            if self.redis_client:
-                self.redis_client.ping()
-                return True
+            await self._client.ping()
         except Exception:
-            pass
-        return False
+            return False
+        if not self.is_available():
+            # Answered, but too slowly to close the breaker
+            return False
+        if self._fallback_writes:
+            await self._replay_fallback()
+        return True
+    
+    # Fallback for non-critical writes
+    async def _write_or_buffer(self, commands: BufferedWrite) -> bool:
+        """Send the commands in one MULTI block, or keep them for replay while Redis is unavailable"""
+        client = self.redis_client
+        # While older writes wait for replay, newer ones queue behind them to keep their order
+        if client is not None and not self._fallback_writes:
+            try:
+                pipe = client.pipeline(transaction=True)
+                for command, args, kwargs in commands:
+                    getattr(pipe, command)(*args, **kwargs)
+                await pipe.execute()
+                return True
+            except UNAVAILABLE_ERRORS as e:
+                print(f"Redis unavailable, buffering write: {e}")
+        if self._client is None or not self.fallback_enabled:
+            return False
+        if len(self._fallback_writes) == self._fallback_writes.maxlen:
+            self.fallback_stats["dropped"] += 1
+        self._fallback_writes.append(commands)
+        self.fallback_stats["buffered"] += 1
+        return True
+    
+    async def _replay_fallback(self, chunk_size: int = 100):
+        while self._fallback_writes:
+            writes = [self._fallback_writes.popleft() for _ in range(min(chunk_size, len(self._fallback_writes)))]
+            try:
+                pipe = self._client.pipeline(transaction=False)
+                for commands in writes:
+                    for command, args, kwargs in commands:
+                        getattr(pipe, command)(*args, **kwargs)
+                await pipe.execute()
+                self.fallback_stats["replayed"] += len(writes)
+            except Exception as e:
+                print(f"Error replaying buffered Redis writes: {e}")
+                self._fallback_writes.extendleft(reversed(writes))
+                return
+        print(f"✅ Redis: escrituras pendientes reenviadas ({self.fallback_stats['replayed']} en total)")
+    
+    def health_snapshot(self) -> Dict[str, Any]:
+        return {
+            "configured": self._client is not None,
+            "available": self.is_available(),
+            **self.health.snapshot(),
+            "pending_writes": len(self._fallback_writes),
+            **{f"fallback_{name}": count for name, count in self.fallback_stats.items()}
+        }
+    
+    # Batching: several commands in one round trip
+    def batch(self, transaction: bool = False):
+        """
+        Pipeline that sends its queued commands in a single round trip on `await execute()`
+        transaction=True wraps them in MULTI/EXEC so they apply atomically
+        """
+        return self.require_client().pipeline(transaction=transaction)
+    
+    async def get_many(self, keys: List[str]) -> List[Optional[str]]:
+        """Values of several string keys in one round trip (MGET), None where missing"""
+        if not keys:
+            return []
+        return await self.require_client().mget(keys)
+    
+    async def hget_many(self, keys: List[str], field: str) -> List[Optional[str]]:
+        """One field from several hashes in one round trip"""
+        if not keys:
+            return []
+        pipe = self.batch()
+        for key in keys:
+            pipe.hget(key, field)
+        return await pipe.execute()
+    
+    # Secondary indexes: listings read these instead of scanning the keyspace with KEYS
+    @staticmethod
+    def _progress_index_key(user_id: str) -> str:
+        """Set of the module ids with stored progress for a user"""
+        return f"user:{user_id}:progress_modules"
+    
+    async def backfill_indexes(self) -> Dict[str, int]:
+        """
+        Index data written before the indexes existed (maintenance, never on the request path)
+        Uses SCAN, so Redis keeps serving other clients while it runs; safe to re-run
+        """
+        indexed = {"progress_modules": 0, "global_stats": 0}
+        if not self.redis_client:
+            return indexed
+        
+        async for key in self.redis_client.scan_iter(match="user:*:progress:*", count=500):
+            _, user_id, _, module_id = key.split(":", 3)
+            index_key = self._progress_index_key(user_id)
+            pipe = self.batch(transaction=True)
+            pipe.sadd(index_key, module_id)
+            pipe.expire(index_key, 30 * 24 * 60 * 60)
+            await pipe.execute()
+            indexed["progress_modules"] += 1
+        
+        # Legacy one-key-per-stat counters are folded into the stats hash and removed
+        async for key in self.redis_client.scan_iter(match="global:stats:*", count=500):
+            pipe = self.batch(transaction=True)
+            pipe.get(key)
+            pipe.delete(key)
+            value, _ = await pipe.execute()
+            if value:
+                await self.redis_client.hincrby(GLOBAL_STATS_KEY, key.split(":", 2)[-1], int(value))
+                indexed["global_stats"] += 1
+        
+        return indexed
     
     # User Learning Progress
-    def save_user_progress(self, user_id: str, module_id: str, progress_data: Dict[str, Any]) -> bool:
+    async def save_user_progress(self, user_id: str, module_id: str, progress_data: Dict[str, Any]) -> bool:
         """Save user progress for a specific module"""
         try:
             if not self.redis_client:
@@ -40,27 +233,31 @@ class RedisService:
             key = f"user:{user_id}:progress:{module_id}"
             progress_data["updated_at"] = datetime.utcnow().isoformat()
             
-            self.redis_client.hset(key, mapping={
+            pipe = self.batch(transaction=True)
+            pipe.hset(key, mapping={
                 "data": json.dumps(progress_data),
                 "module_id": module_id,
                 "user_id": user_id
             })
-            
             # Set expiration to 30 days
-            self.redis_client.expire(key, 30 * 24 * 60 * 60)
+            pipe.expire(key, 30 * 24 * 60 * 60)
+            index_key = self._progress_index_key(user_id)
+            pipe.sadd(index_key, module_id)
+            pipe.expire(index_key, 30 * 24 * 60 * 60)
+            await pipe.execute()
             return True
         except Exception as e:
             print(f"Error saving user progress: {e}")
             return False
     
-    def get_user_progress(self, user_id: str, module_id: str) -> Optional[Dict[str, Any]]:
+    async def get_user_progress(self, user_id: str, module_id: str) -> Optional[Dict[str, Any]]:
         """Get user progress for a specific module"""
         try:
             if not self.redis_client:
                 return None
                 
             key = f"user:{user_id}:progress:{module_id}"
-            data = self.redis_client.hget(key, "data")
+            data = await self.redis_client.hget(key, "data")
             
             if data:
                 return json.loads(data)
@@ -69,29 +266,34 @@ class RedisService:
             print(f"Error getting user progress: {e}")
             return None
     
-    def get_all_user_progress(self, user_id: str) -> Dict[str, Any]:
+    async def get_all_user_progress(self, user_id: str) -> Dict[str, Any]:
         """Get all progress for a user across all modules"""
         try:
             if not self.redis_client:
                 return {}
                 
-            pattern = f"user:{user_id}:progress:*"
-            keys = self.redis_client.keys(pattern)
+            index_key = self._progress_index_key(user_id)
+            module_ids = sorted(await self.redis_client.smembers(index_key))
+            values = await self.hget_many(
+                [f"user:{user_id}:progress:{module_id}" for module_id in module_ids], "data"
+            )
             
-            progress = {}
-            for key in keys:
-                module_id = key.split(":")[-1]
-                data = self.redis_client.hget(key, "data")
-                if data:
-                    progress[module_id] = json.loads(data)
+            # Modules whose progress expired are dropped from the index
+            expired = [module_id for module_id, data in zip(module_ids, values) if not data]
+            if expired:
+                await self.redis_client.srem(index_key, *expired)
             
-            return progress
+            return {
+                module_id: json.loads(data)
+                for module_id, data in zip(module_ids, values)
+                if data
+            }
         except Exception as e:
             print(f"Error getting all user progress: {e}")
             return {}
     
     # Learning Analytics
-    def track_module_completion(self, user_id: str, module_id: str, completion_time: Optional[datetime] = None) -> bool:
+    async def track_module_completion(self, user_id: str, module_id: str, completion_time: Optional[datetime] = None) -> bool:
         """Track when a user completes a module"""
         try:
             if not self.redis_client:
@@ -107,20 +309,18 @@ class RedisService:
                 "timestamp": completion_time.timestamp()
             }
             
+            pipe = self.batch(transaction=True)
             # Add to sorted set for time-based queries
-            self.redis_client.zadd(
-                key, 
-                {json.dumps(completion_data): completion_time.timestamp()}
-            )
-            
+            pipe.zadd(key, {json.dumps(completion_data): completion_time.timestamp()})
             # Set expiration to 90 days
-            self.redis_client.expire(key, 90 * 24 * 60 * 60)
+            pipe.expire(key, 90 * 24 * 60 * 60)
+            await pipe.execute()
             return True
         except Exception as e:
             print(f"Error tracking module completion: {e}")
             return False
     
-    def get_user_completions(self, user_id: str, days: int = 30) -> List[Dict[str, Any]]:
+    async def get_user_completions(self, user_id: str, days: int = 30) -> List[Dict[str, Any]]:
         """Get user module completions in the last N days"""
         try:
             if not self.redis_client:
@@ -129,14 +329,14 @@ class RedisService:
             key = f"user:{user_id}:completions"
             since = (datetime.utcnow() - timedelta(days=days)).timestamp()
             
-            completions = self.redis_client.zrangebyscore(key, since, "+inf")
+            completions = await self.redis_client.zrangebyscore(key, since, "+inf")
             return [json.loads(completion) for completion in completions]
         except Exception as e:
             print(f"Error getting user completions: {e}")
             return []
     
     # Bookmarks System
-    def save_bookmark(self, user_id: str, bookmark_data: Dict[str, Any]) -> bool:
+    async def save_bookmark(self, user_id: str, bookmark_data: Dict[str, Any]) -> bool:
         """Save a user bookmark"""
         try:
             if not self.redis_client:
@@ -148,23 +348,24 @@ class RedisService:
             bookmark_data["created_at"] = datetime.utcnow().isoformat()
             bookmark_data["bookmark_id"] = bookmark_id
             
-            self.redis_client.hset(key, bookmark_id, json.dumps(bookmark_data))
-            
+            pipe = self.batch(transaction=True)
+            pipe.hset(key, bookmark_id, json.dumps(bookmark_data))
             # Set expiration to 180 days
-            self.redis_client.expire(key, 180 * 24 * 60 * 60)
+            pipe.expire(key, 180 * 24 * 60 * 60)
+            await pipe.execute()
             return True
         except Exception as e:
             print(f"Error saving bookmark: {e}")
             return False
     
-    def get_user_bookmarks(self, user_id: str) -> List[Dict[str, Any]]:
+    async def get_user_bookmarks(self, user_id: str) -> List[Dict[str, Any]]:
         """Get all bookmarks for a user"""
         try:
             if not self.redis_client:
                 return []
                 
             key = f"user:{user_id}:bookmarks"
-            bookmark_data = self.redis_client.hgetall(key)
+            bookmark_data = await self.redis_client.hgetall(key)
             
             bookmarks = []
             for bookmark_json in bookmark_data.values():
@@ -177,24 +378,24 @@ class RedisService:
             print(f"Error getting user bookmarks: {e}")
             return []
     
-    def remove_bookmark(self, user_id: str, bookmark_id: str) -> bool:
+    async def remove_bookmark(self, user_id: str, bookmark_id: str) -> bool:
         """Remove a user bookmark"""
         try:
             if not self.redis_client:
                 return False
                 
             key = f"user:{user_id}:bookmarks"
-            self.redis_client.hdel(key, bookmark_id)
+            await self.redis_client.hdel(key, bookmark_id)
             return True
         except Exception as e:
             print(f"Error removing bookmark: {e}")
             return False
     
     # Learning Session Tracking
-    def start_learning_session(self, user_id: str, module_id: str) -> str:
+    async def start_learning_session(self, user_id: str, module_id: str) -> str:
         """Start a learning session and return session ID"""
         try:
-            if not self.redis_client:
+            if self._client is None:
                 return ""
                 
             session_id = f"{user_id}:{module_id}:{datetime.utcnow().timestamp()}"
@@ -207,63 +408,47 @@ class RedisService:
                 "status": "active"
             }
             
-            self.redis_client.hset(key, mapping=session_data)
-            self.redis_client.expire(key, 24 * 60 * 60)  # 24 hours
+            buffered = await self._write_or_buffer([
+                ("hset", (key,), {"mapping": session_data}),
+                ("expire", (key, 24 * 60 * 60), {})  # 24 hours
+            ])
             
-            return session_id
+            return session_id if buffered else ""
         except Exception as e:
             print(f"Error starting learning session: {e}")
             return ""
     
-    def end_learning_session(self, session_id: str, completion_percentage: float = 0.0) -> bool:
+    async def end_learning_session(self, session_id: str, completion_percentage: float = 0.0) -> bool:
         """End a learning session"""
         try:
-            if not self.redis_client:
-                return False
-                
             key = f"session:{session_id}"
             
-            self.redis_client.hset(key, mapping={
+            return await self._write_or_buffer([("hset", (key,), {"mapping": {
                 "ended_at": datetime.utcnow().isoformat(),
                 "status": "completed",
                 "completion_percentage": completion_percentage
-            })
-            
-            return True
+            }})])
         except Exception as e:
             print(f"Error ending learning session: {e}")
             return False
     
     # Global Learning Statistics
-    def increment_global_stat(self, stat_name: str, increment: int = 1) -> bool:
+    async def increment_global_stat(self, stat_name: str, increment: int = 1) -> bool:
         """Increment a global learning statistic"""
         try:
-            if not self.redis_client:
-                return False
-                
-            key = f"global:stats:{stat_name}"
-            self.redis_client.incr(key, increment)
-            return True
+            return await self._write_or_buffer([("hincrby", (GLOBAL_STATS_KEY, stat_name, increment), {})])
         except Exception as e:
             print(f"Error incrementing global stat: {e}")
             return False
     
-    def get_global_stats(self) -> Dict[str, int]:
+    async def get_global_stats(self) -> Dict[str, int]:
         """Get global learning statistics"""
         try:
             if not self.redis_client:
                 return {}
                 
-            pattern = "global:stats:*"
-            keys = self.redis_client.keys(pattern)
-            
-            stats = {}
-            for key in keys:
-                stat_name = key.split(":")[-1]
-                value = self.redis_client.get(key)
-                stats[stat_name] = int(value) if value else 0
-            
-            return stats
+            stats = await self.redis_client.hgetall(GLOBAL_STATS_KEY)
+            return {stat_name: int(value) for stat_name, value in stats.items()}
         except Exception as e:
             print(f"Error getting global stats: {e}")
             return {}
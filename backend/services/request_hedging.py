@@ -0,0 +1,101 @@
+"""
+Hedging de peticiones LLM para controlar la latencia de cola
+Si el proveedor primario no responde dentro de un percentil de su latencia reciente,
+se lanza la misma petición al secundario y se usa la primera respuesta
+"""
+
+import os
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from services.provider_health import ProviderHealth
+
+
+class HedgePolicy:
+    """Política de hedging: tipos de tarea habilitados, percentil de disparo y tope de tráfico"""
+
+    def __init__(self):
+        task_types = os.getenv("AI_HEDGE_TASK_TYPES", "financial_chat")
+        self.task_types: Set[str] = {t.strip() for t in task_types.split(",") if t.strip()}
+        self.percentile = float(os.getenv("AI_HEDGE_PERCENTILE", "95"))
+        self.max_hedge_ratio = float(os.getenv("AI_HEDGE_MAX_RATIO", "0.1"))
+        self.min_delay_seconds = float(os.getenv("AI_HEDGE_MIN_DELAY_SECONDS", "2.0"))
+        self.min_samples = int(os.getenv("AI_HEDGE_MIN_SAMPLES", "10"))
+
+        self.eligible_requests = 0
+        self.hedged_requests = 0
+        self.hedge_wins = 0
+
+    def applies(self, task_type: str) -> bool:
+        return "*" in self.task_types or task_type in self.task_types
+
+    def hedge_delay(self, health: ProviderHealth) -> Optional[float]:
+        """Espera antes de disparar el hedge; None si no hay suficientes muestras"""
+        if len(health.latencies) < self.min_samples:
+            return None
+        threshold = health.latency_percentile(self.percentile)
+        if threshold is None:
+            return None
+        return max(threshold, self.min_delay_seconds)
+
+    def try_acquire(self) -> bool:
+        """Reserva un hedge si no se supera el porcentaje máximo de tráfico duplicado"""
+        if self.eligible_requests == 0:
+            return False
+        if (self.hedged_requests + 1) / self.eligible_requests > self.max_hedge_ratio:
+            return False
+        self.hedged_requests += 1
+        return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "task_types": sorted(self.task_types),
+            "percentile": self.percentile,
+            "max_hedge_ratio": self.max_hedge_ratio,
+            "eligible_requests": self.eligible_requests,
+            "hedged_requests": self.hedged_requests,
+            "hedge_wins": self.hedge_wins,
+            "hedge_ratio": round(self.hedged_requests / self.eligible_requests, 3) if self.eligible_requests else 0.0
+        }
+
+
+async def hedged_call(
+    policy: HedgePolicy,
+    primary: Callable[[], Awaitable[Any]],
+    secondary: Callable[[], Awaitable[Any]],
+    delay: float
+) -> Tuple[Any, bool]:
+    """
+    Ejecuta primary; si no termina en `delay` segundos lanza secondary y retorna el primero
+    que termine con éxito, cancelando al perdedor. Retorna (resultado, ganó_el_hedge).
+    """
+    policy.eligible_requests += 1
+    primary_task = asyncio.ensure_future(primary())
+    tasks = [primary_task]
+
+    try:
+        done, _ = await asyncio.wait({primary_task}, timeout=delay)
+        if done or not policy.try_acquire():
+            return await primary_task, False
+
+        secondary_task = asyncio.ensure_future(secondary())
+        tasks.append(secondary_task)
+        pending = {primary_task, secondary_task}
+        last_error: Optional[BaseException] = None
+
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    hedge_won = task is secondary_task
+                    if hedge_won:
+                        policy.hedge_wins += 1
+                    return task.result(), hedge_won
+                last_error = task.exception()
+
+        raise last_error
+    finally:
+        # Perdedor del hedge, o ambas peticiones si quien llamó fue cancelado (p. ej. el cliente se desconectó)
+        for task in tasks:
+            if not task.done():
+                task.cancel()
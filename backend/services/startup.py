@@ -0,0 +1,75 @@
+"""
+Perfil de arranque y fase de warm-up
+Registra cuánto cuesta cada fase del arranque y precalienta clientes y agentes en segundo plano;
+/ready indica cuándo la instancia puede recibir tráfico, /health solo que el proceso vive
+"""
+
+import os
+import time
+import asyncio
+import inspect
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+WARMUP_ENABLED = os.getenv("AI_WARMUP_ENABLED", "true").lower() == "true"
+
+
+class StartupProfile:
+    """Duración de las fases de importación/arranque y resultado de cada paso de warm-up"""
+
+    def __init__(self):
+        self.process_started = time.perf_counter()
+        self.phases: List[Dict[str, Any]] = []
+        self.warmup_steps: List[Dict[str, Any]] = []
+        self.ready = False
+        self.warming_up = False
+        self.ready_at: str = ""
+        self.seconds_to_ready: float = 0.0
+
+    @contextmanager
+    def measure(self, phase: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append({"phase": phase, "seconds": round(time.perf_counter() - started, 3)})
+
+    async def warm_up(self, steps: List[Tuple[str, Callable[[], Any]]]):
+        """Ejecuta los pasos en orden; los síncronos van a un hilo para no bloquear el event loop"""
+        self.warming_up = True
+        if WARMUP_ENABLED:
+            for name, step in steps:
+                started = time.perf_counter()
+                entry: Dict[str, Any] = {"step": name, "status": "ok"}
+                try:
+                    if inspect.iscoroutinefunction(step):
+                        await step()
+                    else:
+                        await asyncio.to_thread(step)
+                except Exception as e:
+                    # Un paso fallido no bloquea el tráfico: el servicio tiene sus propios fallbacks
+                    entry.update(status="error", error=str(e))
+                    print(f"⚠️ Warm-up {name} falló: {e}")
+                entry["seconds"] = round(time.perf_counter() - started, 3)
+                self.warmup_steps.append(entry)
+
+        self.ready = True
+        self.warming_up = False
+        self.ready_at = datetime.utcnow().isoformat()
+        self.seconds_to_ready = round(time.perf_counter() - self.process_started, 3)
+        print(f"🚦 Instancia lista en {self.seconds_to_ready:.2f}s desde el arranque del proceso")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "warming_up": self.warming_up,
+            "ready_at": self.ready_at or None,
+            "seconds_to_ready": self.seconds_to_ready if self.ready else None,
+            "import_phases": sorted(self.phases, key=lambda phase: phase["seconds"], reverse=True),
+            "warmup_steps": self.warmup_steps
+        }
+
+
+# Instancia global (se crea al importar main, así mide desde el inicio del arranque)
+startup_profile = StartupProfile()
@@ -0,0 +1,288 @@
+"""
+Contabilidad de uso de IA: tokens, latencia y costo por usuario, agente, proveedor y endpoint
+Cada llamada se acumula en contadores de Redis por hora (un pipeline por llamada, escrito en
+segundo plano para no bloquear a quien registra); las consultas suman los buckets del rango pedido
+"""
+
+import os
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from services.redis_service import redis_service
+
+# Dimensiones por las que se agrega el uso
+DIMENSIONS = ("total", "provider", "model", "user", "agent", "endpoint")
+
+# Límites superiores (segundos) del histograma de latencia
+LATENCY_BUCKETS = (1, 2, 5, 10, 20, 30, 60)
+
+# Precio por millón de tokens en USD: (entrada, salida, entrada en caché)
+DEFAULT_MODEL_PRICES: Dict[str, Tuple[float, float, float]] = {
+    "deepseek-reasoner": (0.55, 2.19, 0.14),
+    "deepseek-chat": (0.27, 1.10, 0.07),
+    "gpt-4o-mini": (0.15, 0.60, 0.075),
+}
+
+# Etiquetas de atribución de la petición en curso (usuario, agente, endpoint)
+_usage_labels: ContextVar[Dict[str, str]] = ContextVar("usage_labels", default={})
+
+
+@contextmanager
+def usage_scope(**labels: Optional[str]) -> Iterator[None]:
+    """Atribuye las llamadas de IA dentro del bloque a user/agent/endpoint"""
+    merged = dict(_usage_labels.get())
+    merged.update({k: str(v) for k, v in labels.items() if v})
+    token = _usage_labels.set(merged)
+    try:
+        yield
+    finally:
+        _usage_labels.reset(token)
+
+
+def current_labels() -> Dict[str, str]:
+    return dict(_usage_labels.get())
+
+
+def _load_model_prices() -> Dict[str, Tuple[float, float, float]]:
+    """Precios por defecto sobrescribibles con AI_MODEL_PRICES=modelo=entrada:salida[:caché],..."""
+    prices = dict(DEFAULT_MODEL_PRICES)
+    for entry in os.getenv("AI_MODEL_PRICES", "").split(","):
+        if "=" not in entry:
+            continue
+        model, values = entry.split("=", 1)
+        try:
+            parts = [float(v) for v in values.split(":")]
+            prices[model.strip()] = (parts[0], parts[1], parts[2] if len(parts) > 2 else parts[0])
+        except (ValueError, IndexError):
+            print(f"⚠️ Precio de modelo inválido ignorado: {entry}")
+    return prices
+
+
+MODEL_PRICES = _load_model_prices()
+
+
+def extract_usage(usage: Optional[Dict[str, Any]]) -> Dict[str, int]:
+    """Normaliza el bloque usage de OpenAI/DeepSeek (o usage_metadata de LangChain)"""
+    usage = usage or {}
+    completion_details = usage.get("completion_tokens_details") or usage.get("output_token_details") or {}
+    prompt_details = usage.get("prompt_tokens_details") or usage.get("input_token_details") or {}
+    return {
+        "prompt_tokens": int(usage.get("prompt_tokens") or usage.get("input_tokens") or 0),
+        "completion_tokens": int(usage.get("completion_tokens") or usage.get("output_tokens") or 0),
+        "reasoning_tokens": int(completion_details.get("reasoning_tokens") or completion_details.get("reasoning") or 0),
+        # DeepSeek reporta prompt_cache_hit_tokens; OpenAI, prompt_tokens_details.cached_tokens
+        "cached_prompt_tokens": int(
+            usage.get("prompt_cache_hit_tokens")
+            or prompt_details.get("cached_tokens")
+            or prompt_details.get("cache_read")
+            or 0
+        ),
+    }
+
+
+def usage_from_langchain(message: Any) -> Dict[str, int]:
+    """Uso real de tokens de un AIMessage de LangChain"""
+    metadata = getattr(message, "response_metadata", None) or {}
+    if metadata.get("token_usage"):
+        return extract_usage(metadata["token_usage"])
+    return extract_usage(getattr(message, "usage_metadata", None))
+
+
+@dataclass
+class UsageRecord:
+    """Una llamada a un modelo (o un acierto de caché que la evitó)"""
+    provider: str
+    model: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    reasoning_tokens: int = 0
+    cached_prompt_tokens: int = 0
+    latency_seconds: float = 0.0
+    retrieval_seconds: float = 0.0
+    cache_hit: bool = False
+    error: bool = False
+    labels: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def cost_usd(self) -> float:
+        input_price, output_price, cached_price = MODEL_PRICES.get(self.model, (0.0, 0.0, 0.0))
+        uncached = max(0, self.prompt_tokens - self.cached_prompt_tokens)
+        return (
+            uncached * input_price
+            + self.cached_prompt_tokens * cached_price
+            + self.completion_tokens * output_price
+        ) / 1_000_000
+
+    def counters(self) -> Dict[str, int]:
+        """Incrementos enteros para los contadores (ms y micro-USD)"""
+        values = {
+            "calls": 1,
+            "errors": int(self.error),
+            "cache_hits": int(self.cache_hit),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "reasoning_tokens": self.reasoning_tokens,
+            "cached_prompt_tokens": self.cached_prompt_tokens,
+            "latency_ms": int(self.latency_seconds * 1000),
+            "retrieval_ms": int(self.retrieval_seconds * 1000),
+            "cost_microusd": int(round(self.cost_usd * 1_000_000)),
+        }
+        if not self.cache_hit:
+            bound = next((b for b in LATENCY_BUCKETS if self.latency_seconds <= b), "inf")
+            values[f"latency_le_{bound}"] = 1
+        return {k: v for k, v in values.items() if v}
+
+
+class UsageAccounting:
+    """Contadores horarios en Redis: un hash por (hora, dimensión) con campos valor|métrica"""
+
+    def __init__(self):
+        self.retention_hours = int(os.getenv("AI_USAGE_RETENTION_HOURS", str(30 * 24)))
+        self._local: Dict[str, Dict[str, int]] = {}
+        # Escrituras en curso: se conserva la referencia para que el GC no cancele la tarea
+        self._writes: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def _bucket(moment: datetime) -> str:
+        return moment.strftime("%Y%m%d%H")
+
+    def _dimension_values(self, record: UsageRecord) -> Dict[str, str]:
+        labels = {**current_labels(), **record.labels}
+        values = {
+            "total": "all",
+            "provider": record.provider,
+            "model": record.model,
+            "user": labels.get("user"),
+            "agent": labels.get("agent"),
+            "endpoint": labels.get("endpoint"),
+        }
+        return {dimension: value for dimension, value in values.items() if value}
+
+    def record(self, record: UsageRecord):
+        """Acumula la llamada en todas sus dimensiones (una sola ida y vuelta a Redis)"""
+        bucket = self._bucket(datetime.utcnow())
+        counters = record.counters()
+        increments = {
+            f"usage:{bucket}:{dimension}": {f"{value}|{metric}": amount for metric, amount in counters.items()}
+            for dimension, value in self._dimension_values(record).items()
+        }
+
+        if redis_service.redis_client:
+            try:
+                task = asyncio.get_running_loop().create_task(self._write(increments))
+                self._writes.add(task)
+                task.add_done_callback(self._writes.discard)
+                return
+            except RuntimeError:
+                pass  # Sin event loop: se acumula en memoria
+        self._merge_local(increments)
+
+    async def _write(self, increments: Dict[str, Dict[str, int]]):
+        try:
+            if redis_service.redis_client:
+                pipe = redis_service.redis_client.pipeline(transaction=False)
+                for key, fields in increments.items():
+                    for field_name, amount in fields.items():
+                        pipe.hincrby(key, field_name, amount)
+                    pipe.expire(key, self.retention_hours * 3600)
+                await pipe.execute()
+                return
+        except Exception as e:
+            print(f"Error recording AI usage: {e}")
+        self._merge_local(increments)
+
+    def _merge_local(self, increments: Dict[str, Dict[str, int]]):
+        for key, fields in increments.items():
+            local = self._local.setdefault(key, {})
+            for field_name, amount in fields.items():
+                local[field_name] = local.get(field_name, 0) + amount
+
+    def record_cache_hit(self, namespace: str):
+        """Respuesta servida desde caché propia sin llamar al modelo"""
+        self.record(UsageRecord(provider="cache", model=namespace, cache_hit=True))
+
+    async def get_usage(self, dimension: str = "total", hours: int = 24, limit: int = 50) -> Dict[str, Any]:
+        """Uso agregado de las últimas `hours` horas por valor de la dimensión, ordenado por costo"""
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"Dimensión desconocida: {dimension}")
+        now = datetime.utcnow()
+        keys = [f"usage:{self._bucket(now - timedelta(hours=h))}:{dimension}" for h in range(hours)]
+        if self._writes:
+            # Que la consulta incluya las llamadas ya registradas
+            await asyncio.gather(*self._writes, return_exceptions=True)
+
+        raw_hashes: List[Dict[str, Any]] = []
+        try:
+            if redis_service.redis_client:
+                pipe = redis_service.redis_client.pipeline(transaction=False)
+                for key in keys:
+                    pipe.hgetall(key)
+                raw_hashes = await pipe.execute()
+        except Exception as e:
+            print(f"Error reading AI usage: {e}")
+            raw_hashes = []
+        if not raw_hashes:
+            raw_hashes = [self._local.get(key, {}) for key in keys]
+
+        totals: Dict[str, Dict[str, int]] = {}
+        for raw in raw_hashes:
+            for field_name, amount in raw.items():
+                value, metric = field_name.rsplit("|", 1)
+                entry = totals.setdefault(value, {})
+                entry[metric] = entry.get(metric, 0) + int(amount)
+
+        rows = [self._summarize(value, counters) for value, counters in totals.items()]
+        rows.sort(key=lambda row: row["cost_usd"], reverse=True)
+        return {
+            "dimension": dimension,
+            "hours": hours,
+            "from": (now - timedelta(hours=hours)).isoformat(),
+            "to": now.isoformat(),
+            "rows": rows[:limit]
+        }
+
+    @staticmethod
+    def _summarize(value: str, counters: Dict[str, int]) -> Dict[str, Any]:
+        calls = counters.get("calls", 0)
+        model_calls = calls - counters.get("cache_hits", 0)
+        histogram = {
+            str(bound): counters.get(f"latency_le_{bound}", 0)
+            for bound in (*LATENCY_BUCKETS, "inf")
+        }
+        return {
+            "value": value,
+            "calls": calls,
+            "errors": counters.get("errors", 0),
+            "cache_hits": counters.get("cache_hits", 0),
+            "prompt_tokens": counters.get("prompt_tokens", 0),
+            "completion_tokens": counters.get("completion_tokens", 0),
+            "reasoning_tokens": counters.get("reasoning_tokens", 0),
+            "cached_prompt_tokens": counters.get("cached_prompt_tokens", 0),
+            "cost_usd": round(counters.get("cost_microusd", 0) / 1_000_000, 6),
+            "avg_latency_seconds": round(counters.get("latency_ms", 0) / 1000 / model_calls, 3) if model_calls > 0 else None,
+            "avg_retrieval_seconds": round(counters.get("retrieval_ms", 0) / 1000 / model_calls, 3) if model_calls > 0 else None,
+            "p50_latency_le_seconds": _histogram_percentile(histogram, 0.5),
+            "p95_latency_le_seconds": _histogram_percentile(histogram, 0.95),
+            "latency_histogram": histogram
+        }
+
+
+def _histogram_percentile(histogram: Dict[str, int], quantile: float) -> Optional[str]:
+    """Límite superior del bucket que contiene el percentil pedido"""
+    total = sum(histogram.values())
+    if not total:
+        return None
+    running = 0
+    for bound, count in histogram.items():
+        running += count
+        if running >= quantile * total:
+            return bound
+    return "inf"
+
+
+# Instancia global
+usage_accounting = UsageAccounting()
@@ -0,0 +1,77 @@
+"""
+Unit tests for agent result digests used by the map-reduce executive summary
+"""
+
+import json
+
+from services.agent_digest import extract_digest, parse_digest, fallback_summary, DIGEST_MAX_ITEMS
+from services.prompt_builder import compact_json
+
+STRUCTURED_RESULT = {
+    "agent": "Maya",
+    "analysis": {
+        "response": "Runway de 4.5 meses, por debajo del objetivo.\nDetalle adicional",
+        "structured_analysis": {
+            "runway_months": 4.5123,
+            "cash_health": "warning",
+            "risk_categories": {"liquidity": "high", "collections": "medium"},
+            "key_risks": ["Cobros lentos", "Gasto fijo alto", "Un cliente concentra ventas", "Estacionalidad"],
+            "recommendations": [
+                {"title": "Renegociar proveedores", "description": "x" * 500, "priority": "medium"},
+                {"title": "Acelerar cobros", "description": "y" * 500, "priority": "high"},
+                {"title": "Revisar precios", "description": "z", "priority": "low"},
+                {"title": "Línea de crédito", "description": "w", "priority": "high"},
+            ],
+            "citations": [{"chapter": "1", "excerpt": "..." * 100}],
+        },
+    },
+}
+
+
+class TestExtractDigest:
+    """Structured outputs are digested without an LLM"""
+
+    def test_structured_result_is_condensed(self):
+        digest = extract_digest("Maya", STRUCTURED_RESULT)
+
+        assert digest["status"] == "ok"
+        assert digest["headline"] == "Runway de 4.5 meses, por debajo del objetivo."
+        assert digest["metrics"]["runway_months"] == 4.51
+        assert digest["metrics"]["risk_categories.liquidity"] == "high"
+        assert digest["top_recommendations"] == [
+            "Acelerar cobros (high)", "Línea de crédito (high)", "Renegociar proveedores (medium)"
+        ]
+        assert len(digest["highlights"]) == DIGEST_MAX_ITEMS
+        assert len(compact_json(digest)) < len(compact_json(STRUCTURED_RESULT)) / 4
+
+    def test_text_mode_result_needs_llm_map(self):
+        result = {"agent": "Maya", "analysis": {"response": "...", "structured_analysis": {"analysis_summary": "..."}}}
+        assert extract_digest("Maya", result) is None
+
+    def test_failed_agent_is_marked_unavailable(self):
+        digest = extract_digest("Alex", {"agent": "Alex", "status": "timeout", "error": "El agente no respondió a tiempo"})
+        assert digest == {"agent": "Alex", "status": "unavailable", "reason": "El agente no respondió a tiempo"}
+
+
+class TestParseAndFallback:
+    """LLM map output parsing and the deterministic reduce"""
+
+    def test_llm_digest_is_parsed_and_trimmed(self):
+        text = "```json\n" + json.dumps({"headline": "Caja ajustada", "top_recommendations": ["a", "b", "c", "d"]}) + "\n```"
+        digest = parse_digest("Sofia", text)
+        assert digest["headline"] == "Caja ajustada"
+        assert digest["top_recommendations"] == ["a", "b", "c"]
+
+    def test_invalid_llm_output_falls_back_to_response_excerpt(self):
+        digest = parse_digest("Sofia", "no es json", "Crecimiento estable del 5% mensual")
+        assert digest == {"agent": "Sofia", "status": "ok", "headline": "Crecimiento estable del 5% mensual"}
+
+    def test_fallback_summary_uses_digests(self):
+        digests = [
+            extract_digest("Maya", STRUCTURED_RESULT),
+            extract_digest("Alex", {"status": "timeout", "error": "tarde"}),
+        ]
+        summary = fallback_summary(digests)
+        assert "1 de 2 agentes" in summary
+        assert "Prioridad: Acelerar cobros (high)" in summary
+        assert "Sin resultado: Alex" in summary
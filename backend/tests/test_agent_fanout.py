@@ -0,0 +1,121 @@
+"""
+Unit tests for concurrent multi-agent execution
+"""
+
+import time
+import asyncio
+
+from services.agent_fanout import run_agents, iter_agents, AGENT_OK, AGENT_TIMEOUT, AGENT_ERROR, AGENT_SKIPPED
+from services.deadline import deadline_scope, degraded_stages
+
+
+def sleeper(seconds, result="done", tracker=None):
+    async def call():
+        if tracker is not None:
+            tracker["running"] += 1
+            tracker["peak"] = max(tracker["peak"], tracker["running"])
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            if tracker is not None:
+                tracker["running"] -= 1
+        return result
+    return call
+
+
+class TestRunAgents:
+    """Wall clock is the slowest agent, not the sum"""
+
+    def test_agents_run_concurrently(self):
+        calls = {f"agent{i}": sleeper(0.1, result=i) for i in range(5)}
+        started = time.monotonic()
+        outcomes = asyncio.run(run_agents(calls))
+        elapsed = time.monotonic() - started
+
+        assert elapsed < 0.3
+        assert list(outcomes) == list(calls)
+        assert [outcome.result for outcome in outcomes.values()] == [0, 1, 2, 3, 4]
+        assert all(outcome.status == AGENT_OK for outcome in outcomes.values())
+
+    def test_slow_and_failing_agents_keep_partial_results(self):
+        async def failing():
+            raise RuntimeError("boom")
+
+        async def scenario():
+            with deadline_scope(30):
+                outcomes = await run_agents(
+                    {"fast": sleeper(0.01), "slow": sleeper(5), "broken": failing},
+                    timeout=0.1
+                )
+                return outcomes, degraded_stages()
+
+        started = time.monotonic()
+        outcomes, degraded = asyncio.run(scenario())
+
+        assert time.monotonic() - started < 1
+        assert outcomes["fast"].status == AGENT_OK
+        assert outcomes["slow"].status == AGENT_TIMEOUT
+        assert outcomes["broken"].status == AGENT_ERROR
+        assert outcomes["broken"].as_result("Broken") == {"agent": "Broken", "status": AGENT_ERROR, "error": "boom"}
+        assert {"stage": "agent:slow", "reason": "timeout"} in degraded
+
+    def test_error_returned_by_the_agent_is_not_a_success(self):
+        async def caught():
+            # Agents catch their own exceptions and answer with an error dict
+            return {"agent": "Maya", "error": "rate limited", "analysis": {"response": "Error en el análisis"}}
+
+        outcomes = asyncio.run(run_agents({"maya": caught, "fast": sleeper(0.01)}))
+
+        assert outcomes["fast"].ok
+        assert outcomes["maya"].status == AGENT_ERROR
+        assert outcomes["maya"].error == "rate limited"
+        assert outcomes["maya"].as_result("Maya") == {
+            "agent": "Maya",
+            "error": "rate limited",
+            "status": AGENT_ERROR,
+            "analysis": {"response": "Error en el análisis"}
+        }
+
+    def test_concurrency_cap(self):
+        tracker = {"running": 0, "peak": 0}
+        calls = {f"agent{i}": sleeper(0.02, tracker=tracker) for i in range(6)}
+        asyncio.run(run_agents(calls, max_concurrency=2))
+        assert tracker["peak"] == 2
+
+    def test_agents_are_skipped_without_remaining_time(self):
+        async def scenario():
+            with deadline_scope(0.5):
+                return await run_agents({"late": sleeper(0.01)})
+
+        outcomes = asyncio.run(scenario())
+        assert outcomes["late"].status == AGENT_SKIPPED
+
+
+class TestIterAgents:
+    """Streaming order and cleanup"""
+
+    def test_outcomes_arrive_in_completion_order(self):
+        async def scenario():
+            calls = {"sofia": sleeper(0.15), "maya": sleeper(0.01), "alex": sleeper(0.08)}
+            return [outcome.agent_id async for outcome in iter_agents(calls)]
+
+        assert asyncio.run(scenario()) == ["maya", "alex", "sofia"]
+
+    def test_closing_the_stream_cancels_pending_agents(self):
+        finished = []
+
+        def tracked(name, seconds):
+            async def call():
+                await asyncio.sleep(seconds)
+                finished.append(name)
+            return call
+
+        async def scenario():
+            stream = iter_agents({"fast": tracked("fast", 0.01), "slow": tracked("slow", 0.2)})
+            first = await stream.__anext__()
+            await stream.aclose()
+            await asyncio.sleep(0.3)
+            return first.agent_id
+
+        assert asyncio.run(scenario()) == "fast"
+        assert finished == ["fast"]
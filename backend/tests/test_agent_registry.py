@@ -0,0 +1,49 @@
+"""
+Unit tests for the lazily built LangChain agent registry
+"""
+
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("langchain_openai")
+
+from agents.langchain_agents import LangChainAgentManager, LazyAgentRegistry
+
+
+class SlowAgent:
+    name = "Slow - Test Agent"
+    specialty = "Pruebas"
+    builds = 0
+
+    def __init__(self):
+        SlowAgent.builds += 1
+        time.sleep(0.05)
+
+
+class TestLazyAgentRegistry:
+    """Listings read the agent classes; each agent is built once even across threads"""
+
+    def test_available_agents_are_listed_without_building(self):
+        manager = LangChainAgentManager()
+
+        listed = manager.get_available_agents()
+
+        assert [agent["id"] for agent in listed] == ["maya", "carlos", "sofia", "alex", "diana"]
+        assert listed[0]["name"] == "Maya - Cash Flow Optimizer"
+        assert manager.agents.built() == []
+
+    def test_concurrent_first_use_builds_once(self):
+        SlowAgent.builds = 0
+        registry = LazyAgentRegistry({"slow": SlowAgent})
+        agents = []
+
+        threads = [threading.Thread(target=lambda: agents.append(registry["slow"])) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert SlowAgent.builds == 1
+        assert all(agent is agents[0] for agent in agents)
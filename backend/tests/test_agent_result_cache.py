@@ -0,0 +1,113 @@
+"""
+Unit tests for the per-user agent result cache (in-memory fallback, no Redis)
+"""
+
+import asyncio
+
+import pytest
+
+from services import agent_result_cache as cache_module
+from services.agent_result_cache import AgentResultCache
+
+DATA = {"question": "¿Cuántos meses de runway tengo?", "current_balance": 9000, "monthly_expenses": 3000}
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(cache_module.redis_service, "redis_client", None)
+    monkeypatch.setattr(cache_module.usage_accounting, "record_cache_hit", lambda namespace: None)
+    return AgentResultCache()
+
+
+def counting_compute(calls, result=None):
+    async def compute():
+        calls.append(1)
+        return dict(result or {"agent": "Maya", "analysis": {"response": f"run {len(calls)}"}})
+    return compute
+
+
+class TestAgentResultCache:
+    """Keyed by agent, question and data fingerprint; invalidated by the user's data version"""
+
+    def test_second_consultation_is_served_from_cache(self, cache):
+        calls = []
+
+        async def scenario():
+            first = await cache.get_or_compute("langchain", "u1", "maya", DATA, counting_compute(calls))
+            second = await cache.get_or_compute("langchain", "u1", "maya", dict(reversed(list(DATA.items()))), counting_compute(calls))
+            return first, second
+
+        first, second = asyncio.run(scenario())
+        assert len(calls) == 1
+        assert first["cache"]["status"] == "miss"
+        assert second["cache"]["status"] == "hit"
+        assert second["analysis"] == first["analysis"]
+
+    def test_different_data_question_or_user_recomputes(self, cache):
+        calls = []
+
+        async def scenario():
+            await cache.get_or_compute("langchain", "u1", "maya", DATA, counting_compute(calls))
+            await cache.get_or_compute("langchain", "u1", "maya", {**DATA, "current_balance": 1}, counting_compute(calls))
+            await cache.get_or_compute("langchain", "u1", "maya", {**DATA, "question": "otra"}, counting_compute(calls))
+            await cache.get_or_compute("langchain", "u2", "maya", DATA, counting_compute(calls))
+            await cache.get_or_compute("langchain", "u1", "alex", DATA, counting_compute(calls))
+
+        asyncio.run(scenario())
+        assert len(calls) == 5
+
+    def test_data_version_bump_invalidates_entries_and_latest(self, cache):
+        calls = []
+
+        async def scenario():
+            await cache.get_or_compute("langchain", "u1", "maya", DATA, counting_compute(calls))
+            assert (await cache.latest("langchain", "u1", "maya"))["analysis"]["response"] == "run 1"
+            assert await cache.bump_data_version("u1") == 1
+            assert await cache.latest("langchain", "u1", "maya") is None
+            return await cache.get_or_compute("langchain", "u1", "maya", DATA, counting_compute(calls))
+
+        result = asyncio.run(scenario())
+        assert len(calls) == 2
+        assert result["cache"] == {"status": "miss", "age_seconds": 0.0, "data_version": 1}
+
+    def test_stale_entry_is_returned_and_revalidated_in_background(self, cache):
+        calls = []
+        cache.fresh_seconds = 0
+
+        async def scenario():
+            await cache.get_or_compute("langchain", "u1", "maya", DATA, counting_compute(calls))
+            stale = await cache.get_or_compute("langchain", "u1", "maya", DATA, counting_compute(calls))
+            await asyncio.sleep(0.01)
+            return stale, await cache.latest("langchain", "u1", "maya")
+
+        stale, latest = asyncio.run(scenario())
+        assert stale["cache"]["status"] == "stale"
+        assert stale["analysis"]["response"] == "run 1"
+        assert len(calls) == 2
+        assert latest["analysis"]["response"] == "run 2"
+        assert cache.snapshot()["refreshes"] == 1
+
+    def test_background_refresh_is_referenced_until_it_finishes(self, cache):
+        calls = []
+        cache.fresh_seconds = 0
+
+        async def scenario():
+            await cache.get_or_compute("langchain", "u1", "maya", DATA, counting_compute(calls))
+            await cache.get_or_compute("langchain", "u1", "maya", DATA, counting_compute(calls))
+            pending = len(cache._refresh_tasks)
+            await asyncio.sleep(0.01)
+            return pending, len(cache._refresh_tasks)
+
+        assert asyncio.run(scenario()) == (1, 0)
+
+    def test_errors_are_not_cached(self, cache):
+        calls = []
+        failing = counting_compute(calls, {"agent": "Maya", "error": "timeout"})
+
+        async def scenario():
+            await cache.get_or_compute("langchain", "u1", "maya", DATA, failing)
+            await cache.get_or_compute("langchain", "u1", "maya", DATA, failing)
+            return await cache.latest("langchain", "u1", "maya")
+
+        assert asyncio.run(scenario()) is None
+        assert len(calls) == 2
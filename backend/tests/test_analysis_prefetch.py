@@ -0,0 +1,107 @@
+"""
+Unit tests for predictive analysis prefetch (in-memory cache and quota, no Redis)
+"""
+
+import asyncio
+
+import pytest
+
+from services import agent_result_cache as cache_module
+from services import analysis_prefetch as prefetch_module
+from services.agent_result_cache import AgentResultCache
+from services.analysis_prefetch import AnalysisPrefetcher, normalize_module
+
+DATA = {"question": "Analiza mi flujo de caja", "current_balance": 9000, "monthly_expenses": 3000}
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(cache_module.redis_service, "redis_client", None)
+    monkeypatch.setattr(cache_module.usage_accounting, "record_cache_hit", lambda namespace: None)
+    cache = AgentResultCache()
+    monkeypatch.setattr(prefetch_module, "agent_result_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def prefetcher(cache):
+    prefetcher = AnalysisPrefetcher()
+    prefetcher.max_per_user_per_hour = 2
+    calls = []
+
+    async def runner(agent_id, user_id, data):
+        calls.append(agent_id)
+        return await cache.warm("langchain", user_id, agent_id, data, compute(f"prefetched {agent_id}"))
+
+    prefetcher.register("langchain", runner)
+    prefetcher.calls = calls
+    return prefetcher
+
+
+def compute(response):
+    async def run():
+        return {"agent": "Maya", "analysis": {"response": response}}
+    return run
+
+
+class TestPrediction:
+    """Module events map to the agent analysis the user is likely to request"""
+
+    def test_module_ids_are_normalized(self):
+        assert normalize_module("cash_flow") == "cash-flow"
+        assert normalize_module("Unit-Economics-Basics") == "unit-economics"
+        assert normalize_module("glossary") is None
+
+    def test_session_start_and_progress(self):
+        prefetcher = AnalysisPrefetcher()
+        assert prefetcher.predict("cash-flow") == ["maya"]
+        assert prefetcher.predict("cash-flow", 10) == []
+        assert prefetcher.predict("cash-flow", 60) == ["maya"]
+        # Completing a module points at the next one in the sequence
+        assert prefetcher.predict("cash-flow", 100) == ["carlos"]
+        assert prefetcher.predict("planning", 100) == []
+
+
+class TestPrefetch:
+    """Background warming of the result cache with per-user caps"""
+
+    def test_session_start_warms_the_previous_analysis(self, cache, prefetcher):
+        async def scenario():
+            await cache.get_or_compute("langchain", "u1", "maya", DATA, compute("first run"))
+            await cache.bump_data_version("u1")
+            scheduled = await prefetcher.on_session_start("u1", "cash-flow")
+            assert len(prefetcher._tasks) == 1
+            await asyncio.sleep(0.01)
+            assert not prefetcher._tasks
+            clicked = await cache.get_or_compute("langchain", "u1", "maya", DATA, compute("on click"))
+            return scheduled, clicked
+
+        scheduled, clicked = asyncio.run(scenario())
+        assert scheduled == ["maya"]
+        assert clicked["cache"]["status"] == "hit"
+        assert clicked["analysis"]["response"] == "prefetched maya"
+        assert cache.snapshot()["prefetches"] == 1
+
+    def test_fresh_or_unknown_analyses_are_not_prefetched(self, cache, prefetcher):
+        async def scenario():
+            assert await prefetcher.on_session_start("u1", "cash-flow") == []
+            await cache.get_or_compute("langchain", "u1", "maya", DATA, compute("first run"))
+            return await prefetcher.on_session_start("u1", "cash-flow")
+
+        assert asyncio.run(scenario()) == []
+        assert prefetcher.calls == []
+        assert prefetcher.stats["no_previous_input"] == 1
+        assert prefetcher.stats["already_fresh"] == 1
+
+    def test_per_user_hourly_cap(self, cache, prefetcher):
+        async def scenario():
+            await cache.get_or_compute("langchain", "u1", "maya", DATA, compute("first run"))
+            scheduled = []
+            for _ in range(4):
+                await cache.bump_data_version("u1")
+                scheduled += await prefetcher.on_session_start("u1", "cash-flow")
+                await asyncio.sleep(0.01)
+            return scheduled
+
+        assert asyncio.run(scenario()) == ["maya", "maya"]
+        assert prefetcher.stats["rate_limited"] == 2
@@ -0,0 +1,56 @@
+"""
+Unit tests for the in-process TTL cache used on the authentication hot path
+"""
+
+import time
+
+from services.auth_cache import LocalTTLCache
+
+
+class TestLocalTTLCache:
+    """Bounded LRU with per-entry expiry and explicit invalidation"""
+
+    def test_hits_until_the_ttl_elapses(self, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr(time, "monotonic", lambda: now[0])
+        cache = LocalTTLCache(ttl_seconds=60, max_entries=10)
+
+        cache.set("token", {"sub": "u1"})
+        assert cache.get("token") == {"sub": "u1"}
+        now[0] += 61
+        assert cache.get("token") is None
+        assert cache.snapshot()["hits"] == 1
+        assert cache.snapshot()["misses"] == 1
+
+    def test_entry_ttl_can_only_shorten_the_default(self, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr(time, "monotonic", lambda: now[0])
+        cache = LocalTTLCache(ttl_seconds=60, max_entries=10)
+
+        cache.set("expiring", "a", ttl_seconds=5)
+        cache.set("long-lived", "b", ttl_seconds=3600)
+        cache.set("expired", "c", ttl_seconds=-1)
+        now[0] += 10
+
+        assert cache.get("expiring") is None
+        assert cache.get("long-lived") == "b"
+        assert cache.get("expired") is None
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = LocalTTLCache(ttl_seconds=60, max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert cache.get("b") is None
+        assert (cache.get("a"), cache.get("c")) == (1, 3)
+        assert cache.snapshot()["evictions"] == 1
+
+    def test_invalidate_drops_the_entry(self):
+        cache = LocalTTLCache(ttl_seconds=60, max_entries=10)
+        cache.set("key-hash", "access key")
+
+        assert cache.invalidate("key-hash") is True
+        assert cache.invalidate("key-hash") is False
+        assert cache.get("key-hash") is None
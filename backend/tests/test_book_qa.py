@@ -184,8 +184,57 @@ actualizándolas semanalmente para mantener visibilidad sobre la posición de li
         
         # Should fail with auth error, not 404
         assert response.status_code in [401, 403, 422], f"Unexpected status: {response.status_code}"
-    
-    @pytest.mark.asyncio 
+
+    def test_batch_book_qa_endpoint_structure(self, test_client):
+        """Test that batch book QA endpoint exists"""
+        response = test_client.post("/api/multi/book-qa/batch", json={
+            "items": [
+                {"agent": "maya", "question": "¿Cuál es mi runway?"},
+                {"agent": "carlos", "question": "¿Es sano mi LTV/CAC?"}
+            ]
+        })
+
+        # Should fail with auth error, not 404
+        assert response.status_code in [401, 403, 422], f"Unexpected status: {response.status_code}"
+
+    def test_batch_retrieval_uses_one_embedding_call(self):
+        """Batch retrieval embeds all questions at once and keeps their order"""
+        from app.core.vector_store import SupabaseBookRetriever
+
+        class FakeEmbeddings:
+            def __init__(self):
+                self.calls = []
+
+            def embed_documents(self, texts):
+                self.calls.append(list(texts))
+                return [[float(len(text))] for text in texts]
+
+        class FakeRpc:
+            def __init__(self, params):
+                self.params = params
+
+            def execute(self):
+                size = self.params["query_embedding"][0]
+                row = {"id": int(size), "file": "f.md", "chapter": "C", "chunk": 0,
+                       "similarity": 0.9, "content": f"len {int(size)}"}
+                return type("Result", (), {"data": [row]})()
+
+        class FakeSupabase:
+            def rpc(self, name, params):
+                return FakeRpc(params)
+
+        embeddings = FakeEmbeddings()
+        retriever = SupabaseBookRetriever(supabase_client=FakeSupabase(), embeddings=embeddings)
+        questions = ["¿runway?", "¿cuál es mi LTV?", "¿runway?"]
+
+        results = asyncio.run(retriever.aget_relevant_documents_batch(questions))
+
+        assert embeddings.calls == [["¿runway?", "¿cuál es mi LTV?"]]
+        assert [docs[0].page_content for docs in results] == [
+            f"len {len(question)}" for question in questions
+        ]
+
+    @pytest.mark.asyncio
     async def test_agent_with_book_qa_integration(self):
         """Test agent integration with book QA tool"""
         # Skip if no credentials
@@ -0,0 +1,176 @@
+"""
+Unit tests for the bounded conversation memory store (in-memory fallback and a list-backed fake Redis)
+"""
+
+import json
+import asyncio
+
+import pytest
+
+from services import conversation_memory as memory_module
+from services.conversation_memory import ConversationMemoryStore
+
+
+@pytest.fixture
+def store(monkeypatch):
+    monkeypatch.setattr(memory_module.redis_service, "redis_client", None)
+    store = ConversationMemoryStore()
+    store.window_turns = 2
+    store.summarize = False
+    return store
+
+
+class TestConversationMemoryStore:
+    """Bounded window per user and per scope"""
+
+    def test_window_keeps_only_recent_turns(self, store):
+        async def scenario():
+            for turn in range(5):
+                await store.append_turn("user-1", f"question {turn}", f"answer {turn}")
+            return await store.get_window("user-1")
+
+        window = asyncio.run(scenario())
+
+        assert [m["content"] for m in window["messages"]] == [
+            "question 3", "answer 3", "question 4", "answer 4"
+        ]
+        assert window["stored_messages"] == 4
+
+    def test_users_and_agents_are_isolated(self, store):
+        async def scenario():
+            await store.append_turn("user-1", "hola", "hola!")
+            await store.append_turn("user-2", "hi", "hi!", scope="agent:maya")
+            return await store.get_window("user-2"), await store.get_window("user-2", scope="agent:maya")
+
+        default, agent = asyncio.run(scenario())
+        assert default["messages"] == []
+        assert len(agent["messages"]) == 2
+
+    def test_format_for_prompt_includes_summary(self):
+        text = ConversationMemoryStore.format_for_prompt({
+            "summary": "Habló de su flujo de caja",
+            "messages": [{"type": "human", "content": "¿Y el CAC?"}]
+        })
+
+        assert text.splitlines() == [
+            "Resumen de la conversación previa: Habló de su flujo de caja",
+            "Usuario: ¿Y el CAC?"
+        ]
+
+    def test_background_summary_is_referenced_until_it_finishes(self, store):
+        store.summarize = True
+        store.summary_batch_turns = 1
+
+        async def build_summary(previous, messages):
+            return f"{len(messages)} mensajes resumidos"
+        store._build_summary = build_summary
+
+        async def scenario():
+            for turn in range(4):
+                await store.append_turn("user-1", f"question {turn}", f"answer {turn}")
+            pending = len(store._summary_tasks)
+            await asyncio.sleep(0.01)
+            return pending, len(store._summary_tasks), await store.get_window("user-1")
+
+        pending, remaining, window = asyncio.run(scenario())
+        assert (pending, remaining) == (1, 0)
+        assert window["summary"] == "4 mensajes resumidos"
+
+
+class ListRedis:
+    """In-memory Redis with the list commands the store uses; eval runs the real Lua script"""
+
+    def __init__(self):
+        self.data = {}
+
+    def pipeline(self, transaction=True):
+        return ListPipeline(self)
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def rpush(self, key, *values):
+        self.data.setdefault(key, []).extend(values)
+        return len(self.data[key])
+
+    def ltrim(self, key, start, end):
+        items = self.data.get(key, [])
+        start = max(len(items) + start, 0) if start < 0 else start
+        self.data[key] = items[start:len(items) + end + 1 if end < 0 else end + 1]
+
+    def lrange(self, key, start, end):
+        items = self.data.get(key, [])
+        start = max(len(items) + start, 0) if start < 0 else start
+        return items[start:len(items) + end + 1 if end < 0 else end + 1]
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def expire(self, key, seconds):
+        return True
+
+    async def eval(self, script, numkeys, *args):
+        lupa = pytest.importorskip("lupa")
+        lua = lupa.LuaRuntime()
+        commands = {
+            "LRANGE": lambda key, start, end: lua.table_from(self.lrange(key, int(start), int(end))),
+            "LTRIM": lambda key, start, end: self.ltrim(key, int(start), int(end)),
+            "SET": lambda key, value, _ex, _seconds: self.data.__setitem__(key, value),
+        }
+        lua.globals().redis = lua.table_from({"call": lambda name, *params: commands[name](*params)})
+        lua.globals().KEYS = lua.table_from(list(args[:numkeys]))
+        lua.globals().ARGV = lua.table_from([str(arg) for arg in args[numkeys:]])
+        return lua.execute(script)
+
+
+class ListPipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((getattr(self.redis, name), args))
+        return queue
+
+    async def execute(self):
+        return [command(*args) for command, args in self.commands]
+
+
+class TestSummaryAcrossWorkers:
+    """Turns appended while a summary is being written are never dropped"""
+
+    def test_turns_appended_during_the_summary_survive(self, monkeypatch):
+        pytest.importorskip("lupa")
+        redis = ListRedis()
+        monkeypatch.setattr(memory_module.redis_service, "redis_client", redis)
+        store = ConversationMemoryStore()
+        store.window_turns = 1
+        store.summarize = True
+        store.summary_batch_turns = 1
+
+        async def build_summary(previous, messages):
+            # Another worker keeps the conversation going (and hits the list cap) mid-summary
+            await store.append_turn("user-1", "late question", "late answer")
+            return " | ".join(m["content"] for m in messages)
+
+        async def scenario():
+            store._maybe_schedule_summary = lambda user_id, scope, length: None
+            for turn in range(3):
+                await store.append_turn("user-1", f"question {turn}", f"answer {turn}")
+            store._build_summary = build_summary
+            await store._summarize_overflow("user-1", "chat")
+            return [json.loads(m)["content"] for m in redis.data[store._key("user-1", "chat")]]
+
+        remaining = asyncio.run(scenario())
+
+        # The cap already dropped question 0 / answer 0; only the rest of the summarized batch is removed
+        assert remaining == ["question 2", "answer 2", "late question", "late answer"]
+        assert redis.data[store._key("user-1", "chat") + ":summary"].startswith("question 0")
@@ -0,0 +1,76 @@
+"""
+Unit tests for request deadline propagation
+"""
+
+import asyncio
+
+import pytest
+
+from services.deadline import (
+    DeadlineExceeded, deadline_scope, current_deadline, remaining_time,
+    has_time_for, run_stage, degraded_stages, deadline_for_request, ROUTE_DEADLINES
+)
+
+
+class TestDeadlineScope:
+    """Budget shared by nested stages"""
+
+    def test_no_deadline_keeps_stage_defaults(self):
+        assert current_deadline() is None
+        assert remaining_time(30) == 30
+        assert has_time_for(1000)
+
+    def test_stage_timeout_shrinks_to_remaining_budget(self):
+        with deadline_scope(5):
+            assert remaining_time(30) <= 5
+            assert remaining_time(1) == 1
+        assert current_deadline() is None
+
+    def test_shorter_outer_deadline_wins(self):
+        with deadline_scope(1) as outer:
+            with deadline_scope(60) as inner:
+                assert inner is outer
+            with deadline_scope(60, detached=True) as detached:
+                assert detached is not outer
+                assert remaining_time(30) > 1
+
+
+class TestRunStage:
+    """Stages cut short by the deadline are reported as degraded"""
+
+    def test_stage_within_budget_returns_result(self):
+        async def scenario():
+            with deadline_scope(5):
+                return await run_stage("llm", asyncio.sleep(0.01, result="ok"), 30), degraded_stages()
+
+        result, degraded = asyncio.run(scenario())
+        assert result == "ok"
+        assert degraded == []
+
+    def test_stage_is_cancelled_when_budget_runs_out(self):
+        async def scenario():
+            with deadline_scope(0.05):
+                with pytest.raises(DeadlineExceeded):
+                    await run_stage("executive_summary", asyncio.sleep(1), 30)
+                return degraded_stages()
+
+        assert asyncio.run(scenario()) == [{"stage": "executive_summary", "reason": "timeout"}]
+
+    def test_stage_is_skipped_without_minimum_time(self):
+        async def scenario():
+            with deadline_scope(0.5):
+                with pytest.raises(DeadlineExceeded):
+                    await run_stage("book_qa", asyncio.sleep(0), 10, min_seconds=5)
+                return degraded_stages()
+
+        assert asyncio.run(scenario()) == [{"stage": "book_qa", "reason": "deadline"}]
+
+
+class TestDeadlineForRequest:
+    """Header overrides the per-route default"""
+
+    def test_header_in_milliseconds(self):
+        assert deadline_for_request("/api/ai/chat", "1500") == 1.5
+
+    def test_route_default_and_invalid_header(self):
+        assert deadline_for_request("/api/ai/chat", "soon") == ROUTE_DEADLINES["/api/ai/chat"]
@@ -0,0 +1,71 @@
+"""
+Unit tests for provider calls in the dual AI service (provider requests stubbed)
+"""
+
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("openai")
+
+from services.dual_ai_service import AIResponse, DualAIService
+from services.provider_health import CircuitState
+from services.provider_scheduler import Priority, QueueTimeoutError
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test-key")
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    return DualAIService()
+
+
+def open_circuit(service, provider):
+    health = service.health.get(provider)
+    for _ in range(health.failure_threshold):
+        health.record_failure()
+    health.opened_at = time.monotonic() - health.open_seconds
+    return health
+
+
+class TestHalfOpenProbe:
+    """A probe reserved by routing is released if the provider is never called"""
+
+    def test_queue_timeout_releases_the_probe(self, service):
+        health = open_circuit(service, "deepseek")
+        assert service.health.choose("deepseek", None) == "deepseek"
+        assert health.probe_in_flight
+
+        # Every slot busy: the request times out in the queue without reaching the provider
+        bulkhead = service.scheduler.bulkheads["deepseek"]
+        bulkhead.in_flight = bulkhead.max_concurrency
+        service.scheduler.queue_timeouts[Priority.BATCH] = 0.05
+
+        with pytest.raises(QueueTimeoutError):
+            asyncio.run(service._call_provider("deepseek", "hola", priority=Priority.BATCH))
+
+        assert health.state == CircuitState.HALF_OPEN
+        assert not health.probe_in_flight
+        assert health.allow_request()
+
+
+class TestCascadeEscalation:
+    """A rejected draft is never re-requested from the provider that wrote it"""
+
+    def test_rerouted_escalation_returns_the_draft(self, service, monkeypatch):
+        calls = []
+
+        async def call_provider(provider, prompt, context=None, max_tokens=1000, priority=Priority.INTERACTIVE):
+            calls.append(provider)
+            return AIResponse(content="borrador corto", model_used="gpt-4o-mini", provider=provider)
+
+        monkeypatch.setattr(service, "_call_provider", call_provider)
+        monkeypatch.setattr(service.cascade, "applies", lambda task_type: True)
+        monkeypatch.setattr(service.cascade, "evaluate", lambda *args, **kwargs: ["too_short"])
+        open_circuit(service, "deepseek").opened_at = time.monotonic()  # still open: reroutes to openai
+
+        response = asyncio.run(service.generate_response("Analizar mi estrategia de precios", "pricing_strategy"))
+
+        assert calls == ["openai"]
+        assert response.content == "borrador corto"
@@ -0,0 +1,97 @@
+"""
+Unit tests for the per-user, per-agent interaction log (Redis Streams with in-memory fallback)
+"""
+
+import asyncio
+
+import pytest
+
+from services import interaction_log as log_module
+from services.interaction_log import InteractionLog
+
+
+class RecordingPipeline:
+    def __init__(self, calls):
+        self.calls = calls
+
+    def xadd(self, key, fields, maxlen=None, approximate=True):
+        self.calls.append(("xadd", key, maxlen, approximate))
+
+    def expire(self, key, seconds):
+        self.calls.append(("expire", key, seconds))
+
+    async def execute(self):
+        return ["1700000000000-0", True]
+
+
+class RecordingRedis:
+    """Records stream commands; XREVRANGE serves three stored entries"""
+
+    def __init__(self):
+        self.calls = []
+
+    def pipeline(self, transaction=False):
+        return RecordingPipeline(self.calls)
+
+    async def xrevrange(self, key, max="+", min="-", count=None):
+        self.calls.append(("xrevrange", key, max, count))
+        return [(f"{i}-0", {"data": '{"n": %d}' % i}) for i in (3, 2, 1)][:count]
+
+
+@pytest.fixture
+def log(monkeypatch):
+    monkeypatch.setattr(log_module.redis_service, "redis_client", None)
+    return InteractionLog()
+
+
+class TestInteractionLog:
+    """Appends are capped and reads page backwards from the newest entry"""
+
+    def test_pages_newest_first_with_cursor(self, log):
+        async def scenario():
+            for n in range(5):
+                await log.append("langchain", "u1", "maya", {"n": n})
+            first = await log.recent("langchain", "u1", "maya", count=2)
+            second = await log.recent("langchain", "u1", "maya", count=2, before=first["next_cursor"])
+            last = await log.recent("langchain", "u1", "maya", count=2, before=second["next_cursor"])
+            return first, second, last
+
+        first, second, last = asyncio.run(scenario())
+        assert [entry["n"] for entry in first["interactions"]] == [4, 3]
+        assert [entry["n"] for entry in second["interactions"]] == [2, 1]
+        assert [entry["n"] for entry in last["interactions"]] == [0]
+        assert last["next_cursor"] is None
+
+    def test_streams_are_capped_and_scoped(self, log):
+        log.max_len = 3
+
+        async def scenario():
+            for n in range(10):
+                await log.append("langchain", "u1", "maya", {"n": n})
+            await log.append("langchain", "u2", "maya", {"n": 99})
+            return (await log.recent("langchain", "u1", "maya", count=50),
+                    await log.recent("langchain", "u1", "carlos"))
+
+        page, other_agent = asyncio.run(scenario())
+        assert [entry["n"] for entry in page["interactions"]] == [9, 8, 7]
+        assert other_agent["interactions"] == []
+
+    def test_invalid_cursor_is_rejected(self, log):
+        with pytest.raises(ValueError):
+            asyncio.run(log.recent("langchain", "u1", "maya", before="agent_interaction:*"))
+
+    def test_redis_commands_cost_one_page(self, monkeypatch):
+        client = RecordingRedis()
+        monkeypatch.setattr(log_module.redis_service, "redis_client", client)
+        log = InteractionLog()
+
+        async def scenario():
+            entry_id = await log.append("langchain", "u1", "maya", {"n": 1})
+            return entry_id, await log.recent("langchain", "u1", "maya", count=2, before="4-0")
+
+        entry_id, page = asyncio.run(scenario())
+        assert entry_id == "1700000000000-0"
+        assert client.calls[0] == ("xadd", "interactions:langchain:maya:u1", log.max_len, True)
+        assert client.calls[-1] == ("xrevrange", "interactions:langchain:maya:u1", "(4-0", 3)
+        assert [entry["n"] for entry in page["interactions"]] == [3, 2]
+        assert page["next_cursor"] == "2-0"
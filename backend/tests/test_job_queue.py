@@ -0,0 +1,77 @@
+"""
+Unit tests for the background AI job queue (in-memory fallback, no Redis)
+"""
+
+import asyncio
+
+import pytest
+
+from services import job_queue as job_queue_module
+from services.job_queue import JobQueue, JOB_COMPLETED, JOB_FAILED
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    monkeypatch.setattr(job_queue_module.redis_service, "redis_client", None)
+    return JobQueue()
+
+
+async def wait_until_finished(queue, job_id, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while asyncio.get_running_loop().time() < deadline:
+        job = await queue.get_job(job_id)
+        if job["status"] in (JOB_COMPLETED, JOB_FAILED):
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+class TestJobQueue:
+    """Submit, progress and result lifecycle"""
+
+    def test_job_runs_with_progress_and_result(self, queue):
+        seen_progress = []
+
+        async def handler(payload, progress):
+            progress(50, "halfway")
+            await asyncio.sleep(0)  # the progress write runs in the background
+            seen_progress.append((await queue.get_job(job_ids[0]))["progress"])
+            return {"total": payload["a"] + payload["b"]}
+
+        queue.register("sum", handler)
+        job_ids = []
+
+        async def scenario():
+            job_ids.append(await queue.submit("sum", "user-1", {"a": 2, "b": 3}))
+            job = await wait_until_finished(queue, job_ids[0])
+            await queue.stop()
+            return job
+
+        job = asyncio.run(scenario())
+
+        assert job["status"] == JOB_COMPLETED
+        assert job["progress"] == 100
+        assert job["result"] == {"total": 5}
+        assert job["user_id"] == "user-1"
+        assert seen_progress == [50]
+
+    def test_failed_job_records_error(self, queue):
+        async def handler(payload, progress):
+            raise RuntimeError("provider down")
+
+        queue.register("boom", handler)
+
+        async def scenario():
+            job_id = await queue.submit("boom", "user-1", {})
+            job = await wait_until_finished(queue, job_id)
+            await queue.stop()
+            return job
+
+        job = asyncio.run(scenario())
+
+        assert job["status"] == JOB_FAILED
+        assert job["error"] == "provider down"
+
+    def test_unknown_job_type_is_rejected(self, queue):
+        with pytest.raises(ValueError):
+            asyncio.run(queue.submit("missing", "user-1", {}))
@@ -0,0 +1,53 @@
+"""
+Unit tests for the LLM stand-in server helpers
+"""
+
+import random
+import statistics
+
+from scripts.llm_standin import (
+    CassetteStore,
+    LatencyModel,
+    completion_payload,
+    prompt_hash,
+    stream_chunks,
+)
+
+
+class TestLLMStandIn:
+    """Cassette keys, streaming format and latency distribution"""
+
+    def test_prompt_hash_ignores_key_order(self):
+        messages = [{"role": "user", "content": "¿Qué es el CAC?"}]
+        reordered = [{"content": "¿Qué es el CAC?", "role": "user"}]
+
+        assert prompt_hash("gpt-4o-mini", messages) == prompt_hash("gpt-4o-mini", reordered)
+        assert prompt_hash("gpt-4o-mini", messages) != prompt_hash("deepseek-reasoner", messages)
+
+    def test_cassette_round_trip(self, tmp_path):
+        store = CassetteStore(str(tmp_path))
+        body = {"model": "gpt-4o-mini", "messages": [{"role": "user", "content": "hola"}]}
+        response = completion_payload("gpt-4o-mini", "hola emprendedor", prompt_tokens=1)
+        key = prompt_hash(body["model"], body["messages"])
+
+        store.save(key, body, response, latency=1.25)
+
+        assert store.load(key)["response"] == response
+        assert store.load(key)["latency_seconds"] == 1.25
+        assert store.load("missing") is None
+
+    def test_stream_chunks_rebuild_the_content(self):
+        completion = completion_payload("gpt-4o-mini", "margen de contribución positivo", prompt_tokens=3)
+        chunks = stream_chunks(completion)
+
+        content = "".join(c["choices"][0]["delta"].get("content", "") for c in chunks)
+        assert content == "margen de contribución positivo"
+        assert chunks[0]["choices"][0]["delta"] == {"role": "assistant"}
+        assert chunks[-1]["choices"][0]["finish_reason"] == "stop"
+
+    def test_latency_model_matches_median(self):
+        model = LatencyModel(median=1.0, p99=5.0, tokens_per_second=50, rng=random.Random(7))
+        samples = [model.time_to_first_token() for _ in range(4000)]
+
+        assert 0.9 < statistics.median(samples) < 1.1
+        assert model.token_interval() == 0.02
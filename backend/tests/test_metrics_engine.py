@@ -0,0 +1,102 @@
+"""
+Unit tests for the deterministic financial metrics engine
+"""
+
+from services.metrics_engine import metrics_engine, quick_recommendations
+
+HEALTHY = {
+    "id": "acme",
+    "revenue": 100000, "expenses": 75000, "net_profit": 25000, "cash_flow": 20000,
+    "ltv": 3000, "coca": 500, "fixed_costs": 30000,
+    "price_per_unit": 100, "variable_cost_per_unit": 30,
+}
+
+STRUGGLING = {
+    "id": "beta",
+    "revenue": 50000, "expenses": 52000, "net_profit": -2000, "cash_flow": -5000,
+    "ltv": 400, "coca": 500, "fixed_costs": 20000,
+    "price_per_unit": 50, "variable_cost_per_unit": 45,
+    "cash_balance": 10000, "monthly_burn": 5000,
+    "customer_concentration": 30, "debt_to_equity": 1.5,
+}
+
+
+class TestDerivedMetrics:
+    """Ratios, break-even, payback and runway"""
+
+    def test_unit_economics_and_break_even(self):
+        metrics = metrics_engine.evaluate_one(HEALTHY)["metrics"]
+        assert metrics["net_margin_pct"] == 25.0
+        assert metrics["ltv_cac_ratio"] == 6.0
+        assert metrics["contribution_margin_pct"] == 70.0
+        assert metrics["payback_months"] == round(500 / 70, 2)
+        assert metrics["break_even_units"] == round(30000 / 70, 2)
+
+    def test_cac_falls_back_to_marketing_spend(self):
+        metrics = metrics_engine.evaluate_one({"ltv": 900, "marketing_spend": 3000, "new_customers": 10})["metrics"]
+        assert metrics["coca"] == 300.0
+        assert metrics["ltv_cac_ratio"] == 3.0
+
+    def test_missing_inputs_are_none_and_zero_burn_has_no_runway(self):
+        metrics = metrics_engine.evaluate_one({"cash_balance": 1000, "monthly_burn": 0})["metrics"]
+        assert metrics["runway_months"] is None
+        assert metrics["ltv_cac_ratio"] is None
+        assert metrics_engine.evaluate_one({"cash_balance": 1000, "monthly_burn": 0})["risk"]["runway_risk"] == "Bajo"
+
+
+class TestRiskAndHealth:
+    """Rule-level answers that previously lived in several scalar copies"""
+
+    def test_risk_levels(self):
+        risk = metrics_engine.evaluate_one(STRUGGLING)["risk"]
+        assert risk == {
+            "runway_risk": "Alto",
+            "liquidity_risk": "Alto",
+            "concentration_risk": "Alto",
+            "financial_risk": "Medio",
+        }
+
+    def test_health_score_bands(self):
+        health = metrics_engine.health_score(HEALTHY)
+        assert health["component_scores"] == {
+            "profitability": 25.0, "unit_economics": 25.0, "cash_flow": 25.0, "growth_efficiency": 25.0
+        }
+        assert health["total_score"] == 100.0
+        assert health["health_level"] == "Excelente"
+        assert health["recommendations_priority"] == "Mantenimiento"
+
+    def test_partial_data_rescales_to_available_components(self):
+        health = metrics_engine.health_score({"revenue": 1000, "net_profit": 200, "cash_flow": 150})
+        assert set(health["component_scores"]) == {"profitability", "cash_flow"}
+        assert health["total_score"] == 100.0
+
+    def test_no_data(self):
+        health = metrics_engine.health_score({})
+        assert health["total_score"] == 0
+        assert health["health_level"] == "Sin datos"
+
+
+class TestBatch:
+    """Hundreds of businesses in one call, same answers as one at a time"""
+
+    def test_batch_matches_single_evaluation(self):
+        records = [dict(HEALTHY, id=f"h{i}") if i % 2 else dict(STRUGGLING, id=f"s{i}") for i in range(300)]
+        results = metrics_engine.evaluate(records)
+        assert len(results) == 300
+        assert results[0]["id"] == "s0"
+        assert results[1] == dict(metrics_engine.evaluate_one(HEALTHY), id="h1")
+
+        portfolio = metrics_engine.summarize(results)
+        assert portfolio["count"] == 300
+        assert portfolio["by_health_level"]["Excelente"] == 150
+        assert len(portfolio["high_risk_ids"]) == 150
+
+    def test_quick_recommendations_from_rules(self):
+        quick = quick_recommendations(metrics_engine.evaluate_one(STRUGGLING), cash_flow=STRUGGLING["cash_flow"])
+        categories = {rec["category"] for rec in quick["recommendations"]}
+        assert categories == {"unit_economics", "profitability", "pricing", "cash_flow"}
+        assert quick["overall_status"] == "Crítico"
+
+    def test_agent_facts_only_include_computable_values(self):
+        facts = metrics_engine.facts({"question": "runway?", "current_balance": 9000, "burn_rate": 3000})
+        assert facts == {"runway_months": 3.0, "runway_risk": "Medio", "liquidity_risk": "Alto"}
@@ -0,0 +1,56 @@
+"""
+Unit tests for the fast-model-first cascade checks
+"""
+
+from services.model_cascade import CascadePolicy, input_metrics, numeric_mismatches
+
+
+def make_policy():
+    policy = CascadePolicy()
+    policy.enabled = True
+    return policy
+
+
+CASH_FLOW_ANSWER = (
+    "El saldo actual de 15.000 cubre tres meses. Riesgo principal: concentración de cobros. "
+    "Proyección: en el escenario base el flujo se estabiliza. KPI: días de caja. "
+    "Plan de acción: renegociar plazos con proveedores. "
+) * 3
+
+
+class TestCascadeChecks:
+    """Length, required sections and numeric consistency"""
+
+    def test_complete_answer_is_accepted(self):
+        policy = make_policy()
+        prompt = 'DATOS: {"saldo_actual":15000}'
+        assert policy.evaluate("complex_cash_flow_analysis", CASH_FLOW_ANSWER, prompt) == []
+
+    def test_short_answer_without_sections_escalates(self):
+        policy = make_policy()
+        failures = policy.evaluate("complex_cash_flow_analysis", "Todo bien.", "")
+        assert "length" in failures
+        assert any(failure.startswith("section:riesgo") for failure in failures)
+
+    def test_contradicting_input_metric_escalates(self):
+        policy = make_policy()
+        prompt = 'DATOS: {"saldo_actual":15000}'
+        answer = CASH_FLOW_ANSWER.replace("15.000", "25.000")
+        assert "numeric:saldo_actual" in policy.evaluate("complex_cash_flow_analysis", answer, prompt)
+
+    def test_ratio_quoted_as_percentage_is_consistent(self):
+        metrics = input_metrics('{"churn_rate":0.05}')
+        assert numeric_mismatches("Tu churn rate de 5% es saludable", metrics) == []
+        assert numeric_mismatches("Tu churn rate de 12% es alto", metrics) == ["churn_rate"]
+
+    def test_escalation_rate_by_task_type(self):
+        policy = make_policy()
+        policy.record("financial_chat", [])
+        policy.record("financial_chat", ["length"])
+        policy.record_draft_error("complex_pricing_strategy")
+
+        snapshot = policy.snapshot()
+        assert snapshot["drafts"] == 3
+        assert snapshot["escalations"] == 2
+        assert snapshot["by_task_type"]["financial_chat"]["escalation_rate"] == 0.5
+        assert snapshot["failed_checks"] == {"length": 1}
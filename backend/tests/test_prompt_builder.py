@@ -0,0 +1,54 @@
+"""
+Unit tests for compact prompt serialisation and output budgets
+"""
+
+import json
+
+from services.prompt_builder import check_tokens, compact_json, compact_value, output_budget
+
+
+class TestCompactJson:
+    """Compact prompt context serialisation"""
+
+    def test_drops_empty_fields_and_rounds_floats(self):
+        data = {"revenue": 12345.6789, "notes": None, "tags": [], "margin": 0.5000001}
+
+        assert compact_value(data) == {"revenue": 12345.68, "margin": 0.5}
+
+    def test_small_ratios_keep_significant_digits(self):
+        text = compact_json({"churn_rate": 0.004, "conversion": 0.0123456, "margin": -0.00051234})
+
+        assert text == '{"churn_rate":0.004,"conversion":0.0123,"margin":-0.000512}'
+
+    def test_list_summary_keeps_small_ratios(self):
+        values = [0.001] * 5 + [0.003] * 5
+        summary = compact_value(values, max_list_items=2)[1]
+
+        assert summary == {"omitted_items": 8, "min": 0.001, "max": 0.003, "avg": 0.002}
+
+    def test_uses_no_whitespace(self):
+        text = compact_json({"a": 1, "b": [1, 2]})
+
+        assert text == '{"a":1,"b":[1,2]}'
+
+    def test_long_lists_keep_head_tail_and_summary(self):
+        values = list(range(100))
+        result = json.loads(compact_json({"series": values}, max_list_items=4))["series"]
+
+        assert result[:2] == [0, 1]
+        assert result[-2:] == [98, 99]
+        assert result[2] == {"omitted_items": 96, "min": 2, "max": 97, "avg": 49.5}
+
+
+class TestOutputBudget:
+
+    def test_known_task_and_fallback(self):
+        assert output_budget("agent_digest") < output_budget("agent_consultation")
+        assert output_budget("unknown_task") == output_budget("general")
+
+
+class TestCheckTokens:
+
+    def test_limit(self):
+        assert check_tokens("hola " * 10)
+        assert not check_tokens("hola " * 10, max_tokens=2)
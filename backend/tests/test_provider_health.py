@@ -0,0 +1,110 @@
+"""
+Unit tests for live provider health tracking and adaptive routing
+"""
+
+import time
+
+from services.provider_health import ProviderHealth, ProviderHealthRegistry, CircuitState
+
+
+def make_health(**overrides):
+    options = {
+        "name": "deepseek",
+        "slow_latency_seconds": 5.0,
+        "failure_threshold": 3,
+        "open_seconds": 0.05,
+    }
+    options.update(overrides)
+    return ProviderHealth(**options)
+
+
+class TestProviderHealth:
+    """Circuit breaker and EWMA behaviour"""
+
+    def test_consecutive_failures_open_circuit(self):
+        health = make_health()
+        for _ in range(3):
+            health.record_failure(1.0)
+
+        assert health.state == CircuitState.OPEN
+        assert health.is_degraded()
+        assert not health.allow_request()
+
+    def test_half_open_allows_single_probe_and_recovers(self):
+        health = make_health()
+        for _ in range(3):
+            health.record_failure()
+        time.sleep(0.06)
+
+        assert health.allow_request()
+        assert health.state == CircuitState.HALF_OPEN
+        assert not health.allow_request()  # only one probe in flight
+
+        health.record_success(0.5)
+        assert health.state == CircuitState.CLOSED
+        assert health.allow_request()
+
+    def test_released_probe_lets_the_next_request_probe(self):
+        health = make_health()
+        for _ in range(3):
+            health.record_failure()
+        time.sleep(0.06)
+        assert health.allow_request()
+
+        health.release_probe()
+        assert health.state == CircuitState.HALF_OPEN
+        assert health.ewma_latency is None
+        assert health.allow_request()
+
+    def test_failed_probe_reopens_circuit(self):
+        health = make_health()
+        for _ in range(3):
+            health.record_failure()
+        time.sleep(0.06)
+        assert health.allow_request()
+
+        health.record_failure()
+        assert health.state == CircuitState.OPEN
+
+    def test_slow_ewma_marks_provider_degraded(self):
+        health = make_health()
+        for _ in range(5):
+            health.record_success(12.0)
+
+        assert health.state == CircuitState.CLOSED
+        assert health.is_degraded()
+        assert health.snapshot()["ewma_latency_seconds"] > 5.0
+
+
+class TestProviderRouting:
+    """Routing decisions between DeepSeek and OpenAI"""
+
+    def test_healthy_preferred_provider_is_kept(self):
+        registry = ProviderHealthRegistry()
+        assert registry.choose("deepseek", "openai") == "deepseek"
+
+    def test_degraded_provider_is_skipped_for_healthy_alternative(self):
+        registry = ProviderHealthRegistry()
+        registry.probe_every = 1000
+        for _ in range(5):
+            registry.get("deepseek").record_success(60.0)
+
+        assert registry.choose("deepseek", "openai") == "openai"
+
+    def test_degraded_provider_receives_probe_traffic(self):
+        registry = ProviderHealthRegistry()
+        registry.probe_every = 3
+        for _ in range(5):
+            registry.get("deepseek").record_success(60.0)
+
+        choices = [registry.choose("deepseek", "openai") for _ in range(6)]
+        assert choices.count("deepseek") == 2
+        assert choices.count("openai") == 4
+
+    def test_no_provider_when_all_circuits_open(self):
+        registry = ProviderHealthRegistry()
+        for name in ("deepseek", "openai"):
+            for _ in range(5):
+                registry.get(name).record_failure()
+
+        assert registry.choose("deepseek", "openai") is None
@@ -0,0 +1,94 @@
+"""
+Unit tests for per-provider bulkheads and priority queueing
+"""
+
+import asyncio
+
+import pytest
+
+from services.provider_scheduler import (
+    Priority,
+    ProviderBulkhead,
+    QueueTimeoutError,
+    current_priority,
+    parse_priority,
+    priority_scope,
+)
+
+
+async def hold_slot(bulkhead, priority, order, label, hold=0.02, timeout=5.0):
+    async with bulkhead.slot(priority, timeout):
+        order.append(label)
+        await asyncio.sleep(hold)
+
+
+class TestProviderBulkhead:
+    """Concurrency limits, priority ordering and queue deadlines"""
+
+    def test_interactive_jumps_ahead_of_queued_batch(self):
+        bulkhead = ProviderBulkhead("deepseek", max_concurrency=1, reserved_interactive=0)
+        order = []
+
+        async def scenario():
+            first = asyncio.ensure_future(hold_slot(bulkhead, Priority.BATCH, order, "batch-1", hold=0.05))
+            await asyncio.sleep(0)
+            batch = asyncio.ensure_future(hold_slot(bulkhead, Priority.BATCH, order, "batch-2"))
+            await asyncio.sleep(0)
+            interactive = asyncio.ensure_future(hold_slot(bulkhead, Priority.INTERACTIVE, order, "chat"))
+            await asyncio.gather(first, batch, interactive)
+
+        asyncio.run(scenario())
+
+        assert order == ["batch-1", "chat", "batch-2"]
+        assert bulkhead.in_flight == 0
+
+    def test_reserved_slot_is_kept_for_interactive(self):
+        bulkhead = ProviderBulkhead("openai", max_concurrency=2, reserved_interactive=1)
+        order = []
+
+        async def scenario():
+            background = [
+                asyncio.ensure_future(hold_slot(bulkhead, Priority.BACKGROUND, order, f"report-{i}", hold=0.05))
+                for i in range(2)
+            ]
+            await asyncio.sleep(0.01)
+            assert bulkhead.in_flight == 1
+            await hold_slot(bulkhead, Priority.INTERACTIVE, order, "chat", hold=0)
+            await asyncio.gather(*background)
+
+        asyncio.run(scenario())
+
+        assert order.index("chat") < order.index("report-1")
+
+    def test_queue_timeout_raises_and_leaves_queue_clean(self):
+        bulkhead = ProviderBulkhead("deepseek", max_concurrency=1, reserved_interactive=0)
+
+        async def scenario():
+            holder = asyncio.ensure_future(hold_slot(bulkhead, Priority.BATCH, [], "batch", hold=0.1))
+            await asyncio.sleep(0)
+            with pytest.raises(QueueTimeoutError):
+                await bulkhead.acquire(Priority.BACKGROUND, queue_timeout=0.01)
+            await holder
+
+        asyncio.run(scenario())
+
+        snapshot = bulkhead.snapshot()
+        assert snapshot["in_flight"] == 0
+        assert snapshot["queues"]["background"]["timeouts"] == 1
+        assert snapshot["queues"]["background"]["queue_depth"] == 0
+
+
+class TestParsePriority:
+
+    def test_explicit_and_derived(self):
+        assert parse_priority("batch") == Priority.BATCH
+        assert parse_priority(None, "financial_chat") == Priority.INTERACTIVE
+        assert parse_priority(None, "complex_cash_flow_analysis") == Priority.BACKGROUND
+
+    def test_scope_sets_the_default_for_calls_inside_it(self):
+        with priority_scope(Priority.BATCH):
+            assert current_priority() == Priority.BATCH
+            assert parse_priority(None, "financial_chat") == Priority.BATCH
+            assert parse_priority("interactive") == Priority.INTERACTIVE
+        assert current_priority() == Priority.INTERACTIVE
+        assert parse_priority(None, "financial_chat") == Priority.INTERACTIVE
@@ -0,0 +1,456 @@
+"""
+Round-trip counts of RedisService operations against an in-memory Redis that counts them
+"""
+
+import asyncio
+import fnmatch
+
+import pytest
+
+from services.redis_service import RedisService, RedisUnavailableError
+
+
+class CountingRedis:
+    """Minimal in-memory Redis: each direct command or pipeline execute is one round trip"""
+
+    def __init__(self):
+        self.data = {}
+        self.round_trips = 0
+        self.commands = []
+
+    def pipeline(self, transaction=True):
+        return CountingPipeline(self)
+
+    async def scan_iter(self, match="*", count=None):
+        # One round trip per SCAN page; the fake returns a single page
+        self.round_trips += 1
+        for key in [key for key in self.data if fnmatch.fnmatchcase(key, match)]:
+            yield key
+
+    def __getattr__(self, name):
+        handler = getattr(type(self), f"_{name}", None)
+        if handler is None:
+            raise AttributeError(name)
+
+        async def command(*args, **kwargs):
+            self.round_trips += 1
+            return self.run(name, *args, **kwargs)
+        return command
+
+    def run(self, name, *args, **kwargs):
+        self.commands.append(name)
+        return getattr(self, f"_{name}")(*args, **kwargs)
+
+    # Commands
+    def _ping(self):
+        return True
+
+    def _get(self, key):
+        return self.data.get(key)
+
+    def _mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    def _incr(self, key, amount=1):
+        self.data[key] = str(int(self.data.get(key, 0)) + amount)
+        return int(self.data[key])
+
+    def _exists(self, *keys):
+        return sum(1 for key in keys if key in self.data)
+
+    def _delete(self, *keys):
+        return sum(1 for key in keys if self.data.pop(key, None) is not None)
+
+    def _keys(self, pattern):
+        return [key for key in self.data if fnmatch.fnmatchcase(key, pattern)]
+
+    def _expire(self, key, seconds):
+        return key in self.data
+
+    def _hset(self, key, field=None, value=None, mapping=None):
+        fields = self.data.setdefault(key, {})
+        if field is not None:
+            fields[field] = value
+        fields.update({k: str(v) for k, v in (mapping or {}).items()})
+        return 1
+
+    def _hget(self, key, field):
+        return self.data.get(key, {}).get(field)
+
+    def _hmget(self, key, fields):
+        return [self.data.get(key, {}).get(field) for field in fields]
+
+    def _hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    def _hdel(self, key, *fields):
+        return sum(1 for field in fields if self.data.get(key, {}).pop(field, None) is not None)
+
+    def _hincrby(self, key, field, amount=1):
+        fields = self.data.setdefault(key, {})
+        fields[field] = str(int(fields.get(field, 0)) + amount)
+        return int(fields[field])
+
+    def _sadd(self, key, *members):
+        self.data.setdefault(key, set()).update(members)
+        return len(members)
+
+    def _srem(self, key, *members):
+        self.data.get(key, set()).difference_update(members)
+        return len(members)
+
+    def _smembers(self, key):
+        return set(self.data.get(key, set()))
+
+    def _publish(self, channel, message):
+        self.data.setdefault(f"published:{channel}", []).append(message)
+        return 0
+
+    def _zadd(self, key, mapping):
+        self.data.setdefault(key, {}).update(mapping)
+        return len(mapping)
+
+    def _zrangebyscore(self, key, low, high):
+        entries = self.data.get(key, {})
+        return [member for member, score in sorted(entries.items(), key=lambda item: item[1]) if score >= low]
+
+
+class CountingPipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.queued = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.queued.append((name, args, kwargs))
+            return self
+        return queue
+
+    async def execute(self):
+        self.redis.round_trips += 1
+        return [self.redis.run(name, *args, **kwargs) for name, args, kwargs in self.queued]
+
+
+@pytest.fixture
+def service():
+    service = RedisService()
+    service.redis_client = CountingRedis()
+    return service
+
+
+def round_trips(service, operation):
+    """Runs the operation and returns (result, round trips it took)"""
+    before = service.redis_client.round_trips
+    result = asyncio.run(operation)
+    return result, service.redis_client.round_trips - before
+
+
+class TestRoundTrips:
+    """Each operation costs a fixed number of round trips, independent of the data size"""
+
+    def test_writes_take_one_round_trip(self, service):
+        _, saved = round_trips(service, service.save_user_progress("u1", "cash-flow", {"progress_percentage": 40}))
+        _, completed = round_trips(service, service.track_module_completion("u1", "cash-flow"))
+        _, bookmarked = round_trips(service, service.save_bookmark("u1", {"module_id": "cash-flow", "section": "intro"}))
+        _, started = round_trips(service, service.start_learning_session("u1", "cash-flow"))
+
+        assert (saved, completed, bookmarked, started) == (1, 1, 1, 1)
+        # TTLs travel with their writes (progress also refreshes its module index)
+        assert service.redis_client.commands.count("expire") == 5
+
+    def test_all_progress_is_independent_of_module_count(self, service):
+        modules = ["cash-flow", "unit-economics", "costs-pricing", "profitability", "planning"]
+        for percentage, module_id in enumerate(modules):
+            asyncio.run(service.save_user_progress("u1", module_id, {"progress_percentage": percentage}))
+
+        progress, trips = round_trips(service, service.get_all_user_progress("u1"))
+
+        assert trips == 2
+        assert sorted(progress) == sorted(modules)
+        assert progress["planning"]["progress_percentage"] == 4
+
+    def test_global_stats_are_one_hash_read(self, service):
+        for stat_name in ("learning_sessions", "modules_completed", "chat_messages"):
+            asyncio.run(service.increment_global_stat(stat_name, 3))
+
+        stats, trips = round_trips(service, service.get_global_stats())
+
+        assert trips == 1
+        assert stats == {"learning_sessions": 3, "modules_completed": 3, "chat_messages": 3}
+
+    def test_completions_round_trip_through_json(self, service):
+        asyncio.run(service.track_module_completion("u1", "cash-flow"))
+
+        completions, trips = round_trips(service, service.get_user_completions("u1"))
+
+        assert trips == 1
+        assert [entry["module_id"] for entry in completions] == ["cash-flow"]
+
+
+class TestSecondaryIndexes:
+    """Listings read maintained indexes; KEYS never runs on the request path"""
+
+    def test_listings_never_scan_the_keyspace(self, service):
+        asyncio.run(service.save_user_progress("u1", "cash-flow", {"progress_percentage": 10}))
+        asyncio.run(service.save_user_progress("u2", "planning", {"progress_percentage": 20}))
+        asyncio.run(service.increment_global_stat("learning_sessions"))
+
+        progress = asyncio.run(service.get_all_user_progress("u1"))
+        asyncio.run(service.get_global_stats())
+
+        assert list(progress) == ["cash-flow"]
+        assert "keys" not in service.redis_client.commands
+
+    def test_expired_modules_are_dropped_from_the_index(self, service):
+        asyncio.run(service.save_user_progress("u1", "cash-flow", {"progress_percentage": 10}))
+        asyncio.run(service.save_user_progress("u1", "planning", {"progress_percentage": 20}))
+        del service.redis_client.data["user:u1:progress:planning"]  # TTL elapsed
+
+        assert list(asyncio.run(service.get_all_user_progress("u1"))) == ["cash-flow"]
+        assert service.redis_client.data["user:u1:progress_modules"] == {"cash-flow"}
+
+    def test_backfill_indexes_legacy_keys(self, service):
+        data = service.redis_client.data
+        data["user:u1:progress:cash-flow"] = {"data": '{"progress_percentage": 70}'}
+        data["global:stats:modules_completed"] = "4"
+        asyncio.run(service.increment_global_stat("modules_completed"))
+
+        indexed = asyncio.run(service.backfill_indexes())
+        again = asyncio.run(service.backfill_indexes())
+
+        assert indexed == {"progress_modules": 1, "global_stats": 1}
+        assert again == {"progress_modules": 1, "global_stats": 0}
+        assert asyncio.run(service.get_all_user_progress("u1"))["cash-flow"]["progress_percentage"] == 70
+        assert asyncio.run(service.get_global_stats()) == {"modules_completed": 5}
+
+
+class TestAccessKeyIndex:
+    """Access keys are found by id through the index, O(keys listed) instead of O(keys²)"""
+
+    @pytest.fixture
+    def auth(self, monkeypatch):
+        from services import auth_service as auth_module
+
+        client = CountingRedis()
+        monkeypatch.setattr(auth_module.redis_service, "redis_client", client)
+        return auth_module.auth_service, client
+
+    def test_list_and_revoke_by_id(self, auth):
+        from models.auth import AccessKeyCreate, AccessKeyScope
+
+        auth_service, client = auth
+
+        async def scenario():
+            _, first = await auth_service.generate_access_key(
+                AccessKeyCreate(name="first", scopes=[AccessKeyScope.READ]), "admin"
+            )
+            _, second = await auth_service.generate_access_key(
+                AccessKeyCreate(name="second", scopes=[AccessKeyScope.READ]), "admin"
+            )
+            before = client.round_trips
+            listed = await auth_service.get_admin_keys("admin")
+            listing_trips = client.round_trips - before
+            revoked = await auth_service.revoke_access_key(first.id, "admin")
+            return first, listed, listing_trips, revoked, await auth_service.get_admin_keys("admin")
+
+        first, listed, listing_trips, revoked, after = asyncio.run(scenario())
+        assert sorted(key.name for key in listed) == ["first", "second"]
+        assert listing_trips == 3
+        assert revoked is True
+        assert {key.id: key.is_active for key in after}[first.id] is False
+        assert "keys" not in client.commands
+
+    def test_validation_is_cached_and_usage_is_batched(self, auth):
+        from models.auth import AccessKeyCreate, AccessKeyScope
+
+        auth_service, client = auth
+
+        async def scenario():
+            key, created = await auth_service.generate_access_key(
+                AccessKeyCreate(name="batched", scopes=[AccessKeyScope.READ]), "admin"
+            )
+            before = client.round_trips
+            for _ in range(3):
+                assert await auth_service.validate_access_key(key)
+            validation_trips = client.round_trips - before
+            await auth_service.flush_usage()
+            listed = await auth_service.get_admin_keys("admin")
+            await auth_service.revoke_access_key(created.id, "admin")
+            revoked = await auth_service.validate_access_key(key)
+            await auth_service.stop()
+            return created, validation_trips, listed, revoked
+
+        created, validation_trips, listed, revoked = asyncio.run(scenario())
+        assert validation_trips == 1
+        assert {key.id: key.uses_count for key in listed}[created.id] == 3
+        assert revoked is None
+        assert client.data["published:auth:invalidate"]
+
+
+class TestAccessKeyUsage:
+    """max_uses holds across workers; local counts survive reloads and never recreate expired keys"""
+
+    @pytest.fixture
+    def workers(self, monkeypatch):
+        from services import auth_service as auth_module
+
+        client = CountingRedis()
+        monkeypatch.setattr(auth_module.redis_service, "redis_client", client)
+        return auth_module.AuthService(), auth_module.AuthService(), client
+
+    @staticmethod
+    def create_key(auth_service, max_uses=None):
+        from models.auth import AccessKeyCreate, AccessKeyScope
+
+        return asyncio.run(auth_service.generate_access_key(
+            AccessKeyCreate(name="key", scopes=[AccessKeyScope.READ], max_uses=max_uses), "admin"
+        ))
+
+    def test_max_uses_is_shared_by_every_worker(self, workers):
+        first, second, client = workers
+        key, created = self.create_key(first, max_uses=3)
+
+        async def scenario():
+            return [
+                await worker.validate_access_key(key) is not None
+                for worker in (first, second, first, second, first)
+            ]
+
+        accepted = asyncio.run(scenario())
+
+        key_hash = client.data["access_key_index"][created.id]
+        assert accepted == [True, True, True, False, False]
+        assert client.data[f"access_key:{key_hash}"]["uses_count"] == "3"
+        assert first.cache_stats()["pending_key_uses"] == 0
+
+    def test_pending_uses_survive_a_cache_reload(self, workers):
+        auth_service, _, client = workers
+        key, created = self.create_key(auth_service)
+
+        async def scenario():
+            for _ in range(2):
+                await auth_service.validate_access_key(key)
+            auth_service._key_cache.clear()
+            return await auth_service.validate_access_key(key)
+
+        assert asyncio.run(scenario()).uses_count == 3
+
+    def test_flush_does_not_recreate_an_expired_key(self, workers):
+        auth_service, _, client = workers
+        key, created = self.create_key(auth_service)
+        key_hash = client.data["access_key_index"][created.id]
+
+        async def scenario():
+            await auth_service.validate_access_key(key)
+            del client.data[f"access_key:{key_hash}"]  # TTL elapsed before the flush
+            return await auth_service.flush_usage()
+
+        assert asyncio.run(scenario()) == 0
+        assert f"access_key:{key_hash}" not in client.data
+        assert auth_service.cache_stats()["pending_key_uses"] == 0
+
+
+class FlakyRedis(CountingRedis):
+    """CountingRedis that can be taken down: every round trip then fails like a dropped connection"""
+
+    def __init__(self):
+        super().__init__()
+        self.down = False
+
+    def run(self, name, *args, **kwargs):
+        if self.down:
+            raise ConnectionError("connection reset")
+        return super().run(name, *args, **kwargs)
+
+
+class TestCircuitBreaker:
+    """A Redis outage trips the breaker; non-critical writes wait in memory until the probe sees it back"""
+
+    @pytest.fixture
+    def flaky(self, service):
+        client = FlakyRedis()
+        service.redis_client = client
+        return service, client
+
+    def test_outage_fails_fast_and_buffers_writes(self, flaky):
+        service, client = flaky
+        asyncio.run(service.increment_global_stat("learning_sessions"))
+        client.down = True
+
+        async def outage():
+            for _ in range(service.health.failure_threshold):
+                await service.get_user_progress("u1", "cash-flow")
+            before = client.round_trips
+            progress = await service.get_user_progress("u1", "cash-flow")
+            counted = await service.increment_global_stat("learning_sessions", 2)
+            session_id = await service.start_learning_session("u1", "cash-flow")
+            return progress, counted, session_id, client.round_trips - before
+
+        progress, counted, session_id, trips = asyncio.run(outage())
+
+        assert not service.is_available()
+        assert (progress, counted, trips) == (None, True, 0)
+        assert session_id
+        assert service.health_snapshot()["pending_writes"] == 2
+
+    def test_probe_closes_the_breaker_and_replays_in_order(self, flaky):
+        service, client = flaky
+        client.down = True
+        for _ in range(service.health.failure_threshold):
+            asyncio.run(service.get_global_stats())
+        asyncio.run(service.increment_global_stat("modules_completed", 3))
+        session_id = asyncio.run(service.start_learning_session("u1", "cash-flow"))
+        asyncio.run(service.end_learning_session(session_id, 100.0))
+
+        assert asyncio.run(service.probe()) is False
+        client.down = False
+        assert asyncio.run(service.probe()) is True
+
+        assert service.is_available()
+        assert service.health_snapshot()["pending_writes"] == 0
+        assert asyncio.run(service.get_global_stats()) == {"modules_completed": 3}
+        assert client.data[f"session:{session_id}"]["status"] == "completed"
+
+    def test_buffer_is_bounded(self, flaky):
+        service, client = flaky
+        service._fallback_writes = type(service._fallback_writes)(maxlen=2)
+        client.down = True
+        for _ in range(service.health.failure_threshold):
+            asyncio.run(service.get_global_stats())
+        for _ in range(5):
+            asyncio.run(service.increment_global_stat("learning_sessions"))
+
+        snapshot = service.health_snapshot()
+        assert (snapshot["pending_writes"], snapshot["fallback_dropped"]) == (2, 3)
+
+    def test_slow_replies_open_the_breaker(self, flaky):
+        service, client = flaky
+        slow_latency = service.health.slow_latency_seconds
+        service.health.slow_latency_seconds = 0.0  # every reply counts as slow
+        for _ in range(service.health.failure_threshold):
+            asyncio.run(service.get_global_stats())
+
+        assert not service.is_available()
+        assert asyncio.run(service.probe()) is False
+
+        service.health.slow_latency_seconds = slow_latency
+        assert asyncio.run(service.probe()) is True
+        assert service.is_available()
+
+    def test_paths_without_fallback_raise_a_typed_error(self, flaky, monkeypatch):
+        from services import auth_service as auth_module
+
+        service, client = flaky
+        monkeypatch.setattr(auth_module, "redis_service", service)
+        client.down = True
+        for _ in range(service.health.failure_threshold):
+            asyncio.run(service.get_global_stats())
+
+        with pytest.raises(RedisUnavailableError):
+            service.batch()
+        with pytest.raises(RedisUnavailableError):
+            asyncio.run(auth_module.auth_service.validate_access_key("kat_unknown"))
+        with pytest.raises(RedisUnavailableError):
+            asyncio.run(auth_module.auth_service.create_user_from_access_code("abcdef"))
+        with pytest.raises(RedisUnavailableError):
+            asyncio.run(auth_module.auth_service.get_admin_keys("admin"))
@@ -0,0 +1,109 @@
+"""
+Unit tests for hedged LLM requests
+"""
+
+import asyncio
+
+from services.request_hedging import HedgePolicy, hedged_call
+
+
+def make_policy(max_ratio=1.0):
+    policy = HedgePolicy()
+    policy.max_hedge_ratio = max_ratio
+    return policy
+
+
+async def respond_after(delay, value, cancelled=None):
+    try:
+        await asyncio.sleep(delay)
+    except asyncio.CancelledError:
+        if cancelled is not None:
+            cancelled.append(value)
+        raise
+    return value
+
+
+class TestHedgedCall:
+    """Race between primary and secondary providers"""
+
+    def test_fast_primary_is_not_hedged(self):
+        policy = make_policy()
+        result, hedge_won = asyncio.run(hedged_call(
+            policy,
+            lambda: respond_after(0.01, "primary"),
+            lambda: respond_after(0.01, "secondary"),
+            delay=0.2
+        ))
+
+        assert result == "primary"
+        assert not hedge_won
+        assert policy.hedged_requests == 0
+
+    def test_slow_primary_loses_to_hedge_and_is_cancelled(self):
+        policy = make_policy()
+        cancelled = []
+
+        async def scenario():
+            outcome = await hedged_call(
+                policy,
+                lambda: respond_after(1.0, "primary", cancelled),
+                lambda: respond_after(0.01, "secondary"),
+                delay=0.05
+            )
+            await asyncio.sleep(0)  # let the cancellation propagate
+            return outcome
+
+        result, hedge_won = asyncio.run(scenario())
+
+        assert result == "secondary"
+        assert hedge_won
+        assert cancelled == ["primary"]
+        assert policy.hedge_wins == 1
+
+    def test_hedge_ratio_cap_keeps_waiting_on_primary(self):
+        policy = make_policy(max_ratio=0.0)
+        result, hedge_won = asyncio.run(hedged_call(
+            policy,
+            lambda: respond_after(0.1, "primary"),
+            lambda: respond_after(0.01, "secondary"),
+            delay=0.01
+        ))
+
+        assert result == "primary"
+        assert not hedge_won
+        assert policy.hedged_requests == 0
+
+    def test_failed_hedge_falls_back_to_primary(self):
+        policy = make_policy()
+
+        async def failing():
+            raise RuntimeError("secondary down")
+
+        result, hedge_won = asyncio.run(hedged_call(
+            policy,
+            lambda: respond_after(0.1, "primary"),
+            failing,
+            delay=0.01
+        ))
+
+        assert result == "primary"
+        assert not hedge_won
+
+    def test_cancelled_caller_cancels_both_requests(self):
+        policy = make_policy()
+        cancelled = []
+
+        async def scenario():
+            call = asyncio.ensure_future(hedged_call(
+                policy,
+                lambda: respond_after(1.0, "primary", cancelled),
+                lambda: respond_after(1.0, "secondary", cancelled),
+                delay=0.01
+            ))
+            await asyncio.sleep(0.05)  # both requests in flight
+            call.cancel()
+            await asyncio.gather(call, return_exceptions=True)
+            await asyncio.sleep(0)  # let the cancellations propagate
+            return sorted(cancelled)  # before asyncio.run cancels whatever is left
+
+        assert asyncio.run(scenario()) == ["primary", "secondary"]
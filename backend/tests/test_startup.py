@@ -0,0 +1,41 @@
+"""
+Unit tests for the startup profile and warm-up phase
+"""
+
+import asyncio
+
+from services.startup import StartupProfile
+
+
+class TestWarmUp:
+    """Readiness flips only after every warm-up step ran"""
+
+    def test_sync_and_async_steps_run_and_errors_do_not_block_readiness(self):
+        profile = StartupProfile()
+        calls = []
+
+        async def async_step():
+            calls.append("async")
+
+        def failing_step():
+            raise RuntimeError("redis down")
+
+        assert not profile.snapshot()["ready"]
+        asyncio.run(profile.warm_up([
+            ("sync", lambda: calls.append("sync")),
+            ("async", async_step),
+            ("redis", failing_step),
+        ]))
+
+        snapshot = profile.snapshot()
+        assert calls == ["sync", "async"]
+        assert snapshot["ready"]
+        assert [step["status"] for step in snapshot["warmup_steps"]] == ["ok", "ok", "error"]
+
+    def test_import_phases_sorted_by_cost(self):
+        profile = StartupProfile()
+        with profile.measure("fast"):
+            pass
+        with profile.measure("slow"):
+            sum(range(200000))
+        assert profile.snapshot()["import_phases"][0]["phase"] == "slow"
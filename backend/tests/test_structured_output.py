@@ -0,0 +1,116 @@
+"""
+Unit tests for the schema-constrained JSON output mode of the LangChain agents (LLM calls stubbed)
+"""
+
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("langchain_openai")
+
+from langchain.schema import AIMessage
+
+from agents.langchain_agents import CashFlowAnalysis, MayaCashFlowAgent, response_schema_prompt
+from services.dual_ai_service import dual_ai_service
+from services.provider_scheduler import Priority, priority_scope
+from services.redis_service import redis_service
+
+VALID_ANALYSIS = {
+    "runway_months": 6.5,
+    "risk_level": "Medium",
+    "liquidity_ratio": 1.4,
+    "seasonal_patterns": ["Ventas bajas en enero"],
+    "recommendations": [{
+        "title": "Negociar plazos con proveedores",
+        "description": "Extender pagos a 60 días",
+        "priority": "high",
+        "impact": "Libera caja en el corto plazo",
+        "timeline": "30 días"
+    }],
+    "next_review_date": "2026-11-30"
+}
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test-key")
+    monkeypatch.setattr(redis_service, "redis_client", None)
+    agent = MayaCashFlowAgent()
+    agent.output_mode = "structured"
+    agent.calls = []
+    return agent
+
+
+def stub_llm(agent, *replies):
+    """Replace the provider call with canned replies, recording each call"""
+    async def invoke(llm, model_name, messages, user_id, retrieval_seconds=0.0):
+        agent.calls.append(messages)
+        return AIMessage(content=replies[len(agent.calls) - 1]), {"prompt_tokens": 10, "completion_tokens": 5}
+    agent._invoke_llm = invoke
+
+
+class TestResponseSchemaPrompt:
+    """The schema sent to the model keeps real properties and drops annotations"""
+
+    def test_recommendation_title_property_is_kept(self):
+        schema = json.loads(response_schema_prompt(CashFlowAnalysis))
+        recommendation = schema["$defs"]["AgentRecommendation"]
+
+        assert "title" in recommendation["properties"]
+        assert "title" in recommendation["required"]
+        assert "title" not in schema
+        assert "citations" not in schema["properties"]
+
+
+class TestStructuredAnalysis:
+    """One validated pass, at most one repair, then the agent error fallback"""
+
+    def test_valid_json_is_parsed_in_one_call(self, agent):
+        stub_llm(agent, json.dumps(VALID_ANALYSIS))
+
+        result = asyncio.run(agent.process_request("u1", {"question": "¿Cuánto runway tengo?"}))
+
+        structured = result["analysis"]["structured_analysis"]
+        assert len(agent.calls) == 1
+        assert structured["recommendations"][0]["title"] == "Negociar plazos con proveedores"
+        assert result["analysis"]["usage"]["total_tokens"] == 15
+
+    def test_invalid_json_is_repaired_once(self, agent):
+        stub_llm(agent, '{"runway_months": "muchos"}', json.dumps(VALID_ANALYSIS))
+
+        result = asyncio.run(agent.process_request("u1", {"question": "¿Cuánto runway tengo?"}))
+
+        assert len(agent.calls) == 2
+        assert "error" not in result
+        assert result["analysis"]["usage"]["total_tokens"] == 30
+
+    def test_second_invalid_reply_falls_back_to_the_agent_error(self, agent):
+        stub_llm(agent, "no es json", "tampoco", json.dumps(VALID_ANALYSIS))
+
+        result = asyncio.run(agent.process_request("u1", {"question": "¿Cuánto runway tengo?"}))
+
+        assert len(agent.calls) == 2
+        assert "error" in result
+        assert result["analysis"]["structured_analysis"] == {}
+
+
+class TestAgentLLMScheduling:
+    """Agent LLM calls go through the DeepSeek bulkhead at the priority of their block"""
+
+    def test_call_takes_a_slot_at_the_scoped_priority(self, agent):
+        class FakeLLM:
+            async def ainvoke(self, messages):
+                return AIMessage(content="ok")
+
+        stats = dual_ai_service.scheduler.bulkheads["deepseek"].stats
+        before = stats[Priority.BATCH].admitted
+
+        async def scenario():
+            with priority_scope(Priority.BATCH):
+                return await agent._invoke_llm(FakeLLM(), "deepseek-chat", [], "u1")
+
+        response, _ = asyncio.run(scenario())
+
+        assert response.content == "ok"
+        assert stats[Priority.BATCH].admitted == before + 1
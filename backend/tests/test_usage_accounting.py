@@ -0,0 +1,68 @@
+"""
+Unit tests for AI usage accounting (in-memory fallback, no Redis)
+"""
+
+import asyncio
+
+import pytest
+
+from services import usage_accounting as accounting_module
+from services.usage_accounting import (
+    UsageAccounting,
+    UsageRecord,
+    extract_usage,
+    usage_scope,
+)
+
+
+@pytest.fixture
+def accounting(monkeypatch):
+    monkeypatch.setattr(accounting_module.redis_service, "redis_client", None)
+    return UsageAccounting()
+
+
+class TestUsageAccounting:
+    """Roll-ups per dimension, cost and attribution"""
+
+    def test_rolls_up_by_provider_and_user(self, accounting):
+        with usage_scope(user="user-1", endpoint="POST /api/ai/chat"):
+            accounting.record(UsageRecord(
+                provider="deepseek", model="deepseek-reasoner",
+                prompt_tokens=1000, completion_tokens=500, latency_seconds=3.2
+            ))
+            accounting.record(UsageRecord(provider="openai", model="gpt-4o-mini", latency_seconds=0.4, error=True))
+
+        providers = {row["value"]: row for row in asyncio.run(accounting.get_usage("provider"))["rows"]}
+        users = asyncio.run(accounting.get_usage("user"))["rows"]
+
+        assert providers["deepseek"]["prompt_tokens"] == 1000
+        assert providers["deepseek"]["cost_usd"] == pytest.approx((1000 * 0.55 + 500 * 2.19) / 1_000_000, abs=1e-6)
+        assert providers["deepseek"]["p95_latency_le_seconds"] == "5"
+        assert providers["openai"]["errors"] == 1
+        assert [(row["value"], row["calls"]) for row in users] == [("user-1", 2)]
+
+    def test_explicit_labels_override_scope(self, accounting):
+        with usage_scope(user="user-1", agent="maya"):
+            accounting.record(UsageRecord(provider="deepseek", model="deepseek-reasoner", labels={"agent": "carlos"}))
+
+        agents = [row["value"] for row in asyncio.run(accounting.get_usage("agent"))["rows"]]
+        assert agents == ["carlos"]
+
+    def test_cached_prompt_tokens_are_cheaper(self):
+        full = UsageRecord(provider="deepseek", model="deepseek-reasoner", prompt_tokens=1_000_000)
+        cached = UsageRecord(provider="deepseek", model="deepseek-reasoner",
+                             prompt_tokens=1_000_000, cached_prompt_tokens=1_000_000)
+
+        assert cached.cost_usd < full.cost_usd
+
+
+class TestExtractUsage:
+
+    def test_deepseek_usage_block(self):
+        usage = extract_usage({
+            "prompt_tokens": 120, "completion_tokens": 80, "prompt_cache_hit_tokens": 64,
+            "completion_tokens_details": {"reasoning_tokens": 50}
+        })
+
+        assert usage == {"prompt_tokens": 120, "completion_tokens": 80,
+                         "reasoning_tokens": 50, "cached_prompt_tokens": 64}